@@ -0,0 +1,676 @@
+#!/usr/bin/env python3
+"""
+合成账簿数据生成器
+按final_enhanced_balance.csv与final_voucher_detail.csv的结构生成任意规模的基准测试数据：
+科目层级与核算维度取自现有余额表（不存在时使用内置科目表），凭证按业务模板生成且借贷平衡，
+年末结转损益；余额表由凭证发生额汇总并逐年结转，满足会计恒等式、年度连续性与上下级汇总关系。
+凭证按时间分块生成并追加写入，5000万行规模下内存占用只与分块大小有关
+"""
+
+import argparse
+import itertools
+import json
+import string
+import time
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+BASE_DIR = Path(__file__).parent.parent
+TEMPLATE_BALANCE_FILE = BASE_DIR / "format-data/financial/final_enhanced_balance.csv"
+
+# 预设的凭证明细行数
+PRESETS = {"small": 100_000, "1m": 1_000_000, "10m": 10_000_000, "50m": 50_000_000}
+
+# 每个分块生成的凭证明细行数（近似值）
+CHUNK_ROWS = 1_000_000
+
+VOUCHER_COLUMNS = ["分录行号", "日期", "会计年度", "期间", "凭证字", "凭证号", "摘要", "科目编码", "科目全名",
+                   "币别", "原币金额", "借方金额", "贷方金额", "制单", "审核", "过账", "出纳", "附件数",
+                   "来源系统", "业务类型", "审核状态", "作废状态", "公司", "文件来源", "凭证唯一标识"]
+BALANCE_COLUMNS = ["科目编码", "科目名称", "核算维度编码", "核算维度名称", "期初余额借方", "期初余额贷方",
+                   "本年累计借方", "本年累计贷方", "期末余额借方", "期末余额贷方", "文件来源", "公司", "期间",
+                   "币别", "subject_code_path", "subject_name_path", "is_dimension_row", "年份"]
+
+# 内置科目表，没有现有余额表时使用（覆盖凭证模板用到的全部科目）
+BUILTIN_CHART = [
+    ("1001", "库存现金"), ("1002", "银行存款"), ("1002.01", "工商银行"), ("1002.02", "中国农业银行"),
+    ("1002.03", "广发银行"), ("1122", "应收账款"), ("1221", "其他应收款"), ("1403", "原材料"),
+    ("1405", "库存商品"), ("1601", "固定资产"), ("1602", "累计折旧"), ("2202", "应付账款"),
+    ("2202.01", "材料供应商"), ("2202.02", "固定资产供应商"), ("2211", "应付职工薪酬"), ("2211.01", "工资"),
+    ("2211.02", "社会保险费"), ("2221", "应交税费"), ("2221.01", "应交增值税"), ("2221.01.01", "进项税额"),
+    ("2221.01.05", "销项税额"), ("4001", "实收资本"), ("4103", "本年利润"), ("5001", "生产成本"), ("5101", "制造费用"),
+    ("6001", "主营业务收入"), ("6401", "主营业务成本"), ("6601", "销售费用"), ("6602", "管理费用"),
+    ("6602.01", "办公费"), ("6602.02", "业务招待费"), ("6602.03", "差旅费"), ("6602.04", "职工薪酬"),
+]
+
+# 往来科目及其核算维度（交易对方）类型
+PARTY_SUBJECTS = {"1122": "customer", "2202": "supplier"}
+
+# 本年利润科目，年末损益类科目结转至此
+PROFIT_SUBJECT = "4103"
+# 实收资本科目，期初余额的轧差科目
+CAPITAL_SUBJECT = "4001"
+
+# 凭证模板：lines为(借贷方向, 科目编码前缀, 末级科目名称关键字, 金额类型)，
+# 金额类型net为不含税金额、tax为税额（13%）、total为价税合计，scale为独立凭证的金额倍数。
+# 带follows的模板为后续凭证，不独立抽样：按rate比例跟随所列模板（按摘要格式指定，须排在其后）的凭证生成，
+# 不含税金额为原凭证的ratio倍，日期滞后lag天，交易对方类型相同时沿用原凭证的交易对方及往来明细科目。
+# 收付款逐笔核销已开具的发票，往来余额不会被超额冲销；存货按采购→领料→完工入库→销售→结转成本流转，
+# 只有已入库的商品才会销售，库存不会为负
+VOUCHER_TEMPLATES = [
+    {"summary": "采购材料/{counterparty}", "weight": 0.22, "source": "采购管理", "business": "采购增值税专用发票",
+     "lines": [("debit", "1403", None, "net"), ("debit", "2221", "进项", "tax"), ("credit", "2202", "材料", "total")]},
+    {"summary": "购入固定资产/{counterparty}", "weight": 0.004, "scale": 10, "source": "采购管理", "business": "采购增值税专用发票",
+     "lines": [("debit", "1601", None, "net"), ("debit", "2221", "进项", "tax"), ("credit", "2202", "固定资产", "total")]},
+    {"summary": "{maker}报{subject}/{department}", "weight": 0.06, "source": "总账", "business": "手工录入",
+     "lines": [("debit", "6602", None, "net"), ("credit", "1002", None, "net")]},
+    {"summary": "计提{year}年{month}月工资", "weight": 0.03, "source": "总账", "business": "手工录入",
+     "lines": [("debit", "6602", "薪酬", "net"), ("credit", "2211", None, "net")]},
+    {"summary": "计提{month}月折旧", "weight": 0.02, "source": "总账", "business": "手工录入",
+     "lines": [("debit", "5101", "折旧", "net"), ("credit", "1602", None, "net")]},
+    {"summary": "生产领料", "follows": ("采购材料/{counterparty}",), "rate": 1.0, "ratio": 1.0, "lag": (0, 20),
+     "source": "生产管理", "business": "生产领料单",
+     "lines": [("debit", "5001", None, "net"), ("credit", "1403", None, "net")]},
+    {"summary": "完工入库", "follows": ("生产领料",), "rate": 1.0, "ratio": 1.0, "lag": (5, 30),
+     "source": "生产管理", "business": "生产入库单",
+     "lines": [("debit", "1405", None, "net"), ("credit", "5001", None, "net")]},
+    {"summary": "确认{counterparty}收入", "follows": ("完工入库",), "rate": 1.0, "ratio": 2.0, "lag": (0, 60),
+     "source": "发票管理", "business": "销售增值税专用发票",
+     "lines": [("debit", "1122", None, "total"), ("credit", "6001", None, "net"), ("credit", "2221", "销项", "tax")]},
+    {"summary": "结转销售成本", "follows": ("确认{counterparty}收入",), "rate": 1.0, "ratio": 0.5, "lag": (0, 0),
+     "source": "销售管理", "business": "销售出库单",
+     "lines": [("debit", "6401", None, "net"), ("credit", "1405", None, "net")]},
+    {"summary": "收到货款/{counterparty}", "follows": ("确认{counterparty}收入",), "rate": 0.9, "ratio": 1.0, "lag": (15, 120),
+     "source": "出纳管理", "business": "收款单",
+     "lines": [("debit", "1002", None, "total"), ("credit", "1122", None, "total")]},
+    {"summary": "支付货款/{counterparty}", "follows": ("采购材料/{counterparty}", "购入固定资产/{counterparty}"),
+     "rate": 0.75, "ratio": 1.0, "lag": (30, 120), "source": "出纳管理", "business": "付款单",
+     "lines": [("debit", "2202", None, "total"), ("credit", "1002", None, "total")]},
+    {"summary": "发放{year}年{month}月工资", "follows": ("计提{year}年{month}月工资",), "rate": 1.0, "ratio": 1.0, "lag": (5, 15),
+     "source": "总账", "business": "手工录入",
+     "lines": [("debit", "2211", None, "net"), ("credit", "1002", None, "net")]},
+]
+
+# 备抵科目及其对应的资产科目（一级科目编码），备抵科目的期初余额取对应资产期初余额的一定比例
+CONTRA_SUBJECTS = {"1231": "1122", "1602": "1601", "1702": "1701"}
+
+MAKERS = ["梁映婵", "方晓淮", "朱彩荧", "刘锦秀"]
+REVIEWER = "梁映婵"
+DEPARTMENTS = ["财务部", "市场部", "生产部", "研发部", "行政部", "采购部"]
+
+# 合成公司与交易对方名称的组成部分
+NAME_REGIONS = ["广州", "深圳", "上海", "东莞", "佛山", "苏州", "杭州", "宁波", "天津", "重庆", "成都", "武汉",
+                "长沙", "厦门", "青岛", "南京", "无锡", "常州", "中山", "珠海", "清远", "江门", "惠州", "合肥"]
+NAME_WORDS = ["华", "泰", "金", "瑞", "恒", "鑫", "博", "达", "盛", "宏", "信", "安", "联", "创", "丰", "源",
+              "明", "德", "新", "海", "中", "嘉", "永", "兴"]
+NAME_INDUSTRIES = ["科技", "实业", "材料", "贸易", "机械", "电子", "化工", "物流", "包装", "新能源", "精密", "汽车配件"]
+NAME_SUFFIXES = ["有限公司", "股份有限公司"]
+
+def synthetic_names(count: int, rng: np.random.Generator, exclude: Optional[set] = None) -> List[str]:
+    """生成count个不重复的企业名称（地区+两字商号+行业+组织形式）"""
+    exclude = exclude or set()
+    names: List[str] = []
+    if count <= 0:
+        return names
+    pool = list(itertools.product(NAME_REGIONS, NAME_WORDS, NAME_WORDS, NAME_INDUSTRIES, NAME_SUFFIXES))
+    for i in rng.permutation(len(pool)):
+        region, first, second, industry, suffix = pool[i]
+        if first == second:
+            continue
+        name = f"{region}{first}{second}{industry}{suffix}"
+        if name not in exclude:
+            names.append(name)
+            if len(names) >= count:
+                break
+    return names
+
+def load_chart(template_file: Optional[Path]) -> Tuple[pd.DataFrame, pd.DataFrame, List[str]]:
+    """读取科目表、核算维度与公司名称
+
+    返回(科目表, 核算维度, 公司列表)：科目表含code/name/code_path/name_path/level/is_leaf，
+    核算维度含party/code/name。模板余额表不存在时使用内置科目表
+    """
+    if template_file is not None and Path(template_file).exists():
+        template = pd.read_csv(template_file, encoding="utf-8")
+        subjects = template[(template["is_dimension_row"] != True) & template["科目编码"].notna()]
+        subjects = subjects.drop_duplicates("科目编码")
+        chart = pd.DataFrame({
+            "code": subjects["科目编码"].astype(str),
+            "name": subjects["科目名称"].astype(str).str.strip().str.strip("　"),
+            "code_path": subjects["subject_code_path"].astype(str),
+            "name_path": subjects["subject_name_path"].astype(str),
+        })
+        dims = template[template["is_dimension_row"] == True]
+        top = dims["subject_code_path"].astype(str).str.split("/").str[1]
+        dimensions = pd.DataFrame({
+            "party": top.map(PARTY_SUBJECTS),
+            "code": dims["核算维度编码"].astype(str),
+            "name": dims["核算维度名称"].astype(str),
+        }).dropna().drop_duplicates("name")
+        companies = list(template["公司"].dropna().unique())
+    else:
+        codes = [code for code, _ in BUILTIN_CHART]
+        names = dict(BUILTIN_CHART)
+        code_paths, name_paths = [], []
+        for code in codes:
+            parts = code.split(".")
+            ancestors = [".".join(parts[:i]) for i in range(1, len(parts) + 1)]
+            code_paths.append("/" + "/".join(ancestors) + "/")
+            name_paths.append("/" + "/".join(names[a] for a in ancestors) + "/")
+        chart = pd.DataFrame({"code": codes, "name": [names[c] for c in codes],
+                              "code_path": code_paths, "name_path": name_paths})
+        dimensions = pd.DataFrame(columns=["party", "code", "name"])
+        companies = []
+
+    chart = chart.sort_values("code_path", ignore_index=True)
+    chart["level"] = chart["code"].str.count(r"\.") + 1
+    parents = set(chart["code"].str.rsplit(".", n=1).str[0][chart["level"] > 1])
+    chart["is_leaf"] = ~chart["code"].isin(parents)
+    chart["full_name"] = chart["name_path"].str.strip("/").str.replace("/", "_", regex=False)
+    return chart, dimensions, companies
+
+class LedgerGenerator:
+    """按科目表与凭证模板生成凭证明细，并汇总为科目余额表"""
+
+    def __init__(self, chart: pd.DataFrame, dimensions: pd.DataFrame, rows: int, companies: List[str],
+                 start_year: int = 2023, years: int = 3, seed: int = 20240101, counterparties: Optional[int] = None):
+        self.chart = chart
+        self.rows = rows
+        self.companies = np.asarray(companies, dtype=object)
+        self.company_codes = np.asarray([f"c{i:03d}" for i in range(len(companies))], dtype=object)
+        self.start_year = start_year
+        self.years = years
+        self.seed = seed
+        self.rng = np.random.default_rng(seed)
+
+        self.codes = chart["code"].to_numpy(dtype=object)
+        self.full_names = chart["full_name"].to_numpy(dtype=object)
+        self.short_names = chart["name"].to_numpy(dtype=object)
+        self._resolve_templates()
+
+        pool_size = counterparties or min(5000, max(500, rows // 20000))
+        self.parties = {party: self._counterparty_pool(dimensions, party, pool_size) for party in set(PARTY_SUBJECTS.values())}
+
+        # 日期表：按自起始年1月1日的天数取日期字符串与会计年度
+        days = pd.date_range(f"{start_year}-01-01", f"{start_year + years - 1}-12-31", freq="D")
+        self.day_years = days.year.to_numpy()
+        self.day_months = days.month.to_numpy()
+        self.day_labels = np.asarray([f"{d.year}/{d.month}/{d.day}" for d in days], dtype=object)
+        self.year_labels = {y: f"{y // 1000},{y % 1000:03d}" for y in range(start_year, start_year + years)}
+        # 每个（公司, 年, 月）已使用的凭证号
+        self.voucher_numbers = np.zeros(len(companies) * years * 12, dtype=np.int64)
+
+        # 日期晚于已生成分块、尚待输出的后续凭证
+        self.pending: Optional[pd.DataFrame] = None
+        self.leaf_moves: List[pd.DataFrame] = []
+        self.party_moves: List[pd.DataFrame] = []
+        self.voucher_rows = 0
+        self.voucher_count = 0
+
+    def _leaf_pool(self, prefix: str, keyword: Optional[str]) -> np.ndarray:
+        """科目前缀下的末级科目位置，可按科目全名关键字筛选"""
+        chart = self.chart
+        under = chart["is_leaf"] & ((chart["code"] == prefix) | chart["code"].str.startswith(prefix + "."))
+        if keyword:
+            matched = under & chart["full_name"].str.contains(keyword, regex=False)
+            if matched.any():
+                under = matched
+        if not under.any():
+            raise ValueError(f"科目表中没有科目 {prefix}")
+        return np.flatnonzero(under.to_numpy())
+
+    def _resolve_templates(self):
+        """将凭证模板中的科目前缀解析为末级科目位置，后续凭证模板解析为所跟随模板的位置"""
+        self.templates = []
+        summaries = [template["summary"] for template in VOUCHER_TEMPLATES]
+        for template in VOUCHER_TEMPLATES:
+            lines = [(side, self._leaf_pool(prefix, keyword), kind, PARTY_SUBJECTS.get(prefix))
+                     for side, prefix, keyword, kind in template["lines"]]
+            parties = {party for *_, party in lines if party}
+            fields = [field for _, field, _, _ in string.Formatter().parse(template["summary"]) if field]
+            sources = [summaries.index(summary) for summary in template.get("follows", ())]
+            if any(source >= len(self.templates) for source in sources):
+                raise ValueError(f"后续凭证模板须排在所跟随的模板之后: {template['summary']}")
+            self.templates.append({**template, "lines": lines, "party": next(iter(parties), None), "fields": fields,
+                                   "party_pool": next((pool for _, pool, _, party in lines if party), None),
+                                   "sources": sources})
+        weights = np.asarray([0.0 if t["sources"] else t["weight"] for t in self.templates])
+        self.template_weights = weights / weights.sum()
+        self.template_scales = np.asarray([t.get("scale", 1.0) for t in self.templates])
+        # 每张独立凭证连同其后续凭证的期望张数与明细行数
+        expected = self.template_weights.copy()
+        for t, template in enumerate(self.templates):
+            if template["sources"]:
+                expected[t] = template["rate"] * expected[template["sources"]].sum()
+        lines = np.asarray([len(t["lines"]) for t in self.templates])
+        self.mean_lines = float((lines * expected).sum())
+
+    def _counterparty_pool(self, dimensions: pd.DataFrame, party: str, size: int) -> Tuple[np.ndarray, np.ndarray]:
+        """交易对方的核算维度编码与名称：优先使用模板余额表中的维度，不足部分合成"""
+        existing = dimensions[dimensions["party"] == party].head(size)
+        codes = list(existing["code"])
+        names = list(existing["name"])
+        prefix = "1.01" if party == "customer" else "02"
+        extra = synthetic_names(size - len(names), self.rng, exclude=set(names))
+        codes += [f"{prefix}.{9000 + i:05d}" for i in range(len(extra))]
+        names += extra
+        return np.asarray(codes, dtype=object), np.asarray(names, dtype=object)
+
+    def _summaries(self, template: dict, n: int, counterparty: np.ndarray, subject: np.ndarray,
+                   year: np.ndarray, month: np.ndarray) -> np.ndarray:
+        """按模板的摘要格式整列拼接摘要"""
+        values = {
+            "counterparty": lambda: pd.Series(counterparty),
+            "subject": lambda: pd.Series(subject),
+            "maker": lambda: pd.Series(np.asarray(MAKERS, dtype=object)[self.rng.integers(0, len(MAKERS), n)]),
+            "department": lambda: pd.Series(np.asarray(DEPARTMENTS, dtype=object)[self.rng.integers(0, len(DEPARTMENTS), n)]),
+            "year": lambda: pd.Series(year).astype(str),
+            "month": lambda: pd.Series(month).astype(str),
+        }
+        summary = pd.Series([""] * n, dtype=object)
+        for literal, field, _, _ in string.Formatter().parse(template["summary"]):
+            summary = summary + literal
+            if field:
+                summary = summary + values[field]()
+        return summary.to_numpy(dtype=object)
+
+    def _number_vouchers(self, company: np.ndarray, year: np.ndarray, month: np.ndarray) -> np.ndarray:
+        """按（公司, 年, 月）顺序编号，输入须已按公司、日期排序"""
+        period_key = company * (self.years * 12) + (year - self.start_year) * 12 + month - 1
+        n = len(period_key)
+        starts = np.r_[True, period_key[1:] != period_key[:-1]]
+        group_start = np.maximum.accumulate(np.where(starts, np.arange(n), 0))
+        numbers = self.voucher_numbers[period_key] + np.arange(n) - group_start + 1
+        np.add.at(self.voucher_numbers, period_key, 1)
+        return numbers
+
+    def _draw_counterparties(self, template: dict, n: int) -> Tuple[np.ndarray, np.ndarray]:
+        """为n张凭证抽取交易对方及其往来明细科目"""
+        pool = len(self.parties[template["party"]][0])
+        # 交易对方按幂律分布抽取，少数客户/供应商占多数业务
+        counterparty = (pool * self.rng.random(n) ** 2).astype(np.int64)
+        # 往来科目的明细科目由交易对方决定（如供应商固定属于某一类应付账款）
+        leaves = template["party_pool"]
+        return counterparty, leaves[counterparty % len(leaves)]
+
+    def _base_vouchers(self, n: int, first_day: int, last_day: int) -> pd.DataFrame:
+        """独立抽样的n张凭证：模板、公司、日期、不含税金额、交易对方及其往来明细科目"""
+        rng = self.rng
+        template_ids = rng.choice(len(self.templates), size=n, p=self.template_weights)
+        net = np.maximum(np.round(rng.lognormal(np.log(20000), 1.2, n) * self.template_scales[template_ids], 2), 1.0)
+        counterparty = np.full(n, -1, dtype=np.int64)
+        party_leaf = np.full(n, -1, dtype=np.int64)
+        for t, template in enumerate(self.templates):
+            positions = np.flatnonzero(template_ids == t)
+            if template["party"] and len(positions):
+                counterparty[positions], party_leaf[positions] = self._draw_counterparties(template, len(positions))
+        day = rng.integers(first_day, last_day, n)
+        return pd.DataFrame({"template": template_ids, "company": rng.integers(0, len(self.companies), n), "day": day,
+                             "net": net, "counterparty": counterparty, "party_leaf": party_leaf, "source_day": day})
+
+    def _follow_ups(self, vouchers: pd.DataFrame) -> pd.DataFrame:
+        """按模板顺序为凭证追加后续凭证（后续凭证可再被跟随），后续凭证的日期可能晚于当前分块"""
+        frames = [vouchers]
+        for t, template in enumerate(self.templates):
+            if not template["sources"]:
+                continue
+            generated = pd.concat(frames, ignore_index=True)
+            source = generated[generated["template"].isin(template["sources"]).to_numpy()]
+            source = source[self.rng.random(len(source)) < template["rate"]]
+            low, high = template["lag"]
+            counterparty = source["counterparty"].to_numpy()
+            party_leaf = source["party_leaf"].to_numpy()
+            if not template["party"]:
+                party_leaf = np.full(len(source), -1, dtype=np.int64)
+            elif any(self.templates[s]["party"] != template["party"] for s in template["sources"]):
+                # 交易对方类型不同（如入库商品销售给客户）时重新抽取
+                counterparty, party_leaf = self._draw_counterparties(template, len(source))
+            frames.append(pd.DataFrame({
+                "template": t, "company": source["company"].to_numpy(),
+                "day": source["day"].to_numpy() + self.rng.integers(low, high + 1, len(source)),
+                "net": np.round(source["net"].to_numpy() * template["ratio"], 2),
+                "counterparty": counterparty, "party_leaf": party_leaf,
+                "source_day": source["day"].to_numpy(),
+            }))
+        return pd.concat(frames, ignore_index=True)
+
+    def voucher_chunk(self, n: int, first_day: int, last_day: int) -> pd.DataFrame:
+        """生成n张独立凭证及其后续凭证，输出日期位于[first_day, last_day)的明细行，晚于分块的后续凭证留待之后的分块"""
+        rng = self.rng
+        vouchers = pd.concat([self.pending, self._follow_ups(self._base_vouchers(n, first_day, last_day))],
+                             ignore_index=True)
+        day = vouchers["day"].to_numpy()
+        # 超出生成期间的后续凭证不再生成（如年末尚未收回的应收账款）
+        self.pending = vouchers[(day >= last_day) & (day < len(self.day_labels))]
+        vouchers = vouchers[day < last_day].sort_values(["company", "day"], kind="stable", ignore_index=True)
+        if vouchers.empty:
+            return pd.DataFrame(columns=VOUCHER_COLUMNS)
+
+        n = len(vouchers)
+        template_ids = vouchers["template"].to_numpy()
+        company = vouchers["company"].to_numpy()
+        day = vouchers["day"].to_numpy()
+        year, month = self.day_years[day], self.day_months[day]
+        numbers = self._number_vouchers(company, year, month)
+        net = vouchers["net"].to_numpy()
+        tax = np.round(net * 0.13, 2)
+        amounts = {"net": net, "tax": tax, "total": np.round(net + tax, 2)}
+        counterparty = vouchers["counterparty"].to_numpy()
+        party_leaf = vouchers["party_leaf"].to_numpy()
+        # 摘要中的年月取原凭证日期（如发放工资的所属月份）
+        source_day = vouchers["source_day"].to_numpy()
+        summary = np.empty(n, dtype=object)
+
+        line_parts = []
+        for t, template in enumerate(self.templates):
+            positions = np.flatnonzero(template_ids == t)
+            if len(positions) == 0:
+                continue
+            names = np.full(len(positions), "", dtype=object)
+            if template["party"]:
+                names = self.parties[template["party"]][1][counterparty[positions]]
+            leaves = [party_leaf[positions] if party else pool_[rng.integers(0, len(pool_), len(positions))]
+                      for _, pool_, _, party in template["lines"]]
+            summary[positions] = self._summaries(template, len(positions), names, self.short_names[leaves[0]],
+                                                 self.day_years[source_day[positions]],
+                                                 self.day_months[source_day[positions]])
+            for line_no, ((side, _, kind, party), leaf) in enumerate(zip(template["lines"], leaves), start=1):
+                amount = amounts[kind][positions]
+                line_parts.append(pd.DataFrame({
+                    "voucher": positions, "line": line_no, "leaf": leaf,
+                    "debit": amount if side == "debit" else 0.0,
+                    "credit": amount if side == "credit" else 0.0,
+                    "party": party or "",
+                }))
+
+        lines = pd.concat(line_parts, ignore_index=True).sort_values(["voucher", "line"], ignore_index=True)
+        v = lines["voucher"].to_numpy()
+        lines["company"] = company[v]
+        lines["year"] = year[v]
+        lines["counterparty"] = counterparty[v]
+        self._collect_moves(lines)
+
+        attachments = rng.integers(0, 4, n).astype(float)
+        return self._voucher_frame(lines, day[v], month[v], numbers[v], summary[v],
+                                   np.where(lines["line"].to_numpy() == 1, attachments[v], np.nan),
+                                   np.asarray([self.templates[t]["source"] for t in range(len(self.templates))], dtype=object)[template_ids[v]],
+                                   np.asarray([self.templates[t]["business"] for t in range(len(self.templates))], dtype=object)[template_ids[v]],
+                                   np.asarray(MAKERS, dtype=object)[rng.integers(0, len(MAKERS), n)][v])
+
+    def _voucher_frame(self, lines: pd.DataFrame, day: np.ndarray, month: np.ndarray, numbers: np.ndarray,
+                       summary: np.ndarray, attachments: np.ndarray, source: np.ndarray, business: np.ndarray,
+                       maker: np.ndarray) -> pd.DataFrame:
+        """按凭证明细表的列组织明细行"""
+        leaf = lines["leaf"].to_numpy()
+        company_names = pd.Series(self.companies[lines["company"].to_numpy()])
+        year_labels = lines["year"].map(self.year_labels)
+        period = pd.Series(month.astype(float))
+        number = pd.Series(numbers.astype(float))
+        file_source = ("pz-" + pd.Series(self.company_codes[lines["company"].to_numpy()]) + "-"
+                       + lines["year"].astype(str) + ".csv")
+        frame = pd.DataFrame({
+            "分录行号": lines["line"].to_numpy(),
+            "日期": self.day_labels[day],
+            "会计年度": year_labels.to_numpy(),
+            "期间": period.to_numpy(),
+            "凭证字": "记",
+            "凭证号": number.to_numpy(),
+            "摘要": summary,
+            "科目编码": self.codes[leaf],
+            "科目全名": self.full_names[leaf],
+            "币别": "人民币",
+            "原币金额": (lines["debit"] + lines["credit"]).to_numpy(),
+            "借方金额": lines["debit"].to_numpy(),
+            "贷方金额": lines["credit"].to_numpy(),
+            "制单": maker,
+            "审核": REVIEWER,
+            "过账": REVIEWER,
+            "出纳": np.nan,
+            "附件数": attachments,
+            "来源系统": source,
+            "业务类型": business,
+            "审核状态": "已审核",
+            "作废状态": "未作废",
+            "公司": company_names.to_numpy(),
+            "文件来源": file_source.to_numpy(),
+            "凭证唯一标识": (company_names + "_" + year_labels + "_" + period.astype(str) + "_记_"
+                         + number.astype(str)).to_numpy(),
+        }, columns=VOUCHER_COLUMNS)
+        self.voucher_rows += len(frame)
+        self.voucher_count += int((lines["line"] == 1).sum())
+        return frame
+
+    def _collect_moves(self, lines: pd.DataFrame):
+        """累计末级科目及往来维度的本年发生额"""
+        self.leaf_moves.append(lines.groupby(["company", "year", "leaf"], as_index=False)[["debit", "credit"]].sum())
+        party_lines = lines[lines["party"] != ""]
+        if not party_lines.empty:
+            self.party_moves.append(party_lines.groupby(["company", "year", "leaf", "party", "counterparty"],
+                                                        as_index=False)[["debit", "credit"]].sum())
+
+    def closing_vouchers(self) -> pd.DataFrame:
+        """每个公司每年12月31日将损益类科目余额结转至本年利润"""
+        moves = pd.concat(self.leaf_moves, ignore_index=True).groupby(["company", "year", "leaf"], as_index=False).sum()
+        moves = moves[pd.Series(self.codes[moves["leaf"].to_numpy()]).str.startswith("6").to_numpy()]
+        moves["net"] = np.round(moves["debit"] - moves["credit"], 2)
+        moves = moves[moves["net"] != 0]
+        if moves.empty:
+            return pd.DataFrame(columns=VOUCHER_COLUMNS)
+        profit_leaf = self._leaf_pool(PROFIT_SUBJECT, None)[0]
+        totals = moves.groupby(["company", "year"], as_index=False)["net"].sum()
+
+        lines = pd.concat([
+            pd.DataFrame({"company": moves["company"], "year": moves["year"], "leaf": moves["leaf"],
+                          "debit": np.maximum(-moves["net"], 0.0), "credit": np.maximum(moves["net"], 0.0)}),
+            pd.DataFrame({"company": totals["company"], "year": totals["year"], "leaf": profit_leaf,
+                          "debit": np.maximum(totals["net"], 0.0), "credit": np.maximum(-totals["net"], 0.0)}),
+        ], ignore_index=True).sort_values(["company", "year"], kind="stable", ignore_index=True)
+        lines["line"] = lines.groupby(["company", "year"]).cumcount() + 1
+        lines["party"] = ""
+        lines["counterparty"] = -1
+        self._collect_moves(lines)
+
+        company = lines["company"].to_numpy()
+        year = lines["year"].to_numpy()
+        first = (lines["line"] == 1).to_numpy()
+        numbers = self._number_vouchers(company[first], year[first], np.full(first.sum(), 12))[np.cumsum(first) - 1]
+        day_index = pd.to_datetime(pd.Series(year).astype(str) + "-12-31") - pd.Timestamp(f"{self.start_year}-01-01")
+        n = len(lines)
+        return self._voucher_frame(lines, day_index.dt.days.to_numpy(), np.full(n, 12), numbers,
+                                   np.full(n, "结转本期损益", dtype=object),
+                                   np.where(first, 0.0, np.nan), np.full(n, "总账", dtype=object),
+                                   np.full(n, "结转损益", dtype=object), np.full(n, REVIEWER, dtype=object))
+
+    def write_vouchers(self, path: Path, progress: bool = True):
+        """按时间分块生成凭证明细并追加写入CSV"""
+        total_days = len(self.day_labels)
+        chunks = max(1, int(np.ceil(self.rows / CHUNK_ROWS)))
+        # 独立凭证张数，后续凭证随之生成
+        vouchers = int(round(self.rows / self.mean_lines))
+        bounds = np.linspace(0, total_days, chunks + 1).astype(int)
+        counts = np.diff(np.linspace(0, vouchers, chunks + 1).astype(int))
+        started = time.perf_counter()
+        for i, count in enumerate(counts):
+            frame = self.voucher_chunk(int(count), bounds[i], max(bounds[i + 1], bounds[i] + 1))
+            frame.to_csv(path, mode="w" if i == 0 else "a", header=i == 0, index=False, encoding="utf-8")
+            if progress:
+                print(f"  凭证分块 {i + 1}/{chunks}: 累计 {self.voucher_rows:,} 行 ({time.perf_counter() - started:.1f}s)")
+        self.closing_vouchers().to_csv(path, mode="a", header=False, index=False, encoding="utf-8")
+
+    def _opening_balances(self) -> pd.Series:
+        """首年期初余额（借方为正）：资产、负债末级科目随机取值，备抵科目取对应资产的20%~50%，
+        负债合计取资产净额的30%~60%，实收资本轧差使期初借贷平衡"""
+        chart = self.chart
+        codes = chart["code"]
+        top = codes.str.split(".").str[0]
+        party = top.isin(PARTY_SUBJECTS)
+        candidates = np.flatnonzero((chart["is_leaf"] & codes.str[0].isin(["1", "2"]) & ~party).to_numpy())
+        contra = chart["name"].str.contains("累计|坏账|减值|跌价").to_numpy()
+        candidate_tops = top.to_numpy()[candidates]
+        capital_leaf = self._leaf_pool(CAPITAL_SUBJECT, None)[0]
+        frames = []
+        for company in range(len(self.companies)):
+            amount = np.round(self.rng.lognormal(np.log(500000), 1.5, len(candidates)), 2)
+            for contra_top, asset_top in CONTRA_SUBJECTS.items():
+                target = candidate_tops == contra_top
+                if target.any():
+                    asset_total = amount[candidate_tops == asset_top].sum()
+                    amount[target] = np.round(asset_total * self.rng.uniform(0.2, 0.5) / target.sum(), 2)
+            liability = codes.str[0].to_numpy()[candidates] == "2"
+            credit_normal = liability | contra[candidates]
+            assets = amount[~liability].sum() - 2 * amount[~liability & contra[candidates]].sum()
+            amount[liability] = np.round(amount[liability] * assets * self.rng.uniform(0.3, 0.6)
+                                         / amount[liability].sum(), 2)
+            net = np.where(credit_normal, -amount, amount)
+            frames.append(pd.DataFrame({"company": company, "leaf": np.r_[candidates, capital_leaf],
+                                        "net": np.r_[net, -np.round(net.sum(), 2)]}))
+        return pd.concat(frames, ignore_index=True).groupby(["company", "leaf"])["net"].sum()
+
+    def _roll_forward(self, moves: pd.DataFrame, keys: List[str], opening: pd.Series) -> pd.DataFrame:
+        """逐年计算期初、本年发生额与期末（均以借方为正的净额表示），上年期末结转为下年期初"""
+        moves = moves.groupby(["year"] + keys)[["debit", "credit"]].sum()
+        frames = []
+        for year in range(self.start_year, self.start_year + self.years):
+            current = moves.xs(year, level="year") if year in moves.index.get_level_values("year") else moves.iloc[:0].droplevel("year")
+            frame = pd.concat([opening.rename("opening"), current], axis=1).fillna(0.0)
+            frame["ending"] = np.round(frame["opening"] + frame["debit"] - frame["credit"], 2)
+            frame = frame[(frame[["opening", "debit", "credit", "ending"]].abs() > 0.001).any(axis=1)]
+            frames.append(frame.assign(year=year).reset_index())
+            opening = frame["ending"]
+        return pd.concat(frames, ignore_index=True)
+
+    def balance_table(self) -> pd.DataFrame:
+        """由发生额汇总科目余额表：末级科目逐年结转后汇总到各级上级科目，往来科目附核算维度行"""
+        chart = self.chart
+        leaf_moves = pd.concat(self.leaf_moves, ignore_index=True)
+        leaves = self._roll_forward(leaf_moves, ["company", "leaf"], self._opening_balances())
+
+        # 末级科目到自身及各级上级科目的映射
+        position = {code: i for i, code in enumerate(self.codes)}
+        ancestors = [(leaf, position[node]) for leaf, path in enumerate(chart["code_path"])
+                     for node in path.strip("/").split("/") if node in position]
+        ancestors = pd.DataFrame(ancestors, columns=["leaf", "node"])
+        nodes = (leaves.merge(ancestors, on="leaf")
+                 .groupby(["company", "year", "node"], as_index=False)[["opening", "debit", "credit", "ending"]].sum())
+        node = nodes["node"].to_numpy()
+        subject_rows = pd.DataFrame({
+            "科目编码": self.codes[node],
+            "科目名称": chart["level"].map(lambda level: "　　" * (level - 1)).to_numpy(dtype=object)[node] + self.short_names[node],
+            "核算维度编码": np.nan,
+            "核算维度名称": np.nan,
+            "company": nodes["company"], "year": nodes["year"],
+            "opening": nodes["opening"], "debit": nodes["debit"], "credit": nodes["credit"], "ending": nodes["ending"],
+            "subject_code_path": chart["code_path"].to_numpy()[node],
+            "subject_name_path": chart["name_path"].to_numpy()[node],
+            "is_dimension_row": False,
+        })
+
+        frames = [subject_rows]
+        if self.party_moves:
+            party_moves = pd.concat(self.party_moves, ignore_index=True)
+            dims = self._roll_forward(party_moves, ["company", "leaf", "party", "counterparty"], pd.Series(
+                dtype=float, index=pd.MultiIndex.from_arrays([[], [], [], []], names=["company", "leaf", "party", "counterparty"])))
+            dim_codes = np.empty(len(dims), dtype=object)
+            dim_names = np.empty(len(dims), dtype=object)
+            for party, (codes, names) in self.parties.items():
+                mask = (dims["party"] == party).to_numpy()
+                dim_codes[mask] = codes[dims["counterparty"].to_numpy()[mask]]
+                dim_names[mask] = names[dims["counterparty"].to_numpy()[mask]]
+            leaf = dims["leaf"].to_numpy()
+            frames.append(pd.DataFrame({
+                "科目编码": np.nan, "科目名称": np.nan, "核算维度编码": dim_codes, "核算维度名称": dim_names,
+                "company": dims["company"], "year": dims["year"],
+                "opening": dims["opening"], "debit": dims["debit"], "credit": dims["credit"], "ending": dims["ending"],
+                "subject_code_path": chart["code_path"].to_numpy()[leaf],
+                "subject_name_path": chart["name_path"].to_numpy()[leaf],
+                "is_dimension_row": True,
+            }))
+
+        rows = pd.concat(frames, ignore_index=True).sort_values(
+            ["company", "year", "subject_code_path", "is_dimension_row", "核算维度编码"], ignore_index=True)
+        company = rows["company"].to_numpy()
+        return pd.DataFrame({
+            "科目编码": rows["科目编码"], "科目名称": rows["科目名称"],
+            "核算维度编码": rows["核算维度编码"], "核算维度名称": rows["核算维度名称"],
+            "期初余额借方": np.maximum(rows["opening"], 0.0).round(2),
+            "期初余额贷方": np.maximum(-rows["opening"], 0.0).round(2),
+            "本年累计借方": rows["debit"].round(2),
+            "本年累计贷方": rows["credit"].round(2),
+            "期末余额借方": np.maximum(rows["ending"], 0.0).round(2),
+            "期末余额贷方": np.maximum(-rows["ending"], 0.0).round(2),
+            "文件来源": "ky-" + pd.Series(self.company_codes[company]) + "-" + rows["year"].astype(str) + ".csv",
+            "公司": self.companies[company],
+            "期间": rows["year"],
+            "币别": "综合本位币",
+            "subject_code_path": rows["subject_code_path"], "subject_name_path": rows["subject_name_path"],
+            "is_dimension_row": rows["is_dimension_row"],
+            "年份": rows["year"],
+        }, columns=BALANCE_COLUMNS)
+
+def generate(out_dir: Path, rows: int, companies: Optional[int] = None, start_year: int = 2023, years: int = 3,
+             seed: int = 20240101, template_file: Optional[Path] = TEMPLATE_BALANCE_FILE,
+             counterparties: Optional[int] = None, progress: bool = True) -> Dict:
+    """生成凭证明细表与科目余额表，并写入记录生成参数的manifest.json"""
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    chart, dimensions, template_companies = load_chart(template_file)
+    company_count = companies or max(2, rows // 1_000_000)
+    rng = np.random.default_rng(seed)
+    names = template_companies[:company_count]
+    names += synthetic_names(company_count - len(names), rng, exclude=set(names))
+
+    started = time.perf_counter()
+    generator = LedgerGenerator(chart, dimensions, rows, names, start_year, years, seed, counterparties)
+    generator.write_vouchers(out_dir / "final_voucher_detail.csv", progress)
+    balance = generator.balance_table()
+    balance.to_csv(out_dir / "final_enhanced_balance.csv", index=False, encoding="utf-8")
+
+    manifest = {
+        "rows": rows,
+        "voucher_rows": generator.voucher_rows,
+        "vouchers": generator.voucher_count,
+        "balance_rows": len(balance),
+        "dimension_rows": int(balance["is_dimension_row"].sum()),
+        "companies": names,
+        "start_year": start_year,
+        "years": years,
+        "seed": seed,
+        "subjects": len(chart),
+        "counterparties": {party: len(codes) for party, (codes, _) in generator.parties.items()},
+        "template": str(template_file) if template_file is not None and Path(template_file).exists() else "builtin",
+        "generated_seconds": round(time.perf_counter() - started, 1),
+    }
+    with open(out_dir / "manifest.json", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    return manifest
+
+def parse_rows(value: str) -> int:
+    """行数参数：预设名称（small/1m/10m/50m）或整数"""
+    if value.lower() in PRESETS:
+        return PRESETS[value.lower()]
+    return int(value.replace("_", "").replace(",", ""))
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="生成合成的科目余额表与凭证明细表")
+    parser.add_argument("--rows", default="small", help=f"凭证明细行数，可用预设 {'/'.join(PRESETS)} 或整数")
+    parser.add_argument("--out", default=str(Path(__file__).parent / "data"), help="输出目录")
+    parser.add_argument("--companies", type=int, help="公司数量，默认每100万行1家且不少于2家")
+    parser.add_argument("--start-year", type=int, default=2023, help="起始年度")
+    parser.add_argument("--years", type=int, default=3, help="年度数量")
+    parser.add_argument("--counterparties", type=int, help="客户与供应商各自的数量")
+    parser.add_argument("--seed", type=int, default=20240101, help="随机种子，相同参数与种子生成相同数据")
+    parser.add_argument("--template", default=str(TEMPLATE_BALANCE_FILE), help="提供科目表与核算维度的余额表，不存在时使用内置科目表")
+    args = parser.parse_args()
+
+    rows = parse_rows(args.rows)
+    print(f"生成 {rows:,} 行凭证明细至 {args.out}")
+    manifest = generate(Path(args.out), rows, args.companies, args.start_year, args.years, args.seed,
+                        Path(args.template) if args.template else None, args.counterparties)
+    print(json.dumps(manifest, ensure_ascii=False, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
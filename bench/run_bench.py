@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+基准测试运行器
+对generate_ledger.py生成的数据依次计时：MCP服务数据加载、各工具调用、FinancialDataValidator
+各项验证及OpeningBalanceAdjuster期初调整，输出可在不同运行之间对比的JSON报告；
+指定基线报告时按中位耗时比较，超过容差的场景视为性能回退
+"""
+
+import argparse
+import asyncio
+import importlib
+import json
+import logging
+import os
+import platform
+import re
+import resource
+import statistics
+import subprocess
+import sys
+import time
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+BENCH_DIR = Path(__file__).parent
+BASE_DIR = BENCH_DIR.parent
+sys.path.insert(0, str(BASE_DIR / "mcp"))
+sys.path.insert(0, str(BASE_DIR / "cleaning"))
+
+# 默认容差：中位耗时增加超过20%视为回退
+DEFAULT_TOLERANCE = 0.2
+# 耗时增加小于该值（毫秒）时不视为回退，避免短耗时场景的抖动
+DEFAULT_MIN_DELTA_MS = 5.0
+
+# MCP工具场景：(场景名, 工具名, 参数)，参数中的{company}、{year}按生成数据替换
+TOOL_SCENARIOS = [
+    ("query_balance_sheet", "query_balance_sheet", {"company": "{company}", "year": "{year}"}),
+    ("query_balance_sheet.dimensions", "query_balance_sheet", {"company": "{company}", "subject_code": "1122", "include_dimensions": True}),
+    ("query_voucher_details", "query_voucher_details", {"company": "{company}", "subject_code": "1002", "limit": 100}),
+    ("query_voucher_details.json", "query_voucher_details", {"company": "{company}", "subject_code": "1002", "limit": 1000, "output_format": "json"}),
+    ("analyze_subject_hierarchy", "analyze_subject_hierarchy", {"subject_code": "1002", "company": "{company}", "year": "{year}"}),
+    ("get_financial_summary", "get_financial_summary", {"company": "{company}", "year": "{year}"}),
+    ("validate_data_consistency", "validate_data_consistency", {"subject_code": "1122", "company": "{company}", "year": "{year}"}),
+    ("search_transactions", "search_transactions", {"keyword": "货款", "company": "{company}", "limit": 100}),
+    ("find_subject_by_name", "find_subject_by_name", {"subject_name": "银行"}),
+    ("query_dimension_details", "query_dimension_details", {"subject_code": "1122", "company": "{company}", "year": "{year}"}),
+    ("detect_duplicate_payments", "detect_duplicate_payments", {"company": "{company}"}),
+    ("benford_analysis", "benford_analysis", {"company": "{company}", "year": "{year}"}),
+    ("run_journal_entry_tests", "run_journal_entry_tests", {"company": "{company}", "year": "{year}"}),
+    ("query_subject_flows", "query_subject_flows", {"subject_code": "1002", "company": "{company}", "year": "{year}"}),
+    ("analyze_counterparty_aging", "analyze_counterparty_aging", {"subject_code": "1122", "company": "{company}"}),
+    ("query_balance_trend", "query_balance_trend", {"subject_code": "1002", "company": "{company}", "year": "{year}"}),
+    ("detect_subject_anomalies", "detect_subject_anomalies", {"company": "{company}"}),
+    ("generate_financial_statements", "generate_financial_statements", {"company": "{company}", "year": "{year}"}),
+    ("reconcile_intercompany", "reconcile_intercompany", {"year": "{year}"}),
+    ("run_voucher_report", "run_voucher_report", {"template": "fixed_asset_disposal", "company": "{company}"}),
+    ("run_voucher_report.line", "run_voucher_report", {"template": "spare_parts_purchase", "company": "{company}", "year": "{year}"}),
+    ("batch", "batch", {"calls": [
+        {"tool": "query_balance_sheet", "arguments": {"company": "{company}", "year": "{year}", "subject_code": "1002"}},
+        {"tool": "query_voucher_details", "arguments": {"company": "{company}", "subject_code": "1122", "limit": 100}},
+        {"tool": "query_dimension_details", "arguments": {"subject_code": "2202", "company": "{company}", "year": "{year}"}},
+        {"tool": "get_financial_summary", "arguments": {"company": "{company}", "year": "{year}"}},
+    ]}),
+    ("server_stats", "server_stats", {}),
+]
+
+VALIDATOR_CHECKS = ["validate_accounting_equation", "validate_year_continuity",
+                    "validate_hierarchy_correctness", "validate_voucher_reconciliation"]
+
+def fill_arguments(value: Any, context: Dict[str, Any]) -> Any:
+    """替换参数中的{company}、{year}占位符，整个值为占位符时保留原类型"""
+    if isinstance(value, dict):
+        return {key: fill_arguments(item, context) for key, item in value.items()}
+    if isinstance(value, list):
+        return [fill_arguments(item, context) for item in value]
+    if isinstance(value, str):
+        match = re.fullmatch(r"\{(\w+)\}", value)
+        if match and match.group(1) in context:
+            return context[match.group(1)]
+        return value.format(**context)
+    return value
+
+def summarize_runs(runs_ms: List[float]) -> Dict[str, Any]:
+    """首次（冷启动）与全部运行的耗时统计"""
+    return {
+        "runs": len(runs_ms),
+        "first_ms": round(runs_ms[0], 3),
+        "min_ms": round(min(runs_ms), 3),
+        "median_ms": round(statistics.median(runs_ms), 3),
+        "max_ms": round(max(runs_ms), 3),
+    }
+
+def time_scenario(run: Callable[[], Any], repeat: int, setup: Optional[Callable[[], Any]] = None) -> Dict[str, Any]:
+    """执行repeat次并计时，setup在每次计时前执行且不计入耗时"""
+    runs_ms = []
+    result = None
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        started = time.perf_counter()
+        result = run()
+        runs_ms.append((time.perf_counter() - started) * 1000)
+    stats = summarize_runs(runs_ms)
+    stats["_result"] = result
+    return stats
+
+class BenchRunner:
+    """按数据目录运行全部场景并收集结果"""
+
+    def __init__(self, data_dir: Path, repeat: int = 3, only: Optional[str] = None, verbose: bool = True):
+        self.data_dir = Path(data_dir)
+        self.repeat = repeat
+        self.only = re.compile(only) if only else None
+        self.verbose = verbose
+        self.results: Dict[str, Dict[str, Any]] = {}
+        manifest_file = self.data_dir / "manifest.json"
+        self.manifest = json.loads(manifest_file.read_text(encoding="utf-8")) if manifest_file.exists() else {}
+
+    def selected(self, name: str) -> bool:
+        return self.only is None or bool(self.only.search(name))
+
+    def record(self, name: str, stats: Dict[str, Any], **extra):
+        stats.pop("_result", None)
+        stats.update(extra)
+        self.results[name] = stats
+        if self.verbose:
+            status = " ❌" if stats.get("error") else ""
+            print(f"  {name:<48} 首次 {stats['first_ms']:>10.1f}ms  中位 {stats['median_ms']:>10.1f}ms{status}")
+
+    def _server(self, reload: bool = False):
+        """导入MCP服务模块并指向数据目录；reload时重新导入以清空全部数据与派生缓存"""
+        import financial_data_mcp
+        server = importlib.reload(financial_data_mcp) if reload else financial_data_mcp
+        server.BALANCE_FILE = self.data_dir / "final_enhanced_balance.csv"
+        server.VOUCHER_FILE = self.data_dir / "final_voucher_detail.csv"
+        return server
+
+    def run_tools(self):
+        """MCP服务：冷启动加载数据后逐个工具计时，首次调用包含派生缓存的构建"""
+        holder = {}
+        if self.selected("load_data"):
+            stats = time_scenario(lambda: holder["server"].load_data(), self.repeat,
+                                  setup=lambda: holder.update(server=self._server(reload=True)))
+            server = holder["server"]
+            self.record("load_data", stats, voucher_rows=len(server.voucher_df), balance_rows=len(server.balance_df))
+        server = holder.get("server") or self._server(reload=True)
+        server.load_data()
+
+        companies = self.manifest.get("companies") or list(server.balance_df["公司"].dropna().unique())
+        years = sorted(server.balance_df["年份"].dropna().astype(int).unique())
+        context = {"company": companies[0], "year": int(years[len(years) // 2])}
+
+        for name, tool, arguments in TOOL_SCENARIOS:
+            scenario = f"tool.{name}"
+            if not self.selected(scenario):
+                continue
+            arguments = fill_arguments(arguments, context)
+            server.metrics.reset()
+            stats = time_scenario(lambda: asyncio.run(server.handle_call_tool(tool, dict(arguments))), self.repeat)
+            text = "".join(getattr(content, "text", "") for content in stats["_result"])
+            summary = server.metrics.tool_summary()
+            scanned = int(summary["扫描行数"].sum() // max(self.repeat, 1)) if not summary.empty else 0
+            self.record(scenario, stats, response_chars=len(text), rows_scanned=scanned,
+                        error=text.split("\n")[0] if text.startswith(("❌", "执行工具")) else None)
+
+    def run_validator(self):
+        """FinancialDataValidator：数据加载与各项验证"""
+        from financial_validation import FinancialDataValidator
+        holder = {}
+        if self.selected("validator.load_data") or any(self.selected(f"validator.{c}") for c in VALIDATOR_CHECKS):
+            stats = time_scenario(lambda: holder["validator"].load_data(), self.repeat if self.selected("validator.load_data") else 1,
+                                  setup=lambda: holder.update(validator=FinancialDataValidator(str(self.data_dir))))
+            if self.selected("validator.load_data"):
+                self.record("validator.load_data", stats)
+        validator = holder.get("validator")
+        for check in VALIDATOR_CHECKS:
+            scenario = f"validator.{check}"
+            if validator is None or not self.selected(scenario):
+                continue
+            stats = time_scenario(getattr(validator, check), self.repeat)
+            result = stats["_result"] or {}
+            self.record(scenario, stats, passed=result.get("passed"), failed=result.get("failed"))
+
+    def run_adjuster(self):
+        """OpeningBalanceAdjuster：读取余额表、调整期初余额并校验，不写回文件
+
+        load_data会在数据目录创建备份文件，这里直接读取余额表并调用预处理代替
+        """
+        from adjust_opening_balance import OpeningBalanceAdjuster
+        adjuster = OpeningBalanceAdjuster(str(self.data_dir))
+        raw = pd.read_csv(adjuster.original_file, encoding="utf-8")
+
+        def load():
+            adjuster.balance_df = pd.read_csv(adjuster.original_file, encoding="utf-8")
+            adjuster._preprocess_data()
+
+        def reset():
+            adjuster.balance_df = raw.copy()
+            adjuster._preprocess_data()
+
+        if self.selected("adjuster.load"):
+            self.record("adjuster.load", time_scenario(load, self.repeat), balance_rows=len(raw))
+        if self.selected("adjuster.adjust_opening_balances"):
+            stats = time_scenario(adjuster.adjust_opening_balances, self.repeat, setup=reset)
+            self.record("adjuster.adjust_opening_balances", stats, adjusted=stats["_result"])
+        if self.selected("adjuster.verify_adjustments"):
+            reset()
+            adjuster.adjust_opening_balances()
+            stats = time_scenario(adjuster.verify_adjustments, self.repeat)
+            result = stats["_result"] or {}
+            self.record("adjuster.verify_adjustments", stats, passed=result.get("passed"), failed=result.get("failed"))
+
+    def run(self, skip_tools: bool = False, skip_cleaning: bool = False) -> Dict[str, Any]:
+        started = time.perf_counter()
+        if not skip_tools:
+            print("MCP服务:")
+            self.run_tools()
+        if not skip_cleaning:
+            print("数据清洗脚本:")
+            self.run_validator()
+            self.run_adjuster()
+        return {"meta": self.meta(time.perf_counter() - started), "results": self.results}
+
+    def meta(self, elapsed: float) -> Dict[str, Any]:
+        """运行环境与数据规模，用于判断两份报告是否可比"""
+        try:
+            commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR, capture_output=True,
+                                    text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            commit = None
+        return {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "git_commit": commit,
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "repeat": self.repeat,
+            "data_dir": str(self.data_dir),
+            "dataset": {key: self.manifest.get(key) for key in ("rows", "voucher_rows", "balance_rows", "seed", "years")},
+            "elapsed_seconds": round(elapsed, 1),
+            "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        }
+
+def compare_reports(baseline: Dict[str, Any], current: Dict[str, Any], tolerance: float = DEFAULT_TOLERANCE,
+                    min_delta_ms: float = DEFAULT_MIN_DELTA_MS) -> pd.DataFrame:
+    """按场景对比中位耗时，返回对比表（含是否回退）"""
+    rows = []
+    for name, result in current["results"].items():
+        base = baseline["results"].get(name)
+        if base is None:
+            continue
+        delta = result["median_ms"] - base["median_ms"]
+        ratio = result["median_ms"] / base["median_ms"] if base["median_ms"] else float("inf")
+        rows.append({
+            "场景": name,
+            "基线中位ms": base["median_ms"],
+            "当前中位ms": result["median_ms"],
+            "变化": ratio - 1,
+            "回退": bool(ratio > 1 + tolerance and delta > min_delta_ms),
+        })
+    return pd.DataFrame(rows, columns=["场景", "基线中位ms", "当前中位ms", "变化", "回退"])
+
+def print_comparison(comparison: pd.DataFrame, baseline: Dict[str, Any], current: Dict[str, Any]):
+    if baseline["meta"].get("dataset") != current["meta"].get("dataset"):
+        print("⚠️  基线与当前运行的数据集不同，对比结果仅供参考")
+    for row in comparison.itertuples(index=False):
+        flag = "❌ 回退" if row.回退 else ""
+        print(f"  {row.场景:<48} {row.基线中位ms:>10.1f}ms → {row.当前中位ms:>10.1f}ms  {row.变化:>+7.1%} {flag}")
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="运行基准测试并输出JSON报告")
+    parser.add_argument("--data-dir", default=str(BENCH_DIR / "data"), help="generate_ledger.py生成的数据目录")
+    parser.add_argument("--repeat", type=int, default=3, help="每个场景的运行次数")
+    parser.add_argument("--only", help="只运行名称匹配该正则的场景，如 'tool\\.|load_data'")
+    parser.add_argument("--skip-tools", action="store_true", help="跳过MCP服务场景")
+    parser.add_argument("--skip-cleaning", action="store_true", help="跳过数据清洗脚本场景")
+    parser.add_argument("--output", help="报告输出路径，默认 bench/results/<时间戳>.json")
+    parser.add_argument("--compare", help="基线报告，对比中位耗时，有回退时返回码为1")
+    parser.add_argument("--current", help="与--compare一起使用：直接对比已有报告而不运行")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="允许的中位耗时增幅")
+    parser.add_argument("--min-delta-ms", type=float, default=DEFAULT_MIN_DELTA_MS, help="视为回退的最小耗时增加")
+    parser.add_argument("--verbose", action="store_true", help="输出清洗脚本的INFO日志")
+    args = parser.parse_args()
+
+    if args.current:
+        report = json.loads(Path(args.current).read_text(encoding="utf-8"))
+    else:
+        if not args.verbose:
+            logging.disable(logging.INFO)
+        runner = BenchRunner(Path(args.data_dir), args.repeat, args.only)
+        report = runner.run(args.skip_tools, args.skip_cleaning)
+        output = Path(args.output) if args.output else BENCH_DIR / "results" / f"{time.strftime('%Y%m%d_%H%M%S')}.json"
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(report, ensure_ascii=False, indent=2, default=str), encoding="utf-8")
+        print(f"报告已保存: {output}")
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        comparison = compare_reports(baseline, report, args.tolerance, args.min_delta_ms)
+        print(f"与基线对比（容差 {args.tolerance:.0%}）:")
+        print_comparison(comparison, baseline, report)
+        regressions = int(comparison["回退"].sum())
+        if regressions:
+            print(f"❌ {regressions} 个场景性能回退")
+            return 1
+        print("✅ 没有性能回退")
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
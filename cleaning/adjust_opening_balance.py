@@ -13,6 +13,8 @@ from typing import Dict, List, Tuple
 import shutil
 from datetime import datetime
 
+from subject_master import CREDIT_NORMAL_TYPES, load_subject_master, normal_net, row_subject_codes
+
 # 配置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -22,6 +24,8 @@ class OpeningBalanceAdjuster:
         """初始化期初余额调整器"""
         self.data_dir = Path(data_dir)
         self.balance_df = None
+        self.subject_master = None
+        self.account_types = None
         self.original_file = self.data_dir / "final_enhanced_balance.csv"
         self.backup_file = self.data_dir / f"final_enhanced_balance_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
         
@@ -58,142 +62,40 @@ class OpeningBalanceAdjuster:
         
         logger.info(f"数据包含年份: {sorted(self.balance_df['年份'].unique())}")
         logger.info(f"数据包含公司: {self.balance_df['公司'].unique()}")
-    
-    def _get_account_type(self, row: pd.Series) -> str:
-        """
-        根据科目编码或subject_code_path判断科目类型
-        中国会计准则科目编码规则:
-        1xxx: 资产类
-        2xxx: 负债类  
-        3xxx: 所有者权益类
-        4xxx: 收入类
-        5xxx: 费用类
-        6xxx: 损益类
-        """
-        # 首先尝试从科目编码获取
-        subject_code = str(row['科目编码'])
-        if subject_code != 'nan' and subject_code != '':
-            code = subject_code.split('.')[0]  # 取主科目编码
-            if code.startswith('1'):
-                return 'asset'
-            elif code.startswith('2'):
-                return 'liability'
-            elif code.startswith('3'):
-                return 'equity'
-            elif code.startswith('4'):
-                return 'income'
-            elif code.startswith('5') or code.startswith('6'):
-                return 'expense'
         
-        # 如果科目编码为空，从subject_code_path获取
-        subject_code_path = str(row['subject_code_path'])
-        if subject_code_path != 'nan' and subject_code_path != '':
-            # 从路径中提取科目编码（如 "/1001/" -> "1001"）
-            path_parts = [part for part in subject_code_path.split('/') if part]
-            if path_parts:
-                main_code = path_parts[0]  # 第一个非空部分就是主科目编码
-                if main_code.startswith('1'):
-                    return 'asset'
-                elif main_code.startswith('2'):
-                    return 'liability'
-                elif main_code.startswith('3'):
-                    return 'equity'
-                elif main_code.startswith('4'):
-                    return 'income'
-                elif main_code.startswith('5') or main_code.startswith('6'):
-                    return 'expense'
-        
-        return 'unknown'
+        # 科目类型由科目主数据按编码连接取得（核算维度行取subject_code_path中的所属科目）
+        self.subject_master = load_subject_master(self.balance_df, self.original_file)
+        self.account_types = self.subject_master.lookup(row_subject_codes(self.balance_df), '科目类型').fillna('unknown')
     
-    def _calculate_opening_balance(self, row: pd.Series) -> Tuple[float, float]:
+    def _calculate_opening_balances(self, df: pd.DataFrame) -> Tuple[pd.Series, pd.Series]:
         """
         根据会计恒等式倒推期初余额
         
         基本公式：期初余额 + 本年累计发生额 = 期末余额
         即：期初余额 = 期末余额 - 本年累计发生额
         
-        根据科目类型使用不同的计算逻辑：
-        - 资产类: 期初借方 - 期初贷方 = (期末借方 - 期末贷方) - (本年累计借方 - 本年累计贷方)
-        - 负债类: 期初贷方 - 期初借方 = (期末贷方 - 期末借方) - (本年累计贷方 - 本年累计借方)
-        - 所有者权益类: 期初贷方 - 期初借方 = (期末贷方 - 期末借方) - (本年累计贷方 - 本年累计借方)
-        - 收入类: 期初一般为0，按贷方性质计算
-        - 费用类: 期初一般为0，按借方性质计算
+        按科目主数据中的余额方向计算净额：
+        - 借方余额科目（资产类、共同类、成本类、费用类）: 期初借方 - 期初贷方 = (期末借方 - 期末贷方) - (本年累计借方 - 本年累计贷方)
+        - 贷方余额科目（负债类、所有者权益类、收入类）: 期初贷方 - 期初借方 = (期末贷方 - 期末借方) - (本年累计贷方 - 本年累计借方)
+        期初净额为正数记入正常余额方向，为负数记入相反方向；未知类型保持原值
         """
-        account_type = self._get_account_type(row)
+        account_types = self.account_types[df.index]
+        credit_normal = account_types.isin(CREDIT_NORMAL_TYPES)
+        closing_net = normal_net(df['期末余额借方'], df['期末余额贷方'], credit_normal)
+        period_net = normal_net(df['本年累计借方'], df['本年累计贷方'], credit_normal)
+        opening_net = closing_net - period_net
         
-        # 根据科目类型获取正确的净额计算
-        if account_type == 'asset':
-            # 资产类: 借方 - 贷方
-            closing_net = row['期末余额借方'] - row['期末余额贷方']
-            period_net = row['本年累计借方'] - row['本年累计贷方']
-            opening_net = closing_net - period_net
-            
-        elif account_type in ['liability', 'equity']:
-            # 负债类和权益类: 贷方 - 借方
-            closing_net = row['期末余额贷方'] - row['期末余额借方']
-            period_net = row['本年累计贷方'] - row['本年累计借方']
-            opening_net = closing_net - period_net
-            
-        elif account_type == 'income':
-            # 收入类: 贷方 - 借方
-            closing_net = row['期末余额贷方'] - row['期末余额借方']
-            period_net = row['本年累计贷方'] - row['本年累计借方']
-            opening_net = closing_net - period_net
-            
-        elif account_type == 'expense':
-            # 费用类: 借方 - 贷方
-            closing_net = row['期末余额借方'] - row['期末余额贷方']
-            period_net = row['本年累计借方'] - row['本年累计贷方']
-            opening_net = closing_net - period_net
-            
-        else:
-            # 未知类型，保持原计算方式
-            closing_net = row['期末余额借方'] - row['期末余额贷方']
-            period_net = row['本年累计借方'] - row['本年累计贷方']
-            opening_net = closing_net - period_net
-        
-        # 根据科目类型和期初净额的正负，分配到借方或贷方
-        if account_type == 'asset':
-            # 资产类：正数记借方，负数记贷方
-            if opening_net >= 0:
-                opening_debit = opening_net
-                opening_credit = 0
-            else:
-                opening_debit = 0
-                opening_credit = -opening_net
-                
-        elif account_type in ['liability', 'equity']:
-            # 负债类和权益类：正数记贷方，负数记借方
-            if opening_net >= 0:
-                opening_debit = 0
-                opening_credit = opening_net
-            else:
-                opening_debit = -opening_net
-                opening_credit = 0
-                
-        elif account_type == 'income':
-            # 收入类：一般为贷方余额
-            if opening_net >= 0:
-                opening_debit = 0
-                opening_credit = opening_net
-            else:
-                opening_debit = -opening_net
-                opening_credit = 0
-                
-        elif account_type == 'expense':
-            # 费用类：一般为借方余额
-            if opening_net >= 0:
-                opening_debit = opening_net
-                opening_credit = 0
-            else:
-                opening_debit = 0
-                opening_credit = -opening_net
-                
-        else:
-            # 未知类型，保持原值
-            logger.warning(f"未知科目类型: {row['科目编码']} - {account_type}")
-            return row['期初余额借方'], row['期初余额贷方']
+        normal_side = opening_net.where(opening_net >= 0, 0.0)
+        opposite_side = (-opening_net).where(opening_net < 0, 0.0)
+        opening_debit = normal_side.where(~credit_normal, opposite_side)
+        opening_credit = opposite_side.where(~credit_normal, normal_side)
         
+        unknown = account_types == 'unknown'
+        if unknown.any():
+            logger.warning(f"{unknown.sum()} 条记录科目类型未知，保持原期初余额: "
+                           f"{df.loc[unknown, '科目编码'].astype(str).unique()[:10].tolist()}")
+        opening_debit[unknown] = df.loc[unknown, '期初余额借方']
+        opening_credit[unknown] = df.loc[unknown, '期初余额贷方']
         return opening_debit, opening_credit
     
     def adjust_opening_balances(self):
@@ -210,43 +112,35 @@ class OpeningBalanceAdjuster:
         
         logger.info(f"需要调整的记录数: {len(target_rows)}")
         
-        adjustments_made = 0
+        # 跳过合计行
+        target_rows = target_rows[target_rows['科目名称'] != '合计']
         
-        for idx, row in target_rows.iterrows():
-            # 跳过合计行
-            if row['科目名称'] == '合计':
-                continue
-            
-            # 计算新的期初余额
-            new_opening_debit, new_opening_credit = self._calculate_opening_balance(row)
-            
-            # 检查是否需要调整
-            current_opening_debit = row['期初余额借方']
-            current_opening_credit = row['期初余额贷方']
-            
-            tolerance = 0.01
-            needs_adjustment = (
-                abs(new_opening_debit - current_opening_debit) > tolerance or
-                abs(new_opening_credit - current_opening_credit) > tolerance
+        # 计算新的期初余额
+        new_opening_debit, new_opening_credit = self._calculate_opening_balances(target_rows)
+        
+        # 检查是否需要调整
+        tolerance = 0.01
+        needs_adjustment = (
+            ((new_opening_debit - target_rows['期初余额借方']).abs() > tolerance) |
+            ((new_opening_credit - target_rows['期初余额贷方']).abs() > tolerance)
+        )
+        adjusted = target_rows.index[needs_adjustment]
+        
+        # 记录调整信息
+        for idx in adjusted:
+            row = target_rows.loc[idx]
+            dimension_info = f" 核算维度: {row['核算维度名称']}" if row['is_dimension_row'] else ""
+            logger.info(
+                f"调整科目 {row['科目编码']} ({row['科目名称']}){dimension_info} [{self.account_types[idx]}类] "
+                f"{row['公司']} {row['年份']}年: "
+                f"期初借方 {row['期初余额借方']:.2f} -> {new_opening_debit[idx]:.2f}, "
+                f"期初贷方 {row['期初余额贷方']:.2f} -> {new_opening_credit[idx]:.2f}"
             )
-            
-            if needs_adjustment:
-                # 更新期初余额
-                self.balance_df.loc[idx, '期初余额借方'] = new_opening_debit
-                self.balance_df.loc[idx, '期初余额贷方'] = new_opening_credit
-                
-                adjustments_made += 1
-                
-                # 记录调整信息
-                account_type = self._get_account_type(row)
-                dimension_info = f" 核算维度: {row['核算维度名称']}" if row['is_dimension_row'] else ""
-                
-                logger.info(
-                    f"调整科目 {row['科目编码']} ({row['科目名称']}){dimension_info} [{account_type}类] "
-                    f"{row['公司']} {row['年份']}年: "
-                    f"期初借方 {current_opening_debit:.2f} -> {new_opening_debit:.2f}, "
-                    f"期初贷方 {current_opening_credit:.2f} -> {new_opening_credit:.2f}"
-                )
+        
+        # 更新期初余额
+        self.balance_df.loc[adjusted, '期初余额借方'] = new_opening_debit[adjusted]
+        self.balance_df.loc[adjusted, '期初余额贷方'] = new_opening_credit[adjusted]
+        adjustments_made = len(adjusted)
         
         logger.info(f"共调整了 {adjustments_made} 条记录")
         return adjustments_made
@@ -266,45 +160,28 @@ class OpeningBalanceAdjuster:
         mask = self.balance_df['年份'].isin(target_years)
         target_data = self.balance_df[mask]
         
-        for idx, row in target_data.iterrows():
-            account_type = self._get_account_type(row)
-            tolerance = 0.01
-            
-            # 使用与调整时相同的净额计算逻辑
-            # 根据科目类型使用不同的净额计算方式
-            if account_type == 'asset':
-                opening_net = row['期初余额借方'] - row['期初余额贷方']
-                period_net = row['本年累计借方'] - row['本年累计贷方']
-                closing_net = row['期末余额借方'] - row['期末余额贷方']
-            elif account_type in ['liability', 'equity']:
-                opening_net = row['期初余额贷方'] - row['期初余额借方']
-                period_net = row['本年累计贷方'] - row['本年累计借方']
-                closing_net = row['期末余额贷方'] - row['期末余额借方']
-            elif account_type == 'income':
-                opening_net = row['期初余额贷方'] - row['期初余额借方']
-                period_net = row['本年累计贷方'] - row['本年累计借方']
-                closing_net = row['期末余额贷方'] - row['期末余额借方']
-            elif account_type == 'expense':
-                opening_net = row['期初余额借方'] - row['期初余额贷方']
-                period_net = row['本年累计借方'] - row['本年累计贷方']
-                closing_net = row['期末余额借方'] - row['期末余额贷方']
-            
-            expected_closing = opening_net + period_net
-            
-            # 对于未知类型，仍然进行验证（不应该有未知类型）
-            
-            # 验证恒等式
-            if abs(closing_net - expected_closing) > tolerance:
-                dimension_info = f" 核算维度: {row['核算维度名称']}" if row['is_dimension_row'] else ""
-                error_msg = (
-                    f"科目 {row['科目编码']} ({row['科目名称']}){dimension_info} [{account_type}类] 会计恒等式不平衡: "
-                    f"期初净额({opening_net:.2f}) + 发生净额({period_net:.2f}) = {expected_closing:.2f}, "
-                    f"但期末净额为 {closing_net:.2f}, 差异: {closing_net - expected_closing:.2f}"
-                )
-                results['errors'].append(error_msg)
-                results['failed'] += 1
-            else:
-                results['passed'] += 1
+        # 使用与调整时相同的净额计算逻辑（未知类型按借方余额计算，仍然进行验证）
+        tolerance = 0.01
+        account_types = self.account_types[target_data.index]
+        credit_normal = account_types.isin(CREDIT_NORMAL_TYPES)
+        opening_nets = normal_net(target_data['期初余额借方'], target_data['期初余额贷方'], credit_normal)
+        period_nets = normal_net(target_data['本年累计借方'], target_data['本年累计贷方'], credit_normal)
+        closing_nets = normal_net(target_data['期末余额借方'], target_data['期末余额贷方'], credit_normal)
+        expected_closings = opening_nets + period_nets
+        failed = (closing_nets - expected_closings).abs() > tolerance
+        results['passed'] = int((~failed).sum())
+        
+        # 验证恒等式
+        for idx in target_data.index[failed]:
+            row = target_data.loc[idx]
+            dimension_info = f" 核算维度: {row['核算维度名称']}" if row['is_dimension_row'] else ""
+            error_msg = (
+                f"科目 {row['科目编码']} ({row['科目名称']}){dimension_info} [{account_types[idx]}类] 会计恒等式不平衡: "
+                f"期初净额({opening_nets[idx]:.2f}) + 发生净额({period_nets[idx]:.2f}) = {expected_closings[idx]:.2f}, "
+                f"但期末净额为 {closing_nets[idx]:.2f}, 差异: {closing_nets[idx] - expected_closings[idx]:.2f}"
+            )
+            results['errors'].append(error_msg)
+            results['failed'] += 1
         
         logger.info(f"验证完成: 通过 {results['passed']}, 失败 {results['failed']}")
         
@@ -350,12 +227,9 @@ class OpeningBalanceAdjuster:
             f.write("- 适用年份: 2024年, 2025年\n")
             f.write("- 适用范围: 所有科目（包括核算维度）\n\n")
             
-            f.write("科目类型处理规则:\n")
-            f.write("- 资产类: 正数记借方，负数记贷方\n")
-            f.write("- 负债类: 正数记贷方，负数记借方\n")
-            f.write("- 所有者权益类: 正数记贷方，负数记借方\n")
-            f.write("- 收入类: 正数记贷方，负数记借方\n")
-            f.write("- 费用类: 正数记借方，负数记贷方\n\n")
+            f.write("科目类型处理规则（按科目主数据的余额方向）:\n")
+            f.write("- 资产类、共同类、成本类、费用类: 正数记借方，负数记贷方\n")
+            f.write("- 负债类、所有者权益类、收入类: 正数记贷方，负数记借方\n\n")
         
         logger.info(f"调整报告已生成: {report_path}")
     
@@ -10,6 +10,8 @@ from pathlib import Path
 import logging
 from typing import Dict, List, Tuple
 
+from subject_master import CREDIT_NORMAL_TYPES, load_subject_master, normal_net, row_subject_codes
+
 # 配置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -21,6 +23,9 @@ class FinancialDataValidator:
         self.balance_df = None
         self.voucher_df = None
         self.validation_results = {}
+        self.subject_master = None
+        self.subject_codes = None
+        self.account_types = None
         
     def load_data(self):
         """加载数据文件"""
@@ -64,41 +69,18 @@ class FinancialDataValidator:
         self.voucher_df['日期'] = pd.to_datetime(self.voucher_df['日期'], errors='coerce')
         self.voucher_df['年份'] = self.voucher_df['日期'].dt.year
         self.voucher_df['月份'] = self.voucher_df['日期'].dt.month
-    
-    def _get_account_type(self, subject_code: str) -> str:
-        """
-        根据科目编码判断科目类型
-        中国会计准则科目编码规则:
-        1xxx: 资产类
-        2xxx: 负债类  
-        3xxx: 所有者权益类
-        4xxx: 收入类
-        5xxx: 费用类
-        6xxx: 损益类
-        """
-        code = str(subject_code).split('.')[0]  # 取主科目编码
-        if code.startswith('1'):
-            return 'asset'
-        elif code.startswith('2'):
-            return 'liability'
-        elif code.startswith('3'):
-            return 'equity'
-        elif code.startswith('4'):
-            return 'income'
-        elif code.startswith('5') or code.startswith('6'):
-            return 'expense'
-        else:
-            return 'unknown'
+        
+        # 科目类型由科目主数据按编码连接取得（核算维度行取所属科目）
+        self.subject_master = load_subject_master(self.balance_df, self.data_dir / "final_enhanced_balance.csv")
+        self.subject_codes = row_subject_codes(self.balance_df)
+        self.account_types = self.subject_master.lookup(self.subject_codes, '科目类型').fillna('unknown')
     
     def validate_accounting_equation(self) -> Dict:
         """
         验证1: 会计恒等式平衡验证
-        根据不同科目类型使用不同的验证公式:
-        - 资产类: 期初借方 - 期初贷方 + 本年累计借方 - 本年累计贷方 = 期末借方 - 期末贷方
-        - 负债类: 期初贷方 - 期初借方 + 本年累计贷方 - 本年累计借方 = 期末贷方 - 期末借方
-        - 所有者权益类: 期初贷方 - 期初借方 + 本年累计贷方 - 本年累计借方 = 期末贷方 - 期末借方
-        - 收入类: 本年累计贷方 - 本年累计借方 = 期末贷方 - 期末借方 (期初应为0)
-        - 费用类: 本年累计借方 - 本年累计贷方 = 期末借方 - 期末贷方 (期初应为0)
+        按科目主数据中的余额方向计算净额（期初净额 + 本年发生净额 = 期末净额）:
+        - 借方余额科目（资产类、共同类、成本类、费用类）: 借方 - 贷方
+        - 贷方余额科目（负债类、所有者权益类、收入类）: 贷方 - 借方
         """
         logger.info("开始验证会计恒等式平衡...")
         
@@ -108,70 +90,48 @@ class FinancialDataValidator:
             'errors': []
         }
         
-        for idx, row in self.balance_df.iterrows():
-            # 包括核算维度行也需要验证
-            account_type = self._get_account_type(row['科目编码'])
-            tolerance = 0.01
-            
-            # 根据科目类型使用不同的验证逻辑
-            if account_type == 'asset':
-                # 资产类: 借方增加，贷方减少
-                opening_net = row['期初余额借方'] - row['期初余额贷方']
-                period_net = row['本年累计借方'] - row['本年累计贷方']
-                closing_net = row['期末余额借方'] - row['期末余额贷方']
-                expected_closing = opening_net + period_net
-                
-            elif account_type in ['liability', 'equity']:
-                # 负债类和权益类: 贷方增加，借方减少
-                opening_net = row['期初余额贷方'] - row['期初余额借方']
-                period_net = row['本年累计贷方'] - row['本年累计借方']
-                closing_net = row['期末余额贷方'] - row['期末余额借方']
-                expected_closing = opening_net + period_net
-                
-            elif account_type == 'income':
-                # 收入类: 贷方增加，期初一般为0
-                opening_net = row['期初余额贷方'] - row['期初余额借方']
-                period_net = row['本年累计贷方'] - row['本年累计借方']
-                closing_net = row['期末余额贷方'] - row['期末余额借方']
-                expected_closing = opening_net + period_net
-                
-            elif account_type == 'expense':
-                # 费用类: 借方增加，期初一般为0
-                opening_net = row['期初余额借方'] - row['期初余额贷方']
-                period_net = row['本年累计借方'] - row['本年累计贷方']
-                closing_net = row['期末余额借方'] - row['期末余额贷方']
-                expected_closing = opening_net + period_net
-                
-            else:
-                # 未知类型，跳过验证
-                continue
-            
-            # 验证恒等式
-            if abs(closing_net - expected_closing) > tolerance:
-                dimension_info = f" 核算维度: {row['核算维度名称']}" if row['is_dimension_row'] else ""
-                error_msg = (
-                    f"科目 {row['科目编码']} ({row['科目名称']}){dimension_info} [{account_type}类] 会计恒等式不平衡: "
-                    f"期初净额({opening_net:.2f}) + 发生净额({period_net:.2f}) = {expected_closing:.2f}, "
-                    f"但期末净额为 {closing_net:.2f}, 差异: {closing_net - expected_closing:.2f}"
-                )
-                results['errors'].append({
-                    'type': 'accounting_equation',
-                    'subject_code': row['科目编码'],
-                    'subject_name': row['科目名称'],
-                    'dimension_name': row['核算维度名称'] if row['is_dimension_row'] else None,
-                    'account_type': account_type,
-                    'company': row['公司'],
-                    'period': row['期间'],
-                    'opening_net': opening_net,
-                    'period_net': period_net,
-                    'closing_net': closing_net,
-                    'expected_closing': expected_closing,
-                    'difference': closing_net - expected_closing,
-                    'message': error_msg
-                })
-                results['failed'] += 1
-            else:
-                results['passed'] += 1
+        # 包括核算维度行也需要验证，未知类型跳过
+        df = self.balance_df
+        tolerance = 0.01
+        known = self.account_types != 'unknown'
+        credit_normal = self.account_types.isin(CREDIT_NORMAL_TYPES)
+        opening_nets = normal_net(df['期初余额借方'], df['期初余额贷方'], credit_normal)
+        period_nets = normal_net(df['本年累计借方'], df['本年累计贷方'], credit_normal)
+        closing_nets = normal_net(df['期末余额借方'], df['期末余额贷方'], credit_normal)
+        expected_closings = opening_nets + period_nets
+        failed = known & ((closing_nets - expected_closings).abs() > tolerance)
+        results['passed'] = int((known & ~failed).sum())
+        
+        for idx in df.index[failed]:
+            row = df.loc[idx]
+            account_type = self.account_types[idx]
+            opening_net, period_net = opening_nets[idx], period_nets[idx]
+            closing_net, expected_closing = closing_nets[idx], expected_closings[idx]
+            # 核算维度行没有科目编码与名称，显示所属科目
+            subject_code = self.subject_codes[idx]
+            subject_name = row['科目名称'] if pd.notna(row['科目名称']) else self.subject_master.attributes(subject_code).get('科目名称')
+            dimension_info = f" 核算维度: {row['核算维度名称']}" if row['is_dimension_row'] else ""
+            error_msg = (
+                f"科目 {subject_code} ({subject_name}){dimension_info} [{account_type}类] 会计恒等式不平衡: "
+                f"期初净额({opening_net:.2f}) + 发生净额({period_net:.2f}) = {expected_closing:.2f}, "
+                f"但期末净额为 {closing_net:.2f}, 差异: {closing_net - expected_closing:.2f}"
+            )
+            results['errors'].append({
+                'type': 'accounting_equation',
+                'subject_code': subject_code,
+                'subject_name': subject_name,
+                'dimension_name': row['核算维度名称'] if row['is_dimension_row'] else None,
+                'account_type': account_type,
+                'company': row['公司'],
+                'period': row['期间'],
+                'opening_net': opening_net,
+                'period_net': period_net,
+                'closing_net': closing_net,
+                'expected_closing': expected_closing,
+                'difference': closing_net - expected_closing,
+                'message': error_msg
+            })
+            results['failed'] += 1
         
         logger.info(f"会计恒等式验证完成: 通过 {results['passed']}, 失败 {results['failed']}")
         self.validation_results['accounting_equation'] = results
@@ -274,7 +234,7 @@ class FinancialDataValidator:
                     continue  # 跳过不存在的父科目
                 
                 parent_row = period_group[period_group['科目编码'] == parent_code].iloc[0]
-                parent_account_type = self._get_account_type(parent_code)
+                parent_account_type = self.subject_master.account_type(parent_code)
                 
                 # 汇总子科目数据
                 child_debit_open = sum(child['期初余额借方'] for child in children)
@@ -287,8 +247,19 @@ class FinancialDataValidator:
                 tolerance = 0.01
                 
                 # 根据科目类型决定验证策略
-                if parent_account_type in ['asset', 'expense']:
-                    # 资产类和费用类科目：借方为正常余额方向
+                if parent_account_type == 'unknown':
+                    # 未知类型科目，逐项比较
+                    checks = [
+                        ('期初借方', parent_row['期初余额借方'], child_debit_open),
+                        ('期初贷方', parent_row['期初余额贷方'], child_credit_open),
+                        ('本年累计借方', parent_row['本年累计借方'], child_debit_current),
+                        ('本年累计贷方', parent_row['本年累计贷方'], child_credit_current),
+                        ('期末借方', parent_row['期末余额借方'], child_debit_close),
+                        ('期末贷方', parent_row['期末余额贷方'], child_credit_close)
+                    ]
+                    
+                elif parent_account_type not in CREDIT_NORMAL_TYPES:
+                    # 资产类、共同类、成本类和费用类科目：借方为正常余额方向
                     # 验证净额是否相等（允许借贷抵消后只显示净余额）
                     parent_net_open = parent_row['期初余额借方'] - parent_row['期初余额贷方']
                     child_net_open = child_debit_open - child_credit_open
@@ -305,7 +276,7 @@ class FinancialDataValidator:
                         ('期末净额', parent_net_close, child_net_close)
                     ]
                     
-                elif parent_account_type in ['liability', 'equity', 'income']:
+                else:
                     # 负债类、所有者权益类、收入类科目：贷方为正常余额方向
                     # 验证净额是否相等（允许借贷抵消后只显示净余额）
                     parent_net_open = parent_row['期初余额贷方'] - parent_row['期初余额借方']
@@ -322,16 +293,6 @@ class FinancialDataValidator:
                         ('本年累计净额', parent_net_current, child_net_current),
                         ('期末净额', parent_net_close, child_net_close)
                     ]
-                else:
-                    # 未知类型科目，使用原来的逐项比较方式
-                    checks = [
-                        ('期初借方', parent_row['期初余额借方'], child_debit_open),
-                        ('期初贷方', parent_row['期初余额贷方'], child_credit_open),
-                        ('本年累计借方', parent_row['本年累计借方'], child_debit_current),
-                        ('本年累计贷方', parent_row['本年累计贷方'], child_credit_current),
-                        ('期末借方', parent_row['期末余额借方'], child_debit_close),
-                        ('期末贷方', parent_row['期末余额贷方'], child_credit_close)
-                    ]
                 
                 # 执行验证检查
                 for field, parent_val, child_sum in checks:
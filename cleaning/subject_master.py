@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+科目主数据
+从科目余额表构建一次科目主数据（编码 → 名称、级次、上级科目、会计要素、余额方向、是否末级），
+保存在数据目录中供清洗脚本与MCP服务器共用；余额表更新后自动重建。
+数据表通过科目编码与主数据的整数位置连接取得科目属性，无需逐行解析编码
+
+会计要素按《企业会计准则》科目编码首位划分：
+1 资产类、2 负债类、3 共同类、4 所有者权益类、5 成本类、6 损益类；
+损益类中60、61、63开头的收入、收益类科目为贷方余额，其余为借方余额
+"""
+
+import logging
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# 主数据文件名，保存在余额表所在目录
+MASTER_FILE = "subject_master.csv"
+
+# 科目编码首位对应的会计要素
+CATEGORY_BY_CLASS = {
+    "1": "资产类",
+    "2": "负债类",
+    "3": "共同类",
+    "4": "所有者权益类",
+    "5": "成本类",
+    "6": "损益类",
+}
+
+# 会计要素对应的科目类型（损益类按编码再分收入与费用）
+ACCOUNT_TYPE_BY_CATEGORY = {
+    "资产类": "asset",
+    "负债类": "liability",
+    "共同类": "common",
+    "所有者权益类": "equity",
+    "成本类": "cost",
+}
+
+# 贷方余额的损益类科目编码前缀（营业收入、其他业务收入、投资收益、营业外收入等）
+INCOME_PREFIXES = ("60", "61", "63")
+
+# 正常余额在贷方的科目类型
+CREDIT_NORMAL_TYPES = {"liability", "equity", "income"}
+
+# 由科目编码推导、对主数据以外的编码同样适用的属性
+CLASSIFICATION_COLUMNS = ["一级科目", "会计要素", "科目类型", "余额方向"]
+
+MASTER_COLUMNS = ["科目编码", "科目名称", "科目全名", "级次", "上级科目", "一级科目",
+                  "会计要素", "科目类型", "余额方向", "是否末级"]
+
+def classify_codes(codes: pd.Series) -> pd.DataFrame:
+    """按去重后的科目编码推导一级科目、会计要素、科目类型与余额方向，返回以编码为索引的表"""
+    unique = pd.Index(pd.Series(codes, dtype=object).dropna().astype(str).unique())
+    top = pd.Series(unique.str.split(".").str[0], index=unique)
+    category = top.str[:1].map(CATEGORY_BY_CLASS).fillna("其他类")
+    account_type = category.map(ACCOUNT_TYPE_BY_CATEGORY)
+    profit_loss = category == "损益类"
+    account_type.loc[profit_loss] = np.where(top[profit_loss].str[:2].isin(INCOME_PREFIXES), "income", "expense")
+    account_type = account_type.fillna("unknown")
+    direction = np.where(account_type.isin(CREDIT_NORMAL_TYPES), "贷", "借")
+    return pd.DataFrame({"一级科目": top, "会计要素": category, "科目类型": account_type, "余额方向": direction},
+                        index=unique)
+
+def row_subject_codes(df: pd.DataFrame) -> pd.Series:
+    """余额表每行所属的科目编码：核算维度行没有科目编码，取subject_code_path的最后一级"""
+    codes = df["科目编码"].astype(object)
+    if "subject_code_path" not in df.columns:
+        return codes.where(codes.notna(), None)
+    paths = df["subject_code_path"].astype(object)
+    unique_paths = pd.Series(paths.dropna().unique())
+    last = dict(zip(unique_paths, unique_paths.astype(str).str.strip("/").str.split("/").str[-1]))
+    return codes.where(codes.notna(), paths.map(last))
+
+def build_subject_master(balance_df: pd.DataFrame) -> pd.DataFrame:
+    """由余额表构建科目主数据，每个科目编码一行"""
+    subjects = balance_df.loc[balance_df["科目编码"].notna(), ["科目编码", "科目名称", "subject_name_path"]]
+    if "is_dimension_row" in balance_df.columns:
+        subjects = subjects[~balance_df.loc[subjects.index, "is_dimension_row"].astype(bool)]
+    # 同一编码在各期间的名称取最后出现的一条
+    subjects = subjects.astype({"科目编码": str}).drop_duplicates("科目编码", keep="last")
+    subjects = subjects.sort_values("科目编码", kind="stable").reset_index(drop=True)
+
+    codes = subjects["科目编码"]
+    parts = codes.str.split(".")
+    master = pd.DataFrame({
+        "科目编码": codes,
+        "科目名称": subjects["科目名称"].astype(str).str.strip(),
+        "科目全名": subjects["subject_name_path"].astype(str).str.strip("/").str.replace("/", "-", regex=False),
+        "级次": parts.str.len(),
+    })
+
+    # 上级科目为主数据中存在的最近一级祖先编码
+    known = set(codes)
+    parent = pd.Series(None, index=master.index, dtype=object)
+    for depth in range(master["级次"].max() - 1, 0, -1):
+        pending = parent.isna() & (master["级次"] > depth)
+        candidates = parts[pending].str[:depth].str.join(".")
+        parent[candidates[candidates.isin(known)].index] = candidates[candidates.isin(known)]
+    master["上级科目"] = parent
+
+    classified = classify_codes(codes)
+    master = master.join(classified, on="科目编码")
+    master["是否末级"] = ~master["科目编码"].isin(set(parent.dropna()))
+    return master[MASTER_COLUMNS]
+
+def normal_net(debit: pd.Series, credit: pd.Series, credit_normal: pd.Series) -> pd.Series:
+    """按正常余额方向计算净额：贷方余额科目为贷减借，其余为借减贷"""
+    return pd.Series(np.where(credit_normal, credit - debit, debit - credit), index=debit.index)
+
+class SubjectMaster:
+    """科目主数据：科目编码映射为行位置后按位置取属性"""
+
+    def __init__(self, frame: pd.DataFrame):
+        self.frame = frame.reset_index(drop=True)
+        self.index = pd.Index(self.frame["科目编码"].astype(str))
+
+    def __len__(self) -> int:
+        return len(self.frame)
+
+    def ids(self, codes: pd.Series) -> np.ndarray:
+        """科目编码对应的主数据行位置，未知编码为-1"""
+        return self.index.get_indexer(pd.Series(codes, dtype=object).astype(str))
+
+    def lookup(self, codes: pd.Series, column: str) -> pd.Series:
+        """按科目编码取主数据列，结果与codes对齐；主数据中没有的编码仍按编码推导会计要素等属性"""
+        codes = pd.Series(codes, dtype=object)
+        ids = self.ids(codes)
+        values = self.frame[column].to_numpy()[ids].astype(object)
+        missing = ids < 0
+        if missing.any():
+            values[missing] = None
+            if column in CLASSIFICATION_COLUMNS:
+                missing_codes = codes[missing]
+                known = missing_codes.notna()
+                classified = classify_codes(missing_codes)[column]
+                values[np.flatnonzero(missing)[known.to_numpy()]] = classified.reindex(
+                    missing_codes[known].astype(str)).to_numpy()
+        return pd.Series(values, index=codes.index, name=column)
+
+    def attributes(self, code: str) -> Dict[str, object]:
+        """单个科目的全部属性"""
+        position = self.index.get_indexer([str(code)])[0]
+        if position >= 0:
+            return self.frame.iloc[position].to_dict()
+        return {"科目编码": str(code), **classify_codes(pd.Series([code])).iloc[0].to_dict()}
+
+    def category(self, code: str) -> str:
+        """科目的会计要素"""
+        return self.attributes(code)["会计要素"]
+
+    def account_type(self, code: str) -> str:
+        """科目类型：asset、liability、common、equity、cost、income、expense或unknown"""
+        return self.attributes(code)["科目类型"]
+
+    def credit_normal(self, code: str) -> bool:
+        """科目的正常余额是否在贷方"""
+        return self.attributes(code)["余额方向"] == "贷"
+
+def load_subject_master(balance_df: pd.DataFrame, source: Optional[Path] = None,
+                        path: Optional[Path] = None) -> SubjectMaster:
+    """读取已保存且不早于余额表的主数据，否则由余额表重建并保存
+
+    path默认为余额表所在目录下的subject_master.csv；未提供余额表路径或目录不可写时只在内存中构建
+    """
+    if path is None and source is not None:
+        path = Path(source).parent / MASTER_FILE
+    if path is not None and source is not None and path.exists() and Path(source).exists() \
+            and path.stat().st_mtime_ns >= Path(source).stat().st_mtime_ns:
+        frame = pd.read_csv(path, dtype={"科目编码": str, "上级科目": str, "一级科目": str}, encoding="utf-8")
+        if list(frame.columns) == MASTER_COLUMNS:
+            return SubjectMaster(frame)
+
+    frame = build_subject_master(balance_df)
+    if path is not None:
+        try:
+            frame.to_csv(path, index=False, encoding="utf-8")
+            logger.info(f"科目主数据已保存: {path} ({len(frame)}个科目)")
+        except OSError as e:
+            logger.warning(f"科目主数据保存失败，仅在内存中使用: {e}")
+    return SubjectMaster(frame)
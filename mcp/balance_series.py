@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+月度余额时间序列
+以余额表首个年度的期初余额为起点，按（公司, 科目）对凭证的月度发生额做累计求和，
+物化为以月份为列的稠密数组，逐月余额查询为O(1)下标访问
+"""
+
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional, Tuple
+
+from voucher_features import accounting_period_end
+
+def month_index(period: int) -> int:
+    """整数年月（如202401）转换为连续月序号"""
+    return (period // 100) * 12 + (period % 100) - 1
+
+def month_label(index: int) -> str:
+    """连续月序号转换为YYYY-MM"""
+    return f"{index // 12}-{index % 12 + 1:02d}"
+
+def ancestor_codes(codes: pd.Series) -> pd.Series:
+    """将科目编码展开为自身及全部上级科目（1002.01.01 -> 1002, 1002.01, 1002.01.01）"""
+    parts = codes.astype(str).str.split(".")
+    return parts.map(lambda p: [".".join(p[:level]) for level in range(1, len(p) + 1)])
+
+def monthly_movements(voucher_df: pd.DataFrame) -> pd.DataFrame:
+    """按（公司, 科目及其上级科目, 会计月份）汇总借贷方发生额"""
+    period_end = accounting_period_end(voucher_df)
+    lines = pd.DataFrame({
+        "公司": voucher_df["公司"].to_numpy(),
+        "科目编码": voucher_df["科目编码"].astype(str).to_numpy(),
+        "月份": (period_end.dt.year * 12 + period_end.dt.month - 1).to_numpy(),
+        "借方": voucher_df["借方金额"].to_numpy(),
+        "贷方": voucher_df["贷方金额"].to_numpy(),
+    }).dropna(subset=["月份"])
+    lines["月份"] = lines["月份"].astype(np.int64)
+
+    # 先在明细科目上汇总，再展开到上级科目，展开的行数只与科目数量有关
+    leaf = lines.groupby(["公司", "科目编码", "月份"], sort=False, as_index=False)[["借方", "贷方"]].sum()
+    leaf["科目编码"] = ancestor_codes(leaf["科目编码"])
+    return leaf.explode("科目编码").groupby(["公司", "科目编码", "月份"], sort=False, as_index=False)[["借方", "贷方"]].sum()
+
+def opening_anchors(balance_df: pd.DataFrame, start_years: pd.Series) -> pd.Series:
+    """取各公司首个凭证年度科目行（非核算维度行）的期初余额（借方为正）"""
+    rows = balance_df[balance_df["is_dimension_row"] != True]
+    rows = rows[rows["年份"] == rows["公司"].map(start_years)]
+    opening = rows["期初余额借方"].fillna(0) - rows["期初余额贷方"].fillna(0)
+    return opening.groupby([rows["公司"], rows["科目编码"].astype(str)]).sum()
+
+class BalanceSeries:
+    """按（公司, 科目）物化的月度借方、贷方发生额与期末余额"""
+
+    def __init__(self, movements: pd.DataFrame, anchors: pd.Series):
+        keys = pd.MultiIndex.from_frame(movements[["公司", "科目编码"]]).unique().union(anchors.index)
+        self.keys: List[Tuple[str, str]] = list(keys)
+        self.rows: Dict[Tuple[str, str], int] = {key: i for i, key in enumerate(self.keys)}
+        self.first_month = int(movements["月份"].min())
+        n_months = int(movements["月份"].max()) - self.first_month + 1
+
+        self.opening = anchors.reindex(keys).fillna(0).to_numpy()
+        self.debit = np.zeros((len(self.keys), n_months))
+        self.credit = np.zeros((len(self.keys), n_months))
+        row_ids = keys.get_indexer(pd.MultiIndex.from_frame(movements[["公司", "科目编码"]]))
+        col_ids = movements["月份"].to_numpy() - self.first_month
+        np.add.at(self.debit, (row_ids, col_ids), movements["借方"].to_numpy())
+        np.add.at(self.credit, (row_ids, col_ids), movements["贷方"].to_numpy())
+        self.ending = self.opening[:, None] + np.cumsum(self.debit - self.credit, axis=1)
+
+    @property
+    def months(self) -> List[str]:
+        """已物化的月份标签"""
+        return [month_label(self.first_month + i) for i in range(self.ending.shape[1])]
+
+    def lookup(self, company: str, subject_code: str, period: int) -> Optional[float]:
+        """查询某公司某科目某月末余额（借方为正），不存在时返回None"""
+        row = self.rows.get((company, subject_code))
+        col = month_index(period) - self.first_month
+        if row is None or not 0 <= col < self.ending.shape[1]:
+            return None
+        return float(self.ending[row, col])
+
+    def trend(self, companies: List[str], subject_code: str,
+              period_start: Optional[int] = None, period_end: Optional[int] = None) -> pd.DataFrame:
+        """返回指定公司（多个时合计）某科目的逐月发生额与期末余额"""
+        rows = [self.rows[(company, subject_code)] for company in companies if (company, subject_code) in self.rows]
+        if not rows:
+            return pd.DataFrame(columns=["月份", "期初余额", "借方发生额", "贷方发生额", "期末余额"])
+
+        start = 0 if period_start is None else max(month_index(period_start) - self.first_month, 0)
+        stop = self.ending.shape[1] if period_end is None else min(month_index(period_end) - self.first_month + 1, self.ending.shape[1])
+        if start >= stop:
+            return pd.DataFrame(columns=["月份", "期初余额", "借方发生额", "贷方发生额", "期末余额"])
+
+        ending = self.ending[rows, :].sum(axis=0)
+        opening = np.concatenate([[self.opening[rows].sum()], ending[:-1]])
+        return pd.DataFrame({
+            "月份": self.months[start:stop],
+            "期初余额": opening[start:stop],
+            "借方发生额": self.debit[rows, start:stop].sum(axis=0),
+            "贷方发生额": self.credit[rows, start:stop].sum(axis=0),
+            "期末余额": ending[start:stop],
+        })
+
+def build_balance_series(voucher_df: pd.DataFrame, balance_df: pd.DataFrame) -> BalanceSeries:
+    """由凭证月度发生额与余额表期初数构建月度余额序列"""
+    movements = monthly_movements(voucher_df)
+    start_years = (movements.groupby("公司")["月份"].min() // 12).astype(int)
+    return BalanceSeries(movements, opening_anchors(balance_df, start_years))
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+业务类型分类器
+加载数据时对整张凭证表一次性打标：摘要关键词与科目名称关键词各用一个组合正则单次匹配，
+科目编码按一级科目前缀查表，结果以分类列（categorical）保存，可用于筛选和分组统计
+"""
+
+import re
+import numpy as np
+import pandas as pd
+from typing import Dict, List
+
+# 摘要关键词组（按优先级）
+SUMMARY_KEYWORDS: Dict[str, List[str]] = {
+    "receipt": ["收到", "收款", "货款", "回款", "还款"],
+    "payment": ["支付", "付款", "采购", "购买", "预付"],
+    "transfer": ["转账", "划转", "内部", "调拨"],
+}
+
+# 科目名称关键词
+NAME_KEYWORDS: Dict[str, str] = {
+    "receivable": "应收",
+    "notes_receivable": "应收票据",
+    "payable": "应付",
+    "prepayment": "预付",
+    "selling_expense": "销售费用",
+    "admin_expense": "管理费用",
+    "finance_expense": "财务费用",
+    "bank": "银行存款",
+    "expense": "费用",
+    "deposit": "存款",
+}
+
+# 分类规则表：(摘要关键词组, 一级科目编码, 科目名称关键词, 业务类型)，自上而下首个命中生效
+# 一级科目编码和名称关键词满足其一即可；两者为None表示该关键词组的兜底类型
+CLASSIFICATION_RULES = [
+    ("receipt", ["1122"], "receivable", "销售收款"),
+    ("receipt", ["1121"], "notes_receivable", "票据收款"),
+    ("receipt", ["2202"], "payable", "预收款项"),
+    ("receipt", None, None, "其他收款"),
+    ("payment", ["2202"], "payable", "采购付款"),
+    ("payment", ["1123"], "prepayment", "预付款项"),
+    ("payment", ["6601"], "selling_expense", "销售费用"),
+    ("payment", ["6602"], "admin_expense", "管理费用"),
+    ("payment", ["6603"], "finance_expense", "财务费用"),
+    ("payment", None, None, "其他付款"),
+    ("transfer", ["1002"], "bank", "银行转账"),
+    ("transfer", None, None, "内部转账"),
+]
+
+# 不含摘要关键词时的兜底规则：(一级科目首位, 名称关键词, 是否两者同时满足, 业务类型)
+FALLBACK_RULES = [
+    ("6", "expense", False, "费用报销"),
+    ("1", "deposit", True, "资金业务"),
+    ("2", "payable", True, "应付款项"),
+]
+
+DEFAULT_TYPE = "其他业务"
+
+BUSINESS_TYPES = list(dict.fromkeys(
+    [rule[3] for rule in CLASSIFICATION_RULES] + [rule[3] for rule in FALLBACK_RULES] + [DEFAULT_TYPE]
+))
+
+def _presence_pattern(groups: Dict[str, List[str]]) -> re.Pattern:
+    """构造单次扫描即可判断各关键词组是否出现的组合正则（每组一个可选前瞻）"""
+    lookaheads = "".join(
+        f"(?=.*?(?P<{name}>{'|'.join(re.escape(k) for k in keywords)}))?"
+        for name, keywords in groups.items()
+    )
+    return re.compile("^" + lookaheads, re.IGNORECASE | re.DOTALL)
+
+SUMMARY_PATTERN = _presence_pattern(SUMMARY_KEYWORDS)
+NAME_PATTERN = _presence_pattern({name: [keyword] for name, keyword in NAME_KEYWORDS.items()})
+
+def _keyword_presence(text: pd.Series, pattern: re.Pattern) -> pd.DataFrame:
+    """对文本做一次组合正则匹配，返回各关键词组是否出现的布尔矩阵"""
+    return text.fillna("").astype(str).str.extract(pattern).notna().set_axis(text.index)
+
+def _apply_rules(summary_group: pd.Series, top_codes: pd.Series, name_hits: pd.DataFrame) -> np.ndarray:
+    """按规则表自上而下判定业务类型"""
+    conditions = []
+    labels = []
+    for group, code_prefixes, name_key, label in CLASSIFICATION_RULES:
+        condition = summary_group == group
+        if code_prefixes is not None:
+            condition &= top_codes.isin(code_prefixes) | name_hits[name_key]
+        conditions.append(condition)
+        labels.append(label)
+
+    no_keyword = summary_group == ""
+    first_digit = top_codes.str[:1]
+    for digit, name_key, require_both, label in FALLBACK_RULES:
+        code_match = first_digit == digit
+        condition = (code_match & name_hits[name_key]) if require_both else (code_match | name_hits[name_key])
+        conditions.append(no_keyword & condition)
+        labels.append(label)
+
+    return np.select(conditions, labels, default=DEFAULT_TYPE)
+
+def classify_business_type(voucher_df: pd.DataFrame) -> pd.Series:
+    """对整张凭证表进行业务类型分类，返回categorical列
+
+    分类只取决于摘要关键词组与科目，因此先对去重后的摘要和科目分别匹配，
+    再对（关键词组, 科目）的去重组合套用规则表，最后按下标展开回整表
+    """
+    # 1. 摘要：去重后单次组合正则匹配，按优先级归入收款/付款/转账/无
+    summary_ids, summary_uniques = pd.factorize(voucher_df["摘要"].fillna("").astype(str))
+    summary_hits = _keyword_presence(pd.Series(summary_uniques), SUMMARY_PATTERN)
+    group_ids = np.select(
+        [summary_hits["receipt"], summary_hits["payment"], summary_hits["transfer"]], [1, 2, 3], default=0
+    )[summary_ids]
+
+    # 2. 科目：按（科目编码, 科目名称）去重
+    name_column = "科目全名" if "科目全名" in voucher_df.columns else "科目名称"
+    subject_frame = voucher_df[["科目编码", name_column]].astype(str)
+    subject_ids = subject_frame.groupby(["科目编码", name_column], sort=False).ngroup().to_numpy()
+    subjects = subject_frame.drop_duplicates().reset_index(drop=True)
+
+    # 3. 对去重组合套用规则表
+    combo_ids, combos = pd.factorize(group_ids * len(subjects) + subject_ids)
+    combo_groups = combos // len(subjects)
+    combo_subjects = subjects.iloc[combos % len(subjects)].reset_index(drop=True)
+
+    group_names = np.array(["", "receipt", "payment", "transfer"])
+    labels = _apply_rules(
+        pd.Series(group_names[combo_groups]),
+        combo_subjects["科目编码"].str.split(".").str[0],
+        _keyword_presence(combo_subjects[name_column], NAME_PATTERN),
+    )
+    return pd.Series(pd.Categorical(labels[combo_ids], categories=BUSINESS_TYPES), index=voucher_df.index)
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+工具调用性能剖析
+按调用参数显式开启时用cProfile精确统计；设置耗时阈值时对每次调用做低开销的
+调用栈采样，超过阈值才保留并记录热点。两者都未开启时不做任何额外工作
+"""
+
+import cProfile
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+import pandas as pd
+from collections import Counter, deque
+from typing import Any, Dict, List, Optional, Tuple
+
+# 默认保留的热点函数数量
+DEFAULT_TOP_N = 20
+
+# 采样间隔（秒）
+SAMPLE_INTERVAL = 0.005
+
+HOTSPOT_COLUMNS = ["函数", "位置", "调用次数", "自身耗时ms", "累计耗时ms"]
+
+def _function_label(code_key: Tuple[str, int, str]) -> Tuple[str, str]:
+    """(文件, 行号, 函数名) 转换为函数名与简短位置"""
+    filename, line, name = code_key
+    return name, f"{os.path.basename(filename)}:{line}" if line else filename
+
+def cprofile_hotspots(profile: cProfile.Profile, top_n: int, ignore: frozenset = frozenset()) -> pd.DataFrame:
+    """按累计耗时取cProfile统计的前top_n个函数，ignore中的函数（分发包装等）不列出"""
+    stats = pstats.Stats(profile).stats
+    rows = []
+    for code_key, (_, calls, self_time, cumulative_time, _) in stats.items():
+        name, location = _function_label(code_key)
+        if name not in ignore:
+            rows.append((name, location, calls, self_time * 1000, cumulative_time * 1000))
+    hotspots = pd.DataFrame(rows, columns=HOTSPOT_COLUMNS)
+    return hotspots.nlargest(top_n, "累计耗时ms").reset_index(drop=True)
+
+class StackSampler:
+    """后台线程定时读取目标线程的调用栈，按函数统计出现在栈中（累计）与栈顶（自身）的次数
+
+    只统计root_code（发起调用的函数）以下的栈帧，事件循环等外层帧不计入
+    """
+
+    def __init__(self, thread_id: int, root_code, interval: float = SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.root_code = root_code
+        self.interval = interval
+        self.samples = 0
+        self.cumulative: Counter = Counter()
+        self.own: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            self.samples += 1
+            seen = set()
+            top = True
+            while frame is not None and frame.f_code is not self.root_code:
+                code = frame.f_code
+                key = (code.co_filename, code.co_firstlineno, code.co_name)
+                if top:
+                    self.own[key] += 1
+                    top = False
+                if key not in seen:
+                    seen.add(key)
+                    self.cumulative[key] += 1
+                frame = frame.f_back
+
+    def start(self) -> "StackSampler":
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def hotspots(self, top_n: int, ignore: frozenset = frozenset()) -> pd.DataFrame:
+        """按采样次数估算各函数的自身与累计耗时"""
+        rows = []
+        for key, count in self.cumulative.most_common():
+            name, location = _function_label(key)
+            if name in ignore:
+                continue
+            if len(rows) >= top_n:
+                break
+            rows.append((name, location, None, self.own.get(key, 0) * self.interval * 1000, count * self.interval * 1000))
+        return pd.DataFrame(rows, columns=HOTSPOT_COLUMNS)
+
+class CallProfiler:
+    """工具调用剖析：profile参数开启时返回热点，超过阈值的慢调用记录到日志"""
+
+    def __init__(self, threshold_ms: Optional[float] = None, top_n: int = DEFAULT_TOP_N,
+                 log_file: Optional[str] = None, history: int = 20, ignore: tuple = ()):
+        self.threshold_ms = threshold_ms
+        self.top_n = top_n
+        self.ignore = frozenset(("<lambda>", "disable") + tuple(ignore))
+        self.log_file = log_file
+        self.recent: deque = deque(maxlen=history)
+        # cProfile同一时间只剖析一个调用，其余请求改用采样
+        self._cprofile_lock = threading.Lock()
+        self._log_lock = threading.Lock()
+
+    async def run(self, tool: str, arguments: dict, call) -> Tuple[Any, Optional[Dict[str, Any]]]:
+        """执行call()，返回(结果, 剖析信息)；未请求剖析且未超过阈值时剖析信息为None"""
+        requested = bool(arguments.get("profile"))
+        if not requested and self.threshold_ms is None:
+            return await call(), None
+
+        profile = None
+        sampler = None
+        if requested and self._cprofile_lock.acquire(blocking=False):
+            profile = cProfile.Profile()
+        else:
+            sampler = StackSampler(threading.get_ident(), CallProfiler.run.__code__).start()
+
+        started = time.perf_counter()
+        try:
+            if profile is not None:
+                profile.enable()
+            result = await call()
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            if profile is not None:
+                profile.disable()
+                self._cprofile_lock.release()
+            if sampler is not None:
+                sampler.stop()
+
+        slow = self.threshold_ms is not None and elapsed_ms >= self.threshold_ms
+        if not requested and not slow:
+            return result, None
+
+        report = {
+            "tool": tool,
+            "method": "cProfile" if profile is not None else "sampling",
+            "elapsed_ms": elapsed_ms,
+            "hotspots": (cprofile_hotspots(profile, self.top_n, self.ignore) if profile is not None
+                         else sampler.hotspots(self.top_n, self.ignore)),
+        }
+        if slow:
+            self._log(tool, arguments, report)
+        return result, report
+
+    def _log(self, tool: str, arguments: dict, report: Dict[str, Any]):
+        """保存慢调用的热点，并写入标准错误与跟踪文件"""
+        record = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S"), "type": "profile", "tool": tool, "arguments": arguments,
+            "method": report["method"], "elapsed_ms": round(report["elapsed_ms"], 3),
+            "hotspots": report["hotspots"].astype(object).where(report["hotspots"].notna(), None).to_dict(orient="records"),
+        }
+        self.recent.append(record)
+        top = report["hotspots"].head(5)
+        summary = "; ".join(f"{row.函数} {row.累计耗时ms:.0f}ms" for row in top.itertuples())
+        print(f"Slow tool call: {tool} {report['elapsed_ms']:.0f}ms [{summary}]", file=sys.stderr)
+        if self.log_file:
+            with self._log_lock, open(self.log_file, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+
+    def recent_profiles(self) -> List[Dict[str, Any]]:
+        """最近记录的慢调用剖析"""
+        return list(self.recent)
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+往来款项账龄分析
+按往来单位将增加额（应收的借方、应付的贷方）与减少额按先进先出配对：
+某笔增加额的未核销金额 = min(金额, max(0, 截至该笔的累计增加 - 截至分析日的累计减少))，
+整列一次计算，无需逐笔循环。账簿构建时按月份顺序追加凭证，累计值在已有基础上续算
+"""
+
+import re
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional
+
+# 默认账龄区间上限（天），最后一档为超过最大上限
+DEFAULT_BUCKETS = [30, 90, 180]
+
+# 无法识别往来单位的分录归入该名称
+UNKNOWN_COUNTERPARTY = "未识别往来单位"
+
+def bucket_labels(buckets: List[int]) -> List[str]:
+    """生成账龄区间标签，如0-30天、31-90天、180天以上"""
+    labels = []
+    lower = 0
+    for upper in buckets:
+        labels.append(f"{lower}-{upper}天")
+        lower = upper + 1
+    labels.append(f"{buckets[-1]}天以上")
+    return labels
+
+def resolve_counterparties(counterparties: pd.Series, dimension_names: pd.Series) -> pd.Series:
+    """将摘要中的往来单位简称匹配到余额表核算维度全称
+
+    依次尝试完全相同、以及"地区+简称"形式（如"东莞和永"对应"东莞市和永热熔胶有限公司"），
+    只有唯一命中时才替换，匹配只在去重后的简称上进行
+    """
+    names = pd.Series(dimension_names.dropna().astype(str).unique())
+    known = set(names)
+    resolved: Dict[str, str] = {}
+    for short_name in counterparties.dropna().unique():
+        if short_name in known:
+            continue
+        pattern = re.escape(short_name[:2]) + "(?:市|省|区|县)?" + re.escape(short_name[2:])
+        hits = names[names.str.contains(pattern, regex=True)]
+        if len(hits) == 1:
+            resolved[short_name] = hits.iloc[0]
+    counterparties = counterparties.replace(resolved)
+    # 未匹配到维度且含数字的分段多为单号、调整说明，不视为往来单位
+    invalid = ~counterparties.isin(known) & counterparties.str.contains(r'\d', na=False)
+    return counterparties.mask(invalid)
+
+class AgingLedger:
+    """单个科目的往来账龄账簿，按日期顺序追加增加额与减少额"""
+
+    def __init__(self, subject_code: str, credit_normal: bool = False):
+        self.subject_code = subject_code
+        self.credit_normal = credit_normal
+        self.increases = pd.DataFrame(columns=["公司", "往来单位", "日期", "金额", "累计增加"])
+        self.decreases = pd.DataFrame(columns=["公司", "往来单位", "日期", "金额", "累计减少"])
+        self.latest_date = None
+
+    @staticmethod
+    def _append_cumulative(existing: pd.DataFrame, lines: pd.DataFrame, column: str) -> pd.DataFrame:
+        """在已有累计值基础上，为新增分录计算各往来单位的累计金额"""
+        lines = lines.sort_values(["公司", "往来单位", "日期"], kind="mergesort")
+        running = lines.groupby(["公司", "往来单位"], sort=False)["金额"].cumsum()
+        if not existing.empty:
+            previous = existing.groupby(["公司", "往来单位"], sort=False)[column].max()
+            offset = pd.MultiIndex.from_frame(lines[["公司", "往来单位"]]).map(previous.to_dict())
+            running = running + pd.Series(offset, index=lines.index).fillna(0).to_numpy()
+        lines = lines.assign(**{column: running})
+        if existing.empty:
+            return lines.reset_index(drop=True)
+        return pd.concat([existing, lines], ignore_index=True)
+
+    def update(self, lines: pd.DataFrame) -> "AgingLedger":
+        """追加一批分录（公司, 往来单位, 日期, 借方金额, 贷方金额），日期须晚于已入账分录"""
+        if lines.empty:
+            return self
+        signed = lines["借方金额"] - lines["贷方金额"]
+        if self.credit_normal:
+            signed = -signed
+        movements = lines[["公司", "往来单位", "日期"]].assign(金额=signed.abs().to_numpy())
+
+        self.increases = self._append_cumulative(self.increases, movements[signed > 0], "累计增加")
+        self.decreases = self._append_cumulative(self.decreases, movements[signed < 0], "累计减少")
+        latest = lines["日期"].max()
+        self.latest_date = latest if self.latest_date is None else max(self.latest_date, latest)
+        return self
+
+    def aging(self, as_of: Optional[pd.Timestamp] = None, buckets: Optional[List[int]] = None) -> pd.DataFrame:
+        """计算截至as_of各往来单位的余额及账龄分布"""
+        as_of = pd.Timestamp(as_of) if as_of is not None else self.latest_date
+        buckets = buckets or DEFAULT_BUCKETS
+        labels = bucket_labels(buckets)
+        if as_of is None or self.increases.empty and self.decreases.empty:
+            return pd.DataFrame(columns=["公司", "往来单位", "余额"] + labels + ["超额冲销"])
+
+        keys = ["公司", "往来单位"]
+        increases = self.increases[self.increases["日期"] <= as_of]
+        decreases = self.decreases[self.decreases["日期"] <= as_of]
+        decreased = decreases.groupby(keys, sort=False)["累计减少"].max()
+
+        # 先进先出：累计增加超过累计减少的部分即为未核销金额
+        consumed = pd.MultiIndex.from_frame(increases[keys]).map(decreased.to_dict())
+        consumed = pd.Series(consumed, index=increases.index).fillna(0).to_numpy()
+        amounts = increases["金额"].to_numpy(dtype=float)
+        outstanding = np.clip(increases["累计增加"].to_numpy(dtype=float) - consumed, 0, amounts)
+
+        ages = (as_of - increases["日期"]).dt.days.to_numpy()
+        bucket_ids = np.searchsorted(np.asarray(buckets), ages, side="left")
+        open_items = increases[keys].assign(账龄=pd.Categorical.from_codes(bucket_ids, labels), 金额=outstanding)
+        result = open_items.pivot_table(
+            index=keys, columns="账龄", values="金额", aggfunc="sum", fill_value=0, observed=False
+        ).reindex(columns=labels, fill_value=0)
+        result.columns = list(labels)
+
+        # 减少额超过全部增加额的部分（如预收、预付）
+        total_increase = increases.groupby(keys, sort=False)["累计增加"].max()
+        excess = (decreased - total_increase.reindex(decreased.index).fillna(0)).clip(lower=0)
+        result = result.join(excess.rename("超额冲销"), how="outer").fillna(0)
+
+        result.insert(0, "余额", result[labels].sum(axis=1) - result["超额冲销"])
+        result = result[(result[labels].sum(axis=1) > 0.005) | (result["超额冲销"] > 0.005)]
+        return result.reset_index().sort_values("余额", ascending=False, key=np.abs, kind="mergesort").reset_index(drop=True)
+
+def opening_lines(cube_slice: pd.DataFrame, start_dates: pd.Series) -> pd.DataFrame:
+    """将各公司首个凭证年度的核算维度期初余额转换为期初分录（日期为上年末）"""
+    frames = []
+    for company, start in start_dates.items():
+        rows = cube_slice[(cube_slice["公司"].astype(str) == company) & (cube_slice["年份"] == start.year)]
+        rows = rows[rows["期初余额"].abs() >= 0.005]
+        frames.append(pd.DataFrame({
+            "公司": company,
+            "往来单位": rows["核算维度名称"].astype(str).to_numpy(),
+            "日期": pd.Timestamp(year=start.year, month=1, day=1) - pd.Timedelta(days=1),
+            "借方金额": rows["期初余额"].clip(lower=0).to_numpy(),
+            "贷方金额": (-rows["期初余额"]).clip(lower=0).to_numpy(),
+        }))
+    if not frames:
+        return pd.DataFrame(columns=["公司", "往来单位", "日期", "借方金额", "贷方金额"])
+    return pd.concat(frames, ignore_index=True)
+
+def subject_lines(voucher_df: pd.DataFrame, subject_code: str, dimension_names: pd.Series) -> pd.DataFrame:
+    """筛选科目（含下级科目）分录并识别往来单位"""
+    codes = voucher_df["科目编码"].astype(str)
+    mask = (codes == subject_code) | codes.str.startswith(subject_code + ".")
+    lines = voucher_df.loc[mask & voucher_df["日期"].notna(), ["公司", "日期", "借方金额", "贷方金额", "交易对方"]]
+    counterparties = resolve_counterparties(lines["交易对方"], dimension_names)
+    lines = lines.assign(往来单位=counterparties.fillna(UNKNOWN_COUNTERPARTY)).drop(columns="交易对方")
+    return lines.sort_values("日期", kind="mergesort")
+
+def build_aging_ledger(voucher_df: pd.DataFrame, cube_slice: pd.DataFrame, subject_code: str,
+                       credit_normal: bool = False) -> AgingLedger:
+    """以核算维度期初余额为起点，按月份顺序将凭证分录追加到账龄账簿"""
+    lines = subject_lines(voucher_df, subject_code, cube_slice["核算维度名称"])
+    ledger = AgingLedger(subject_code, credit_normal)
+    if lines.empty:
+        return ledger
+
+    start_dates = voucher_df.groupby("公司")["日期"].min().dropna()
+    ledger.update(opening_lines(cube_slice, start_dates))
+    for _, month_lines in lines.groupby(lines["日期"].dt.to_period("M"), sort=True):
+        ledger.update(month_lines)
+    return ledger
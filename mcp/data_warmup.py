@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+后台数据预热
+服务器启动时在后台线程按阶段加载数据表并预先构建常用的派生缓存，
+每个阶段完成（或失败）后设置对应的就绪事件；MCP握手与工具列表无需等待，
+工具调用只等待所需的阶段
+"""
+
+import asyncio
+import sys
+import threading
+import time
+import pandas as pd
+from typing import Callable, Dict, List, Optional, Tuple
+
+class DataWarmup:
+    """按顺序执行(阶段名, 函数)，记录各阶段的状态、耗时与错误"""
+
+    def __init__(self, stages: List[Tuple[str, Callable[[], object]]]):
+        self.stages = stages
+        self.events: Dict[str, threading.Event] = {name: threading.Event() for name, _ in stages}
+        self.timings: Dict[str, float] = {}
+        self.errors: Dict[str, str] = {}
+        self.current: Optional[str] = None
+        self.started: Optional[float] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "DataWarmup":
+        """启动后台线程，重复调用无效"""
+        if self._thread is None:
+            self.started = time.perf_counter()
+            self._thread = threading.Thread(target=self._run, name="data-warmup", daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        failed = False
+        for name, stage in self.stages:
+            if failed:
+                # 前序阶段失败时跳过其余阶段，等待方改为同步加载并得到原始错误
+                self.events[name].set()
+                continue
+            self.current = name
+            started = time.perf_counter()
+            try:
+                stage()
+                status = "完成"
+            except Exception as e:
+                self.errors[name] = str(e).split("\n")[0]
+                status = f"失败: {self.errors[name]}"
+                failed = True
+            finally:
+                self.timings[name] = (time.perf_counter() - started) * 1000
+                self.events[name].set()
+            print(f"数据预热 {name} {status} ({self.timings[name]:.0f}ms)", file=sys.stderr)
+        self.current = None
+
+    def is_ready(self, stage: str) -> bool:
+        """阶段已结束（含失败）或预热未启动时视为就绪，调用方按原流程同步加载"""
+        return self._thread is None or self.events[stage].is_set()
+
+    async def wait(self, stage: str, timeout: Optional[float]) -> bool:
+        """在工作线程中等待阶段就绪，不阻塞事件循环；超时返回False"""
+        if self.is_ready(stage):
+            return True
+        return await asyncio.to_thread(self.events[stage].wait, timeout)
+
+    def elapsed(self) -> float:
+        """自启动以来的秒数"""
+        return time.perf_counter() - self.started if self.started is not None else 0.0
+
+    def status(self) -> pd.DataFrame:
+        """各阶段的状态与耗时"""
+        rows = []
+        for name, _ in self.stages:
+            if name in self.errors:
+                state = "失败"
+            elif name in self.timings:
+                state = "完成"
+            elif self.events[name].is_set():
+                state = "跳过"
+            elif name == self.current:
+                state = "进行中"
+            else:
+                state = "未开始" if self._thread is not None else "未启用"
+            rows.append({"阶段": name, "状态": state, "耗时ms": self.timings.get(name), "错误": self.errors.get(name)})
+        return pd.DataFrame(rows, columns=["阶段", "状态", "耗时ms", "错误"])
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+数据集分区统计
+加载时按分区预先计算汇总统计：余额表按（公司, 年份, 期间）计记录数；凭证表按（公司, 年份, 月份）
+计记录数、借贷方合计、日期范围、各业务分类的汇总，并为凭证唯一标识建立HyperLogLog基数草图。
+任意公司/年份组合的汇总由选中分区合并得到：计数与金额直接相加，凭证数在各分区凭证互不重叠时
+直接相加，否则合并草图（逐寄存器取最大值）后估计，均无需重新扫描明细
+"""
+
+import numpy as np
+import pandas as pd
+from typing import Any, Dict, Optional
+
+# HyperLogLog精度：2^14个寄存器，标准误差约0.8%，每个分区16KB
+HLL_PRECISION = 14
+
+BALANCE_KEYS = ["公司", "年份", "期间"]
+VOUCHER_KEYS = ["公司", "年份", "月份"]
+
+def hash_values(values: pd.Series) -> np.ndarray:
+    """取值的64位哈希"""
+    return pd.util.hash_array(np.asarray(values, dtype=object).astype(str))
+
+def hll_registers(group_ids: np.ndarray, hashes: np.ndarray, n_groups: int,
+                  precision: int = HLL_PRECISION) -> np.ndarray:
+    """按组构建HyperLogLog寄存器：哈希高precision位选寄存器，其余位的前导零个数加1为秩，寄存器取最大秩"""
+    m = 1 << precision
+    registers = np.zeros((n_groups, m), dtype=np.uint8)
+    if len(hashes) == 0:
+        return registers
+    hashes = hashes.astype(np.uint64)
+    index = (hashes >> np.uint64(64 - precision)).astype(np.int64)
+    rest = hashes << np.uint64(precision)
+
+    # 二分统计64位整数的前导零个数
+    zeros = np.zeros(len(rest), dtype=np.int64)
+    for shift in (32, 16, 8, 4, 2, 1):
+        empty = rest < (np.uint64(1) << np.uint64(64 - shift))
+        zeros[empty] += shift
+        rest[empty] <<= np.uint64(shift)
+    rank = (np.minimum(zeros, 64 - precision) + 1).astype(np.uint8)
+
+    ranks = pd.Series(rank).groupby(group_ids * m + index).max()
+    registers.reshape(-1)[ranks.index.to_numpy()] = ranks.to_numpy()
+    return registers
+
+def hll_estimate(registers: np.ndarray) -> float:
+    """由（合并后的）寄存器估计基数，小基数时改用线性计数"""
+    m = registers.size
+    alpha = 0.7213 / (1 + 1.079 / m)
+    raw = alpha * m * m / np.sum(np.exp2(-registers.astype(np.float64)))
+    empty = np.count_nonzero(registers == 0)
+    if raw <= 2.5 * m and empty:
+        return m * np.log(m / empty)
+    return float(raw)
+
+def company_mask(companies: pd.Series, company: Optional[str]) -> np.ndarray:
+    """公司名称匹配（与数据表筛选相同的不区分大小写匹配）"""
+    if not company:
+        return np.ones(len(companies), dtype=bool)
+    return companies.astype(object).str.contains(str(company), case=False, na=False).to_numpy(dtype=bool)
+
+class BalanceStats:
+    """余额表分区统计"""
+
+    def __init__(self, balance_df: pd.DataFrame):
+        self.partitions = balance_df.groupby(BALANCE_KEYS, sort=False, dropna=False, observed=True).size() \
+            .rename("记录数").reset_index()
+
+    def __len__(self) -> int:
+        return len(self.partitions)
+
+    def summary(self, company: Optional[str] = None, year: Optional[int] = None) -> Dict[str, Any]:
+        """合并选中分区：记录数、公司数、期间与年份范围、按公司的记录数"""
+        selected = self.partitions[company_mask(self.partitions["公司"], company)]
+        if year is not None:
+            selected = selected[selected["年份"] == year]
+        return {
+            "records": int(selected["记录数"].sum()),
+            "companies": selected["公司"].nunique(),
+            "period_start": selected["期间"].min(), "period_end": selected["期间"].max(),
+            "year_start": selected["年份"].min(), "year_end": selected["年份"].max(),
+            "by_company": selected.groupby("公司", observed=True)["记录数"].sum(),
+        }
+
+class VoucherStats:
+    """凭证表分区统计与凭证唯一标识的基数草图"""
+
+    def __init__(self, partitions: pd.DataFrame, breakdown: pd.DataFrame, registers: np.ndarray, disjoint: bool):
+        self.partitions = partitions
+        self.breakdown = breakdown
+        self.registers = registers
+        # 各分区的凭证互不重叠时，分区凭证数相加即为精确值
+        self.disjoint = disjoint
+
+    def __len__(self) -> int:
+        return len(self.partitions)
+
+    def select(self, company: Optional[str] = None, year: Optional[int] = None) -> np.ndarray:
+        """选中分区的位置"""
+        mask = company_mask(self.partitions["公司"], company)
+        if year is not None:
+            mask &= (self.partitions["年份"] == year).to_numpy()
+        return np.flatnonzero(mask)
+
+    def voucher_count(self, positions: np.ndarray) -> int:
+        """选中分区的凭证数：分区互不重叠时精确相加，否则合并草图估计"""
+        if len(positions) == 0:
+            return 0
+        if self.disjoint:
+            return int(self.partitions["凭证数"].to_numpy()[positions].sum())
+        return int(round(hll_estimate(self.registers[positions].max(axis=0))))
+
+    def summary(self, company: Optional[str] = None, year: Optional[int] = None) -> Dict[str, Any]:
+        """合并选中分区：记录数、公司数、日期范围、凭证数、借贷方合计、按公司与按业务分类的汇总"""
+        positions = self.select(company, year)
+        selected = self.partitions.iloc[positions]
+        business = self.breakdown[self.breakdown["分区"].isin(positions)]
+        by_business = business.groupby("业务分类", observed=True).agg(
+            记录数=("记录数", "sum"),
+            借方金额=("借方金额", "sum"),
+            贷方金额=("贷方金额", "sum")
+        ).sort_values("记录数", ascending=False)
+        return {
+            "records": int(selected["记录数"].sum()),
+            "companies": selected["公司"].nunique(),
+            "date_start": selected["日期起"].min(), "date_end": selected["日期止"].max(),
+            "vouchers": self.voucher_count(positions),
+            "vouchers_exact": self.disjoint,
+            "total_debit": selected["借方金额"].sum(), "total_credit": selected["贷方金额"].sum(),
+            "by_company": selected.groupby("公司", observed=True)["记录数"].sum(),
+            "by_business_type": by_business,
+        }
+
+def build_voucher_stats(voucher_df: pd.DataFrame, precision: int = HLL_PRECISION) -> VoucherStats:
+    """对凭证表按（公司, 年份, 月份）分区计算统计，日期缺失的凭证归入年份、月份为空的分区"""
+    lines = pd.DataFrame({
+        "公司": voucher_df["公司"].to_numpy(),
+        "年份": voucher_df["日期"].dt.year.to_numpy(),
+        "月份": voucher_df["日期"].dt.month.to_numpy(),
+        "日期": voucher_df["日期"].to_numpy(),
+        "借方金额": voucher_df["借方金额"].to_numpy(),
+        "贷方金额": voucher_df["贷方金额"].to_numpy(),
+    })
+    grouped = lines.groupby(VOUCHER_KEYS, sort=False, dropna=False, observed=True)
+    part_ids = grouped.ngroup().to_numpy()
+    partitions = grouped.agg(
+        记录数=("借方金额", "size"), 借方金额=("借方金额", "sum"), 贷方金额=("贷方金额", "sum"),
+        日期起=("日期", "min"), 日期止=("日期", "max"),
+    ).reset_index()
+
+    # 凭证唯一标识先去重编码，每个（分区, 凭证）只计一次
+    voucher_ids, vouchers = pd.factorize(voucher_df["凭证唯一标识"])
+    pairs = pd.DataFrame({"分区": part_ids, "凭证": voucher_ids})
+    pairs = pairs[pairs["凭证"] >= 0].drop_duplicates()
+    partitions["凭证数"] = pairs.groupby("分区").size().reindex(range(len(partitions)), fill_value=0).to_numpy()
+    registers = hll_registers(pairs["分区"].to_numpy(), hash_values(pd.Series(vouchers)).take(pairs["凭证"].to_numpy()),
+                              len(partitions), precision)
+    disjoint = len(pairs) == pairs["凭证"].nunique()
+
+    breakdown = pd.DataFrame({
+        "分区": part_ids,
+        "业务分类": voucher_df["业务分类"].array,
+        "借方金额": lines["借方金额"].to_numpy(),
+        "贷方金额": lines["贷方金额"].to_numpy(),
+    }).groupby(["分区", "业务分类"], observed=True).agg(
+        记录数=("借方金额", "size"), 借方金额=("借方金额", "sum"), 贷方金额=("贷方金额", "sum"),
+    ).reset_index()
+    return VoucherStats(partitions, breakdown, registers, disjoint)
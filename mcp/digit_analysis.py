@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+本福特定律与数字分布分析
+对借贷方金额进行首位数字、前两位数字、末两位数字检验，
+按公司、一级科目、制单人、月份或业务分类分组，一次遍历凭证表完成全部分组的计数与评分
+"""
+
+import numpy as np
+import pandas as pd
+from typing import Tuple
+
+from voucher_features import voucher_header
+
+# 各检验的分箱：首位1-9、前两位10-99、末两位00-99
+DIGIT_TESTS = {
+    "first_digit": {"name": "首位数字", "bins": np.arange(1, 10)},
+    "first_two_digits": {"name": "前两位数字", "bins": np.arange(10, 100)},
+    "last_two_digits": {"name": "末两位数字", "bins": np.arange(0, 100)},
+}
+
+# Nigrini MAD符合性阈值（近似符合/可接受/边缘符合，超出为不符合）
+MAD_THRESHOLDS = {
+    "first_digit": (0.006, 0.012, 0.015),
+    "first_two_digits": (0.0012, 0.0018, 0.0022),
+    "last_two_digits": (0.0012, 0.0018, 0.0022),
+}
+
+# 卡方检验临界值（显著性水平0.05，自由度=分箱数-1）
+CHI_SQUARE_CRITICAL = {
+    "first_digit": 15.507,
+    "first_two_digits": 112.022,
+    "last_two_digits": 123.225,
+}
+
+# 分组维度：整体、公司、一级科目、公司+一级科目、制单人、月份、业务分类
+GROUP_BY_OPTIONS = ["none", "company", "subject", "company_subject", "maker", "month", "business_type"]
+
+# 本福特检验只统计不小于10元的金额
+MIN_AMOUNT = 10.0
+
+def expected_distribution(test: str) -> np.ndarray:
+    """返回指定检验的理论分布"""
+    bins = DIGIT_TESTS[test]["bins"]
+    if test == "last_two_digits":
+        return np.full(len(bins), 1.0 / len(bins))
+    return np.log10(1 + 1 / bins)
+
+def digit_bins(amounts: np.ndarray, test: str) -> np.ndarray:
+    """将金额数组映射为分箱下标（整数运算，不逐行循环）"""
+    if test == "last_two_digits":
+        return (np.floor(amounts).astype(np.int64) % 100)
+
+    # 以分为单位取整，避免浮点误差影响前导数字
+    cents = np.rint(amounts * 100).astype(np.int64)
+    exponent = np.floor(np.log10(cents)).astype(np.int64)
+    scale = np.power(10, exponent)
+    # 修正log10在10的整数次幂附近的舍入偏差
+    exponent = np.where(cents // scale >= 10, exponent + 1, exponent)
+    exponent = np.where(cents // np.power(10, exponent) == 0, exponent - 1, exponent)
+
+    if test == "first_digit":
+        return cents // np.power(10, exponent) - 1
+    return cents // np.power(10, exponent - 1) - 10
+
+def extract_amounts(voucher_df: pd.DataFrame, amount_side: str = "both") -> pd.DataFrame:
+    """将借方、贷方金额展开为单列金额，保留分组所需字段"""
+    columns = [c for c in ["公司", "科目编码", "制单", "日期", "业务分类"] if c in voucher_df.columns]
+    sides = {"debit": ["借方金额"], "credit": ["贷方金额"], "both": ["借方金额", "贷方金额"]}[amount_side]
+
+    source = voucher_df[columns]
+    if "制单" in columns:
+        # 制单人只在凭证首行填写时，取同一凭证内的首个制单人（与分录测试一致，不跨凭证填充）
+        source = source.assign(制单=voucher_header(voucher_df, "制单"))
+
+    frames = []
+    for column in sides:
+        amounts = voucher_df[column].abs()
+        valid = amounts >= MIN_AMOUNT
+        frame = source.loc[valid].copy()
+        frame["金额"] = amounts[valid].to_numpy()
+        frames.append(frame)
+    return pd.concat(frames, ignore_index=True)
+
+def group_keys(amounts_df: pd.DataFrame, group_by: str) -> pd.Series:
+    """生成分组键"""
+    if group_by == "company":
+        return amounts_df["公司"].astype(str)
+    if group_by == "subject":
+        return amounts_df["科目编码"].astype(str).str.split(".").str[0]
+    if group_by == "company_subject":
+        return amounts_df["公司"].astype(str) + "/" + amounts_df["科目编码"].astype(str).str.split(".").str[0]
+    if group_by == "maker":
+        return amounts_df["制单"].fillna("未知").astype(str)
+    if group_by == "business_type":
+        return amounts_df["业务分类"].astype(str)
+    if group_by == "month":
+        # 以整数年月分组，仅对去重后的标签做格式化
+        return (amounts_df["日期"].dt.year * 100 + amounts_df["日期"].dt.month).fillna(0).astype(np.int64)
+    return pd.Series("全部", index=amounts_df.index)
+
+def score_groups(codes: np.ndarray, n_groups: int, bins: np.ndarray, test: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """按组计数并计算卡方与MAD，返回(计数矩阵, 样本数, 卡方, MAD)"""
+    n_bins = len(DIGIT_TESTS[test]["bins"])
+    counts = np.bincount(codes * n_bins + bins, minlength=n_groups * n_bins).reshape(n_groups, n_bins)
+    totals = counts.sum(axis=1)
+
+    expected = expected_distribution(test)
+    safe_totals = np.maximum(totals, 1)[:, None]
+    observed_share = counts / safe_totals
+    expected_counts = expected[None, :] * safe_totals
+
+    chi_square = ((counts - expected_counts) ** 2 / expected_counts).sum(axis=1)
+    mad = np.abs(observed_share - expected[None, :]).mean(axis=1)
+    return counts, totals, chi_square, mad
+
+def conformity_level(mad: np.ndarray, test: str) -> np.ndarray:
+    """根据MAD判断符合程度"""
+    close, acceptable, marginal = MAD_THRESHOLDS[test]
+    return np.select(
+        [mad <= close, mad <= acceptable, mad <= marginal],
+        ["近似符合", "可接受", "边缘符合"],
+        default="不符合"
+    )
+
+def run_benford_analysis(voucher_df: pd.DataFrame, test: str = "first_digit", group_by: str = "none",
+                         amount_side: str = "both", min_count: int = 50) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """执行数字分布检验，返回(分组评分表, 各分箱分布表)"""
+    if test not in DIGIT_TESTS:
+        raise ValueError(f"不支持的检验类型: {test}")
+    if group_by not in GROUP_BY_OPTIONS:
+        raise ValueError(f"不支持的分组方式: {group_by}")
+
+    amounts_df = extract_amounts(voucher_df, amount_side)
+    if amounts_df.empty:
+        return pd.DataFrame(), pd.DataFrame()
+
+    codes, labels = pd.factorize(group_keys(amounts_df, group_by), sort=True)
+    if group_by == "month":
+        labels = pd.Index([f"{k // 100}-{k % 100:02d}" if k else "未知" for k in labels])
+    bins = digit_bins(amounts_df["金额"].to_numpy(), test)
+    counts, totals, chi_square, mad = score_groups(codes, len(labels), bins, test)
+
+    scores = pd.DataFrame({
+        "分组": labels.astype(str),
+        "样本数": totals,
+        "卡方": chi_square.round(3),
+        "MAD": mad.round(5),
+        "符合程度": conformity_level(mad, test),
+    })
+    scores["卡方显著"] = scores["卡方"] > CHI_SQUARE_CRITICAL[test]
+    insufficient = scores["样本数"] < min_count
+    scores.loc[insufficient, "符合程度"] = "样本不足"
+    # 样本充足的分组按MAD降序排在前面
+    scores = scores.assign(_insufficient=insufficient).sort_values(
+        ["_insufficient", "MAD"], ascending=[True, False], kind="mergesort"
+    ).drop(columns="_insufficient").reset_index(drop=True)
+
+    total_counts = counts.sum(axis=0)
+    distribution = pd.DataFrame({
+        "数字": DIGIT_TESTS[test]["bins"],
+        "实际次数": total_counts,
+        "实际占比": total_counts / max(total_counts.sum(), 1),
+        "理论占比": expected_distribution(test),
+    })
+    distribution["差异"] = distribution["实际占比"] - distribution["理论占比"]
+    return scores, distribution
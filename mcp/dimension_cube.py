@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+核算维度汇总立方体
+将余额表中的核算维度行按科目路径展开到每一级上级科目，
+按（公司, 年份, 上级科目, 维度）预先汇总期初、本年累计、期末金额，
+查询时按科目直接取切片，Top-N通过argpartition部分排序得到
+"""
+
+import numpy as np
+import pandas as pd
+from typing import Dict, Optional
+
+# 汇总的金额列
+AMOUNT_COLUMNS = ["期初余额借方", "期初余额贷方", "本年累计借方", "本年累计贷方", "期末余额借方", "期末余额贷方"]
+
+# 排序方式对应的排序列，ending_balance按期末余额绝对值
+SORT_COLUMNS = {
+    "ending_balance": "期末余额",
+    "total_debit": "本年累计借方",
+    "total_credit": "本年累计贷方",
+}
+
+class DimensionCube:
+    """核算维度汇总立方体，按上级科目编码索引"""
+
+    def __init__(self, balance_df: pd.DataFrame):
+        dimension_rows = balance_df[
+            balance_df["核算维度名称"].notna() & (balance_df["核算维度名称"].astype(str).str.strip() != "")
+        ]
+        # 每条维度行展开到科目路径上的每一级科目
+        ancestors = dimension_rows["subject_code_path"].astype(str).str.strip("/").str.split("/")
+        exploded = dimension_rows[["公司", "年份", "核算维度编码", "核算维度名称"] + AMOUNT_COLUMNS].assign(
+            科目编码=ancestors
+        ).explode("科目编码")
+
+        cube = exploded.groupby(
+            ["科目编码", "公司", "年份", "核算维度编码", "核算维度名称"], sort=True, dropna=False
+        ).agg(**{column: (column, "sum") for column in AMOUNT_COLUMNS}, 记录数=("核算维度名称", "size")).reset_index()
+        cube["期初余额"] = cube["期初余额借方"] - cube["期初余额贷方"]
+        cube["期末余额"] = cube["期末余额借方"] - cube["期末余额贷方"]
+        cube["公司"] = cube["公司"].astype("category")
+        self.cube = cube
+
+        # 科目编码 -> 行区间（cube已按科目编码排序）
+        bounds = cube.groupby("科目编码", sort=False).indices
+        self._slices: Dict[str, slice] = {code: slice(rows[0], rows[-1] + 1) for code, rows in bounds.items()}
+
+    def subject_slice(self, subject_code: str) -> pd.DataFrame:
+        """返回指定科目（含全部下级科目）的维度汇总行"""
+        rows = self._slices.get(str(subject_code).strip())
+        if rows is None:
+            return self.cube.iloc[0:0]
+        return self.cube.iloc[rows]
+
+    def query(self, subject_code: str, company: Optional[str] = None, year: Optional[int] = None) -> pd.DataFrame:
+        """按科目、公司、年份取维度汇总，跨公司或年份时按维度名称合并"""
+        result = self.subject_slice(subject_code)
+        if company:
+            companies = result["公司"].cat.categories.astype(str)
+            matched = np.asarray(companies.str.contains(company, case=False, regex=False))
+            result = result[matched[result["公司"].cat.codes.to_numpy()]]
+        if year:
+            result = result[result["年份"] == year]
+
+        columns = ["核算维度名称"] + AMOUNT_COLUMNS + ["期初余额", "期末余额", "记录数"]
+        if not result["核算维度名称"].duplicated().any():
+            return result[columns].reset_index(drop=True)
+        return result[columns].groupby("核算维度名称", sort=False).sum().reset_index()
+
+def top_dimensions(summary: pd.DataFrame, sort_by: str = "ending_balance", limit: int = 100) -> pd.DataFrame:
+    """取排序后的前limit个维度，数值排序只对前limit个做完整排序"""
+    if limit <= 0:
+        return summary.iloc[0:0]
+    if sort_by == "dimension_name":
+        return summary.sort_values("核算维度名称").head(limit)
+
+    values = summary[SORT_COLUMNS.get(sort_by, "期末余额")].to_numpy()
+    if sort_by == "ending_balance":
+        values = np.abs(values)
+    if limit < len(values):
+        candidates = np.argpartition(-values, limit - 1)[:limit]
+    else:
+        candidates = np.arange(len(values))
+    order = candidates[np.argsort(-values[candidates], kind="stable")]
+    return summary.iloc[order]
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+重复付款与拆分付款检测引擎
+基于排序分组、滑动时间窗口与金额分桶连接，识别同一交易对方的
+完全重复、近似重复以及拆分规避审批额度的付款
+"""
+
+import numpy as np
+import pandas as pd
+from typing import Optional
+
+from counterparty_aging import resolve_counterparties
+from voucher_features import extract_counterparty
+
+# 付款对象须为往来科目（应收、预付、应付）核算维度中的单位；报销、工资等摘要末段的内部部门不参与检测
+VENDOR_SUBJECTS = ("1122", "1123", "2202")
+
+# 检测结果输出列
+FINDING_COLUMNS = [
+    "检测类型", "公司", "交易对方", "日期", "金额", "凭证号", "摘要",
+    "关联日期", "关联金额", "关联凭证号", "间隔天数", "笔数", "合计金额"
+]
+
+def vendor_names(balance_df: pd.DataFrame) -> pd.Series:
+    """余额表中往来科目的核算维度名称"""
+    level1 = balance_df["subject_code_path"].astype(str).str.strip("/").str.split("/").str[0]
+    return balance_df.loc[balance_df["核算维度名称"].notna() & level1.isin(VENDOR_SUBJECTS), "核算维度名称"]
+
+def prepare_payment_lines(voucher_df: pd.DataFrame, subject_code: str = "1002",
+                          direction: str = "credit", company: Optional[str] = None,
+                          vendors: Optional[pd.Series] = None) -> pd.DataFrame:
+    """筛选付款分录并提取交易对方、金额和日期
+
+    给出vendors（往来单位全称）时，交易对方先按简称解析为全称，无法解析的分录不参与检测
+    """
+    codes = voucher_df["科目编码"].astype(str)
+    mask = (codes == subject_code) | codes.str.startswith(subject_code + ".")
+    if company:
+        mask &= voucher_df["公司"].str.contains(company, case=False, na=False, regex=False)
+
+    amount_column = "贷方金额" if direction == "credit" else "借方金额"
+    mask &= voucher_df[amount_column] > 0
+
+    lines = voucher_df.loc[mask, ["公司", "日期", "凭证字", "凭证号", "摘要"]].copy()
+    lines["金额"] = voucher_df.loc[mask, amount_column].round(2)
+    if "交易对方" in voucher_df.columns:
+        lines["交易对方"] = voucher_df.loc[mask, "交易对方"]
+    else:
+        lines["交易对方"] = extract_counterparty(lines["摘要"])
+    lines["凭证号"] = lines["凭证字"].astype(str) + "-" + lines["凭证号"].astype(str)
+    if vendors is not None:
+        resolved = resolve_counterparties(lines["交易对方"], vendors)
+        lines["交易对方"] = resolved.where(resolved.isin(set(vendors.dropna().astype(str))))
+
+    lines = lines.dropna(subset=["交易对方", "日期"])
+    return lines.drop(columns=["凭证字"]).reset_index(drop=True)
+
+def _pair_findings(lines: pd.DataFrame, current_pos: np.ndarray, previous_pos: np.ndarray, label: str) -> pd.DataFrame:
+    """根据配对结果（当前行位置, 关联行位置）生成检测记录"""
+    current = lines.iloc[current_pos]
+    previous = lines.iloc[previous_pos]
+    findings = current[["公司", "交易对方", "日期", "金额", "凭证号", "摘要"]].copy()
+    findings["检测类型"] = label
+    findings["关联日期"] = previous["日期"].to_numpy()
+    findings["关联金额"] = previous["金额"].to_numpy()
+    findings["关联凭证号"] = previous["凭证号"].to_numpy()
+    findings["间隔天数"] = (findings["日期"] - findings["关联日期"]).dt.days.abs().to_numpy()
+    return findings
+
+def detect_exact_duplicates(lines: pd.DataFrame, window_days: int = 30) -> pd.DataFrame:
+    """同一公司、交易对方、金额在时间窗口内重复出现"""
+    if lines.empty:
+        return pd.DataFrame(columns=FINDING_COLUMNS)
+
+    lines = lines.sort_values(["公司", "交易对方", "金额", "日期"], kind="mergesort").reset_index(drop=True)
+    same_key = (
+        lines[["公司", "交易对方", "金额"]].ne(lines[["公司", "交易对方", "金额"]].shift()).sum(axis=1).eq(0)
+    ).to_numpy()
+    gap = lines["日期"].diff().dt.days.to_numpy()
+    current = np.flatnonzero(same_key & (gap <= window_days))
+    return _pair_findings(lines, current, current - 1, "完全重复")
+
+def detect_near_duplicates(lines: pd.DataFrame, window_days: int = 30, tolerance: float = 0.01) -> pd.DataFrame:
+    """同一交易对方金额相近（相对差异不超过tolerance）且日期接近的付款
+
+    按（公司, 交易对方, 金额对数分桶）自连接：相对差异不超过tolerance的两笔金额，对数相差不超过
+    -ln(1 - tolerance)，以此为桶宽时最多相差一个桶；连接相邻的桶后按金额差与日期差筛选，
+    金额排序上不相邻的付款也能配对
+    """
+    if lines.empty or tolerance <= 0:
+        return pd.DataFrame(columns=FINDING_COLUMNS)
+
+    lines = lines.sort_values(["公司", "交易对方", "日期"], kind="mergesort").reset_index(drop=True)
+    width = -np.log1p(-min(tolerance, 0.999999))
+    keys = lines[["公司", "交易对方"]].assign(
+        位置=np.arange(len(lines)), 桶=np.floor(np.log(lines["金额"].to_numpy()) / width).astype(np.int64))
+    neighbours = pd.concat([keys.assign(桶=keys["桶"] + offset) for offset in (-1, 0, 1)], ignore_index=True)
+    pairs = keys.merge(neighbours, on=["公司", "交易对方", "桶"], suffixes=("_前", "_后"))
+    earlier, later = pairs["位置_前"].to_numpy(), pairs["位置_后"].to_numpy()
+    earlier, later = earlier[earlier < later], later[earlier < later]
+
+    amounts = lines["金额"].to_numpy()
+    dates = lines["日期"].to_numpy()
+    diff = np.abs(amounts[later] - amounts[earlier])
+    relative = diff / np.maximum(amounts[later], amounts[earlier])
+    gap = (dates[later] - dates[earlier]) / np.timedelta64(1, "D")
+    flags = (diff > 0.005) & (relative <= tolerance) & (gap <= window_days)
+    return _pair_findings(lines, later[flags], earlier[flags], "近似重复")
+
+def detect_split_payments(lines: pd.DataFrame, approval_threshold: float, window_days: int = 7) -> pd.DataFrame:
+    """时间窗口内多笔低于审批额度、合计超过额度的付款（疑似拆分）"""
+    below = lines[lines["金额"] < approval_threshold]
+    if below.empty:
+        return pd.DataFrame(columns=FINDING_COLUMNS)
+
+    below = below.sort_values(["公司", "交易对方", "日期"], kind="mergesort").reset_index(drop=True)
+    rolling = (
+        below.groupby(["公司", "交易对方"], sort=False)
+        .rolling(f"{window_days}D", on="日期")["金额"]
+        .agg(["sum", "count"])
+        .reset_index(drop=True)
+    )
+    flagged = (rolling["count"] >= 2) & (rolling["sum"] >= approval_threshold)
+    if not flagged.any():
+        return pd.DataFrame(columns=FINDING_COLUMNS)
+
+    # 同一交易对方连续被标记的窗口合并为一个拆分簇，取簇内最后一个窗口
+    group_change = below[["公司", "交易对方"]].ne(below[["公司", "交易对方"]].shift()).any(axis=1)
+    cluster_id = (~flagged | group_change).cumsum()
+    last_in_cluster = flagged & (cluster_id != cluster_id.shift(-1))
+
+    findings = below.loc[last_in_cluster, ["公司", "交易对方", "日期", "金额", "凭证号", "摘要"]].copy()
+    findings["检测类型"] = "拆分付款"
+    findings["笔数"] = rolling.loc[last_in_cluster, "count"].astype(int).to_numpy()
+    findings["合计金额"] = rolling.loc[last_in_cluster, "sum"].round(2).to_numpy()
+    findings["关联日期"] = findings["日期"] - pd.to_timedelta(window_days, unit="D")
+    return findings
+
+def detect_duplicate_payments(voucher_df: pd.DataFrame, subject_code: str = "1002", direction: str = "credit",
+                              company: Optional[str] = None, window_days: int = 30, tolerance: float = 0.01,
+                              approval_threshold: Optional[float] = None, split_window_days: int = 7,
+                              vendors: Optional[pd.Series] = None) -> pd.DataFrame:
+    """执行全部检测并合并结果"""
+    lines = prepare_payment_lines(voucher_df, subject_code, direction, company, vendors)
+
+    results = [
+        detect_exact_duplicates(lines, window_days),
+        detect_near_duplicates(lines, window_days, tolerance),
+    ]
+    if approval_threshold:
+        results.append(detect_split_payments(lines, approval_threshold, split_window_days))
+
+    results = [r for r in results if not r.empty]
+    if not results:
+        return pd.DataFrame(columns=FINDING_COLUMNS)
+
+    findings = pd.concat(results, ignore_index=True).reindex(columns=FINDING_COLUMNS)
+    return findings.sort_values(["检测类型", "金额"], ascending=[True, False], kind="mergesort").reset_index(drop=True)
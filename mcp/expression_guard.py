@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+客户端表达式校验
+凭证分录测试的自定义规则、凭证模式报表的派生列等表达式来自MCP客户端，交由DataFrame.eval求值前
+先按Python语法解析，只允许常量、已知列名及比较、算术、逻辑运算；属性访问、函数调用、下标等
+一律拒绝，避免借表达式调用对象方法（如写文件）
+"""
+
+import ast
+from typing import Iterable
+
+# 允许出现的语法节点
+ALLOWED_NODES = (
+    ast.Expression, ast.Name, ast.Load, ast.Constant,
+    ast.Compare, ast.BoolOp, ast.BinOp, ast.UnaryOp,
+    ast.cmpop, ast.boolop, ast.unaryop, ast.operator,
+)
+
+# 运算符中不允许的：@在DataFrame.eval中表示引用局部变量
+FORBIDDEN_OPERATORS = (ast.MatMult,)
+
+def validate_expression(expression: str, names: Iterable[str], where: str) -> str:
+    """校验单行表达式只引用names中的列，返回去除首尾空白后的表达式，不合法时抛出ValueError"""
+    expression = str(expression or "").strip()
+    if not expression or "\n" in expression:
+        raise ValueError(f"{where} 的表达式不正确: {expression}")
+    try:
+        tree = ast.parse(expression, mode="eval")
+    except SyntaxError:
+        raise ValueError(f"{where} 的表达式不正确: {expression}（语法错误）") from None
+
+    names = set(names)
+    for node in ast.walk(tree):
+        if not isinstance(node, ALLOWED_NODES) or isinstance(node, FORBIDDEN_OPERATORS):
+            raise ValueError(f"{where} 的表达式不正确: {expression}"
+                             f"（只支持列名、常量及比较、算术、逻辑运算，不支持{type(node).__name__}）")
+        if isinstance(node, ast.Name) and node.id not in names:
+            raise ValueError(f"{where} 的表达式引用了未知列 '{node.id}'，可用列：{', '.join(sorted(names))}")
+        if isinstance(node, ast.Constant) and not isinstance(node.value, (bool, int, float, str)):
+            raise ValueError(f"{where} 的表达式不正确: {expression}（不支持常量 {node.value!r}）")
+    return expression
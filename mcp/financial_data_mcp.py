@@ -4,8 +4,16 @@ MCP Server for Financial Data Query
 查询format-data/financial目录下的财务数据的MCP工具
 """
 
+import argparse
 import asyncio
+import contextvars
+import json
+import os
+import secrets
 import sys
+import threading
+import time
+import weakref
 import pandas as pd
 from pathlib import Path
 from typing import Optional, List, Dict, Any, Union
@@ -17,60 +25,363 @@ from mcp.server.models import InitializationOptions
 import mcp.server.stdio
 import mcp.types as types
 
+from voucher_features import extract_counterparty
+from business_classifier import classify_business_type, BUSINESS_TYPES
+import duplicate_payment
+import digit_analysis
+import journal_entry_tests
+import subject_flow
+from dimension_cube import DimensionCube, top_dimensions
+import counterparty_aging
+import balance_series
+import movement_anomalies
+from result_cursor import CursorStore
+from structured_output import OUTPUT_FORMAT_SCHEMA, output_format, render_structured, frame_to_columns, json_safe
+from tool_metrics import ToolMetrics, record_scan, record_returned
+from call_profiler import CallProfiler, DEFAULT_TOP_N
+from data_warmup import DataWarmup
+from synonym_matcher import SynonymMatcher, SynonymSource
+from holiday_calendar import HolidaySource
+import ledger_store
+from dataset_stats import BalanceStats, VoucherStats, build_voucher_stats
+from financial_statements import FinancialStatements, STATEMENTS
+import intercompany
+import voucher_reports
+
 # 数据文件路径 - 使用相对于项目根目录的路径
 BASE_DIR = Path(__file__).parent.parent
+
+# 科目主数据与清洗脚本共用cleaning/subject_master.py
+sys.path.insert(0, str(BASE_DIR / "cleaning"))
+from subject_master import SubjectMaster, load_subject_master
+from subject_catalog import SubjectCatalog, is_initials_query
 DATA_DIR = BASE_DIR / "format-data/financial"
 BALANCE_FILE = DATA_DIR / "final_enhanced_balance.csv"
 VOUCHER_FILE = DATA_DIR / "final_voucher_detail.csv"
 
+# 财务术语同义词表，文件修改后自动重新加载
+SYNONYM_FILE = Path(os.environ.get("FINANCIAL_MCP_SYNONYM_FILE") or Path(__file__).parent / "financial_synonyms.txt")
+synonym_source = SynonymSource(SYNONYM_FILE)
+
+# 节假日日历（法定节假日与调休上班日），文件修改后自动重新加载
+HOLIDAY_FILE = Path(os.environ.get("FINANCIAL_MCP_HOLIDAY_FILE") or Path(__file__).parent / "holiday_calendar.txt")
+holiday_source = HolidaySource(HOLIDAY_FILE)
+
+# 凭证模式报表模板，文件修改后自动重新加载；保存报表时写入REPORT_DIR
+REPORT_TEMPLATE_FILE = Path(os.environ.get("FINANCIAL_MCP_REPORT_TEMPLATES") or Path(__file__).parent / "report_templates.json")
+report_template_source = voucher_reports.TemplateSource(REPORT_TEMPLATE_FILE)
+REPORT_DIR = Path(os.environ.get("FINANCIAL_MCP_REPORT_DIR") or BASE_DIR / "output")
+
+# 共享账簿存储目录（由 ledger_store.py 守护进程维护）：存在与CSV一致的存储时以内存映射打开，不再解析CSV
+STORE_DIR = Path(os.environ.get("FINANCIAL_MCP_STORE_DIR") or DATA_DIR / ".ledger_store")
+
 # 全局数据缓存
 balance_df = None
 voucher_df = None
+journal_entry_features = None
+subject_flow_graph = None
+dimension_cube = None
+aging_ledgers = {}
+monthly_balances = None
+subject_master = None
+subject_catalog = None
+balance_stats = None
+voucher_stats = None
+financial_statements = None
+intercompany_ledger = None
+
+# 延迟构建的派生缓存各用一把锁：并发调用时每个缓存只构建一次，
+# 后台预热正在构建某个缓存时，使用其他缓存的调用不必等待（缓存之间只按依赖顺序嵌套加锁）
+CACHE_NAMES = ["subject_master", "subject_catalog", "balance_stats", "voucher_stats", "financial_statements",
+               "intercompany_ledger", "journal_entry_features", "subject_flow_graph", "dimension_cube",
+               "aging_ledgers", "monthly_balances"]
+cache_locks = {name: threading.RLock() for name in CACHE_NAMES}
+
+# 数据表加载锁：后台预热与工具调用不会重复加载同一张表，两张表互不阻塞
+balance_lock = threading.Lock()
+voucher_lock = threading.Lock()
+
+# 各数据表的实际来源（CSV或共享存储）
+data_sources: Dict[str, str] = {}
+
+# 批量执行期间共享的筛选结果（键为数据表与筛选条件），单次调用时为None
+filter_cache: contextvars.ContextVar[Optional[Dict[tuple, pd.DataFrame]]] = contextvars.ContextVar("filter_cache", default=None)
+
+# 工具调用运行指标：设置FINANCIAL_MCP_TRACE_FILE时逐次调用写入JSON-lines跟踪文件，
+# FINANCIAL_MCP_MEMORY_SAMPLE_RATE为tracemalloc内存峰值的抽样比例
+metrics = ToolMetrics(
+    os.environ.get("FINANCIAL_MCP_TRACE_FILE") or None,
+    float(os.environ.get("FINANCIAL_MCP_MEMORY_SAMPLE_RATE", "0.01"))
+)
+
+# 性能剖析：调用参数profile=true时用cProfile统计并随结果返回热点；
+# 设置FINANCIAL_MCP_PROFILE_THRESHOLD_MS时对调用采样，超过阈值的慢调用记录热点
+profiler = CallProfiler(
+    float(os.environ["FINANCIAL_MCP_PROFILE_THRESHOLD_MS"]) if os.environ.get("FINANCIAL_MCP_PROFILE_THRESHOLD_MS") else None,
+    int(os.environ.get("FINANCIAL_MCP_PROFILE_TOP_N", DEFAULT_TOP_N)),
+    metrics.trace_file,
+    ignore=("dispatch_tool",)
+)
+
+# 所有工具共用的profile参数
+PROFILE_SCHEMA = {
+    "type": "boolean",
+    "description": "返回本次调用的性能剖析热点（cProfile，按累计耗时排序）；批量调用时需在子调用中分别设置",
+    "default": False
+}
+
+# 批量调用的数量上限与默认并发数
+BATCH_MAX_CALLS = 50
+BATCH_DEFAULT_CONCURRENCY = 4
+
+# 只读取余额表的工具，凭证表加载完成前即可调用
+BALANCE_TOOLS = {"query_balance_sheet", "analyze_subject_hierarchy", "find_subject_by_name", "query_dimension_details",
+                 "generate_financial_statements"}
+
+# 工具调用等待数据加载的最长时间（秒），超时返回"加载中"提示
+READY_TIMEOUT = float(os.environ.get("FINANCIAL_MCP_READY_TIMEOUT", "60"))
+
+# 数据表加载完成后在后台预先构建的派生缓存，逗号分隔，为空则不预热
+WARM_CACHES = [name.strip() for name in os.environ.get(
+    "FINANCIAL_MCP_WARM_CACHES", "balance_stats,voucher_stats,dimension_cube,monthly_balances").split(",") if name.strip()]
+
+# 分页游标：保存筛选结果的行位置，翻页时无需重新筛选
+result_cursors = CursorStore()
+
+# 网络传输下各客户端会话的标识，会话对象释放后自动移除；游标按会话隔离
+session_keys: "weakref.WeakKeyDictionary[Any, str]" = weakref.WeakKeyDictionary()
+session_lock = threading.Lock()
+
+# 当前传输方式；工具调用在工作线程中执行（事件循环保持响应ping与取消），同时执行的调用数受call_slots限制
+transport = "stdio"
+call_slots: Optional[asyncio.Semaphore] = None
+
+# 同时执行的工具调用数
+MAX_CONCURRENT_CALLS = int(os.environ.get("FINANCIAL_MCP_MAX_CONCURRENCY", "4"))
+
+# json/csv输出时余额表与凭证明细保留的列
+BALANCE_OUTPUT_COLUMNS = ["公司", "期间", "年份", "科目编码", "科目名称", "核算维度编码", "核算维度名称",
+                          "期初余额借方", "期初余额贷方", "本年累计借方", "本年累计贷方", "期末余额借方", "期末余额贷方",
+                          "subject_code_path"]
+VOUCHER_OUTPUT_COLUMNS = ["公司", "日期", "凭证字", "凭证号", "分录行号", "摘要", "科目编码", "科目全名",
+                          "借方金额", "贷方金额", "业务分类"]
+
+def resolve_data_path(file_path: Path) -> Path:
+    """检查文件路径并尝试从项目根目录解析相对路径"""
+    resolved_path = file_path
+    if not resolved_path.exists():
+        project_root = Path(__file__).parent.parent
+        resolved_path = project_root / file_path
+        if not resolved_path.exists():
+            raise FileNotFoundError(f"❌ 文件不存在: {file_path}\n💡 请确保数据文件位于正确的目录中")
+    return resolved_path
+
+def load_csv_with_optimization(file_path, dtype_mapping, date_columns=None):
+    """通用CSV加载函数，支持数据类型优化"""
+    df = pd.read_csv(resolve_data_path(file_path), encoding='utf-8')
+    
+    # 应用数据类型转换
+    for column, dtype_func in dtype_mapping.items():
+        if column in df.columns:
+            df[column] = dtype_func(df[column])
+    
+    # 处理日期列
+    if date_columns:
+        for col in date_columns:
+            if col in df.columns:
+                df[col] = pd.to_datetime(df[col], errors='coerce')
+    
+    return df
+
+def read_balance_csv() -> pd.DataFrame:
+    """从CSV读取科目余额表"""
+    balance_dtype_mapping = {
+        '科目编码': lambda x: x.astype(str),
+        '年份': lambda x: pd.to_numeric(x, errors='coerce')
+    }
+    return load_csv_with_optimization(BALANCE_FILE, balance_dtype_mapping)
+
+def read_voucher_csv() -> pd.DataFrame:
+    """从CSV读取凭证明细表并计算派生列"""
+    voucher_dtype_mapping = {
+        '科目编码': lambda x: x.astype(str),
+        '借方金额': lambda x: pd.to_numeric(x, errors='coerce').fillna(0),
+        '贷方金额': lambda x: pd.to_numeric(x, errors='coerce').fillna(0)
+    }
+    vouchers = load_csv_with_optimization(VOUCHER_FILE, voucher_dtype_mapping, ['日期'])
+    # 预先提取摘要中的交易对方，供重复付款等分析复用
+    vouchers["交易对方"] = extract_counterparty(vouchers["摘要"])
+    # 对整张凭证表进行业务分类，保存为categorical列
+    vouchers["业务分类"] = classify_business_type(vouchers)
+    return vouchers
+
+def read_ledger_table(table: str, source: Path, read_csv) -> pd.DataFrame:
+    """优先从共享存储映射数据表，存储不存在或已过期时读取CSV"""
+    try:
+        stored = ledger_store.open_table(STORE_DIR, table, resolve_data_path(source))
+    except (OSError, ValueError, KeyError) as e:
+        print(f"共享存储不可用，改为读取CSV: {e}", file=sys.stderr)
+        stored = None
+    if stored is not None:
+        data_sources[table] = f"共享存储 {STORE_DIR}"
+        return stored
+    data_sources[table] = f"CSV {source}"
+    return read_csv()
+
+def load_balance_data():
+    """加载科目余额表"""
+    global balance_df
+    if balance_df is not None:
+        return
+    with balance_lock:
+        if balance_df is None:
+            balance_df = read_ledger_table("balance", BALANCE_FILE, read_balance_csv)
+
+def load_voucher_data():
+    """加载凭证明细表，全部派生列准备好后才对其他线程可见"""
+    global voucher_df
+    if voucher_df is not None:
+        return
+    with voucher_lock:
+        if voucher_df is None:
+            voucher_df = read_ledger_table("voucher", VOUCHER_FILE, read_voucher_csv)
 
 def load_data():
     """加载财务数据到内存"""
-    global balance_df, voucher_df
-    
-    def load_csv_with_optimization(file_path, dtype_mapping, date_columns=None):
-        """通用CSV加载函数，支持数据类型优化"""
-        # 检查文件路径并尝试解析相对路径
-        resolved_path = file_path
-        if not resolved_path.exists():
-            # 尝试从项目根目录解析路径
-            project_root = Path(__file__).parent.parent
-            resolved_path = project_root / file_path
-            if not resolved_path.exists():
-                raise FileNotFoundError(f"❌ 文件不存在: {file_path}\n💡 请确保数据文件位于正确的目录中")
-        
-        df = pd.read_csv(resolved_path, encoding='utf-8')
-        
-        # 应用数据类型转换
-        for column, dtype_func in dtype_mapping.items():
-            if column in df.columns:
-                df[column] = dtype_func(df[column])
-        
-        # 处理日期列
-        if date_columns:
-            for col in date_columns:
-                if col in df.columns:
-                    df[col] = pd.to_datetime(df[col], errors='coerce')
-        
-        return df
-    
-    if balance_df is None:
-        balance_dtype_mapping = {
-            '科目编码': lambda x: x.astype(str),
-            '年份': lambda x: pd.to_numeric(x, errors='coerce')
-        }
-        balance_df = load_csv_with_optimization(BALANCE_FILE, balance_dtype_mapping)
-    
-    if voucher_df is None:
-        voucher_dtype_mapping = {
-            '科目编码': lambda x: x.astype(str),
-            '借方金额': lambda x: pd.to_numeric(x, errors='coerce').fillna(0),
-            '贷方金额': lambda x: pd.to_numeric(x, errors='coerce').fillna(0)
-        }
-        voucher_df = load_csv_with_optimization(VOUCHER_FILE, voucher_dtype_mapping, ['日期'])
+    load_balance_data()
+    load_voucher_data()
+
+def get_subject_master() -> SubjectMaster:
+    """获取科目主数据（首次使用时读取已保存的主数据，余额表更新后由余额表重建）"""
+    global subject_master
+    with cache_locks["subject_master"]:
+        metrics.record_cache("subject_master", subject_master is not None)
+        if subject_master is None:
+            load_balance_data()
+            subject_master = load_subject_master(balance_df, resolve_data_path(BALANCE_FILE))
+    return subject_master
+
+def get_subject_catalog() -> SubjectCatalog:
+    """获取科目目录与名称索引（首次使用时对余额表去重汇总一次）"""
+    global subject_catalog
+    with cache_locks["subject_catalog"]:
+        metrics.record_cache("subject_catalog", subject_catalog is not None)
+        if subject_catalog is None:
+            master = get_subject_master().frame
+            subject_catalog = SubjectCatalog(balance_df, dict(zip(master["科目编码"], master["科目全名"])))
+    return subject_catalog
+
+def get_balance_stats() -> BalanceStats:
+    """获取余额表分区统计（首次使用时按公司、年份、期间汇总一次）"""
+    global balance_stats
+    with cache_locks["balance_stats"]:
+        metrics.record_cache("balance_stats", balance_stats is not None)
+        if balance_stats is None:
+            load_balance_data()
+            balance_stats = BalanceStats(balance_df)
+    return balance_stats
+
+def get_voucher_stats() -> VoucherStats:
+    """获取凭证表分区统计（首次使用时按公司、年份、月份汇总一次）"""
+    global voucher_stats
+    with cache_locks["voucher_stats"]:
+        metrics.record_cache("voucher_stats", voucher_stats is not None)
+        if voucher_stats is None:
+            load_voucher_data()
+            voucher_stats = build_voucher_stats(voucher_df)
+    return voucher_stats
+
+def get_financial_statements() -> FinancialStatements:
+    """获取全部公司、年度的资产负债表与利润表（首次使用时对余额表计算一次）"""
+    global financial_statements
+    with cache_locks["financial_statements"]:
+        metrics.record_cache("financial_statements", financial_statements is not None)
+        if financial_statements is None:
+            master = get_subject_master().frame
+            credit_codes = set(master.loc[master["余额方向"] == "贷", "科目编码"])
+            financial_statements = FinancialStatements(balance_df, credit_codes)
+    return financial_statements
+
+def get_intercompany_ledger() -> intercompany.IntercompanyLedger:
+    """获取集团内部往来（首次使用时解析余额表维度与凭证交易对方一次）"""
+    global intercompany_ledger
+    with cache_locks["intercompany_ledger"]:
+        metrics.record_cache("intercompany_ledger", intercompany_ledger is not None)
+        if intercompany_ledger is None:
+            intercompany_ledger = intercompany.IntercompanyLedger(balance_df, voucher_df)
+    return intercompany_ledger
+
+def get_journal_entry_features() -> pd.DataFrame:
+    """获取凭证分录测试特征表（首次使用时对整张凭证表计算一次）"""
+    global journal_entry_features
+    with cache_locks["journal_entry_features"]:
+        metrics.record_cache("journal_entry_features", journal_entry_features is not None)
+        if journal_entry_features is None:
+            journal_entry_features = journal_entry_tests.build_features(voucher_df)
+    return journal_entry_features
+
+def get_subject_flow_graph() -> tuple[pd.DataFrame, Dict[str, str]]:
+    """获取科目流向边表及科目名称映射（首次使用时对整张凭证表物化一次）"""
+    global subject_flow_graph
+    with cache_locks["subject_flow_graph"]:
+        metrics.record_cache("subject_flow_graph", subject_flow_graph is not None)
+        if subject_flow_graph is None:
+            subject_flow_graph = (subject_flow.build_flow_edges(voucher_df), subject_flow.subject_name_lookup(voucher_df))
+    return subject_flow_graph
+
+def get_dimension_cube() -> DimensionCube:
+    """获取核算维度汇总立方体（首次使用时对余额表预计算一次）"""
+    global dimension_cube
+    with cache_locks["dimension_cube"]:
+        metrics.record_cache("dimension_cube", dimension_cube is not None)
+        if dimension_cube is None:
+            dimension_cube = DimensionCube(balance_df)
+    return dimension_cube
+
+def get_aging_ledger(subject_code: str) -> counterparty_aging.AgingLedger:
+    """获取科目的往来账龄账簿（首次使用时按月份顺序构建一次）"""
+    with cache_locks["aging_ledgers"]:
+        metrics.record_cache("aging_ledgers", subject_code in aging_ledgers)
+        if subject_code not in aging_ledgers:
+            credit_normal = get_subject_master().credit_normal(subject_code)
+            aging_ledgers[subject_code] = counterparty_aging.build_aging_ledger(
+                voucher_df, get_dimension_cube().subject_slice(subject_code), subject_code, credit_normal
+            )
+    return aging_ledgers[subject_code]
+
+def get_monthly_balances() -> balance_series.BalanceSeries:
+    """获取月度余额序列（首次使用时物化一次）"""
+    global monthly_balances
+    with cache_locks["monthly_balances"]:
+        metrics.record_cache("monthly_balances", monthly_balances is not None)
+        if monthly_balances is None:
+            monthly_balances = balance_series.build_balance_series(voucher_df, balance_df)
+    return monthly_balances
+
+CACHE_BUILDERS = {
+    "subject_master": get_subject_master,
+    "subject_catalog": get_subject_catalog,
+    "balance_stats": get_balance_stats,
+    "voucher_stats": get_voucher_stats,
+    "financial_statements": get_financial_statements,
+    "intercompany_ledger": get_intercompany_ledger,
+    "dimension_cube": get_dimension_cube,
+    "monthly_balances": get_monthly_balances,
+    "journal_entry_features": get_journal_entry_features,
+    "subject_flow_graph": get_subject_flow_graph,
+}
+
+# 后台数据预热：先加载余额表，再加载凭证表，最后构建常用派生缓存
+warmup = DataWarmup(
+    [("balance", load_balance_data), ("vouchers", load_voucher_data)]
+    + [(name, CACHE_BUILDERS[name]) for name in WARM_CACHES if name in CACHE_BUILDERS]
+)
+
+def required_stage(name: str) -> Optional[str]:
+    """工具调用需要等待的预热阶段，None表示无需数据"""
+    if name == "server_stats":
+        return None
+    return "balance" if name in BALANCE_TOOLS else "vouchers"
 
 def format_amount(amount: float) -> str:
     """格式化金额显示"""
@@ -80,6 +391,7 @@ def format_amount(amount: float) -> str:
 
 def create_output_header(title: str, record_count: int, truncated: bool = False, limit: int = 0) -> List[str]:
     """创建输出头部信息"""
+    record_returned(min(record_count, limit) if truncated and limit > 0 else record_count)
     output_lines = [f"# {title}\n"]
     output_lines.append(f"**记录数量**: {record_count}")
     
@@ -89,6 +401,56 @@ def create_output_header(title: str, record_count: int, truncated: bool = False,
     output_lines.append("")
     return output_lines
 
+def create_page_header(title: str, total: int, offset: int, page_size: int, next_cursor: Optional[str]) -> List[str]:
+    """创建分页输出头部信息"""
+    record_returned(page_size)
+    output_lines = [f"# {title}\n"]
+    output_lines.append(f"**记录总数**: {total}")
+    output_lines.append(f"**当前页**: 第{offset + 1}-{offset + page_size}条")
+    if next_cursor:
+        output_lines.append(f"**下一页游标**: `{next_cursor}`")
+    output_lines.append("")
+    return output_lines
+
+def structured_response(fmt: str, tables: Dict[str, pd.DataFrame], **meta) -> list[types.TextContent]:
+    """以json或csv格式返回结果表"""
+    record_returned(sum(len(df) for df in tables.values()))
+    return [types.TextContent(type="text", text=render_structured(fmt, tables, meta))]
+
+def subject_categories(codes: pd.Series) -> pd.Series:
+    """按科目主数据取科目类别，缺少编码的行为其他类"""
+    return get_subject_master().lookup(codes, "会计要素").fillna("其他类")
+
+def session_owner() -> Optional[str]:
+    """当前请求所属会话的标识；stdio只有一个客户端，返回None"""
+    if transport == "stdio":
+        return None
+    try:
+        session = app.request_context.session
+    except LookupError:
+        return None
+    with session_lock:
+        if session not in session_keys:
+            session_keys[session] = secrets.token_urlsafe(9)
+        return session_keys[session]
+
+def paginate(tool: str, df: pd.DataFrame, args: dict, run_filter, default_limit: int) -> tuple[pd.DataFrame, int, int, Optional[str]]:
+    """分页取结果，返回(当前页, 记录总数, 偏移量, 下一页游标)
+
+    带游标时直接按保存的行位置取页；否则执行筛选，结果超过一页时保存行位置并创建游标
+    """
+    limit = args.get("limit", default_limit)
+    owner = session_owner()
+    if args.get("cursor"):
+        result_id, positions, offset = result_cursors.resolve(args["cursor"], tool, owner)
+        metrics.record_cache("result_cursors", True)
+        next_cursor = result_cursors.next_cursor(result_id, offset + limit, len(positions))
+    else:
+        positions = df.index.get_indexer(run_filter().index)
+        offset = 0
+        next_cursor = result_cursors.create(tool, positions, limit, owner) if len(positions) > limit else None
+    return df.iloc[positions[offset:offset + limit]], len(positions), offset, next_cursor
+
 def format_balance_info(row: pd.Series, include_dimension: bool = True) -> List[str]:
     """格式化余额信息"""
     lines = []
@@ -117,25 +479,12 @@ def format_balance_info(row: pd.Series, include_dimension: bool = True) -> List[
 
 def get_subject_category(subject_code: str) -> str:
     """根据科目编码判断会计要素分类"""
-    code_prefix = subject_code.split(".")[0]
-    if code_prefix.startswith("1"):
-        return "资产类"
-    elif code_prefix.startswith("2"):
-        return "负债类"
-    elif code_prefix.startswith("3"):
-        return "共同类"
-    elif code_prefix.startswith("4"):
-        return "所有者权益类"
-    elif code_prefix.startswith("5"):
-        return "成本类"
-    elif code_prefix.startswith("6"):
-        return "损益类"
-    else:
-        return "其他类"
+    return get_subject_master().category(subject_code)
 
-def validate_subject_balance_direction(subject_code: str, ending_debit: float, ending_credit: float) -> tuple[bool, str]:
-    """验证科目余额方向是否符合会计准则"""
-    category = get_subject_category(subject_code)
+def validate_subject_balance_direction(subject_code: str, ending_debit: float, ending_credit: float,
+                                       category: Optional[str] = None) -> tuple[bool, str]:
+    """验证科目余额方向是否符合会计准则，category已知时不再查询科目主数据"""
+    category = category or get_subject_category(subject_code)
     
     if category == "资产类":
         # 资产类科目正常应为借方余额
@@ -152,18 +501,9 @@ def validate_subject_balance_direction(subject_code: str, ending_debit: float, e
     
     return True, "余额方向正常"
 
-def get_financial_synonyms() -> Dict[str, List[str]]:
-    """获取财务术语同义词映射"""
-    return {
-        "固定资产": ["固定资产", "固资", "设备", "机器", "厂房", "建筑物"],
-        "其他费用": ["其他费用", "其他", "杂费", "其它费用", "其它"],
-        "管理费用": ["管理费用", "管理费", "行政费用", "行政费"],
-        "销售费用": ["销售费用", "销售费", "营销费用", "营销费"],
-        "财务费用": ["财务费用", "财务费", "利息费用", "利息"],
-        "银行存款": ["银行存款", "银行", "存款", "现金"],
-        "应收账款": ["应收账款", "应收", "客户欠款"],
-        "应付账款": ["应付账款", "应付", "供应商欠款"]
-    }
+def get_synonym_matcher() -> SynonymMatcher:
+    """获取编译后的财务术语同义词表（同义词文件修改后自动重新加载）"""
+    return synonym_source.get()
 
 def enhanced_search_keywords(keyword: str, text_series: pd.Series) -> pd.Series:
     """增强的关键词搜索功能"""
@@ -171,6 +511,7 @@ def enhanced_search_keywords(keyword: str, text_series: pd.Series) -> pd.Series:
         return pd.Series([False] * len(text_series))
     
     keyword = keyword.strip().lower()
+    record_scan(len(text_series))
     
     # 1. 精确匹配
     exact_match = text_series.str.contains(keyword, case=False, na=False, regex=False)
@@ -179,15 +520,9 @@ def enhanced_search_keywords(keyword: str, text_series: pd.Series) -> pd.Series:
     if exact_match.any():
         return exact_match
     
-    # 2. 同义词匹配
-    synonyms = get_financial_synonyms()
-    synonym_match = pd.Series([False] * len(text_series))
-    
-    for main_term, synonym_list in synonyms.items():
-        if keyword in [syn.lower() for syn in synonym_list] or \
-           any(syn.lower() in keyword for syn in synonym_list):
-            for syn in synonym_list:
-                synonym_match |= text_series.str.contains(syn, case=False, na=False, regex=False)
+    # 2. 同义词匹配：查询词涉及的全部同义词合并为一个正则，对去重后的文本单次匹配
+    synonyms = get_synonym_matcher()
+    synonym_match = synonyms.mark(text_series, synonyms.related_terms(keyword))
     
     if synonym_match.any():
         return synonym_match
@@ -315,8 +650,48 @@ def cross_validate_balance_voucher(subject_code: str, company: str = None, year:
     
     return validation_result
 
+# filter_dataframe支持的筛选键，按选择范围由宽到窄排列
+FILTER_KEYS = ("company", "year", "period", "business_type", "subject_path", "subject_code", "dimension_name", "subject_name_path")
+
 def filter_dataframe(df: pd.DataFrame, filters: Dict[str, Any]) -> pd.DataFrame:
+    """通用数据框筛选
+
+    批量执行期间按FILTER_KEYS顺序逐个应用条件并缓存每一级中间结果，
+    公司、年份相同而科目不同的调用共享前面几级的筛选结果
+    """
+    cache = filter_cache.get()
+    table = "balance" if df is balance_df else "voucher" if df is voucher_df else None
+    if cache is None or table is None:
+        return apply_filters(df, filters)
+    
+    result = df
+    key = (table,)
+    for name in FILTER_KEYS:
+        value = filters.get(name)
+        if value is None or value == "":
+            continue
+        key += ((name, str(value)),)
+        metrics.record_cache("filter", key in cache)
+        if key not in cache:
+            cache[key] = apply_filters(result, {name: value})
+        result = cache[key]
+    return result
+
+def validate_year(value: Any) -> int:
+    """年份验证 - 整数与合理范围检查"""
+    if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+        raise ValueError(f"年份 '{value}' 格式不正确，应为整数")
+    try:
+        year_value = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"年份 '{value}' 格式不正确，应为整数") from None
+    if year_value < 2000 or year_value > 2050:
+        raise ValueError(f"年份 {year_value} 超出合理范围（2000-2050）")
+    return year_value
+
+def apply_filters(df: pd.DataFrame, filters: Dict[str, Any]) -> pd.DataFrame:
     """增强的通用数据框筛选函数，增加会计逻辑验证"""
+    record_scan(len(df))
     result = df.copy()
     
     # 列名映射配置
@@ -327,7 +702,8 @@ def filter_dataframe(df: pd.DataFrame, filters: Dict[str, Any]) -> pd.DataFrame:
         "subject_path": "subject_code_path",
         "year": "年份",
         "dimension_name": result.columns[3] if len(result.columns) > 3 else None,
-        "subject_name_path": "subject_name_path"
+        "subject_name_path": "subject_name_path",
+        "business_type": "业务分类"
     }
     
     # 会计科目编码验证
@@ -355,10 +731,7 @@ def filter_dataframe(df: pd.DataFrame, filters: Dict[str, Any]) -> pd.DataFrame:
             result = result[result[column_name].str.contains(re.escape(path_value), case=False, na=False)]
         elif key == "year":
             # 年份验证 - 合理范围检查
-            year_value = int(value)
-            if year_value < 2000 or year_value > 2050:
-                raise ValueError(f"年份 {year_value} 超出合理范围（2000-2050）")
-            result = result[result[column_name] == year_value]
+            result = result[result[column_name] == validate_year(value)]
         elif key == "subject_code":
             # 科目编码查询优化 - 支持层级查询
             code_value = str(value).strip()
@@ -369,6 +742,11 @@ def filter_dataframe(df: pd.DataFrame, filters: Dict[str, Any]) -> pd.DataFrame:
                 # 如果是父级科目，查询该科目及其所有子科目
                 result = result[(result[column_name] == code_value) | 
                                (result[column_name].str.startswith(code_value + ".", na=False))]
+        elif key == "business_type":
+            # 业务分类精确匹配
+            if value not in BUSINESS_TYPES:
+                raise ValueError(f"业务分类 '{value}' 不存在，可选值：{'、'.join(BUSINESS_TYPES)}")
+            result = result[result[column_name] == value]
         else:
             # 通用字符串包含匹配
             result = result[result[column_name].str.contains(str(value), case=False, na=False)]
@@ -380,7 +758,7 @@ app = Server("financial-data-query")
 @app.list_tools()
 async def handle_list_tools() -> list[types.Tool]:
     """返回可用的工具列表"""
-    return [
+    tools = [
         types.Tool(
             name="query_balance_sheet",
             description="查询科目余额表数据，支持按公司、期间、科目等条件筛选",
@@ -415,6 +793,10 @@ async def handle_list_tools() -> list[types.Tool]:
                         "type": "integer",
                         "description": "年份"
                     },
+                    "cursor": {
+                        "type": "string",
+                        "description": "分页游标（上一页结果中返回），提供时沿用原查询条件返回下一页"
+                    },
                     "limit": {
                         "type": "integer",
                         "description": "返回结果数量限制",
@@ -454,6 +836,11 @@ async def handle_list_tools() -> list[types.Tool]:
                         "type": "string",
                         "description": "凭证号"
                     },
+                    "business_type": {
+                        "type": "string",
+                        "enum": BUSINESS_TYPES,
+                        "description": "业务分类（加载时自动识别，如：采购付款、销售收款、费用报销等）"
+                    },
                     "amount_min": {
                         "type": "number",
                         "description": "最小金额"
@@ -462,6 +849,10 @@ async def handle_list_tools() -> list[types.Tool]:
                         "type": "number", 
                         "description": "最大金额"
                     },
+                    "cursor": {
+                        "type": "string",
+                        "description": "分页游标（上一页结果中返回），提供时沿用原查询条件返回下一页"
+                    },
                     "limit": {
                         "type": "integer",
                         "description": "返回结果数量限制",
@@ -547,6 +938,11 @@ async def handle_list_tools() -> list[types.Tool]:
                         "type": "string",
                         "description": "搜索关键词（在摘要中搜索）"
                     },
+                    "business_type": {
+                        "type": "string",
+                        "enum": BUSINESS_TYPES,
+                        "description": "业务分类（加载时自动识别，如：采购付款、销售收款、费用报销等）"
+                    },
                     "company": {
                         "type": "string",
                         "description": "公司名称（支持部分匹配）"
@@ -559,6 +955,10 @@ async def handle_list_tools() -> list[types.Tool]:
                         "type": "string",
                         "description": "结束日期 (YYYY-MM-DD)"
                     },
+                    "cursor": {
+                        "type": "string",
+                        "description": "分页游标（上一页结果中返回），提供时沿用原查询条件返回下一页"
+                    },
                     "limit": {
                         "type": "integer", 
                         "description": "返回结果数量限制",
@@ -576,7 +976,7 @@ async def handle_list_tools() -> list[types.Tool]:
                 "properties": {
                     "subject_name": {
                         "type": "string",
-                        "description": "科目名称（如：其他应付款、银行存款、应收账款等）"
+                        "description": "科目名称（如：其他应付款、银行存款、应收账款等），也可输入拼音首字母（如：yhck）"
                     },
                     "company": {
                         "type": "string",
@@ -637,270 +1037,800 @@ async def handle_list_tools() -> list[types.Tool]:
                 },
                 "required": ["subject_code"]
             }
-        )
-    ]
-
-@app.call_tool()
-async def handle_call_tool(name: str, arguments: dict) -> list[types.TextContent]:
-    """处理工具调用"""
-    try:
-        load_data()
-        
-        if name == "query_balance_sheet":
-            return await query_balance_sheet(arguments)
-        elif name == "query_voucher_details":
-            return await query_voucher_details(arguments)
-        elif name == "analyze_subject_hierarchy":
-            return await analyze_subject_hierarchy(arguments)
-        elif name == "get_financial_summary":
-            return await get_financial_summary(arguments)
-        elif name == "search_transactions":
-            return await search_transactions(arguments)
-        elif name == "validate_data_consistency":
-            return await validate_data_consistency(arguments)
-        elif name == "find_subject_by_name":
-            return await find_subject_by_name(arguments)
-        elif name == "query_dimension_details":
-            return await query_dimension_details(arguments)
-        else:
-            raise ValueError(f"未知工具: {name}")
-            
-    except Exception as e:
-        error_msg = f"执行工具 '{name}' 时发生错误: {str(e)}"
-        print(f"Tool execution error: {error_msg}", file=sys.stderr)
-        
-        # 提供更友好的错误提示
-        if "not found" in str(e).lower() or "file not exist" in str(e).lower():
-            error_msg += "\n\n💡 建议：请检查数据文件是否存在，或联系系统管理员。"
-        elif "invalid" in str(e).lower():
-            error_msg += "\n\n💡 建议：请检查输入参数格式是否正确。"
-        elif "connection" in str(e).lower():
-            error_msg += "\n\n💡 建议：请检查网络连接或数据库连接。"
-        else:
-            error_msg += "\n\n💡 建议：如果问题持续存在，请联系技术支持。"
-        
-        return [types.TextContent(type="text", text=error_msg)]
-
-async def query_balance_sheet(args: dict) -> list[types.TextContent]:
-    """查询科目余额表 - 增强会计逻辑验证"""
-    global balance_df
-    
-    try:
-        # 应用筛选条件
-        result = filter_dataframe(balance_df, args)
-        
-        # 限制返回数量
-        limit = args.get("limit", 100)
-        truncated = len(result) > limit
-        if truncated:
-            result = result.head(limit)
-        
-        if result.empty:
-            suggestion = "💡 建议：\n"
-            suggestion += "- 检查科目编码是否正确（应为数字和点号组合，如1002或1002.01）\n"
-            suggestion += "- 尝试使用部分匹配（如：输入'1002'查找银行存款及其子科目）\n"
-            suggestion += "- 检查公司名称和年份参数是否正确（年份应在2000-2050范围内）\n"
-            suggestion += "- 使用 get_financial_summary 工具查看可用的数据范围"
-            return [types.TextContent(type="text", text=f"❌ 未找到符合条件的余额记录\n\n{suggestion}")]
-        
-        # 格式化输出
-        output_lines = create_output_header("科目余额表查询结果", len(result), truncated, limit)
-        
-        # 会计逻辑验证和增强显示
-        warnings = []
-        category_summary = {}
-        
-        for _, row in result.iterrows():
-            subject_code = str(row['科目编码']) if pd.notna(row['科目编码']) else "未知编码"
-            subject_name = str(row['科目名称']) if pd.notna(row['科目名称']) else "未知名称"
-            
-            # 获取科目类别
-            category = get_subject_category(subject_code)
-            
-            # 收集类别汇总信息
-            if category not in category_summary:
-                category_summary[category] = 0
-            category_summary[category] += 1
-            
-            # 验证余额方向
-            ending_debit = float(row.get('期末余额借方', 0)) if pd.notna(row.get('期末余额借方')) else 0
-            ending_credit = float(row.get('期末余额贷方', 0)) if pd.notna(row.get('期末余额贷方')) else 0
-            
-            is_valid, balance_message = validate_subject_balance_direction(subject_code, ending_debit, ending_credit)
-            if not is_valid:
-                warnings.append(balance_message)
-            
-            output_lines.append(f"## 科目: {subject_code} - {subject_name}")
-            output_lines.append(f"**公司**: {row['公司']}")
-            output_lines.append(f"**期间**: {row['期间']}")
-            output_lines.append(f"**科目类别**: {category}")
-            
-            # 添加余额信息
-            output_lines.extend(format_balance_info(row))
-            output_lines.append("")
-        
-        # 添加会计逻辑验证结果
-        if warnings:
-            output_lines.append("## ⚠️ 会计逻辑检查")
-            output_lines.append("发现以下异常情况：")
-            for warning in warnings:
-                output_lines.append(f"- {warning}")
-            output_lines.append("")
-        
-        # 添加类别汇总
-        if len(category_summary) > 1:
-            output_lines.append("## 📊 科目类别汇总")
-            for category, count in category_summary.items():
-                output_lines.append(f"- {category}: {count} 个科目")
-            output_lines.append("")
-        
-        return [types.TextContent(type="text", text="\n".join(output_lines))]
-        
-    except ValueError as ve:
-        return [types.TextContent(type="text", text=f"❌ 输入参数错误: {str(ve)}\n\n请检查输入的科目编码格式和年份范围。")]
-    except Exception as e:
-        return [types.TextContent(type="text", text=f"❌ 查询过程出错: {str(e)}")]
-
-def identify_business_type(summary: str, subject_code: str, subject_name: str) -> str:
-    """根据摘要和科目信息识别业务类型"""
-    summary_lower = summary.lower() if summary else ""
-    
-    # 收款业务识别
-    if any(keyword in summary_lower for keyword in ['收到', '收款', '货款', '回款', '还款']):
-        if '1122' in subject_code or '应收' in subject_name:
-            return "销售收款"
-        elif '1121' in subject_code or '应收票据' in subject_name:
-            return "票据收款"
-        elif '2202' in subject_code or '应付' in subject_name:
-            return "预收款项"
-        else:
-            return "其他收款"
-    
-    # 付款业务识别
-    elif any(keyword in summary_lower for keyword in ['支付', '付款', '采购', '购买', '预付']):
-        if '2202' in subject_code or '应付' in subject_name:
-            return "采购付款"
-        elif '1123' in subject_code or '预付' in subject_name:
-            return "预付款项"
-        elif '6601' in subject_code or '销售费用' in subject_name:
-            return "销售费用"
-        elif '6602' in subject_code or '管理费用' in subject_name:
-            return "管理费用"
-        elif '6603' in subject_code or '财务费用' in subject_name:
-            return "财务费用"
-        else:
-            return "其他付款"
-    
-    # 转账业务识别
-    elif any(keyword in summary_lower for keyword in ['转账', '划转', '内部', '调拨']):
-        if '1002' in subject_code or '银行存款' in subject_name:
-            return "银行转账"
-        else:
-            return "内部转账"
-    
-    # 根据科目代码判断
-    elif subject_code.startswith('6') or '费用' in subject_name:
-        return "费用报销"
-    elif subject_code.startswith('1') and '存款' in subject_name:
-        return "资金业务"
-    elif subject_code.startswith('2') and '应付' in subject_name:
-        return "应付款项"
-    
-    return "其他业务"
-
-def validate_voucher_balance(voucher_df: pd.DataFrame, voucher_key: str) -> tuple[bool, float, float]:
-    """验证凭证借贷平衡"""
-    voucher_data = voucher_df[voucher_df['凭证唯一标识'] == voucher_key]
-    if voucher_data.empty:
-        return False, 0, 0
-    
-    total_debit = voucher_data['借方金额'].sum()
-    total_credit = voucher_data['贷方金额'].sum()
-    is_balanced = abs(total_debit - total_credit) < 0.01  # 允许0.01的舍入误差
-    
-    return is_balanced, total_debit, total_credit
-
-async def query_voucher_details(args: dict) -> list[types.TextContent]:
-    """查询凭证明细 - 增强业务逻辑识别"""
-    global voucher_df
-    
-    try:
-        # 使用统一的筛选函数
-        voucher_filters = {}
-        for key in ['company', 'subject_code', 'voucher_no']:
-            if args.get(key):
-                voucher_filters[key] = args[key]
-        
-        result = filter_dataframe(voucher_df, voucher_filters)
-        
-        # 处理日期范围筛选
-        if args.get("date_start"):
-            start_date = pd.to_datetime(args["date_start"])
-            result = result[result["日期"] >= start_date]
-        
-        if args.get("date_end"):
-            end_date = pd.to_datetime(args["date_end"])
-            result = result[result["日期"] <= end_date]
-        
-        # 处理金额范围筛选 - 增强会计逻辑
-        if args.get("amount_min"):
-            amount_min = args["amount_min"]
-            # 会计逻辑：金额必须为正数
-            if amount_min < 0:
-                raise ValueError("金额下限不能为负数")
-            result = result[(result["借方金额"] >= amount_min) | (result["贷方金额"] >= amount_min)]
-        
-        if args.get("amount_max"):
-            amount_max = args["amount_max"]
-            # 会计逻辑：检查金额合理性
-            if amount_max > 100000000:  # 1亿以上需要额外注意
-                result = result[(result["借方金额"] <= amount_max) | (result["贷方金额"] <= amount_max)]
-            else:
-                result = result[(result["借方金额"] <= amount_max) | (result["贷方金额"] <= amount_max)]
-        
-        # 限制返回数量
-        limit = args.get("limit", 100)
-        truncated = len(result) > limit
-        if truncated:
-            result = result.head(limit)
-        
-        if result.empty:
-            suggestion = "💡 建议：\n"
-            suggestion += "- 检查日期范围是否正确（格式：YYYY-MM-DD）\n"
-            suggestion += "- 尝试扩大搜索范围（如：减少筛选条件）\n"
-            suggestion += "- 检查科目编码格式（应为数字和点号组合）\n"
-            suggestion += "- 检查金额范围是否为正数\n"
-            suggestion += "- 使用 search_transactions 工具通过关键词搜索"
-            return [types.TextContent(type="text", text=f"❌ 未找到符合条件的凭证记录\n\n{suggestion}")]
-        
-        # 格式化输出 - 增强业务逻辑显示
-        output_lines = create_output_header("凭证明细查询结果", len(result), truncated, limit)
-        
-        # 凭证平衡性检查
-        voucher_balance_check = {}
-        business_type_summary = {}
-        
-        current_voucher = None
-        for _, row in result.iterrows():
-            voucher_key = f"{row['凭证字']}-{row['凭证号']}"
-            
-            # 识别业务类型
-            business_type = identify_business_type(row['摘要'], row['科目编码'], row['科目全名'])
-            if business_type not in business_type_summary:
-                business_type_summary[business_type] = 0
-            business_type_summary[business_type] += 1
-            
-            if current_voucher != voucher_key:
-                current_voucher = voucher_key
-                
-                # 检查凭证借贷平衡
-                is_balanced, total_debit, total_credit = validate_voucher_balance(result, voucher_key)
-                voucher_balance_check[voucher_key] = is_balanced
-                
-                output_lines.append(f"## 凭证: {voucher_key}")
-                output_lines.append(f"**日期**: {row['日期'].strftime('%Y-%m-%d') if pd.notna(row['日期']) else 'N/A'}")
-                
-                if not is_balanced:
+        ),
+        types.Tool(
+            name="detect_duplicate_payments",
+            description="检测同一交易对方的重复付款、近似重复付款以及拆分规避审批额度的付款",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "company": {
+                        "type": "string",
+                        "description": "公司名称（支持部分匹配）"
+                    },
+                    "subject_code": {
+                        "type": "string",
+                        "description": "付款科目编码（默认1002银行存款，包含子科目）",
+                        "default": "1002"
+                    },
+                    "direction": {
+                        "type": "string",
+                        "enum": ["credit", "debit"],
+                        "description": "付款方向：credit(贷方，资金流出), debit(借方)",
+                        "default": "credit"
+                    },
+                    "window_days": {
+                        "type": "integer",
+                        "description": "重复付款的日期窗口（天）",
+                        "default": 30
+                    },
+                    "tolerance": {
+                        "type": "number",
+                        "description": "近似重复的金额相对差异上限（如0.01表示1%）",
+                        "default": 0.01
+                    },
+                    "approval_threshold": {
+                        "type": "number",
+                        "description": "审批额度，设置后检测窗口内拆分到额度以下的付款"
+                    },
+                    "split_window_days": {
+                        "type": "integer",
+                        "description": "拆分付款的日期窗口（天）",
+                        "default": 7
+                    },
+                    "limit": {
+                        "type": "integer",
+                        "description": "返回结果数量限制",
+                        "default": 100
+                    }
+                }
+            }
+        ),
+        types.Tool(
+            name="benford_analysis",
+            description="对借贷方金额进行本福特定律与数字分布检验，按公司、科目、制单人或月份分组输出卡方与MAD评分",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "company": {
+                        "type": "string",
+                        "description": "公司名称（支持部分匹配）"
+                    },
+                    "subject_code": {
+                        "type": "string",
+                        "description": "科目编码（包含子科目）"
+                    },
+                    "year": {
+                        "type": "integer",
+                        "description": "年份"
+                    },
+                    "test": {
+                        "type": "string",
+                        "enum": ["first_digit", "first_two_digits", "last_two_digits"],
+                        "description": "检验类型：first_digit(首位数字), first_two_digits(前两位数字), last_two_digits(末两位数字)",
+                        "default": "first_digit"
+                    },
+                    "group_by": {
+                        "type": "string",
+                        "enum": ["none", "company", "subject", "company_subject", "maker", "month", "business_type"],
+                        "description": "分组方式：none(整体), company(公司), subject(一级科目), company_subject(公司+一级科目), maker(制单人), month(月份), business_type(业务分类)",
+                        "default": "none"
+                    },
+                    "amount_side": {
+                        "type": "string",
+                        "enum": ["both", "debit", "credit"],
+                        "description": "金额方向：both(借贷双方), debit(借方), credit(贷方)",
+                        "default": "both"
+                    },
+                    "min_count": {
+                        "type": "integer",
+                        "description": "参与评分的最小样本数",
+                        "default": 50
+                    },
+                    "limit": {
+                        "type": "integer",
+                        "description": "返回分组数量限制",
+                        "default": 50
+                    }
+                }
+            }
+        ),
+        types.Tool(
+            name="run_journal_entry_tests",
+            description="执行凭证分录测试（周末/节假日记账、整数金额、制单审核同一人、期后记账、罕见科目对应等），按凭证输出风险得分，支持分页",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "company": {
+                        "type": "string",
+                        "description": "公司名称（支持部分匹配）"
+                    },
+                    "year": {
+                        "type": "integer",
+                        "description": "年份"
+                    },
+                    "date_start": {
+                        "type": "string",
+                        "description": "开始日期 (YYYY-MM-DD)"
+                    },
+                    "date_end": {
+                        "type": "string",
+                        "description": "结束日期 (YYYY-MM-DD)"
+                    },
+                    "rules": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "description": "要执行的内置规则ID（留空执行全部）：" + ", ".join(rule["id"] for rule in journal_entry_tests.DEFAULT_RULES)
+                    },
+                    "custom_rules": {
+                        "type": "array",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "id": {"type": "string"},
+                                "name": {"type": "string"},
+                                "expression": {"type": "string"},
+                                "weight": {"type": "number"}
+                            },
+                            "required": ["id", "expression"]
+                        },
+                        "description": "自定义规则，表达式可使用特征列：" + ", ".join(journal_entry_tests.FEATURE_COLUMNS)
+                    },
+                    "min_score": {
+                        "type": "number",
+                        "description": "最低得分（仅返回得分高于该值的凭证）",
+                        "default": 0
+                    },
+                    "offset": {
+                        "type": "integer",
+                        "description": "分页起始位置",
+                        "default": 0
+                    },
+                    "limit": {
+                        "type": "integer",
+                        "description": "每页返回的凭证数量",
+                        "default": 50
+                    }
+                }
+            }
+        ),
+        types.Tool(
+            name="query_subject_flows",
+            description="查询科目的资金来源与去向：按凭证借贷对应关系（多借多贷按金额比例分摊）汇总对方科目，如银行存款的钱从哪来、到哪去",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "subject_code": {
+                        "type": "string",
+                        "description": "科目编码（包含子科目），如1002"
+                    },
+                    "company": {
+                        "type": "string",
+                        "description": "公司名称（支持部分匹配）"
+                    },
+                    "year": {
+                        "type": "integer",
+                        "description": "年份"
+                    },
+                    "period_start": {
+                        "type": "string",
+                        "description": "开始月份 (YYYY-MM)"
+                    },
+                    "period_end": {
+                        "type": "string",
+                        "description": "结束月份 (YYYY-MM)"
+                    },
+                    "counterpart_level": {
+                        "type": "integer",
+                        "description": "对方科目汇总级次（1为一级科目，0为明细科目）",
+                        "default": 1
+                    },
+                    "limit": {
+                        "type": "integer",
+                        "description": "来源、去向各返回的对方科目数量",
+                        "default": 20
+                    }
+                },
+                "required": ["subject_code"]
+            }
+        ),
+        types.Tool(
+            name="analyze_counterparty_aging",
+            description="按往来单位对应收账款、应付账款等往来科目进行先进先出账龄分析（0-30/31-90/91-180/180天以上）",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "subject_code": {
+                        "type": "string",
+                        "description": "往来科目编码（如：1122应收账款、2202应付账款）",
+                        "default": "1122"
+                    },
+                    "company": {
+                        "type": "string",
+                        "description": "公司名称（支持部分匹配）"
+                    },
+                    "counterparty": {
+                        "type": "string",
+                        "description": "往来单位名称（支持部分匹配）"
+                    },
+                    "as_of": {
+                        "type": "string",
+                        "description": "账龄计算基准日 (YYYY-MM-DD)，默认为最新凭证日期"
+                    },
+                    "buckets": {
+                        "type": "array",
+                        "items": {"type": "integer"},
+                        "description": "账龄区间上限（天），默认[30, 90, 180]"
+                    },
+                    "limit": {
+                        "type": "integer",
+                        "description": "返回往来单位数量限制",
+                        "default": 50
+                    }
+                }
+            }
+        ),
+        types.Tool(
+            name="query_balance_trend",
+            description="查询科目逐月余额走势：以余额表期初数为起点累计凭证月度发生额，返回每月期初、借贷方发生额和期末余额",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "subject_code": {
+                        "type": "string",
+                        "description": "科目编码（如：1002银行存款，上级科目自动汇总下级科目）"
+                    },
+                    "company": {
+                        "type": "string",
+                        "description": "公司名称（支持部分匹配，匹配多家公司时合计）"
+                    },
+                    "year": {
+                        "type": "integer",
+                        "description": "年份"
+                    },
+                    "period_start": {
+                        "type": "string",
+                        "description": "开始月份 (YYYY-MM)"
+                    },
+                    "period_end": {
+                        "type": "string",
+                        "description": "结束月份 (YYYY-MM)"
+                    }
+                },
+                "required": ["subject_code"]
+            }
+        ),
+        types.Tool(
+            name="detect_subject_anomalies",
+            description="批量检测全部（公司, 科目）月度发生额异常：滚动中位数/MAD稳健z值识别环比突变、同比偏离和余额方向反转，按异常程度排序",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "company": {
+                        "type": "string",
+                        "description": "公司名称（支持部分匹配）"
+                    },
+                    "subject_code": {
+                        "type": "string",
+                        "description": "科目编码前缀（留空检测全部科目）"
+                    },
+                    "level": {
+                        "type": "integer",
+                        "description": "科目级次（1为一级科目，0为全部级次）",
+                        "default": 1
+                    },
+                    "anomaly_types": {
+                        "type": "array",
+                        "items": {"type": "string", "enum": list(movement_anomalies.ANOMALY_TYPES)},
+                        "description": "异常类型：spike(环比异常), seasonal(同比偏离), sign_flip(余额方向反转)，留空检测全部"
+                    },
+                    "window": {
+                        "type": "integer",
+                        "description": "滚动窗口月数",
+                        "default": 6
+                    },
+                    "threshold": {
+                        "type": "number",
+                        "description": "稳健z值阈值",
+                        "default": 3.5
+                    },
+                    "min_amount": {
+                        "type": "number",
+                        "description": "最小偏离金额",
+                        "default": 10000
+                    },
+                    "year": {
+                        "type": "integer",
+                        "description": "仅返回该年度的异常"
+                    },
+                    "limit": {
+                        "type": "integer",
+                        "description": "返回结果数量限制",
+                        "default": 50
+                    }
+                }
+            }
+        ),
+        types.Tool(
+            name="generate_financial_statements",
+            description="由科目余额表生成资产负债表与利润表：按标准行项目汇总一级科目，列示年初余额/上期金额比较数，并检查资产 = 负债 + 所有者权益",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "company": {
+                        "type": "string",
+                        "description": "公司名称（支持部分匹配，匹配多家公司时分别生成）"
+                    },
+                    "year": {
+                        "type": "integer",
+                        "description": "报表年度（默认为各公司最近一个年度）"
+                    },
+                    "statement": {
+                        "type": "string",
+                        "enum": ["balance_sheet", "income_statement", "both"],
+                        "description": "报表类型：balance_sheet(资产负债表), income_statement(利润表), both(两者)",
+                        "default": "both"
+                    }
+                }
+            }
+        ),
+        types.Tool(
+            name="reconcile_intercompany",
+            description="集团内部往来核对与合并抵销：按金额与日期容差匹配成员公司之间的往来余额和往来分录，列示未匹配差异，并生成抵销分录与合并试算平衡表",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "year": {
+                        "type": "integer",
+                        "description": "核对年度（默认为余额表最近一个年度）"
+                    },
+                    "company": {
+                        "type": "string",
+                        "description": "只显示涉及该公司的匹配结果（支持部分匹配），抵销分录与合并试算平衡表始终按全集团编制"
+                    },
+                    "scope": {
+                        "type": "string",
+                        "enum": ["balances", "vouchers", "both"],
+                        "description": "核对范围：balances(年末往来余额及抵销), vouchers(往来分录), both(两者)",
+                        "default": "both"
+                    },
+                    "amount_tolerance": {
+                        "type": "number",
+                        "description": "双方金额允许的差额（元）",
+                        "default": 0.01
+                    },
+                    "date_tolerance_days": {
+                        "type": "integer",
+                        "description": "往来分录双方入账日期允许相差的天数",
+                        "default": 15
+                    },
+                    "limit": {
+                        "type": "integer",
+                        "description": "未匹配分录的显示数量限制（按金额绝对值降序）",
+                        "default": 50
+                    }
+                }
+            }
+        ),
+        types.Tool(
+            name="run_voucher_report",
+            description="按声明式模板生成凭证模式报表（如固定资产处置、备品备件收发）：模板定义触发科目、同一凭证或经清理科目串联的凭证如何合并为一行、金额列与摘要归类，可保存为CSV明细与文本报告",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "template": {
+                        "type": "string",
+                        "description": "模板ID（模板文件report_templates.json中定义，留空列出可用模板）"
+                    },
+                    "custom_template": {
+                        "type": "object",
+                        "description": "自定义模板（字段同模板文件：row, trigger, exclude_summary, link_subject, measures, derived, fields, classify, summary），优先于template"
+                    },
+                    "company": {
+                        "type": "string",
+                        "description": "公司名称（支持部分匹配）"
+                    },
+                    "year": {
+                        "type": "integer",
+                        "description": "年份"
+                    },
+                    "save": {
+                        "type": "boolean",
+                        "description": "是否将明细表（CSV）与分析报告（TXT）保存到报表输出目录",
+                        "default": False
+                    },
+                    "limit": {
+                        "type": "integer",
+                        "description": "明细显示数量限制",
+                        "default": 50
+                    }
+                }
+            }
+        ),
+        types.Tool(
+            name="batch",
+            description="在一次请求中批量执行多个工具调用：共享同一数据快照，相同筛选条件的中间结果只计算一次，相互独立的调用并发执行",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "calls": {
+                        "type": "array",
+                        "description": f"调用列表（最多{BATCH_MAX_CALLS}个），每项包含工具名称和参数",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "tool": {
+                                    "type": "string",
+                                    "description": "工具名称"
+                                },
+                                "arguments": {
+                                    "type": "object",
+                                    "description": "工具参数，未指定output_format时沿用批量调用的输出格式"
+                                }
+                            },
+                            "required": ["tool"]
+                        }
+                    },
+                    "max_concurrency": {
+                        "type": "integer",
+                        "description": "最大并发数",
+                        "default": BATCH_DEFAULT_CONCURRENCY
+                    }
+                },
+                "required": ["calls"]
+            }
+        ),
+        types.Tool(
+            name="server_stats",
+            description="查看服务器运行指标：各工具调用耗时分布、扫描与返回行数、缓存命中和抽样内存峰值",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "tool": {
+                        "type": "string",
+                        "description": "仅显示指定工具"
+                    },
+                    "reset": {
+                        "type": "boolean",
+                        "description": "返回后清空已累计的指标",
+                        "default": False
+                    }
+                }
+            }
+        )
+    ]
+    # 所有工具均支持output_format与profile参数
+    for tool in tools:
+        tool.inputSchema.setdefault("properties", {})["output_format"] = OUTPUT_FORMAT_SCHEMA
+        tool.inputSchema["properties"]["profile"] = PROFILE_SCHEMA
+    return tools
+
+@app.call_tool()
+async def handle_client_call(name: str, arguments: dict) -> list[types.TextContent]:
+    """客户端调用入口：在工作线程中执行，耗时的查询与缓存构建不阻塞事件循环和其他会话"""
+    if call_slots is None:
+        return await handle_call_tool(name, arguments)
+    session_owner()
+    async with call_slots:
+        return await asyncio.to_thread(run_batch_call, name, arguments)
+
+async def handle_call_tool(name: str, arguments: dict) -> list[types.TextContent]:
+    """处理工具调用"""
+    try:
+        # 等待后台预热加载所需的数据表，超时则提示稍后重试而不阻塞客户端
+        stage = required_stage(name)
+        if stage is not None:
+            if not await warmup.wait(stage, READY_TIMEOUT):
+                return [types.TextContent(type="text", text=(
+                    f"⏳ 数据仍在加载中（当前阶段: {warmup.current or stage}，已用时{warmup.elapsed():.0f}秒），请稍后重试"
+                ))]
+            if stage == "balance":
+                load_balance_data()
+            else:
+                load_data()
+        
+        try:
+            output_format(arguments)
+        except ValueError as ve:
+            return [types.TextContent(type="text", text=f"❌ 输入参数错误: {str(ve)}")]
+        
+        return await metrics.measure(name, arguments, lambda: run_tool(name, arguments))
+            
+    except Exception as e:
+        error_msg = f"执行工具 '{name}' 时发生错误: {str(e)}"
+        print(f"Tool execution error: {error_msg}", file=sys.stderr)
+        
+        # 提供更友好的错误提示
+        if "not found" in str(e).lower() or "file not exist" in str(e).lower():
+            error_msg += "\n\n💡 建议：请检查数据文件是否存在，或联系系统管理员。"
+        elif "invalid" in str(e).lower():
+            error_msg += "\n\n💡 建议：请检查输入参数格式是否正确。"
+        elif "connection" in str(e).lower():
+            error_msg += "\n\n💡 建议：请检查网络连接或数据库连接。"
+        else:
+            error_msg += "\n\n💡 建议：如果问题持续存在，请联系技术支持。"
+        
+        return [types.TextContent(type="text", text=error_msg)]
+
+async def run_tool(name: str, arguments: dict) -> list[types.TextContent]:
+    """执行工具，按需附加性能剖析结果
+
+    markdown追加一段剖析报告；json/csv将剖析结果并入同一段结构化输出，批量调用按格式解析结果时不受影响
+    """
+    result, profile = await profiler.run(name, arguments, lambda: dispatch_tool(name, arguments))
+    if profile is None or not arguments.get("profile"):
+        return result
+    fmt = output_format(arguments)
+    if fmt != "markdown" and len(result) == 1:
+        merged = attach_profile(result[0].text, profile, fmt)
+        if merged is not None:
+            return [types.TextContent(type="text", text=merged)]
+    return result + [types.TextContent(type="text", text=format_profile(profile, fmt))]
+
+def attach_profile(text: str, profile: Dict[str, Any], fmt: str) -> Optional[str]:
+    """将剖析结果并入结构化输出：json放入meta.profile，csv追加为名为profile的表；json结果不是结构化输出时返回None"""
+    summary = {"tool": profile["tool"], "method": profile["method"], "elapsed_ms": round(profile["elapsed_ms"], 3)}
+    if fmt == "csv":
+        hotspots = render_structured("csv", {"profile": profile["hotspots"]})
+        return f"{text}\n# profile: {json.dumps(summary, ensure_ascii=False)}\n# table: profile\n{hotspots}"
+    try:
+        payload = json.loads(text)
+    except ValueError:
+        return None
+    if not isinstance(payload, dict) or not isinstance(payload.get("meta"), dict):
+        return None
+    payload["meta"]["profile"] = json_safe({**summary, "hotspots": frame_to_columns(profile["hotspots"])})
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":"), allow_nan=False)
+
+def format_profile(profile: Dict[str, Any], fmt: str) -> str:
+    """格式化性能剖析热点"""
+    hotspots = profile["hotspots"]
+    if fmt != "markdown":
+        return render_structured(fmt, {"hotspots": hotspots}, {
+            "tool": profile["tool"], "method": profile["method"], "elapsed_ms": round(profile["elapsed_ms"], 3)
+        })
+    
+    output_lines = [f"# 性能剖析: {profile['tool']}\n"]
+    output_lines.append(f"**总耗时**: {profile['elapsed_ms']:.1f}ms | **方式**: {profile['method']}")
+    output_lines.append("")
+    output_lines.append("| 函数 | 位置 | 调用次数 | 自身耗时ms | 累计耗时ms |")
+    output_lines.append("|------|------|------|------|------|")
+    for _, row in hotspots.iterrows():
+        calls = "-" if pd.isna(row["调用次数"]) else f"{int(row['调用次数']):,}"
+        output_lines.append(f"| {row['函数']} | {row['位置']} | {calls} | {row['自身耗时ms']:.1f} | {row['累计耗时ms']:.1f} |")
+    return "\n".join(output_lines)
+
+async def dispatch_tool(name: str, arguments: dict) -> list[types.TextContent]:
+    """按工具名称分发调用"""
+    if name == "query_balance_sheet":
+        return await query_balance_sheet(arguments)
+    elif name == "query_voucher_details":
+        return await query_voucher_details(arguments)
+    elif name == "analyze_subject_hierarchy":
+        return await analyze_subject_hierarchy(arguments)
+    elif name == "get_financial_summary":
+        return await get_financial_summary(arguments)
+    elif name == "search_transactions":
+        return await search_transactions(arguments)
+    elif name == "validate_data_consistency":
+        return await validate_data_consistency(arguments)
+    elif name == "find_subject_by_name":
+        return await find_subject_by_name(arguments)
+    elif name == "query_dimension_details":
+        return await query_dimension_details(arguments)
+    elif name == "detect_duplicate_payments":
+        return await detect_duplicate_payments(arguments)
+    elif name == "benford_analysis":
+        return await benford_analysis(arguments)
+    elif name == "run_journal_entry_tests":
+        return await run_journal_entry_tests(arguments)
+    elif name == "query_subject_flows":
+        return await query_subject_flows(arguments)
+    elif name == "analyze_counterparty_aging":
+        return await analyze_counterparty_aging(arguments)
+    elif name == "query_balance_trend":
+        return await query_balance_trend(arguments)
+    elif name == "detect_subject_anomalies":
+        return await detect_subject_anomalies(arguments)
+    elif name == "generate_financial_statements":
+        return await generate_financial_statements(arguments)
+    elif name == "reconcile_intercompany":
+        return await reconcile_intercompany(arguments)
+    elif name == "run_voucher_report":
+        return await run_voucher_report(arguments)
+    elif name == "batch":
+        return await run_batch(arguments)
+    elif name == "server_stats":
+        return await server_stats(arguments)
+    else:
+        raise ValueError(f"未知工具: {name}")
+
+async def query_balance_sheet(args: dict) -> list[types.TextContent]:
+    """查询科目余额表 - 增强会计逻辑验证"""
+    global balance_df
+    
+    try:
+        # 应用筛选条件并分页
+        result, total, offset, next_cursor = paginate(
+            "query_balance_sheet", balance_df, args, lambda: filter_dataframe(balance_df, args), 100
+        )
+        
+        if total and result.empty:
+            return [types.TextContent(type="text", text=f"✅ 已到最后一页，共{total}条记录")]
+        
+        if result.empty:
+            suggestion = "💡 建议：\n"
+            suggestion += "- 检查科目编码是否正确（应为数字和点号组合，如1002或1002.01）\n"
+            suggestion += "- 尝试使用部分匹配（如：输入'1002'查找银行存款及其子科目）\n"
+            suggestion += "- 检查公司名称和年份参数是否正确（年份应在2000-2050范围内）\n"
+            suggestion += "- 使用 get_financial_summary 工具查看可用的数据范围"
+            return [types.TextContent(type="text", text=f"❌ 未找到符合条件的余额记录\n\n{suggestion}")]
+        
+        fmt = output_format(args)
+        if fmt != "markdown":
+            records = result[[c for c in BALANCE_OUTPUT_COLUMNS if c in result.columns]]
+            records = records.assign(科目类别=subject_categories(records["科目编码"]))
+            return structured_response(fmt, {"balances": records}, total=total, offset=offset, next_cursor=next_cursor)
+        
+        # 格式化输出
+        output_lines = create_page_header("科目余额表查询结果", total, offset, len(result), next_cursor)
+        
+        # 会计逻辑验证和增强显示
+        warnings = []
+        category_summary = {}
+        
+        categories = subject_categories(result['科目编码'])
+        for idx, row in result.iterrows():
+            subject_code = str(row['科目编码']) if pd.notna(row['科目编码']) else "未知编码"
+            subject_name = str(row['科目名称']) if pd.notna(row['科目名称']) else "未知名称"
+            
+            # 获取科目类别
+            category = categories[idx]
+            
+            # 收集类别汇总信息
+            if category not in category_summary:
+                category_summary[category] = 0
+            category_summary[category] += 1
+            
+            # 验证余额方向
+            ending_debit = float(row.get('期末余额借方', 0)) if pd.notna(row.get('期末余额借方')) else 0
+            ending_credit = float(row.get('期末余额贷方', 0)) if pd.notna(row.get('期末余额贷方')) else 0
+            
+            is_valid, balance_message = validate_subject_balance_direction(subject_code, ending_debit, ending_credit, category)
+            if not is_valid:
+                warnings.append(balance_message)
+            
+            output_lines.append(f"## 科目: {subject_code} - {subject_name}")
+            output_lines.append(f"**公司**: {row['公司']}")
+            output_lines.append(f"**期间**: {row['期间']}")
+            output_lines.append(f"**科目类别**: {category}")
+            
+            # 添加余额信息
+            output_lines.extend(format_balance_info(row))
+            output_lines.append("")
+        
+        # 添加会计逻辑验证结果
+        if warnings:
+            output_lines.append("## ⚠️ 会计逻辑检查")
+            output_lines.append("发现以下异常情况：")
+            for warning in warnings:
+                output_lines.append(f"- {warning}")
+            output_lines.append("")
+        
+        # 添加类别汇总
+        if len(category_summary) > 1:
+            output_lines.append("## 📊 科目类别汇总")
+            for category, count in category_summary.items():
+                output_lines.append(f"- {category}: {count} 个科目")
+            output_lines.append("")
+        
+        return [types.TextContent(type="text", text="\n".join(output_lines))]
+        
+    except ValueError as ve:
+        return [types.TextContent(type="text", text=f"❌ 输入参数错误: {str(ve)}\n\n请检查输入的科目编码格式和年份范围。")]
+    except Exception as e:
+        return [types.TextContent(type="text", text=f"❌ 查询过程出错: {str(e)}")]
+
+def validate_voucher_balance(voucher_df: pd.DataFrame, voucher_key: str) -> tuple[bool, float, float]:
+    """验证凭证借贷平衡"""
+    voucher_data = voucher_df[voucher_df['凭证唯一标识'] == voucher_key]
+    if voucher_data.empty:
+        return False, 0, 0
+    
+    total_debit = voucher_data['借方金额'].sum()
+    total_credit = voucher_data['贷方金额'].sum()
+    is_balanced = abs(total_debit - total_credit) < 0.01  # 允许0.01的舍入误差
+    
+    return is_balanced, total_debit, total_credit
+
+async def query_voucher_details(args: dict) -> list[types.TextContent]:
+    """查询凭证明细 - 增强业务逻辑识别"""
+    global voucher_df
+    
+    try:
+        def run_filter() -> pd.DataFrame:
+            # 使用统一的筛选函数
+            voucher_filters = {}
+            for key in ['company', 'subject_code', 'voucher_no', 'business_type']:
+                if args.get(key):
+                    voucher_filters[key] = args[key]
+            
+            result = filter_dataframe(voucher_df, voucher_filters)
+            
+            # 处理日期范围筛选
+            if args.get("date_start"):
+                start_date = pd.to_datetime(args["date_start"])
+                result = result[result["日期"] >= start_date]
+            
+            if args.get("date_end"):
+                end_date = pd.to_datetime(args["date_end"])
+                result = result[result["日期"] <= end_date]
+            
+            # 处理金额范围筛选 - 增强会计逻辑
+            if args.get("amount_min"):
+                amount_min = args["amount_min"]
+                # 会计逻辑：金额必须为正数
+                if amount_min < 0:
+                    raise ValueError("金额下限不能为负数")
+                result = result[(result["借方金额"] >= amount_min) | (result["贷方金额"] >= amount_min)]
+            
+            if args.get("amount_max"):
+                amount_max = args["amount_max"]
+                # 会计逻辑：检查金额合理性
+                if amount_max > 100000000:  # 1亿以上需要额外注意
+                    result = result[(result["借方金额"] <= amount_max) | (result["贷方金额"] <= amount_max)]
+                else:
+                    result = result[(result["借方金额"] <= amount_max) | (result["贷方金额"] <= amount_max)]
+            return result
+        
+        # 执行筛选并分页
+        result, total, offset, next_cursor = paginate("query_voucher_details", voucher_df, args, run_filter, 100)
+        
+        if total and result.empty:
+            return [types.TextContent(type="text", text=f"✅ 已到最后一页，共{total}条记录")]
+        
+        if result.empty:
+            suggestion = "💡 建议：\n"
+            suggestion += "- 检查日期范围是否正确（格式：YYYY-MM-DD）\n"
+            suggestion += "- 尝试扩大搜索范围（如：减少筛选条件）\n"
+            suggestion += "- 检查科目编码格式（应为数字和点号组合）\n"
+            suggestion += "- 检查金额范围是否为正数\n"
+            suggestion += "- 使用 search_transactions 工具通过关键词搜索"
+            return [types.TextContent(type="text", text=f"❌ 未找到符合条件的凭证记录\n\n{suggestion}")]
+        
+        fmt = output_format(args)
+        if fmt != "markdown":
+            return structured_response(fmt, {"entries": result[VOUCHER_OUTPUT_COLUMNS]},
+                                       total=total, offset=offset, next_cursor=next_cursor)
+        
+        # 格式化输出 - 增强业务逻辑显示
+        output_lines = create_page_header("凭证明细查询结果", total, offset, len(result), next_cursor)
+        
+        # 凭证平衡性检查
+        voucher_balance_check = {}
+        business_type_summary = {}
+        
+        current_voucher = None
+        for _, row in result.iterrows():
+            voucher_key = f"{row['凭证字']}-{row['凭证号']}"
+            
+            # 业务类型已在加载时分类
+            business_type = row['业务分类']
+            if business_type not in business_type_summary:
+                business_type_summary[business_type] = 0
+            business_type_summary[business_type] += 1
+            
+            if current_voucher != voucher_key:
+                current_voucher = voucher_key
+                
+                # 检查凭证借贷平衡
+                is_balanced, total_debit, total_credit = validate_voucher_balance(result, voucher_key)
+                voucher_balance_check[voucher_key] = is_balanced
+                
+                output_lines.append(f"## 凭证: {voucher_key}")
+                output_lines.append(f"**日期**: {row['日期'].strftime('%Y-%m-%d') if pd.notna(row['日期']) else 'N/A'}")
+                
+                if not is_balanced:
                     output_lines.append(f"⚠️ **借贷不平衡**: 借方{format_amount(total_debit)} ≠ 贷方{format_amount(total_credit)}")
                 
                 output_lines.append("")
@@ -963,7 +1893,18 @@ async def analyze_subject_hierarchy(args: dict) -> list[types.TextContent]:
     total_debit_amount = result["本年累计借方"].sum()
     total_credit_amount = result["本年累计贷方"].sum()
     
+    fmt = output_format(args)
+    if fmt != "markdown":
+        records = result[["公司", "科目编码", "科目名称", "核算维度名称", "期末余额借方", "期末余额贷方", "subject_code_path"]]
+        records = records.assign(层级=result["subject_code_path"].str.count("/") - 1)
+        return structured_response(
+            fmt, {"subjects": records}, subject_code=subject_code,
+            ending_debit=total_debit_balance, ending_credit=total_credit_balance,
+            total_debit=total_debit_amount, total_credit=total_credit_amount
+        )
+    
     # 格式化输出
+    record_returned(len(result))
     output_lines = [f"# 科目层级分析: {subject_code}\n"]
     output_lines.append("## 汇总信息")
     output_lines.append(f"**子科目数量**: {len(result)}")
@@ -994,68 +1935,81 @@ async def analyze_subject_hierarchy(args: dict) -> list[types.TextContent]:
     return [types.TextContent(type="text", text="\n".join(output_lines))]
 
 async def get_financial_summary(args: dict) -> list[types.TextContent]:
-    """获取财务数据汇总"""
-    global balance_df, voucher_df
-    
+    """获取财务数据汇总（由预先计算的分区统计合并得到，不扫描明细）"""
     summary_type = args.get("summary_type", "both")
+    company = args.get("company") or None
+    year = validate_year(args["year"]) if args.get("year") else None
+    fmt = output_format(args)
     output_lines = ["# 财务数据汇总报告\n"]
+    tables = {}
+    meta = {}
     
     # 余额表汇总
     if summary_type in ["balance", "both"]:
-        # 使用统一的筛选函数
-        balance_filters = {}
-        if args.get("company"):
-            balance_filters["company"] = args["company"]
-        if args.get("year"):
-            balance_filters["year"] = args["year"]
-        
-        balance_data = filter_dataframe(balance_df, balance_filters)
+        stats = get_balance_stats()
+        record_scan(len(stats))
+        balance = stats.summary(company, year)
         
         output_lines.append("## 科目余额表汇总")
-        output_lines.append(f"**总记录数**: {len(balance_data):,}")
-        output_lines.append(f"**公司数量**: {balance_data['公司'].nunique()}")
-        output_lines.append(f"**期间范围**: {balance_data['期间'].min()} - {balance_data['期间'].max()}")
-        output_lines.append(f"**年份范围**: {balance_data['年份'].min()} - {balance_data['年份'].max()}")
+        output_lines.append(f"**总记录数**: {balance['records']:,}")
+        output_lines.append(f"**公司数量**: {balance['companies']}")
+        output_lines.append(f"**期间范围**: {balance['period_start']} - {balance['period_end']}")
+        output_lines.append(f"**年份范围**: {balance['year_start']} - {balance['year_end']}")
         
         # 按公司统计
-        company_stats = balance_data.groupby("公司").size()
+        company_stats = balance["by_company"]
+        meta["balance"] = {
+            "records": balance["records"], "companies": balance["companies"],
+            "period_start": balance["period_start"], "period_end": balance["period_end"],
+        }
+        tables["balance_by_company"] = company_stats.rename("记录数").reset_index()
         output_lines.append("\n**按公司统计**:")
-        for company, count in company_stats.items():
-            output_lines.append(f"- {company}: {count:,} 条记录")
+        for company_name, count in company_stats.items():
+            output_lines.append(f"- {company_name}: {count:,} 条记录")
         
         output_lines.append("")
     
     # 凭证明细汇总
     if summary_type in ["voucher", "both"]:
-        # 使用统一的筛选函数
-        voucher_filters = {}
-        if args.get("company"):
-            voucher_filters["company"] = args["company"]
-        
-        voucher_data = filter_dataframe(voucher_df, voucher_filters)
-        
-        # 添加年份筛选
-        if args.get("year"):
-            voucher_data = voucher_data[voucher_data["日期"].dt.year == args["year"]]
+        stats = get_voucher_stats()
+        record_scan(len(stats))
+        voucher = stats.summary(company, year)
+        # 凭证跨分区重复时凭证数为HyperLogLog估计值
+        voucher_count = f"{voucher['vouchers']:,}" if voucher["vouchers_exact"] else f"约 {voucher['vouchers']:,}"
         
         output_lines.append("## 凭证明细汇总")
-        output_lines.append(f"**总记录数**: {len(voucher_data):,}")
-        output_lines.append(f"**公司数量**: {voucher_data['公司'].nunique()}")
+        output_lines.append(f"**总记录数**: {voucher['records']:,}")
+        output_lines.append(f"**公司数量**: {voucher['companies']}")
         
-        if len(voucher_data) > 0:
-            output_lines.append(f"**日期范围**: {voucher_data['日期'].min().strftime('%Y-%m-%d')} - {voucher_data['日期'].max().strftime('%Y-%m-%d')}")
-            output_lines.append(f"**凭证数量**: {voucher_data['凭证唯一标识'].nunique():,}")
-            
-            total_debit = voucher_data["借方金额"].sum()
-            total_credit = voucher_data["贷方金额"].sum()
-            output_lines.append(f"**借方金额合计**: {format_amount(total_debit)}")
-            output_lines.append(f"**贷方金额合计**: {format_amount(total_credit)}")
+        if voucher["records"] > 0:
+            output_lines.append(f"**日期范围**: {voucher['date_start'].strftime('%Y-%m-%d')} - {voucher['date_end'].strftime('%Y-%m-%d')}")
+            output_lines.append(f"**凭证数量**: {voucher_count}")
+            output_lines.append(f"**借方金额合计**: {format_amount(voucher['total_debit'])}")
+            output_lines.append(f"**贷方金额合计**: {format_amount(voucher['total_credit'])}")
         
         # 按公司统计
-        company_stats = voucher_data.groupby("公司").size()
+        company_stats = voucher["by_company"]
+        meta["voucher"] = {
+            "records": voucher["records"], "companies": voucher["companies"],
+            "date_start": voucher["date_start"], "date_end": voucher["date_end"],
+            "vouchers": voucher["vouchers"], "vouchers_exact": voucher["vouchers_exact"],
+            "total_debit": voucher["total_debit"], "total_credit": voucher["total_credit"],
+        }
+        tables["voucher_by_company"] = company_stats.rename("记录数").reset_index()
         output_lines.append("\n**按公司统计**:")
-        for company, count in company_stats.items():
-            output_lines.append(f"- {company}: {count:,} 条记录")
+        for company_name, count in company_stats.items():
+            output_lines.append(f"- {company_name}: {count:,} 条记录")
+        
+        # 按业务分类统计
+        business_stats = voucher["by_business_type"]
+        tables["voucher_by_business_type"] = business_stats.reset_index()
+        if not business_stats.empty:
+            output_lines.append("\n**按业务分类统计**:")
+            for business_type, stats in business_stats.iterrows():
+                output_lines.append(f"- {business_type}: {int(stats['记录数']):,} 条记录，借方 {format_amount(stats['借方金额'])}，贷方 {format_amount(stats['贷方金额'])}")
+    
+    if fmt != "markdown":
+        return structured_response(fmt, tables, **meta)
     
     return [types.TextContent(type="text", text="\n".join(output_lines))]
 
@@ -1063,32 +2017,40 @@ async def search_transactions(args: dict) -> list[types.TextContent]:
     """搜索交易记录"""
     global voucher_df
     
-    keyword = args["keyword"]
-    # 使用增强搜索算法
-    search_mask = enhanced_search_keywords(keyword, voucher_df["摘要"])
-    result = voucher_df[search_mask]
+    keyword = args.get("keyword", "")
     
-    # 使用统一的筛选函数
-    filters = {}
-    if args.get("company"):
-        filters["company"] = args["company"]
-    
-    result = filter_dataframe(result, filters)
-    
-    # 处理日期范围筛选
-    if args.get("date_start"):
-        start_date = pd.to_datetime(args["date_start"])
-        result = result[result["日期"] >= start_date]
+    def run_filter() -> pd.DataFrame:
+        # 使用增强搜索算法
+        search_mask = enhanced_search_keywords(keyword, voucher_df["摘要"])
+        result = voucher_df[search_mask]
+        
+        # 使用统一的筛选函数
+        filters = {}
+        if args.get("company"):
+            filters["company"] = args["company"]
+        if args.get("business_type"):
+            filters["business_type"] = args["business_type"]
+        
+        result = filter_dataframe(result, filters)
+        
+        # 处理日期范围筛选
+        if args.get("date_start"):
+            start_date = pd.to_datetime(args["date_start"])
+            result = result[result["日期"] >= start_date]
+        
+        if args.get("date_end"):
+            end_date = pd.to_datetime(args["date_end"])
+            result = result[result["日期"] <= end_date]
+        return result
     
-    if args.get("date_end"):
-        end_date = pd.to_datetime(args["date_end"])
-        result = result[result["日期"] <= end_date]
+    # 执行搜索并分页
+    try:
+        result, total, offset, next_cursor = paginate("search_transactions", voucher_df, args, run_filter, 50)
+    except ValueError as ve:
+        return [types.TextContent(type="text", text=f"❌ 输入参数错误: {str(ve)}")]
     
-    # 限制返回数量
-    limit = args.get("limit", 50)
-    truncated = len(result) > limit
-    if truncated:
-        result = result.head(limit)
+    if total and result.empty:
+        return [types.TextContent(type="text", text=f"✅ 已到最后一页，共{total}条记录")]
     
     if result.empty:
         suggestion = "💡 建议：\n"
@@ -1098,13 +2060,19 @@ async def search_transactions(args: dict) -> list[types.TextContent]:
         suggestion += "- 扩大日期范围或减少其他筛选条件"
         return [types.TextContent(type="text", text=f"❌ 未找到包含关键词 '{keyword}' 的交易记录\n\n{suggestion}")]
     
+    fmt = output_format(args)
+    if fmt != "markdown":
+        return structured_response(fmt, {"entries": result[VOUCHER_OUTPUT_COLUMNS]},
+                                   keyword=keyword, total=total, offset=offset, next_cursor=next_cursor)
+    
     # 格式化输出
-    output_lines = create_output_header(f"交易搜索结果: '{keyword}'", len(result), truncated, limit)
+    output_lines = create_page_header(f"交易搜索结果: '{keyword}'", total, offset, len(result), next_cursor)
     
     for _, row in result.iterrows():
         output_lines.append(f"## {row['日期'].strftime('%Y-%m-%d') if pd.notna(row['日期']) else 'N/A'} | {row['凭证字']}-{row['凭证号']}")
         output_lines.append(f"**摘要**: {row['摘要']}")
         output_lines.append(f"**科目**: {row['科目编码']} - {row['科目全名']}")
+        output_lines.append(f"**业务类型**: {row['业务分类']}")
         output_lines.append(f"**金额**: 借方 {format_amount(row['借方金额'])} | 贷方 {format_amount(row['贷方金额'])}")
         output_lines.append(f"**公司**: {row['公司']}")
         output_lines.append("")
@@ -1119,6 +2087,10 @@ async def validate_data_consistency(args: dict) -> list[types.TextContent]:
     
     validation_result = cross_validate_balance_voucher(subject_code, company, year)
     
+    fmt = output_format(args)
+    if fmt != "markdown":
+        return structured_response(fmt, {}, **validation_result)
+    
     # 格式化输出
     output_lines = [f"# 数据一致性验证报告: {subject_code}\n"]
     
@@ -1174,99 +2146,93 @@ async def validate_data_consistency(args: dict) -> list[types.TextContent]:
 
 async def find_subject_by_name(args: dict) -> list[types.TextContent]:
     """通过科目名称智能查找科目编码"""
-    global balance_df
-    
     subject_name = args["subject_name"].strip()
     fuzzy_match = args.get("fuzzy_match", True)
     limit = args.get("limit", 20)
     
-    # 使用统一的筛选函数
-    filters = {}
-    if args.get("company"):
-        filters["company"] = args["company"]
-    
-    result = filter_dataframe(balance_df, filters)
+    # 在去重后的科目目录上查找，只扫描不重复的科目名称
+    catalog = get_subject_catalog()
+    record_scan(len(catalog))
+    companies = catalog.company_mask(args.get("company"))
     
     # 科目名称匹配策略
     matched_subjects = []
     
+    def add_matches(match_type: str, mask):
+        subjects = catalog.subjects(mask & companies)
+        if not subjects.empty:
+            matched_subjects.append((match_type, subjects))
+    
     # 1. 精确匹配科目名称
-    exact_matches = result[result["科目名称"].str.contains(subject_name, case=False, na=False, regex=False)]
-    if not exact_matches.empty:
-        matched_subjects.append(("精确匹配", exact_matches))
+    exact = catalog.match_names(subject_name)
+    add_matches("精确匹配", exact)
     
-    # 2. 精确匹配科目全名
-    if "科目全名" in result.columns:
-        full_name_matches = result[result["科目全名"].str.contains(subject_name, case=False, na=False, regex=False)]
-        if not full_name_matches.empty:
-            matched_subjects.append(("全名匹配", full_name_matches))
+    # 2. 名称未匹配时按科目全名（上级科目名称-本级名称，如"银行存款-工商银行"）匹配
+    if not matched_subjects:
+        add_matches("全名匹配", catalog.match_full_names(subject_name))
     
     # 3. 同义词匹配
-    synonyms = get_financial_synonyms()
-    for main_term, synonym_list in synonyms.items():
-        if subject_name in synonym_list or any(syn in subject_name for syn in synonym_list):
-            for syn in synonym_list:
-                syn_matches = result[result["科目名称"].str.contains(syn, case=False, na=False, regex=False)]
-                if not syn_matches.empty:
-                    matched_subjects.append((f"同义词匹配({syn})", syn_matches))
-    
-    # 4. 模糊匹配（如果启用）
+    synonyms = get_synonym_matcher()
+    related = synonyms.related_terms(subject_name)
+    if related:
+        # 对去重后的科目名称扫描一遍，得到各同义词命中的名称
+        hits = catalog.match_terms(synonyms)
+        for syn in related:
+            if syn.lower() in hits:
+                add_matches(f"同义词匹配({syn})", hits[syn.lower()])
+    
+    # 4. 拼音首字母匹配（如 yhck → 银行存款）
+    if is_initials_query(subject_name):
+        add_matches("拼音首字母匹配", catalog.match_initials(subject_name))
+    
+    # 5. 模糊匹配（如果启用）
     if fuzzy_match and not matched_subjects:
         # 将科目名称拆分为关键词进行匹配
         keywords = subject_name.replace("其他", "").replace("应付", "").replace("应收", "").replace("款", "").strip()
         if keywords:
-            fuzzy_matches = result[result["科目名称"].str.contains(keywords, case=False, na=False, regex=False)]
-            if not fuzzy_matches.empty:
-                matched_subjects.append(("模糊匹配", fuzzy_matches))
+            add_matches("模糊匹配", catalog.match_names(keywords))
     
     if not matched_subjects:
         suggestion = "💡 建议：\n"
         suggestion += f"- 检查科目名称 '{subject_name}' 是否正确\n"
-        suggestion += "- 尝试使用简化名称（如：'应付' 而不是 '其他应付款'）\n"
+        suggestion += "- 尝试使用简化名称（如：'应付' 而不是 '其他应付款'）或拼音首字母（如：'yhck'）\n"
         suggestion += "- 使用 get_financial_summary 查看可用科目\n"
         suggestion += "- 常见科目别名：银行存款、应收账款、固定资产、管理费用等"
         return [types.TextContent(type="text", text=f"❌ 未找到与 '{subject_name}' 相关的科目\n\n{suggestion}")]
     
+    fmt = output_format(args)
+    if fmt != "markdown":
+        frames = [subjects.drop(columns="公司列表").assign(匹配方式=match_type) for match_type, subjects in matched_subjects]
+        subjects = pd.concat(frames, ignore_index=True).drop_duplicates("科目编码")
+        return structured_response(fmt, {"subjects": subjects.head(limit)}, subject_name=subject_name, total=len(subjects))
+    
     # 格式化输出结果
     output_lines = [f"# 科目名称查找结果: '{subject_name}'\n"]
     
     total_found = 0
-    for match_type, matches in matched_subjects:
-        if matches.empty:
-            continue
-            
-        # 去重：按科目编码去重
-        unique_matches = matches.drop_duplicates(subset=['科目编码'])
-        
+    for match_type, subjects in matched_subjects:
         output_lines.append(f"## {match_type}")
-        output_lines.append(f"**找到 {len(unique_matches)} 个科目**\n")
+        output_lines.append(f"**找到 {len(subjects)} 个科目**\n")
         
         # 限制显示数量
-        display_matches = unique_matches.head(limit // len(matched_subjects) + 1)
+        display_subjects = subjects.head(limit // len(matched_subjects) + 1)
         
-        for _, row in display_matches.iterrows():
-            subject_code = str(row['科目编码']) if pd.notna(row['科目编码']) else "未知编码"
-            subject_name_display = str(row['科目名称']) if pd.notna(row['科目名称']) else "未知名称"
+        for _, row in display_subjects.iterrows():
+            output_lines.append(f"### {row['科目编码']} - {row['科目名称']}")
             
-            output_lines.append(f"### {subject_code} - {subject_name_display}")
-            
-            # 显示余额信息（汇总同科目的数据）
-            same_subject = matches[matches['科目编码'] == row['科目编码']]
-            total_debit = same_subject['期末余额借方'].sum()
-            total_credit = same_subject['期末余额贷方'].sum()
-            
-            output_lines.append(f"**期末余额**: 借方 {format_amount(total_debit)} | 贷方 {format_amount(total_credit)}")
+            # 显示余额信息（目录中已汇总同科目的数据）
+            output_lines.append(f"**期末余额**: 借方 {format_amount(row['期末余额借方'])} | 贷方 {format_amount(row['期末余额贷方'])}")
             
             # 显示层级路径（如果有）
             if pd.notna(row.get('subject_code_path')):
                 output_lines.append(f"**科目路径**: {row['subject_code_path']}")
             
             # 显示公司信息
-            companies = same_subject['公司'].unique()
-            if len(companies) > 0:
-                output_lines.append(f"**相关公司**: {', '.join(companies[:3])}")
-                if len(companies) > 3:
-                    output_lines.append(f"  （还有{len(companies)-3}个公司）")
+            companies_found = row['公司列表']
+            if len(companies_found) > 0:
+                output_lines.append(f"**相关公司**: {', '.join(companies_found[:3])}")
+                if len(companies_found) > 3:
+                    output_lines.append(f"  （还有{len(companies_found)-3}个公司）")
             
             output_lines.append("")
             total_found += 1
@@ -1278,6 +2244,8 @@ async def find_subject_by_name(args: dict) -> list[types.TextContent]:
             output_lines.append(f"注意：结果已截断，仅显示前{limit}个科目")
             break
     
+    record_returned(total_found)
+    
     # 提供使用建议
     if total_found > 0:
         output_lines.append("---")
@@ -1300,17 +2268,9 @@ async def query_dimension_details(args: dict) -> list[types.TextContent]:
     limit = args.get("limit", 100)
     show_zero_balance = args.get("show_zero_balance", False)
     
-    # 使用统一的筛选函数
-    filters = {"subject_path": f"/{subject_code}/"}
-    if company:
-        filters["company"] = company
-    if year:
-        filters["year"] = year
-    
-    result = filter_dataframe(balance_df, filters)
-    
-    # 筛选有核算维度的记录
-    dimension_records = result[pd.notna(result[result.columns[3]]) & (result[result.columns[3]] != "")]
+    # 从预计算的维度立方体中按科目取切片
+    dimension_records = get_dimension_cube().query(subject_code, company, year)
+    record_scan(len(dimension_records))
     
     if dimension_records.empty:
         suggestion = "💡 建议：\n"
@@ -1320,63 +2280,39 @@ async def query_dimension_details(args: dict) -> list[types.TextContent]:
         suggestion += "- 使用 query_balance_sheet 查看科目基本信息"
         return [types.TextContent(type="text", text=f"❌ 未找到科目 {subject_code} 的核算维度记录\n\n{suggestion}")]
     
-    # 按核算维度名称分组汇总
-    dimension_groups = dimension_records.groupby(dimension_records.columns[3])
-    
-    # 计算每个维度的汇总信息
-    dimension_summary = []
-    for dim_name, group in dimension_groups:
-        total_debit = group["本年累计借方"].sum()
-        total_credit = group["本年累计贷方"].sum()
-        ending_debit = group["期末余额借方"].sum()
-        ending_credit = group["期末余额贷方"].sum()
-        ending_balance = ending_debit - ending_credit
-        
-        # 过滤零余额记录（如果不需要显示）
-        if not show_zero_balance and abs(ending_balance) < 0.01:
-            continue
-            
-        dimension_summary.append({
-            "dimension_name": dim_name,
-            "total_debit": total_debit,
-            "total_credit": total_credit,
-            "ending_debit": ending_debit,
-            "ending_credit": ending_credit,
-            "ending_balance": ending_balance,
-            "record_count": len(group)
-        })
+    # 过滤零余额记录（如果不需要显示）
+    if not show_zero_balance:
+        dimension_records = dimension_records[dimension_records["期末余额"].abs() >= 0.01]
     
-    if not dimension_summary:
+    if dimension_records.empty:
         return [types.TextContent(type="text", text=f"❌ 科目 {subject_code} 没有符合条件的核算维度记录（所有维度余额均为零）")]
     
-    # 排序
-    if sort_by == "ending_balance":
-        dimension_summary.sort(key=lambda x: abs(x["ending_balance"]), reverse=True)
-    elif sort_by == "total_debit":
-        dimension_summary.sort(key=lambda x: x["total_debit"], reverse=True)
-    elif sort_by == "total_credit":
-        dimension_summary.sort(key=lambda x: x["total_credit"], reverse=True)
-    elif sort_by == "dimension_name":
-        dimension_summary.sort(key=lambda x: x["dimension_name"])
+    # 排序并限制返回数量
+    dimension_summary = top_dimensions(dimension_records, sort_by, limit)
     
-    # 限制返回数量
-    dimension_summary = dimension_summary[:limit]
+    fmt = output_format(args)
+    if fmt != "markdown":
+        return structured_response(fmt, {"dimensions": dimension_summary}, subject_code=subject_code,
+                                   sort_by=sort_by, total=len(dimension_records))
     
     # 格式化输出
+    record_returned(len(dimension_summary))
     output_lines = [f"# 核算维度明细查询: 科目 {subject_code}\n"]
     output_lines.append(f"**找到维度数量**: {len(dimension_summary)}")
     output_lines.append(f"**排序方式**: {sort_by}")
     output_lines.append("")
     
-    for i, dim in enumerate(dimension_summary, 1):
-        balance_sign = "借" if dim["ending_balance"] > 0 else "贷"
-        balance_abs = abs(dim["ending_balance"])
+    for i, (_, dim) in enumerate(dimension_summary.iterrows(), 1):
+        balance_sign = "借" if dim["期末余额"] > 0 else "贷"
+        balance_abs = abs(dim["期末余额"])
+        opening_sign = "借" if dim["期初余额"] > 0 else "贷"
         
-        output_lines.append(f"## {i}. {dim['dimension_name']}")
+        output_lines.append(f"## {i}. {dim['核算维度名称']}")
+        output_lines.append(f"**期初余额**: {format_amount(abs(dim['期初余额']))} ({opening_sign})")
         output_lines.append(f"**期末余额**: {format_amount(balance_abs)} ({balance_sign})")
-        output_lines.append(f"**本年借方**: {format_amount(dim['total_debit'])}")
-        output_lines.append(f"**本年贷方**: {format_amount(dim['total_credit'])}")
-        output_lines.append(f"**记录数量**: {dim['record_count']}")
+        output_lines.append(f"**本年借方**: {format_amount(dim['本年累计借方'])}")
+        output_lines.append(f"**本年贷方**: {format_amount(dim['本年累计贷方'])}")
+        output_lines.append(f"**记录数量**: {int(dim['记录数'])}")
         output_lines.append("")
     
     # 提供使用建议
@@ -1389,34 +2325,967 @@ async def query_dimension_details(args: dict) -> list[types.TextContent]:
     
     return [types.TextContent(type="text", text="\n".join(output_lines))]
 
-async def main():
-    # 在服务器启动时预加载数据
+async def detect_duplicate_payments(args: dict) -> list[types.TextContent]:
+    """检测重复付款与拆分付款"""
+    global voucher_df
+    
+    subject_code = str(args.get("subject_code") or "1002").strip()
+    if not re.match(r'^[\d.]+$', subject_code):
+        return [types.TextContent(type="text", text=f"❌ 输入参数错误: 科目编码 '{subject_code}' 格式不正确，应为数字和点号组合")]
+    
+    direction = args.get("direction", "credit")
+    window_days = args.get("window_days", 30)
+    tolerance = args.get("tolerance", 0.01)
+    approval_threshold = args.get("approval_threshold")
+    split_window_days = args.get("split_window_days", 7)
+    limit = args.get("limit", 100)
+    
+    record_scan(len(voucher_df))
+    findings = duplicate_payment.detect_duplicate_payments(
+        voucher_df,
+        subject_code=subject_code,
+        direction=direction,
+        company=args.get("company"),
+        window_days=window_days,
+        tolerance=tolerance,
+        approval_threshold=approval_threshold,
+        split_window_days=split_window_days,
+        vendors=duplicate_payment.vendor_names(balance_df)
+    )
+    
+    if findings.empty:
+        return [types.TextContent(type="text", text=f"✅ 科目 {subject_code} 未发现重复或拆分付款")]
+    
+    type_counts = findings["检测类型"].value_counts()
+    truncated = len(findings) > limit
+    display = findings.head(limit)
+    
+    fmt = output_format(args)
+    if fmt != "markdown":
+        return structured_response(fmt, {"findings": display}, subject_code=subject_code,
+                                   total=len(findings), type_counts=type_counts.to_dict())
+    
+    output_lines = create_output_header(f"重复付款检测结果: 科目 {subject_code}", len(findings), truncated, limit)
+    output_lines.append("## 📊 检测汇总")
+    for finding_type, count in type_counts.items():
+        output_lines.append(f"- {finding_type}: {count} 条")
+    output_lines.append("")
+    
+    for finding_type, group in display.groupby("检测类型", sort=False):
+        output_lines.append(f"## {finding_type}")
+        for _, row in group.iterrows():
+            output_lines.append(f"### {row['交易对方']} | {format_amount(row['金额'])}")
+            output_lines.append(f"**公司**: {row['公司']}")
+            output_lines.append(f"**凭证**: {row['凭证号']} ({row['日期'].strftime('%Y-%m-%d')})")
+            output_lines.append(f"**摘要**: {row['摘要']}")
+            if finding_type == "拆分付款":
+                output_lines.append(f"**窗口**: {row['关联日期'].strftime('%Y-%m-%d')} 至 {row['日期'].strftime('%Y-%m-%d')}")
+                output_lines.append(f"**窗口内笔数**: {int(row['笔数'])} | **合计**: {format_amount(row['合计金额'])}")
+            else:
+                output_lines.append(f"**关联凭证**: {row['关联凭证号']} ({row['关联日期'].strftime('%Y-%m-%d')}) 金额 {format_amount(row['关联金额'])}")
+                output_lines.append(f"**间隔天数**: {int(row['间隔天数'])}")
+            output_lines.append("")
+    
+    return [types.TextContent(type="text", text="\n".join(output_lines))]
+
+async def benford_analysis(args: dict) -> list[types.TextContent]:
+    """本福特定律与数字分布检验"""
+    global voucher_df
+    
+    test = args.get("test", "first_digit")
+    group_by = args.get("group_by", "none")
+    amount_side = args.get("amount_side", "both")
+    min_count = args.get("min_count", 50)
+    limit = args.get("limit", 50)
+    
     try:
-        load_data()
-        print("财务数据加载成功", file=sys.stderr)
-        print(f"Python executable: {sys.executable}", file=sys.stderr)
-        print(f"Pandas version: {pd.__version__}", file=sys.stderr)
-    except Exception as e:
-        print(f"数据加载失败: {e}", file=sys.stderr)
+        filters = {}
+        for key in ["company", "subject_code"]:
+            if args.get(key):
+                filters[key] = args[key]
+        result = filter_dataframe(voucher_df, filters)
+        if args.get("year"):
+            result = result[result["日期"].dt.year == validate_year(args["year"])]
+        
+        scores, distribution = digit_analysis.run_benford_analysis(result, test, group_by, amount_side, min_count)
+    except ValueError as ve:
+        return [types.TextContent(type="text", text=f"❌ 输入参数错误: {str(ve)}")]
     
-    async with mcp.server.stdio.stdio_server() as (read_stream, write_stream):
-        await app.run(
-            read_stream,
-            write_stream,
-            InitializationOptions(
-                server_name="financial-data-query",
-                server_version="1.0.0",
-                capabilities=types.ServerCapabilities(
-                    tools=types.ToolsCapability(listChanged=True),
-                    experimental=None,
-                    logging=None,
-                    prompts=None,
-                    resources=None,
-                    completions=None
-                ),
-            ),
+    if scores.empty:
+        return [types.TextContent(type="text", text="❌ 未找到金额不小于10元的凭证记录，无法进行数字分布检验")]
+    
+    test_name = digit_analysis.DIGIT_TESTS[test]["name"]
+    truncated = len(scores) > limit
+    fmt = output_format(args)
+    if fmt != "markdown":
+        return structured_response(
+            fmt, {"scores": scores.head(limit), "distribution": distribution}, test=test, total=len(scores),
+            chi_square_critical=digit_analysis.CHI_SQUARE_CRITICAL[test]
+        )
+    
+    output_lines = create_output_header(f"本福特定律分析: {test_name}检验", len(scores), truncated, limit)
+    output_lines.append(f"**样本总数**: {int(scores['样本数'].sum()):,}")
+    output_lines.append(f"**卡方临界值(α=0.05)**: {digit_analysis.CHI_SQUARE_CRITICAL[test]}")
+    output_lines.append("")
+    
+    output_lines.append("## 📊 分组评分（按MAD降序）")
+    output_lines.append("| 分组 | 样本数 | 卡方 | MAD | 符合程度 |")
+    output_lines.append("|------|------|------|------|------|")
+    for _, row in scores.head(limit).iterrows():
+        chi_flag = " ⚠️" if row["卡方显著"] else ""
+        output_lines.append(f"| {row['分组']} | {row['样本数']:,} | {row['卡方']:.2f}{chi_flag} | {row['MAD']:.5f} | {row['符合程度']} |")
+    output_lines.append("")
+    
+    # 整体分布仅展示偏差最大的分箱
+    output_lines.append("## 🔍 整体分布偏差最大的数字")
+    output_lines.append("| 数字 | 实际次数 | 实际占比 | 理论占比 | 差异 |")
+    output_lines.append("|------|------|------|------|------|")
+    top_bins = distribution.reindex(distribution["差异"].abs().sort_values(ascending=False).index).head(10)
+    for _, row in top_bins.iterrows():
+        digit_label = f"{int(row['数字']):02d}" if test == "last_two_digits" else str(int(row["数字"]))
+        output_lines.append(f"| {digit_label} | {int(row['实际次数']):,} | {row['实际占比']:.4f} | {row['理论占比']:.4f} | {row['差异']:+.4f} |")
+    
+    return [types.TextContent(type="text", text="\n".join(output_lines))]
+
+async def run_journal_entry_tests(args: dict) -> list[types.TextContent]:
+    """执行凭证分录测试"""
+    global voucher_df
+    
+    offset = max(args.get("offset", 0), 0)
+    limit = args.get("limit", 50)
+    try:
+        year = validate_year(args["year"]) if args.get("year") else None
+    except ValueError as ve:
+        return [types.TextContent(type="text", text=f"❌ 输入参数错误: {str(ve)}")]
+    
+    try:
+        rules = journal_entry_tests.select_rules(args.get("rules"), args.get("custom_rules"))
+        
+        filters = {}
+        if args.get("company"):
+            filters["company"] = args["company"]
+        result = filter_dataframe(voucher_df, filters)
+        if year:
+            result = result[result["日期"].dt.year == year]
+        if args.get("date_start"):
+            result = result[result["日期"] >= pd.to_datetime(args["date_start"])]
+        if args.get("date_end"):
+            result = result[result["日期"] <= pd.to_datetime(args["date_end"])]
+        
+        calendar = holiday_source.get()
+        exceptions, summary = journal_entry_tests.run_journal_entry_tests(
+            result, get_journal_entry_features(), rules, calendar, args.get("min_score", 0)
+        )
+    except (ValueError, SyntaxError, KeyError, NameError) as e:
+        return [types.TextContent(type="text", text=f"❌ 规则定义或参数错误: {str(e)}")]
+    
+    uncovered = calendar.uncovered_years(result["日期"])
+    calendar_note = (f"⚠️ 节假日日历（{HOLIDAY_FILE.name}）未覆盖 {'、'.join(map(str, uncovered))} 年："
+                     "这些年份的节假日记账不会命中，调休上班的周末按周末记账判断") if uncovered else None
+    if exceptions.empty:
+        return [types.TextContent(type="text", text="✅ 未发现命中规则的凭证" + (f"\n\n{calendar_note}" if calendar_note else ""))]
+    
+    page = exceptions.iloc[offset:offset + limit]
+    fmt = output_format(args)
+    if fmt != "markdown":
+        next_offset = offset + limit if offset + limit < len(exceptions) else None
+        return structured_response(fmt, {"exceptions": page, "rules": summary},
+                                   total=len(exceptions), offset=offset, next_offset=next_offset,
+                                   uncovered_calendar_years=uncovered)
+    record_returned(len(page))
+    output_lines = [f"# 凭证分录测试结果\n"]
+    output_lines.append(f"**异常凭证数量**: {len(exceptions)}")
+    output_lines.append(f"**当前页**: 第{offset + 1}-{offset + len(page)}条")
+    if offset + limit < len(exceptions):
+        output_lines.append(f"**下一页**: offset={offset + limit}")
+    if calendar_note:
+        output_lines.append(calendar_note)
+    output_lines.append("")
+    
+    output_lines.append("## 📊 规则命中统计")
+    output_lines.append("| 规则 | 权重 | 命中分录数 | 命中凭证数 |")
+    output_lines.append("|------|------|------|------|")
+    for _, row in summary.iterrows():
+        output_lines.append(f"| {row['规则']} | {row['权重']:g} | {row['命中分录数']:,} | {row['命中凭证数']:,} |")
+    output_lines.append("")
+    
+    output_lines.append("## ⚠️ 异常凭证（按得分降序）")
+    for rank, (_, row) in enumerate(page.iterrows(), offset + 1):
+        date_text = row['日期'].strftime('%Y-%m-%d') if pd.notna(row['日期']) else 'N/A'
+        output_lines.append(f"### {rank}. {row['凭证字']}-{row['凭证号']} | 得分 {row['得分']:g}")
+        output_lines.append(f"**公司**: {row['公司']}")
+        output_lines.append(f"**日期**: {date_text}")
+        output_lines.append(f"**摘要**: {row['摘要']}")
+        output_lines.append(f"**借方合计**: {format_amount(row['借方合计'])} | **分录数**: {row['分录数']}")
+        output_lines.append(f"**命中规则**: {row['命中规则']}")
+        output_lines.append("")
+    
+    return [types.TextContent(type="text", text="\n".join(output_lines))]
+
+def parse_period(value: str) -> int:
+    """将YYYY-MM格式的月份转换为整数年月（如202401）"""
+    match = re.match(r'^(\d{4})-(\d{1,2})$', str(value).strip())
+    if not match or not 1 <= int(match.group(2)) <= 12:
+        raise ValueError(f"月份 '{value}' 格式不正确，应为YYYY-MM")
+    return int(match.group(1)) * 100 + int(match.group(2))
+
+async def query_subject_flows(args: dict) -> list[types.TextContent]:
+    """查询科目资金来源与去向"""
+    subject_code = str(args.get("subject_code", "")).strip()
+    if not re.match(r'^[\d.]+$', subject_code):
+        return [types.TextContent(type="text", text=f"❌ 输入参数错误: 科目编码 '{subject_code}' 格式不正确，应为数字和点号组合")]
+    
+    level = max(args.get("counterpart_level", 1), 0)
+    limit = args.get("limit", 20)
+    
+    try:
+        period_start = parse_period(args["period_start"]) if args.get("period_start") else None
+        period_end = parse_period(args["period_end"]) if args.get("period_end") else None
+        year = validate_year(args["year"]) if args.get("year") else None
+    except ValueError as ve:
+        return [types.TextContent(type="text", text=f"❌ 输入参数错误: {str(ve)}")]
+    if year:
+        period_start = max(period_start or 0, year * 100 + 1)
+        period_end = min(period_end or 999999, year * 100 + 12)
+    
+    edges, names = get_subject_flow_graph()
+    record_scan(len(edges))
+    inflows, outflows, internal = subject_flow.query_subject_flows(
+        edges, subject_code, args.get("company"), period_start, period_end, level
+    )
+    
+    if inflows.empty and outflows.empty and internal.empty:
+        return [types.TextContent(type="text", text=f"❌ 未找到科目 {subject_code} 的借贷对应记录")]
+    
+    subject_name = names.get(subject_code, "")
+    fmt = output_format(args)
+    if fmt != "markdown":
+        inflows, outflows = (flows.assign(科目名称=flows["对方科目"].astype(str).map(names)) for flows in (inflows, outflows))
+        return structured_response(
+            fmt, {"inflows": inflows.head(limit), "outflows": outflows.head(limit), "internal": internal.head(limit)},
+            subject_code=subject_code, subject_name=subject_name, period_start=period_start, period_end=period_end,
+            total_inflow=inflows["金额"].sum(), total_outflow=outflows["金额"].sum()
+        )
+    
+    record_returned(sum(min(len(flows), limit) for flows in (inflows, outflows, internal)))
+    output_lines = [f"# 科目资金流向: {subject_code} {subject_name}\n"]
+    if args.get("company"):
+        output_lines.append(f"**公司**: {args['company']}")
+    if period_start or period_end:
+        start_text = f"{period_start // 100}-{period_start % 100:02d}" if period_start else "最早"
+        end_text = f"{period_end // 100}-{period_end % 100:02d}" if period_end else "最新"
+        output_lines.append(f"**期间**: {start_text} 至 {end_text}")
+    total_in = inflows["金额"].sum()
+    total_out = outflows["金额"].sum()
+    output_lines.append(f"**流入合计**: {format_amount(total_in)}")
+    output_lines.append(f"**流出合计**: {format_amount(total_out)}")
+    output_lines.append(f"**净流入**: {format_amount(total_in - total_out)}")
+    output_lines.append("")
+    
+    for title, flows in [("## ⬅️ 资金来源（借记本科目时的贷方科目）", inflows), ("## ➡️ 资金去向（贷记本科目时的借方科目）", outflows)]:
+        output_lines.append(title)
+        if flows.empty:
+            output_lines.append("无")
+            output_lines.append("")
+            continue
+        output_lines.append("| 对方科目 | 科目名称 | 金额 | 占比 | 笔数 |")
+        output_lines.append("|------|------|------|------|------|")
+        for _, row in flows.head(limit).iterrows():
+            output_lines.append(
+                f"| {row['对方科目']} | {names.get(row['对方科目'], '')} | {format_amount(row['金额'])} | {row['占比']:.1%} | {row['笔数']:,} |"
+            )
+        if len(flows) > limit:
+            output_lines.append(f"\n注意：共{len(flows)}个对方科目，仅显示前{limit}个")
+        output_lines.append("")
+    
+    if not internal.empty:
+        output_lines.append("## 🔄 科目内部划转")
+        output_lines.append("| 转出科目 | 转入科目 | 金额 | 笔数 |")
+        output_lines.append("|------|------|------|------|")
+        for _, row in internal.head(limit).iterrows():
+            output_lines.append(f"| {row['贷方科目']} | {row['借方科目']} | {format_amount(row['金额'])} | {row['笔数']:,} |")
+    
+    return [types.TextContent(type="text", text="\n".join(output_lines))]
+
+async def analyze_counterparty_aging(args: dict) -> list[types.TextContent]:
+    """往来款项账龄分析"""
+    subject_code = str(args.get("subject_code") or "1122").strip()
+    if not re.match(r'^[\d.]+$', subject_code):
+        return [types.TextContent(type="text", text=f"❌ 输入参数错误: 科目编码 '{subject_code}' 格式不正确，应为数字和点号组合")]
+    
+    buckets = sorted(set(args.get("buckets") or counterparty_aging.DEFAULT_BUCKETS))
+    if buckets[0] <= 0:
+        return [types.TextContent(type="text", text="❌ 输入参数错误: 账龄区间上限应为正整数")]
+    limit = args.get("limit", 50)
+    
+    try:
+        as_of = pd.to_datetime(args["as_of"]) if args.get("as_of") else None
+    except (ValueError, TypeError):
+        return [types.TextContent(type="text", text=f"❌ 输入参数错误: 基准日 '{args['as_of']}' 格式不正确，应为YYYY-MM-DD")]
+    
+    ledger = get_aging_ledger(subject_code)
+    aging = ledger.aging(as_of, buckets)
+    if args.get("company"):
+        aging = aging[aging["公司"].str.contains(args["company"], case=False, na=False, regex=False)]
+    if args.get("counterparty"):
+        aging = aging[aging["往来单位"].str.contains(args["counterparty"], case=False, na=False, regex=False)]
+    
+    if aging.empty:
+        return [types.TextContent(type="text", text=f"❌ 科目 {subject_code} 未找到符合条件的往来余额")]
+    
+    labels = counterparty_aging.bucket_labels(buckets)
+    as_of = as_of or ledger.latest_date
+    truncated = len(aging) > limit
+    fmt = output_format(args)
+    if fmt != "markdown":
+        return structured_response(
+            fmt, {"counterparties": aging.head(limit)}, subject_code=subject_code, as_of=as_of, buckets=labels,
+            total=len(aging), total_balance=aging["余额"].sum()
         )
+    
+    output_lines = create_output_header(f"往来账龄分析: 科目 {subject_code}", len(aging), truncated, limit)
+    output_lines.append(f"**基准日**: {as_of.strftime('%Y-%m-%d')}")
+    output_lines.append(f"**余额合计**: {format_amount(aging['余额'].sum())}")
+    unknown = aging[aging["往来单位"] == counterparty_aging.UNKNOWN_COUNTERPARTY]["余额"].sum()
+    if abs(unknown) >= 0.01:
+        output_lines.append(f"**其中未识别往来单位**: {format_amount(unknown)}（摘要中未注明往来单位的分录）")
+    output_lines.append("")
+    
+    output_lines.append("## 📊 账龄分布")
+    output_lines.append("| 账龄 | 金额 | 占比 |")
+    output_lines.append("|------|------|------|")
+    bucket_total = max(aging[labels].sum().sum(), 0.01)
+    for label in labels:
+        amount = aging[label].sum()
+        output_lines.append(f"| {label} | {format_amount(amount)} | {amount / bucket_total:.1%} |")
+    output_lines.append(f"| 超额冲销 | {format_amount(aging['超额冲销'].sum())} | - |")
+    output_lines.append("")
+    
+    output_lines.append("## 🏢 往来单位明细（按余额绝对值降序）")
+    output_lines.append("| 公司 | 往来单位 | 余额 | " + " | ".join(labels) + " | 超额冲销 |")
+    output_lines.append("|" + "------|" * (len(labels) + 4))
+    for _, row in aging.head(limit).iterrows():
+        bucket_text = " | ".join(format_amount(row[label]) for label in labels)
+        output_lines.append(
+            f"| {row['公司']} | {row['往来单位']} | {format_amount(row['余额'])} | {bucket_text} | {format_amount(row['超额冲销'])} |"
+        )
+    
+    output_lines.append("")
+    output_lines.append("💡 期初余额按首个凭证年度的核算维度期初数计入，其账龄自上年末起算；超额冲销为减少额超过增加额的部分（如预收、预付）")
+    
+    return [types.TextContent(type="text", text="\n".join(output_lines))]
+
+async def query_balance_trend(args: dict) -> list[types.TextContent]:
+    """查询科目逐月余额走势"""
+    subject_code = str(args.get("subject_code", "")).strip()
+    if not re.match(r'^[\d.]+$', subject_code):
+        return [types.TextContent(type="text", text=f"❌ 输入参数错误: 科目编码 '{subject_code}' 格式不正确，应为数字和点号组合")]
+    
+    try:
+        period_start = parse_period(args["period_start"]) if args.get("period_start") else None
+        period_end = parse_period(args["period_end"]) if args.get("period_end") else None
+        year = validate_year(args["year"]) if args.get("year") else None
+    except ValueError as ve:
+        return [types.TextContent(type="text", text=f"❌ 输入参数错误: {str(ve)}")]
+    if year:
+        period_start = max(period_start or 0, year * 100 + 1)
+        period_end = min(period_end or 999999, year * 100 + 12)
+    
+    series = get_monthly_balances()
+    companies = sorted({company for company, _ in series.keys})
+    if args.get("company"):
+        companies = [company for company in companies if args["company"].lower() in company.lower()]
+    
+    trend = series.trend(companies, subject_code, period_start, period_end)
+    if trend.empty:
+        return [types.TextContent(type="text", text=f"❌ 未找到科目 {subject_code} 在指定期间的余额数据")]
+    
+    # 负债、权益、收入类科目按贷方余额展示
+    credit_normal = get_subject_master().credit_normal(subject_code)
+    sign = -1 if credit_normal else 1
+    
+    def balance_text(amount: float) -> str:
+        if abs(amount) < 0.01:
+            return "0.00"
+        direction = "借" if amount > 0 else "贷"
+        return f"{format_amount(abs(amount))} ({direction})"
+    
+    fmt = output_format(args)
+    if fmt != "markdown":
+        return structured_response(fmt, {"trend": trend}, subject_code=subject_code, companies=companies,
+                                   category=get_subject_category(subject_code), credit_normal=credit_normal)
+    
+    output_lines = create_output_header(f"科目余额走势: {subject_code}", len(trend))
+    output_lines.append(f"**公司**: {'、'.join(companies)}")
+    output_lines.append(f"**会计要素**: {get_subject_category(subject_code)}")
+    change = trend["期末余额"].iloc[-1] - trend["期初余额"].iloc[0]
+    output_lines.append(f"**期间余额变动**: {format_amount(change * sign)}（按{'贷' if credit_normal else '借'}方计）")
+    output_lines.append("")
+    
+    output_lines.append("| 月份 | 期初余额 | 借方发生额 | 贷方发生额 | 期末余额 |")
+    output_lines.append("|------|------|------|------|------|")
+    for _, row in trend.iterrows():
+        output_lines.append(
+            f"| {row['月份']} | {balance_text(row['期初余额'])} | {format_amount(row['借方发生额'])} | "
+            f"{format_amount(row['贷方发生额'])} | {balance_text(row['期末余额'])} |"
+        )
+    
+    output_lines.append("")
+    output_lines.append("💡 余额以各公司首个凭证年度的余额表期初数为起点，按凭证会计期间逐月累计；上级科目包含全部下级科目")
+    
+    return [types.TextContent(type="text", text="\n".join(output_lines))]
+
+async def detect_subject_anomalies(args: dict) -> list[types.TextContent]:
+    """批量检测科目月度发生额异常"""
+    subject_code = str(args.get("subject_code") or "").strip()
+    if subject_code and not re.match(r'^[\d.]+$', subject_code):
+        return [types.TextContent(type="text", text=f"❌ 输入参数错误: 科目编码 '{subject_code}' 格式不正确，应为数字和点号组合")]
+    
+    window = args.get("window", 6)
+    threshold = args.get("threshold", 3.5)
+    min_amount = args.get("min_amount", 10000)
+    limit = args.get("limit", 50)
+    if window < movement_anomalies.MIN_PERIODS or threshold <= 0:
+        return [types.TextContent(type="text", text=f"❌ 输入参数错误: 滚动窗口不少于{movement_anomalies.MIN_PERIODS}个月，阈值应大于0")]
+    try:
+        year = validate_year(args["year"]) if args.get("year") else None
+    except ValueError as ve:
+        return [types.TextContent(type="text", text=f"❌ 输入参数错误: {str(ve)}")]
+    
+    series = get_monthly_balances()
+    rows = movement_anomalies.select_rows(series, args.get("company"), subject_code, max(args.get("level", 1), 0))
+    try:
+        anomalies = movement_anomalies.detect_movement_anomalies(
+            series, rows, window, threshold, min_amount, args.get("anomaly_types")
+        )
+    except ValueError as ve:
+        return [types.TextContent(type="text", text=f"❌ 输入参数错误: {str(ve)}")]
+    if year:
+        anomalies = anomalies[anomalies["月份"].str.startswith(f"{year}-")]
+    
+    if anomalies.empty:
+        return [types.TextContent(type="text", text=f"✅ 在{len(rows)}个科目序列中未发现月度发生额异常")]
+    
+    truncated = len(anomalies) > limit
+    fmt = output_format(args)
+    if fmt != "markdown":
+        return structured_response(fmt, {"anomalies": anomalies.head(limit)}, total=len(anomalies), series=len(rows),
+                                   window=window, threshold=threshold, min_amount=min_amount)
+    
+    output_lines = create_output_header("科目月度发生额异常检测", len(anomalies), truncated, limit)
+    output_lines.append(f"**检测序列数**: {len(rows)}")
+    output_lines.append(f"**滚动窗口**: {window}个月 | **z值阈值**: {threshold} | **最小偏离金额**: {format_amount(min_amount)}")
+    output_lines.append("")
+    
+    output_lines.append("## 📊 异常类型统计")
+    for anomaly_type, count in anomalies["异常类型"].value_counts().items():
+        output_lines.append(f"- {anomaly_type}: {count} 条")
+    output_lines.append("")
+    
+    page = anomalies.head(limit)
+    names = get_subject_master().lookup(page["科目编码"], "科目名称").fillna("")
+    output_lines.append("## ⚠️ 异常清单（按异常程度排序）")
+    output_lines.append("| 公司 | 科目 | 月份 | 异常类型 | 本月金额 | 参照金额 | z值 |")
+    output_lines.append("|------|------|------|------|------|------|------|")
+    for (_, row), subject_name in zip(page.iterrows(), names):
+        subject_text = f"{row['科目编码']} {subject_name}".strip()
+        z_text = f"≥{movement_anomalies.MAX_Z:g}" if abs(row["z值"]) >= movement_anomalies.MAX_Z else f"{row['z值']:+.1f}"
+        output_lines.append(
+            f"| {row['公司']} | {subject_text} | {row['月份']} | {row['异常类型']} | "
+            f"{row['本月金额']:,.2f} | {row['参照金额']:,.2f} | {z_text} |"
+        )
+    
+    output_lines.append("")
+    output_lines.append("💡 金额为借方为正的月度净发生额（余额方向反转为月末余额）；环比参照为前N个月中位数，同比参照为上年同月；历史完全平稳的序列z值按上限显示")
+    
+    return [types.TextContent(type="text", text="\n".join(output_lines))]
+
+async def generate_financial_statements(args: dict) -> list[types.TextContent]:
+    """生成资产负债表与利润表"""
+    statement = args.get("statement", "both")
+    keys = list(STATEMENTS) if statement == "both" else [statement]
+    if any(key not in STATEMENTS for key in keys):
+        return [types.TextContent(type="text", text=f"❌ 输入参数错误: 报表类型 '{statement}' 不存在，可选值：balance_sheet、income_statement、both")]
+    year = validate_year(args["year"]) if args.get("year") else None
+    
+    statements = get_financial_statements()
+    companies = pd.Series(statements.companies, dtype=object)
+    if args.get("company"):
+        companies = companies[companies.str.contains(str(args["company"]), case=False, na=False, regex=False)]
+    targets = []
+    for company in companies:
+        years = statements.years(company)
+        target_year = year if year is not None else years[-1]
+        if target_year in years:
+            targets.append((company, target_year))
+    record_scan(len(statements.entities))
+    if not targets:
+        return [types.TextContent(type="text", text=f"❌ 未找到{'公司 ' + args['company'] + ' ' if args.get('company') else ''}{str(year) + '年度' if year else ''}的余额表数据")]
+    
+    checks = statements.balance_checks().set_index(["公司", "年份"])
+    fmt = output_format(args)
+    if fmt != "markdown":
+        tables = {key: pd.concat([statements.statement(key, company, target_year).assign(公司=company, 年份=target_year)
+                                  for company, target_year in targets], ignore_index=True) for key in keys}
+        tables["balance_checks"] = checks.loc[targets].reset_index()
+        unmapped = {f"{company} {target_year}": statements.unmapped_subjects(company, target_year)
+                    for company, target_year in targets}
+        return structured_response(fmt, tables, unmapped_subjects={k: v for k, v in unmapped.items() if v})
+    
+    output_lines = []
+    for company, target_year in targets:
+        output_lines.append(f"# {company} {target_year}年度财务报表\n")
+        output_lines.append("单位：元\n")
+        for key in keys:
+            title, _, (current, comparative) = STATEMENTS[key]
+            report = statements.statement(key, company, target_year)
+            output_lines.append(f"## {title}")
+            output_lines.append(f"| 行项目 | {current} | {comparative} |")
+            output_lines.append("|------|------:|------:|")
+            for _, row in report.iterrows():
+                name = f"**{row['行项目']}**" if row["合计行"] else row["行项目"]
+                previous = "-" if pd.isna(row[comparative]) else format_amount(row[comparative])
+                output_lines.append(f"| {name} | {format_amount(row[current])} | {previous} |")
+            output_lines.append("")
+            
+            if key == "balance_sheet":
+                for _, check in checks.loc[[(company, target_year)]].iterrows():
+                    if check["平衡"]:
+                        output_lines.append(f"✅ {check['口径']}：资产总计 = 负债和所有者权益总计 = {format_amount(check['资产总计'])}")
+                    else:
+                        output_lines.append(f"❌ {check['口径']}：资产总计 {format_amount(check['资产总计'])} ≠ "
+                                            f"负债和所有者权益总计 {format_amount(check['负债和所有者权益总计'])}，差额 {format_amount(check['差额'])}")
+                output_lines.append("")
+        
+        unmapped = statements.unmapped_subjects(company, target_year)
+        if unmapped:
+            output_lines.append(f"⚠️ 以下科目有金额但未映射到报表行项目：{'、'.join(unmapped)}")
+            output_lines.append("")
+    
+    output_lines.append("💡 利润表按损益类科目本年累计发生额编制（收入类取贷方、费用类取借方），未结转的损益余额并入未分配利润")
+    return [types.TextContent(type="text", text="\n".join(output_lines))]
+
+async def reconcile_intercompany(args: dict) -> list[types.TextContent]:
+    """集团内部往来核对与合并抵销"""
+    scope = args.get("scope", "both")
+    if scope not in ("balances", "vouchers", "both"):
+        return [types.TextContent(type="text", text=f"❌ 输入参数错误: 核对范围 '{scope}' 不存在，可选值：balances、vouchers、both")]
+    amount_tolerance = args.get("amount_tolerance", intercompany.DEFAULT_AMOUNT_TOLERANCE)
+    date_tolerance = args.get("date_tolerance_days", intercompany.DEFAULT_DATE_TOLERANCE)
+    if amount_tolerance < 0 or date_tolerance < 0:
+        return [types.TextContent(type="text", text="❌ 输入参数错误: 金额容差与日期容差不能为负数")]
+    limit = args.get("limit", 50)
+    year = validate_year(args["year"]) if args.get("year") else int(balance_df["年份"].max())
+    
+    ledger = get_intercompany_ledger()
+    if len(ledger.entities) < 2:
+        return [types.TextContent(type="text", text="❌ 数据中只有一家公司，无集团内部往来可核对")]
+    record_scan(len(ledger.balances) + len(ledger.lines))
+    
+    def involved(frame: pd.DataFrame, columns: List[str]) -> pd.DataFrame:
+        """筛选涉及指定公司的记录"""
+        if not args.get("company"):
+            return frame
+        mask = pd.Series(False, index=frame.index)
+        for column in columns:
+            mask |= frame[column].astype(str).str.contains(str(args["company"]), case=False, na=False, regex=False)
+        return frame[mask]
+    
+    def subject_label(code: str, name: str) -> str:
+        """科目显示为"编码 名称"，合并抵销差额等无编码的行只显示名称"""
+        return name if not code or code == name else f"{code} {name}"
+    
+    tables = {}
+    meta = {"year": year, "entities": ledger.entities, "amount_tolerance": amount_tolerance}
+    if scope in ("balances", "both"):
+        matched_balances, residual_balances = ledger.match_balances(year, amount_tolerance)
+        master = get_subject_master().frame
+        subject_names = dict(zip(master["科目编码"], master["科目名称"]))
+        credit_codes = set(master.loc[master["余额方向"] == "贷", "科目编码"])
+        eliminations = intercompany.elimination_entries(matched_balances, ledger.internal_revenue(year), subject_names)
+        tables["balance_pairs"] = involved(ledger.pair_summary(year), ["甲方", "乙方"])
+        tables["matched_balances"] = involved(matched_balances, ["公司", "对方_公司"])[
+            ["公司", "科目编码", "科目名称", "金额", "对方_公司", "对方_科目编码", "对方_科目名称", "对方_金额", "金额差"]]
+        tables["unmatched_balances"] = involved(residual_balances, ["公司", "对方"])[
+            ["公司", "对方", "科目编码", "科目名称", "核算维度名称", "金额"]]
+        tables["eliminations"] = eliminations
+        tables["trial_balance"] = intercompany.consolidated_trial_balance(
+            balance_df, year, eliminations, subject_names, credit_codes)
+    if scope in ("vouchers", "both"):
+        matched_lines, residual_lines = ledger.match_lines(year, amount_tolerance, date_tolerance)
+        matched_lines = involved(matched_lines, ["公司", "对方_公司"])
+        residual_lines = involved(residual_lines, ["公司", "对方"])
+        pairs = pd.concat([
+            matched_lines.groupby("成员对").agg(已匹配笔数=("金额", "size"), 已匹配金额=("金额", lambda x: x.abs().sum())),
+            residual_lines.groupby("成员对").agg(未匹配笔数=("金额", "size"), 未匹配金额=("金额", lambda x: x.abs().sum())),
+        ], axis=1).fillna(0).reset_index()
+        residual_lines = residual_lines.reindex(residual_lines["金额"].abs().sort_values(ascending=False).index)
+        tables["line_pairs"] = pairs
+        tables["unmatched_lines"] = residual_lines[["公司", "对方", "日期", "凭证号", "科目编码", "摘要", "金额"]].head(limit)
+        meta.update(date_tolerance_days=date_tolerance, matched_lines=len(matched_lines), unmatched_lines=len(residual_lines))
+    
+    fmt = output_format(args)
+    if fmt != "markdown":
+        return structured_response(fmt, tables, **meta)
+    
+    output_lines = [f"# 集团内部往来核对: {year}年\n"]
+    output_lines.append(f"**集团成员**: {'、'.join(ledger.entities)}")
+    output_lines.append(f"**金额容差**: {format_amount(amount_tolerance)}" + (
+        f" | **日期容差**: {date_tolerance}天" if scope != "balances" else ""))
+    output_lines.append("")
+    
+    if scope in ("balances", "both"):
+        output_lines.append("## 📊 往来余额汇总（按成员对）")
+        output_lines.append("| 甲方 | 乙方 | 甲方余额 | 乙方余额 | 差额 |")
+        output_lines.append("|------|------|------:|------:|------:|")
+        for _, row in tables["balance_pairs"].iterrows():
+            output_lines.append(f"| {row['甲方']} | {row['乙方']} | {format_amount(row['甲方余额'])} | "
+                                f"{format_amount(row['乙方余额'])} | {format_amount(row['差额'])} |")
+        output_lines.append("")
+        
+        output_lines.append(f"## ✅ 已匹配往来余额 ({len(tables['matched_balances'])} 对)")
+        if not tables["matched_balances"].empty:
+            output_lines.append("| 公司 | 科目 | 余额 | 对方公司 | 对方科目 | 对方余额 | 差额 |")
+            output_lines.append("|------|------|------:|------|------|------:|------:|")
+            for _, row in tables["matched_balances"].iterrows():
+                output_lines.append(f"| {row['公司']} | {subject_label(row['科目编码'], row['科目名称'])} | {format_amount(row['金额'])} | "
+                                    f"{row['对方_公司']} | {subject_label(row['对方_科目编码'], row['对方_科目名称'])} | "
+                                    f"{format_amount(row['对方_金额'])} | {format_amount(row['金额差'])} |")
+        output_lines.append("")
+        
+        if not tables["unmatched_balances"].empty:
+            output_lines.append(f"## ⚠️ 未匹配往来余额 ({len(tables['unmatched_balances'])} 项)")
+            output_lines.append("| 公司 | 对方 | 科目 | 余额 |")
+            output_lines.append("|------|------|------|------:|")
+            for _, row in tables["unmatched_balances"].iterrows():
+                output_lines.append(f"| {row['公司']} | {row['对方']} | {subject_label(row['科目编码'], row['科目名称'])} | {format_amount(row['金额'])} |")
+            output_lines.append("")
+    
+    if scope in ("vouchers", "both"):
+        output_lines.append("## 🔗 往来分录匹配（按成员对）")
+        if tables["line_pairs"].empty:
+            output_lines.append("未发现摘要中注明其他成员公司的往来分录")
+        else:
+            output_lines.append("| 成员对 | 已匹配笔数 | 已匹配金额 | 未匹配笔数 | 未匹配金额 |")
+            output_lines.append("|------|------:|------:|------:|------:|")
+            for _, row in tables["line_pairs"].iterrows():
+                output_lines.append(f"| {row['成员对'].replace('|', ' ↔ ')} | {int(row['已匹配笔数'])} | {format_amount(row['已匹配金额'])} | "
+                                    f"{int(row['未匹配笔数'])} | {format_amount(row['未匹配金额'])} |")
+        output_lines.append("")
+        
+        if not tables["unmatched_lines"].empty:
+            output_lines.append(f"### ⚠️ 未匹配往来分录（按金额降序前 {len(tables['unmatched_lines'])} 条）")
+            output_lines.append("| 公司 | 对方 | 日期 | 凭证号 | 科目 | 摘要 | 金额 |")
+            output_lines.append("|------|------|------|------|------|------|------:|")
+            for _, row in tables["unmatched_lines"].iterrows():
+                output_lines.append(f"| {row['公司']} | {row['对方']} | {pd.Timestamp(row['日期']).strftime('%Y-%m-%d')} | {row['凭证号']} | "
+                                    f"{row['科目编码']} | {row['摘要']} | {format_amount(row['金额'])} |")
+            output_lines.append("")
+    
+    if scope in ("balances", "both"):
+        output_lines.append("## 🧾 合并抵销分录")
+        output_lines.append("| 分录号 | 实体 | 科目 | 借方金额 | 贷方金额 | 说明 |")
+        output_lines.append("|------|------|------|------:|------:|------|")
+        for _, row in tables["eliminations"].iterrows():
+            output_lines.append(f"| {row['分录号']} | {row['实体']} | {subject_label(row['科目编码'], row['科目名称'])} | "
+                                f"{format_amount(row['借方金额'])} | {format_amount(row['贷方金额'])} | {row['说明']} |")
+        output_lines.append("")
+        
+        trial = tables["trial_balance"]
+        adjusted = trial[(trial["抵销借方"] != 0) | (trial["抵销贷方"] != 0)]
+        output_lines.append("## 📋 合并试算平衡表（抵销涉及的科目）")
+        output_lines.append("| 科目 | 各成员合计 | 抵销借方 | 抵销贷方 | 合并数 |")
+        output_lines.append("|------|------:|------:|------:|------:|")
+        for _, row in adjusted.iterrows():
+            output_lines.append(f"| {subject_label(row['科目编码'], row['科目名称'])} | {format_amount(row['合计'])} | {format_amount(row['抵销借方'])} | "
+                                f"{format_amount(row['抵销贷方'])} | {format_amount(row['合并数'])} |")
+        output_lines.append("")
+        output_lines.append("💡 金额以借方为正，损益类科目为本年发生额；完整的合并试算平衡表（含各成员列）请使用 output_format=json 或 csv")
+    output_lines.append("💡 内部往来按余额表核算维度名称与凭证摘要中的交易对方识别，未匹配项需核实是否存在在途款项或入账差异")
+    return [types.TextContent(type="text", text="\n".join(output_lines))]
+
+async def run_voucher_report(args: dict) -> list[types.TextContent]:
+    """按模板生成凭证模式报表"""
+    try:
+        templates = report_template_source.get()
+        if args.get("custom_template"):
+            template = voucher_reports.validate_template(args["custom_template"])
+        elif args.get("template"):
+            if args["template"] not in templates:
+                raise ValueError(f"模板 '{args['template']}' 不存在，可用模板：{', '.join(templates) or '无'}")
+            template = templates[args["template"]]
+        else:
+            template = None
+    except ValueError as e:
+        return [types.TextContent(type="text", text=f"❌ 模板定义或参数错误: {str(e)}")]
+
+    if template is None:
+        listing = pd.DataFrame([{
+            "模板ID": item["id"], "名称": item["name"],
+            "行粒度": "分录" if item["row"] == "line" else ("串联凭证" if item["link_subject"] else "凭证"),
+            "说明": item["description"],
+        } for item in templates.values()], columns=["模板ID", "名称", "行粒度", "说明"])
+        fmt = output_format(args)
+        if fmt != "markdown":
+            return structured_response(fmt, {"templates": listing}, template_file=str(REPORT_TEMPLATE_FILE))
+        output_lines = ["# 可用报表模板\n", f"**模板文件**: {REPORT_TEMPLATE_FILE}", ""]
+        output_lines.append("| 模板ID | 名称 | 行粒度 | 说明 |")
+        output_lines.append("|------|------|------|------|")
+        for item in listing.itertuples(index=False):
+            output_lines.append(f"| {item.模板ID} | {item.名称} | {item.行粒度} | {item.说明} |")
+        return [types.TextContent(type="text", text="\n".join(output_lines))]
+
+    limit = args.get("limit", 50)
+    record_scan(len(voucher_df))
+    try:
+        rows = voucher_reports.run_template(template, voucher_df, balance_df)
+    except (ValueError, SyntaxError, KeyError, NameError) as e:
+        return [types.TextContent(type="text", text=f"❌ 模板执行错误: {str(e)}")]
+    if args.get("company"):
+        rows = rows[rows["公司"].astype(str).str.contains(str(args["company"]), case=False, na=False, regex=False)]
+    if args.get("year"):
+        rows = rows[rows["日期"].dt.year == validate_year(args["year"])]
+    if rows.empty:
+        return [types.TextContent(type="text", text=f"✅ 未找到符合模板 '{template['name']}' 的凭证")]
+    tables = voucher_reports.summarize(template, rows, balance_df)
+
+    saved = []
+    if args.get("save"):
+        text = voucher_reports.render_text(template, rows, tables)
+        try:
+            saved = voucher_reports.save_report(template, rows, text, REPORT_DIR)
+        except ValueError as e:
+            return [types.TextContent(type="text", text=f"❌ 报表保存失败: {str(e)}")]
+
+    fmt = output_format(args)
+    if fmt != "markdown":
+        return structured_response(fmt, {"rows": rows.head(limit), **tables}, template=template["id"],
+                                   total=len(rows), saved=[str(path) for path in saved])
+
+    def cell(value: Any) -> str:
+        if pd.isna(value):
+            return ""
+        if isinstance(value, pd.Timestamp):
+            return value.strftime('%Y-%m-%d')
+        if isinstance(value, float):
+            return format_amount(value)
+        return str(value)
+
+    def markdown_table(frame: pd.DataFrame) -> List[str]:
+        numeric = [pd.api.types.is_float_dtype(dtype) for dtype in frame.dtypes]
+        table = ["| " + " | ".join(frame.columns) + " |",
+                 "|" + "|".join("------:" if right else "------" for right in numeric) + "|"]
+        for values in frame.itertuples(index=False):
+            table.append("| " + " | ".join(cell(value) for value in values) + " |")
+        return table
+
+    record_returned(min(len(rows), limit))
+    output_lines = [f"# {template['name']}报表\n"]
+    if template["description"]:
+        output_lines.append(f"**报表说明**: {template['description']}")
+    output_lines.append(f"**记录数**: {len(rows)}")
+    output_lines.append("")
+
+    output_lines.append("## 📊 按公司年度汇总")
+    output_lines.extend(markdown_table(tables["summary"]))
+    output_lines.append("")
+    if "classes" in tables:
+        output_lines.append(f"## 🏷️ 按{template['classify']['column']}统计")
+        output_lines.extend(markdown_table(tables["classes"]))
+        output_lines.append("")
+
+    output_lines.append(f"## 📋 明细（前 {min(len(rows), limit)} 条）")
+    output_lines.extend(markdown_table(rows.head(limit)))
+    output_lines.append("")
+    if saved:
+        output_lines.append("## 💾 已保存")
+        output_lines.extend(f"- {path}" for path in saved)
+    else:
+        output_lines.append("💡 使用 save=true 可将完整明细保存为CSV并生成文本分析报告")
+    return [types.TextContent(type="text", text="\n".join(output_lines))]
+
+def run_batch_call(tool: str, arguments: dict) -> list[types.TextContent]:
+    """在工作线程中执行单个工具调用（批量调用与网络传输共用）"""
+    return asyncio.run(handle_call_tool(tool, arguments))
+
+async def run_batch(args: dict) -> list[types.TextContent]:
+    """批量执行多个工具调用"""
+    calls = args.get("calls")
+    if not isinstance(calls, list) or not calls:
+        return [types.TextContent(type="text", text="❌ 输入参数错误: calls 应为非空的调用列表")]
+    if len(calls) > BATCH_MAX_CALLS:
+        return [types.TextContent(type="text", text=f"❌ 输入参数错误: 单次最多批量执行{BATCH_MAX_CALLS}个调用")]
+    
+    fmt = output_format(args)
+    concurrency = min(max(args.get("max_concurrency", BATCH_DEFAULT_CONCURRENCY), 1), BATCH_MAX_CALLS)
+    semaphore = asyncio.Semaphore(concurrency)
+    
+    async def run_call(call) -> tuple[str, dict, str]:
+        if not isinstance(call, dict) or not call.get("tool"):
+            return "", {}, "❌ 输入参数错误: 每个调用须包含 tool"
+        tool, arguments = call["tool"], dict(call.get("arguments") or {})
+        if tool == "batch":
+            return tool, arguments, "❌ 输入参数错误: 批量调用不能嵌套"
+        arguments.setdefault("output_format", fmt)
+        async with semaphore:
+            # 线程继承当前上下文，各调用共享同一个筛选结果缓存
+            result = await asyncio.to_thread(run_batch_call, tool, arguments)
+        return tool, arguments, "\n".join(content.text for content in result)
+    
+    started = time.perf_counter()
+    # 批量执行期间数据表不会重新加载，所有调用读取同一份快照
+    token = filter_cache.set({})
+    try:
+        results = await asyncio.gather(*(run_call(call) for call in calls))
+    finally:
+        filter_cache.reset(token)
+    elapsed = time.perf_counter() - started
+    
+    if fmt == "json":
+        items = []
+        for tool, arguments, text in results:
+            try:
+                result = json.loads(text) if arguments.get("output_format") == "json" else text
+            except ValueError:
+                result = text
+            items.append({"tool": tool, "arguments": arguments, "result": result})
+        payload = {"meta": {"calls": len(results), "elapsed_seconds": round(elapsed, 3)}, "results": items}
+        return [types.TextContent(type="text", text=json.dumps(payload, ensure_ascii=False, separators=(",", ":")))]
+    
+    if fmt == "csv":
+        output_lines = [f"# calls: {len(results)}"]
+        for i, (tool, _, text) in enumerate(results, 1):
+            output_lines.append(f"# call: {i} {tool}")
+            output_lines.append(text)
+        return [types.TextContent(type="text", text="\n".join(output_lines))]
+    
+    output_lines = create_output_header("批量查询结果", len(results))
+    output_lines.append(f"**耗时**: {elapsed:.3f}秒 | **并发数**: {concurrency}")
+    output_lines.append("")
+    for i, (tool, _, text) in enumerate(results, 1):
+        output_lines.append(f"---\n\n## [{i}] {tool or '无效调用'}\n")
+        output_lines.append(text)
+        output_lines.append("")
+    
+    return [types.TextContent(type="text", text="\n".join(output_lines))]
+
+async def server_stats(args: dict) -> list[types.TextContent]:
+    """查看服务器运行指标"""
+    summary = metrics.tool_summary()
+    histogram = metrics.latency_histogram()
+    caches = metrics.cache_summary()
+    if args.get("tool"):
+        summary = summary[summary["工具"] == args["tool"]]
+        histogram = histogram[histogram["工具"] == args["tool"]]
+    uptime = time.time() - metrics.started
+    
+    fmt = output_format(args)
+    if fmt != "markdown":
+        response = structured_response(
+            fmt, {"tools": summary, "latency_histogram": histogram, "caches": caches, "warmup": warmup.status()},
+            uptime_seconds=round(uptime, 1), trace_file=metrics.trace_file, memory_sample_rate=metrics.memory_sample_rate,
+            data_sources=data_sources, transport=transport, sessions=len(session_keys),
+            profile_threshold_ms=profiler.threshold_ms, slow_calls=profiler.recent_profiles()
+        )
+    else:
+        output_lines = create_output_header("服务器运行指标", len(summary))
+        output_lines.append(f"**统计时长**: {uptime / 60:.1f}分钟")
+        output_lines.append(f"**内存抽样比例**: {metrics.memory_sample_rate:.1%}")
+        output_lines.append(f"**跟踪文件**: {metrics.trace_file or '未启用'}")
+        if transport != "stdio":
+            output_lines.append(f"**传输方式**: {transport} | **客户端会话数**: {len(session_keys)} | **并发调用上限**: {MAX_CONCURRENT_CALLS}")
+        for table, source in data_sources.items():
+            output_lines.append(f"**数据来源（{table}）**: {source}")
+        output_lines.append("")
+        
+        warmup_status = warmup.status()
+        if (warmup_status["状态"] != "未启用").any():
+            output_lines.append("## 🔥 数据预热")
+            output_lines.append("| 阶段 | 状态 | 耗时ms | 错误 |")
+            output_lines.append("|------|------|------|------|")
+            for _, row in warmup_status.iterrows():
+                elapsed = "-" if pd.isna(row["耗时ms"]) else f"{row['耗时ms']:.0f}"
+                output_lines.append(f"| {row['阶段']} | {row['状态']} | {elapsed} | {row['错误'] or '-'} |")
+            output_lines.append("")
+        
+        output_lines.append("## ⏱️ 工具耗时（按平均耗时降序）")
+        output_lines.append("| 工具 | 调用 | 错误 | 平均ms | P50ms | P95ms | P99ms | 最大ms | 扫描行数 | 返回行数 | 缓存命中率 | 内存峰值 |")
+        output_lines.append("|------|------|------|------|------|------|------|------|------|------|------|------|")
+        for _, row in summary.iterrows():
+            hit_rate = "-" if pd.isna(row["缓存命中率"]) else f"{row['缓存命中率']:.0%}"
+            peak = "-" if pd.isna(row["内存峰值字节"]) else f"{row['内存峰值字节'] / 1024 / 1024:.1f}MB"
+            output_lines.append(
+                f"| {row['工具']} | {row['调用次数']} | {row['错误次数']} | {row['平均耗时ms']:.1f} | {row['P50耗时ms']:.1f} | "
+                f"{row['P95耗时ms']:.1f} | {row['P99耗时ms']:.1f} | {row['最大耗时ms']:.1f} | {row['扫描行数']:,} | "
+                f"{row['返回行数']:,} | {hit_rate} | {peak} |"
+            )
+        output_lines.append("")
+        
+        if not caches.empty:
+            output_lines.append("## 🗄️ 缓存命中")
+            output_lines.append("| 缓存 | 命中 | 未命中 |")
+            output_lines.append("|------|------|------|")
+            for _, row in caches.iterrows():
+                output_lines.append(f"| {row['缓存']} | {row['命中']:,} | {row['未命中']:,} |")
+            output_lines.append("")
+        
+        slow_calls = profiler.recent_profiles()
+        if slow_calls:
+            output_lines.append(f"## 🐢 最近的慢调用（耗时≥{profiler.threshold_ms:g}ms）")
+            for record in reversed(slow_calls[-5:]):
+                top = "、".join(f"{spot['函数']}({spot['位置']}) {spot['累计耗时ms']:.0f}ms" for spot in record["hotspots"][:3])
+                output_lines.append(f"- {record['ts']} {record['tool']} {record['elapsed_ms']:.0f}ms：{top}")
+            output_lines.append("")
+        
+        output_lines.append("💡 P50/P95/P99按耗时直方图分桶上限估计；扫描行数为经过筛选的数据表行数；内存峰值为tracemalloc抽样调用的最大值")
+        response = [types.TextContent(type="text", text="\n".join(output_lines))]
+    
+    if args.get("reset"):
+        metrics.reset()
+    return response
+
+def initialization_options() -> InitializationOptions:
+    """服务器初始化选项"""
+    return InitializationOptions(
+        server_name="financial-data-query",
+        server_version="1.0.0",
+        capabilities=types.ServerCapabilities(
+            tools=types.ToolsCapability(listChanged=True),
+            experimental=None,
+            logging=None,
+            prompts=None,
+            resources=None,
+            completions=None
+        ),
+    )
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(description="财务数据查询MCP服务器")
+    parser.add_argument("--transport", choices=["stdio", "http"], default="stdio",
+                        help="stdio: 每个客户端启动一个进程；http: 一个进程通过Streamable HTTP与SSE服务多个客户端")
+    parser.add_argument("--host", default="127.0.0.1", help="http传输监听的地址")
+    parser.add_argument("--port", type=int, default=8765, help="http传输监听的端口")
+    parser.add_argument("--socket", help="http传输改为监听该Unix套接字")
+    return parser.parse_args(argv)
+
+async def main(argv: Optional[List[str]] = None):
+    global transport, call_slots
+    options = parse_args(argv)
+    # 数据在后台线程加载，initialize与list_tools立即响应，工具调用等待所需的数据表
+    warmup.start()
+    print(f"Python executable: {sys.executable}", file=sys.stderr)
+    print(f"Pandas version: {pd.__version__}", file=sys.stderr)
+    
+    call_slots = asyncio.Semaphore(max(MAX_CONCURRENT_CALLS, 1))
+    if options.transport == "http":
+        import network_transport
+        transport = "http"
+        await network_transport.serve(app, initialization_options(), options.host, options.port, options.socket)
+        return
+    
+    async with mcp.server.stdio.stdio_server() as (read_stream, write_stream):
+        await app.run(read_stream, write_stream, initialization_options())
 
 if __name__ == "__main__":
-    import sys
     asyncio.run(main())
\ No newline at end of file
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+财务报表生成
+资产负债表与利润表的行项目以声明式映射定义：每行由科目前缀及符号组成，合计行引用前面的行项目及符号。
+映射编译为（科目 × 行项目）系数矩阵，合计行展开为科目系数，余额表一次透视为（公司, 年份）× 科目的金额矩阵，
+全部公司、年度的报表由一次矩阵乘法得到
+
+- 资产负债表按期末、期初（年初）余额的借方净额计算，负债和所有者权益行取负号即为贷方净额
+- 利润表按本年累计发生额计算：期末损益结转使损益类科目借贷方累计相等，
+  收入类（贷方余额）科目取本年累计贷方，费用类科目取本年累计借方
+- 科目前缀匹配一级科目（如"14"匹配1403、1405等）；含点号的前缀只匹配该明细科目本身
+"""
+
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Set, Tuple
+
+# 资产负债表：(行项目, {科目前缀或前面的行项目: 符号})
+BALANCE_SHEET_LINES: List[Tuple[str, Dict[str, int]]] = [
+    ("货币资金", {"1001": 1, "1002": 1, "1012": 1}),
+    ("交易性金融资产", {"1101": 1}),
+    ("应收票据", {"1121": 1}),
+    ("应收账款", {"1122": 1, "1231": 1}),
+    ("预付款项", {"1123": 1}),
+    ("其他应收款", {"1131": 1, "1132": 1, "1221": 1}),
+    ("存货", {"1401": 1, "1402": 1, "1403": 1, "1404": 1, "1405": 1, "1406": 1, "1407": 1, "1408": 1,
+            "1411": 1, "1471": 1, "5001": 1, "5101": 1, "5201": 1}),
+    ("其他流动资产", {"1901": 1}),
+    ("流动资产合计", {"货币资金": 1, "交易性金融资产": 1, "应收票据": 1, "应收账款": 1, "预付款项": 1,
+                "其他应收款": 1, "存货": 1, "其他流动资产": 1}),
+    ("长期股权投资", {"1511": 1, "1512": 1}),
+    ("投资性房地产", {"1521": 1}),
+    ("固定资产", {"1601": 1, "1602": 1, "1603": 1, "1606": 1}),
+    ("在建工程", {"1604": 1, "1605": 1}),
+    ("无形资产", {"1701": 1, "1702": 1, "1703": 1}),
+    ("开发支出", {"5301": 1}),
+    ("长期待摊费用", {"1801": 1}),
+    ("递延所得税资产", {"1811": 1}),
+    ("非流动资产合计", {"长期股权投资": 1, "投资性房地产": 1, "固定资产": 1, "在建工程": 1, "无形资产": 1,
+                 "开发支出": 1, "长期待摊费用": 1, "递延所得税资产": 1}),
+    ("资产总计", {"流动资产合计": 1, "非流动资产合计": 1}),
+    ("短期借款", {"2001": -1}),
+    ("应付票据", {"2201": -1}),
+    ("应付账款", {"2202": -1}),
+    ("预收款项", {"2203": -1}),
+    ("应付职工薪酬", {"2211": -1}),
+    ("应交税费", {"2221": -1}),
+    ("其他应付款", {"2231": -1, "2232": -1, "2241": -1}),
+    ("流动负债合计", {"短期借款": 1, "应付票据": 1, "应付账款": 1, "预收款项": 1, "应付职工薪酬": 1,
+                "应交税费": 1, "其他应付款": 1}),
+    ("长期借款", {"2501": -1}),
+    ("长期应付款", {"2701": -1, "2702": -1}),
+    ("递延收益", {"2401": -1}),
+    ("递延所得税负债", {"2901": -1}),
+    ("非流动负债合计", {"长期借款": 1, "长期应付款": 1, "递延收益": 1, "递延所得税负债": 1}),
+    ("负债合计", {"流动负债合计": 1, "非流动负债合计": 1}),
+    ("实收资本", {"4001": -1}),
+    ("资本公积", {"4002": -1}),
+    ("盈余公积", {"4101": -1}),
+    # 未结转的损益类科目余额并入未分配利润
+    ("未分配利润", {"4103": -1, "4104": -1, "6": -1}),
+    ("所有者权益合计", {"实收资本": 1, "资本公积": 1, "盈余公积": 1, "未分配利润": 1}),
+    ("负债和所有者权益总计", {"负债合计": 1, "所有者权益合计": 1}),
+]
+
+# 利润表：(行项目, {科目前缀或前面的行项目: 符号})，减值损失以负数列示
+INCOME_STATEMENT_LINES: List[Tuple[str, Dict[str, int]]] = [
+    ("营业收入", {"6001": 1, "6051": 1}),
+    ("营业成本", {"6401": 1, "6402": 1}),
+    ("税金及附加", {"6403": 1}),
+    ("销售费用", {"6601": 1}),
+    ("管理费用", {"6602": 1}),
+    ("财务费用", {"6603": 1}),
+    ("其他收益", {"6117": 1}),
+    ("投资收益", {"6111": 1}),
+    ("公允价值变动收益", {"6101": 1}),
+    ("信用减值损失", {"6702": -1}),
+    ("资产减值损失", {"6701": -1}),
+    ("资产处置收益", {"6115": 1}),
+    ("营业利润", {"营业收入": 1, "营业成本": -1, "税金及附加": -1, "销售费用": -1, "管理费用": -1, "财务费用": -1,
+              "其他收益": 1, "投资收益": 1, "公允价值变动收益": 1, "信用减值损失": 1, "资产减值损失": 1,
+              "资产处置收益": 1}),
+    ("营业外收入", {"6301": 1}),
+    ("营业外支出", {"6711": 1}),
+    ("利润总额", {"营业利润": 1, "营业外收入": 1, "营业外支出": -1}),
+    ("所得税费用", {"6801": 1}),
+    ("净利润", {"利润总额": 1, "所得税费用": -1}),
+]
+
+# 各报表的名称、行项目与（本期列, 比较列）
+STATEMENTS = {
+    "balance_sheet": ("资产负债表", BALANCE_SHEET_LINES, ("期末余额", "年初余额")),
+    "income_statement": ("利润表", INCOME_STATEMENT_LINES, ("本期金额", "上期金额")),
+}
+
+# 损益类科目编码首位，其本年累计发生额应映射到利润表
+PROFIT_LOSS_CLASS = "6"
+
+# 资产负债表平衡检查的容差（元）
+BALANCE_TOLERANCE = 0.01
+
+def is_subject_key(key: str) -> bool:
+    """映射中的键是科目前缀（数字与点号）还是行项目名称"""
+    return key.replace(".", "").isdigit()
+
+def coefficient_matrix(lines: List[Tuple[str, Dict[str, int]]], codes: pd.Index) -> pd.DataFrame:
+    """将行项目映射编译为（科目 × 行项目）系数矩阵，合计行按引用的行项目展开为科目系数"""
+    matrix = pd.DataFrame(0.0, index=codes, columns=[name for name, _ in lines])
+    top_level = ~codes.str.contains(".", regex=False)
+    for name, items in lines:
+        for key, sign in items.items():
+            if not is_subject_key(key):
+                if key not in matrix.columns[:matrix.columns.get_loc(name)]:
+                    raise ValueError(f"行项目 '{name}' 引用了未在其前定义的行项目 '{key}'")
+                matrix[name] += sign * matrix[key]
+            elif "." in key:
+                matrix.loc[codes == key, name] += sign
+            else:
+                matrix.loc[top_level & codes.str.startswith(key), name] += sign
+    return matrix
+
+class FinancialStatements:
+    """全部公司、年度的资产负债表与利润表"""
+
+    def __init__(self, balance_df: pd.DataFrame, credit_codes: Set[str]):
+        rows = balance_df
+        if "is_dimension_row" in rows.columns:
+            rows = rows[~rows["is_dimension_row"].astype(bool)]
+        rows = rows.assign(科目编码=rows["科目编码"].astype(str))
+        rows = rows[rows["科目编码"].str.fullmatch(r"[\d.]+")]
+
+        # 一级科目及映射中引用的明细科目
+        referenced = {key for _, lines, _ in STATEMENTS.values() for _, items in lines for key in items
+                      if is_subject_key(key) and "." in key}
+        rows = rows[~rows["科目编码"].str.contains(".", regex=False) | rows["科目编码"].isin(referenced)]
+        credit = rows["科目编码"].isin(credit_codes).to_numpy()
+        measures = pd.DataFrame({
+            "公司": rows["公司"].to_numpy(),
+            "年份": rows["年份"].to_numpy(),
+            "科目编码": rows["科目编码"].to_numpy(),
+            "期末": (rows["期末余额借方"] - rows["期末余额贷方"]).to_numpy(),
+            "期初": (rows["期初余额借方"] - rows["期初余额贷方"]).to_numpy(),
+            "发生额": np.where(credit, rows["本年累计贷方"], rows["本年累计借方"]),
+        }).dropna(subset=["公司", "年份"])
+        measures["年份"] = measures["年份"].astype(int)
+
+        pivots = {measure: measures.pivot_table(index=["公司", "年份"], columns="科目编码", values=measure,
+                                                aggfunc="sum", fill_value=0.0, observed=True)
+                  for measure in ["期末", "期初", "发生额"]}
+        self.entities = pivots["期末"].index
+        self.codes = pivots["期末"].columns
+        self.matrices = {key: coefficient_matrix(lines, pd.Index(self.codes.astype(str)))
+                         for key, (_, lines, _) in STATEMENTS.items()}
+
+        def evaluate(key: str, measure: str) -> pd.DataFrame:
+            return pd.DataFrame(pivots[measure].to_numpy() @ self.matrices[key].to_numpy(),
+                                index=self.entities, columns=self.matrices[key].columns)
+
+        self.ending = evaluate("balance_sheet", "期末")
+        self.opening = evaluate("balance_sheet", "期初")
+        self.income = evaluate("income_statement", "发生额")
+        # 有余额但未映射到资产负债表、或有发生额但未映射到利润表的损益类科目
+        balance_mapped = self.matrices["balance_sheet"].ne(0).any(axis=1).to_numpy()
+        income_mapped = self.matrices["income_statement"].ne(0).any(axis=1).to_numpy()
+        profit_loss = self.codes.astype(str).str.startswith(PROFIT_LOSS_CLASS)
+        has_balance = (pivots["期末"].abs() + pivots["期初"].abs()) > BALANCE_TOLERANCE
+        has_flow = pivots["发生额"].abs() > BALANCE_TOLERANCE
+        self.unmapped = (has_balance & ~balance_mapped) | (has_flow & (profit_loss & ~income_mapped))
+
+    @property
+    def companies(self) -> List[str]:
+        return list(self.entities.get_level_values(0).unique())
+
+    def years(self, company: str) -> List[int]:
+        """公司有余额数据的年度"""
+        return sorted(year for name, year in self.entities if name == company)
+
+    def statement(self, key: str, company: str, year: int) -> pd.DataFrame:
+        """单个公司、年度的报表：行项目、本期列与比较列
+
+        资产负债表的比较列为年初余额；利润表的比较列为上年本年累计数，上年无数据时为空
+        """
+        _, lines, (current, comparative) = STATEMENTS[key]
+        names = [name for name, _ in lines]
+        if key == "balance_sheet":
+            values = self.ending.loc[(company, year)]
+            previous = self.opening.loc[(company, year)]
+        else:
+            values = self.income.loc[(company, year)]
+            previous = self.income.loc[(company, year - 1)] if (company, year - 1) in self.entities \
+                else pd.Series(np.nan, index=names)
+        totals = {name for name, items in lines if not any(is_subject_key(item) for item in items)}
+        return pd.DataFrame({
+            "行项目": names,
+            current: values[names].to_numpy(),
+            comparative: previous[names].to_numpy(),
+            "合计行": [name in totals for name in names],
+        })
+
+    def balance_checks(self) -> pd.DataFrame:
+        """各公司、年度的资产 = 负债 + 所有者权益检查（期末与年初）"""
+        checks = []
+        for column, frame in [("期末", self.ending), ("年初", self.opening)]:
+            difference = frame["资产总计"] - frame["负债和所有者权益总计"]
+            checks.append(pd.DataFrame({
+                "口径": column,
+                "资产总计": frame["资产总计"],
+                "负债和所有者权益总计": frame["负债和所有者权益总计"],
+                "差额": difference,
+                "平衡": difference.abs() <= BALANCE_TOLERANCE,
+            }))
+        return pd.concat(checks).reset_index().sort_values(["公司", "年份", "口径"], ascending=[True, True, False],
+                                                           kind="stable").reset_index(drop=True)
+
+    def unmapped_subjects(self, company: str, year: int) -> List[str]:
+        """有金额但未映射到报表行项目的科目编码"""
+        flags = self.unmapped.loc[(company, year)]
+        return list(flags[flags].index)
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+节假日日历
+法定节假日与调休上班日从用户可编辑的文本文件加载，供凭证分录测试判断节假日记账与周末记账。
+日历只对文件中出现的年份有效，未覆盖的年份由调用方提示；文件修改后下次使用时自动重新加载
+
+文件格式：每行一个年份的一类日期，"年份 假: 日期、日期~日期" 为放假日（含调休放假），
+"年份 班: 日期" 为调休上班的周末；日期写作"月-日"，区间用~连接；#开头的行为注释
+"""
+
+import re
+import threading
+import pandas as pd
+from pathlib import Path
+from typing import List, Optional, Set
+
+# 日期之间的分隔符
+DATE_SEPARATOR = re.compile(r"[、,，;；\s]+")
+
+# 行首："年份 假/班:"
+LINE_PATTERN = re.compile(r"^(?P<year>\d{4})\s*(?P<kind>假|班)\s*[:：](?P<dates>.*)$")
+
+class HolidayCalendar:
+    """法定节假日与调休上班日，years为日历覆盖的年份"""
+
+    def __init__(self, holidays: pd.DatetimeIndex, workdays: pd.DatetimeIndex, years: Set[int]):
+        self.holidays = holidays
+        self.workdays = workdays
+        self.years = years
+
+    def is_holiday(self, dates: pd.Series) -> pd.Series:
+        return dates.dt.normalize().isin(self.holidays)
+
+    def is_makeup_workday(self, dates: pd.Series) -> pd.Series:
+        return dates.dt.normalize().isin(self.workdays)
+
+    def uncovered_years(self, dates: pd.Series) -> List[int]:
+        """日期所在年份中日历未覆盖的年份"""
+        return sorted(set(dates.dt.year.dropna().astype(int)) - self.years)
+
+def _expand(year: str, item: str, line: str) -> pd.DatetimeIndex:
+    """展开"月-日"或"月-日~月-日"为日期"""
+    start, _, end = item.partition("~")
+    try:
+        return pd.date_range(f"{year}-{start.strip()}", f"{year}-{(end or start).strip()}")
+    except ValueError:
+        raise ValueError(f"节假日日历的日期 '{item}' 格式不正确: {line}") from None
+
+def parse_calendar(text: str) -> HolidayCalendar:
+    """解析节假日日历文件内容"""
+    holidays: List[pd.DatetimeIndex] = []
+    workdays: List[pd.DatetimeIndex] = []
+    years: Set[int] = set()
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        match = LINE_PATTERN.match(line)
+        if not match:
+            raise ValueError(f"节假日日历的行格式不正确，应为\"年份 假: 月-日~月-日\"或\"年份 班: 月-日\": {line}")
+        target = holidays if match.group("kind") == "假" else workdays
+        target += [_expand(match.group("year"), item, line)
+                   for item in DATE_SEPARATOR.split(match.group("dates").strip()) if item]
+        if match.group("kind") == "假":
+            years.add(int(match.group("year")))
+    empty = pd.DatetimeIndex([])
+    return HolidayCalendar(empty.append(holidays) if holidays else empty,
+                           empty.append(workdays) if workdays else empty, years)
+
+class HolidaySource:
+    """节假日日历文件：修改时间变化后下次获取时重新加载，文件不存在时日历为空"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._mtime: Optional[int] = None
+        self._calendar = parse_calendar("")
+
+    def get(self) -> HolidayCalendar:
+        try:
+            mtime = self.path.stat().st_mtime_ns
+        except OSError:
+            mtime = None
+        with self._lock:
+            if mtime != self._mtime:
+                self._calendar = parse_calendar(self.path.read_text(encoding="utf-8")) if mtime is not None else parse_calendar("")
+                self._mtime = mtime
+            return self._calendar
@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""
+集团内部往来匹配与合并抵销
+集团成员为数据中出现的全部公司。余额表核算维度名称与凭证摘要中的交易对方在去重后的名称上
+解析为成员公司，指向其他成员的余额与分录即为内部往来。
+
+双方金额按（成员对, 金额分桶）哈希连接：金额以分为单位、按容差宽度分桶，
+金额完全相同的记录先按日期顺序直接配对，其余记录同时连接相邻的桶，连接后按金额差与日期差筛选，
+再按"双方互为最优"逐轮确定一对一匹配。
+成员对本身是连接键，成员增加到几十家时仍是一次连接，无需两两循环。
+匹配的年末余额生成抵销分录，内部销售收入与营业成本相互抵销，未匹配的余额与分录作为差异列示
+"""
+
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional, Set, Tuple
+
+# 凭证分录匹配的往来科目（一级科目编码）
+RECIPROCAL_PREFIXES = ("1121", "1122", "1123", "1221", "2201", "2202", "2203", "2241")
+
+# 内部销售收入科目及抵销时对应的成本科目
+REVENUE_COST_SUBJECTS = {"6001": "6401", "6051": "6402"}
+
+# 默认容差：金额（元）与日期（天）
+DEFAULT_AMOUNT_TOLERANCE = 0.01
+DEFAULT_DATE_TOLERANCE = 15
+
+# 抵销分录中双方金额差异所用的科目名称
+DIFFERENCE_SUBJECT = "合并抵销差额"
+
+# 合并试算平衡表中已结转至所有者权益的本年损益
+PROFIT_TRANSFER_SUBJECT = "本年损益结转"
+
+def normalize_names(names: pd.Series) -> pd.Series:
+    """统一名称写法：去除空白，全角括号转为半角"""
+    return (names.astype(str).str.replace(r"\s+", "", regex=True)
+            .str.replace("（", "(", regex=False).str.replace("）", ")", regex=False))
+
+def resolve_entities(names: pd.Series, entities: List[str]) -> pd.Series:
+    """将往来单位名称解析为集团成员，无法解析时为NaN
+
+    依次尝试完全相同、名称为成员全称的一部分（至少4个字）、名称包含成员全称，只有唯一命中时才解析；
+    匹配只在去重后的名称上进行
+    """
+    codes, uniques = pd.factorize(names)
+    members = normalize_names(pd.Series(entities, dtype=object)).tolist()
+    resolved = []
+    for name in normalize_names(pd.Series(uniques, dtype=object)):
+        if name in members:
+            resolved.append(entities[members.index(name)])
+            continue
+        hits = [entity for entity, member in zip(entities, members)
+                if (len(name) >= 4 and name in member) or member in name]
+        resolved.append(hits[0] if len(hits) == 1 else np.nan)
+    resolved = np.asarray(resolved + [np.nan], dtype=object)
+    return pd.Series(resolved[codes], index=names.index, dtype=object)
+
+def orient_pairs(frame: pd.DataFrame) -> pd.DataFrame:
+    """标注成员对：名称较小的成员为甲方，乙方金额取反后与甲方金额直接比较"""
+    first = frame["公司"] < frame["对方"]
+    return frame.assign(
+        成员对=np.where(first, frame["公司"] + "|" + frame["对方"], frame["对方"] + "|" + frame["公司"]),
+        甲方=first.to_numpy(),
+        分=np.where(first, 1, -1) * np.round(frame["金额"].to_numpy() * 100).astype(np.int64),
+    )
+
+def rank_within(frame: pd.DataFrame, columns: List[str], position: str) -> pd.DataFrame:
+    """在各组内按日期先后编号：组为columns去掉末尾的日期列，没有日期列时按原顺序编号"""
+    groups = columns[:-1] if columns[-1] == "日期" else columns
+    ranked = frame.sort_values(columns + [position], kind="stable")
+    return ranked.assign(序号=ranked.groupby(groups, sort=False).cumcount())
+
+def match_amounts(left: pd.DataFrame, right: pd.DataFrame, keys: List[str],
+                  amount_tolerance: float = DEFAULT_AMOUNT_TOLERANCE,
+                  date_tolerance: Optional[int] = None) -> pd.DataFrame:
+    """按连接键与金额哈希连接两侧记录，返回一对一匹配的（左位置, 右位置, 金额差, 间隔天数）
+
+    left、right须含keys列、以分为单位的"分"列，date_tolerance不为空时还须含"日期"列
+    """
+    tolerance = int(round(amount_tolerance * 100))
+    width = max(tolerance, 1)
+    columns = keys + ["分"] + (["日期"] if date_tolerance is not None else [])
+    left = left[columns].assign(左=np.arange(len(left)))
+    right = right[columns].assign(右=np.arange(len(right)))
+
+    # 金额完全相同的记录直接配对：同一（连接键, 分）组内按日期排序编号，按编号连接；
+    # 大量相同金额的记录无需逐轮比较，只有超出日期容差的配对留给后续按容差匹配
+    exact = rank_within(left, columns, "左").merge(
+        rank_within(right, columns, "右"), on=keys + ["分", "序号"], suffixes=("_左", "_右"))
+    exact["金额差"] = 0
+    if date_tolerance is not None:
+        exact["间隔天数"] = (exact["日期_左"] - exact["日期_右"]).dt.days.abs()
+        exact = exact[exact["间隔天数"] <= date_tolerance]
+    else:
+        exact["间隔天数"] = 0
+    exact = exact[["左", "右", "金额差", "间隔天数"]]
+    left = left[~left["左"].isin(exact["左"])]
+    right = right[~right["右"].isin(exact["右"])]
+
+    left = left.assign(桶=left["分"].to_numpy() // width)
+    right = right.assign(桶=right["分"].to_numpy() // width)
+    if tolerance:
+        # 差额不超过容差的两笔金额最多相差一个桶
+        right = pd.concat([right.assign(桶=right["桶"] + offset) for offset in (-1, 0, 1)], ignore_index=True)
+
+    candidates = left.merge(right, on=keys + ["桶"], suffixes=("_左", "_右"))
+    candidates["金额差"] = (candidates["分_左"] - candidates["分_右"]).abs()
+    keep = candidates["金额差"] <= tolerance
+    if date_tolerance is not None:
+        candidates["间隔天数"] = (candidates["日期_左"] - candidates["日期_右"]).dt.days.abs()
+        keep &= candidates["间隔天数"] <= date_tolerance
+    else:
+        candidates["间隔天数"] = 0
+    candidates = candidates.loc[keep, ["左", "右", "金额差", "间隔天数"]].sort_values(
+        ["金额差", "间隔天数", "左", "右"], kind="stable")
+
+    # 其余记录每轮接受互为最优的候选对，全局最优的一对总是互为最优，因此每轮至少确定一对
+    matched = [exact]
+    while not candidates.empty:
+        best_left = candidates.drop_duplicates("左")
+        best_right = candidates.drop_duplicates("右")[["左", "右"]]
+        mutual = best_left.merge(best_right, on=["左", "右"])
+        matched.append(mutual)
+        candidates = candidates[~candidates["左"].isin(mutual["左"]) & ~candidates["右"].isin(mutual["右"])]
+    result = pd.concat(matched, ignore_index=True).astype(np.int64)
+    return result.assign(金额差=result["金额差"] / 100).sort_values("左").reset_index(drop=True)
+
+def split_matches(frame: pd.DataFrame, keys: List[str], amount_tolerance: float,
+                  date_tolerance: Optional[int] = None) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """将标注成员对后的记录分为甲乙两侧匹配，返回（匹配结果, 未匹配记录）
+
+    匹配结果每行为一对：甲方记录的列与乙方记录的列（加"对方"前缀）并列
+    """
+    left = frame[frame["甲方"]].reset_index(drop=True)
+    right = frame[~frame["甲方"]].reset_index(drop=True)
+    pairs = match_amounts(left, right, keys, amount_tolerance, date_tolerance)
+    left_rows = left.iloc[pairs["左"].to_numpy()].reset_index(drop=True)
+    right_rows = right.iloc[pairs["右"].to_numpy()].reset_index(drop=True)
+    matched = pd.concat([left_rows, right_rows.add_prefix("对方_"), pairs[["金额差", "间隔天数"]]], axis=1)
+    residual = pd.concat([left.drop(index=pairs["左"]), right.drop(index=pairs["右"])], ignore_index=True)
+    return matched, residual
+
+class IntercompanyLedger:
+    """集团内部往来：余额表维度行与凭证往来分录中指向其他成员的部分"""
+
+    def __init__(self, balance_df: pd.DataFrame, voucher_df: Optional[pd.DataFrame] = None):
+        self.entities = sorted(balance_df["公司"].dropna().astype(str).unique())
+        self.balances = self._balances(balance_df)
+        self.lines = self._lines(voucher_df) if voucher_df is not None else None
+
+    def _balances(self, balance_df: pd.DataFrame) -> pd.DataFrame:
+        rows = balance_df[balance_df["核算维度名称"].notna()]
+        counterparty = resolve_entities(rows["核算维度名称"].astype(str), self.entities)
+        company = rows["公司"].astype(str)
+        internal = counterparty.notna() & (counterparty != company)
+        rows, counterparty = rows[internal], counterparty[internal]
+        codes = rows["subject_code_path"].astype(str).str.strip("/").str.split("/").str[-1]
+        return pd.DataFrame({
+            "公司": rows["公司"].astype(str).to_numpy(),
+            "对方": counterparty.to_numpy(),
+            "年份": rows["年份"].to_numpy(),
+            "科目编码": codes.to_numpy(),
+            "科目名称": rows["subject_name_path"].astype(str).str.strip("/").str.replace("/", "_").to_numpy(),
+            "核算维度名称": rows["核算维度名称"].astype(str).str.strip().to_numpy(),
+            "金额": (rows["期末余额借方"] - rows["期末余额贷方"]).to_numpy(),
+            "本年累计借方": rows["本年累计借方"].to_numpy(),
+            "本年累计贷方": rows["本年累计贷方"].to_numpy(),
+        })
+
+    def _lines(self, voucher_df: pd.DataFrame) -> pd.DataFrame:
+        codes = voucher_df["科目编码"].astype(str)
+        reciprocal = codes.str.split(".").str[0].isin(RECIPROCAL_PREFIXES)
+        rows = voucher_df[reciprocal & voucher_df["日期"].notna()]
+        counterparty = resolve_entities(rows["交易对方"].astype(object).where(rows["交易对方"].notna(), ""),
+                                        self.entities)
+        company = rows["公司"].astype(str)
+        internal = counterparty.notna() & (counterparty != company)
+        rows, counterparty = rows[internal], counterparty[internal]
+        return pd.DataFrame({
+            "公司": rows["公司"].astype(str).to_numpy(),
+            "对方": counterparty.to_numpy(),
+            "日期": rows["日期"].to_numpy(),
+            "凭证号": (rows["凭证字"].astype(str) + "-" + rows["凭证号"].astype(str)).to_numpy(),
+            "科目编码": rows["科目编码"].astype(str).to_numpy(),
+            "摘要": rows["摘要"].to_numpy(),
+            "金额": (rows["借方金额"] - rows["贷方金额"]).to_numpy(),
+        })
+
+    def match_balances(self, year: int, amount_tolerance: float = DEFAULT_AMOUNT_TOLERANCE
+                       ) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """匹配年末往来余额：甲方余额与乙方余额金额相反、差额不超过容差即为一对"""
+        balances = self.balances[(self.balances["年份"] == year) & (self.balances["金额"].round(2) != 0)]
+        return split_matches(orient_pairs(balances), ["成员对"], amount_tolerance)
+
+    def match_lines(self, year: Optional[int] = None, amount_tolerance: float = DEFAULT_AMOUNT_TOLERANCE,
+                    date_tolerance: int = DEFAULT_DATE_TOLERANCE) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """匹配往来分录：一方的借方对另一方的贷方，金额差不超过容差且日期相差不超过date_tolerance天"""
+        lines = self.lines
+        if year is not None:
+            lines = lines[pd.to_datetime(lines["日期"]).dt.year == year]
+        lines = lines[lines["金额"].round(2) != 0]
+        return split_matches(orient_pairs(lines), ["成员对"], amount_tolerance, date_tolerance)
+
+    def pair_summary(self, year: int) -> pd.DataFrame:
+        """各成员对的往来余额合计：双方余额相加应为零，不为零的部分即为差异"""
+        balances = orient_pairs(self.balances[self.balances["年份"] == year])
+        summary = balances.assign(
+            甲方余额=balances["金额"].where(balances["甲方"], 0.0),
+            乙方余额=balances["金额"].where(~balances["甲方"], 0.0),
+        ).groupby("成员对", sort=True)[["甲方余额", "乙方余额"]].sum().reset_index()
+        summary.insert(1, "甲方", summary["成员对"].str.split("|").str[0])
+        summary.insert(2, "乙方", summary["成员对"].str.split("|").str[1])
+        summary["差额"] = summary["甲方余额"] + summary["乙方余额"]
+        return summary.drop(columns="成员对")
+
+    def internal_revenue(self, year: int) -> pd.DataFrame:
+        """本年对其他成员的销售收入（收入科目维度行的本年累计贷方）"""
+        balances = self.balances[self.balances["年份"] == year]
+        level1 = balances["科目编码"].str.split(".").str[0]
+        revenue = balances[level1.isin(REVENUE_COST_SUBJECTS)].assign(一级科目=level1)
+        revenue = revenue.groupby(["公司", "对方", "一级科目"], sort=True, as_index=False)["本年累计贷方"].sum() \
+            .rename(columns={"本年累计贷方": "金额"})
+        return revenue[revenue["金额"].round(2) != 0].reset_index(drop=True)
+
+def elimination_entries(matched_balances: pd.DataFrame, internal_revenue: pd.DataFrame,
+                        subject_names: Dict[str, str]) -> pd.DataFrame:
+    """生成合并抵销分录
+
+    匹配的往来余额：双方余额各自反向冲回，差额（不超过容差）计入合并抵销差额；
+    内部销售：借记销售方收入，贷记购买方相应的营业成本
+    """
+    entries = []
+    for number, pair in enumerate(matched_balances.itertuples(index=False), start=1):
+        description = f"抵销{pair.公司}与{pair.对方_公司}往来余额"
+        for company, code, name, amount in [(pair.公司, pair.科目编码, pair.科目名称, pair.金额),
+                                            (pair.对方_公司, pair.对方_科目编码, pair.对方_科目名称, pair.对方_金额)]:
+            entries.append({"分录号": number, "实体": company, "科目编码": code, "科目名称": name,
+                            "借方金额": max(-amount, 0.0), "贷方金额": max(amount, 0.0), "说明": description})
+        difference = round(pair.金额 + pair.对方_金额, 2)
+        if difference:
+            entries.append({"分录号": number, "实体": "", "科目编码": "", "科目名称": DIFFERENCE_SUBJECT,
+                            "借方金额": max(difference, 0.0), "贷方金额": max(-difference, 0.0), "说明": description})
+
+    number = len(matched_balances)
+    for number, sale in enumerate(internal_revenue.itertuples(index=False), start=number + 1):
+        cost_code = REVENUE_COST_SUBJECTS[sale.一级科目]
+        description = f"抵销{sale.公司}对{sale.对方}的内部销售"
+        entries.append({"分录号": number, "实体": sale.公司, "科目编码": sale.一级科目,
+                        "科目名称": subject_names.get(sale.一级科目, sale.一级科目),
+                        "借方金额": sale.金额, "贷方金额": 0.0, "说明": description})
+        entries.append({"分录号": number, "实体": sale.对方, "科目编码": cost_code,
+                        "科目名称": subject_names.get(cost_code, cost_code),
+                        "借方金额": 0.0, "贷方金额": sale.金额, "说明": description})
+    return pd.DataFrame(entries, columns=["分录号", "实体", "科目编码", "科目名称", "借方金额", "贷方金额", "说明"])
+
+def consolidated_trial_balance(balance_df: pd.DataFrame, year: int, eliminations: pd.DataFrame,
+                               subject_names: Dict[str, str], credit_codes: Set[str]) -> pd.DataFrame:
+    """按一级科目编制合并试算平衡表：各成员金额、合计、抵销借贷方与合并数
+
+    金额以借方为正：资产负债类取期末余额，损益类取本年发生额（贷方科目取贷方累计并记为负数）；
+    期末余额中的所有者权益已包含本年损益，另列本年损益结转一行冲回，使各成员合计为零
+    """
+    rows = balance_df[balance_df["核算维度名称"].isna() & (balance_df["年份"] == year)]
+    codes = rows["科目编码"].astype(str)
+    rows = rows[codes.str.fullmatch(r"\d+")]
+    codes = rows["科目编码"].astype(str)
+    profit_loss = codes.str.startswith("6")
+    credit = codes.isin(credit_codes)
+    closing = (rows["期末余额借方"] - rows["期末余额贷方"]).to_numpy()
+    amount = np.where(profit_loss, np.where(credit, -rows["本年累计贷方"], rows["本年累计借方"]), closing)
+    # 结转额 = 已结转的损益 = 本年发生额 - 仍留在损益类科目的期末余额
+    transfer = pd.DataFrame({"公司": rows["公司"].astype(str).to_numpy(),
+                             "金额": np.where(profit_loss, closing - amount, 0.0)}) \
+        .groupby("公司")["金额"].sum()
+    trial = pd.DataFrame({"科目编码": codes.to_numpy(), "公司": rows["公司"].astype(str).to_numpy(), "金额": amount}) \
+        .pivot_table(index="科目编码", columns="公司", values="金额", aggfunc="sum", fill_value=0.0)
+    trial.loc[PROFIT_TRANSFER_SUBJECT] = transfer.reindex(trial.columns, fill_value=0.0)
+    trial.columns = list(trial.columns)
+    trial["合计"] = trial.sum(axis=1)
+
+    level1 = eliminations["科目编码"].astype(str).str.split(".").str[0].replace("", DIFFERENCE_SUBJECT)
+    adjustments = eliminations.assign(科目编码=level1).groupby("科目编码")[["借方金额", "贷方金额"]].sum() \
+        .rename(columns={"借方金额": "抵销借方", "贷方金额": "抵销贷方"})
+    trial = trial.join(adjustments, how="outer").infer_objects(copy=False).fillna(0.0)
+    trial["合并数"] = trial["合计"] + trial["抵销借方"] - trial["抵销贷方"]
+    trial = trial[(trial.drop(columns="合并数").abs() > 0.005).any(axis=1)].reset_index()
+    trial.insert(1, "科目名称", trial["科目编码"].map(subject_names).fillna(trial["科目编码"]))
+    return trial
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+凭证分录测试（Journal Entry Testing）规则引擎
+规则以声明式表达式定义，编译为一个多行表达式后在特征表上一次性求值，
+再按凭证汇总命中规则与风险得分
+"""
+
+import re
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional, Any
+
+from voucher_features import voucher_keys, voucher_header, accounting_period_end
+from expression_guard import validate_expression
+from holiday_calendar import HolidayCalendar
+
+# 默认规则：expression引用build_features生成的特征列
+DEFAULT_RULES = [
+    {"id": "weekend_posting", "name": "周末记账", "expression": "(weekday >= 5) & ~is_makeup_workday", "weight": 1},
+    {"id": "holiday_posting", "name": "节假日记账", "expression": "is_holiday", "weight": 1},
+    {"id": "round_amount", "name": "整数金额", "expression": "(amount >= 10000) & (trailing_zeros >= 4)", "weight": 1},
+    {"id": "same_maker_reviewer", "name": "制单与审核为同一人", "expression": "same_maker_reviewer", "weight": 3},
+    {"id": "post_after_close", "name": "日期晚于所属会计期间", "expression": "days_after_period_end > 0", "weight": 3},
+    {"id": "period_end_entry", "name": "期末最后一天记账", "expression": "days_after_period_end == 0", "weight": 1},
+    {"id": "rare_subject_pair", "name": "罕见科目对应关系", "expression": "min_pair_count <= 2", "weight": 2},
+    {"id": "blank_summary", "name": "摘要为空", "expression": "summary_blank", "weight": 1},
+]
+
+# 可在规则表达式中使用的特征列
+FEATURE_COLUMNS = {
+    "weekday": "星期（0=周一，6=周日）",
+    "is_holiday": "是否法定节假日（按节假日日历）",
+    "is_makeup_workday": "是否调休上班的周末（按节假日日历）",
+    "amount": "分录金额（借贷方较大者）",
+    "trailing_zeros": "金额整数部分末尾0的个数",
+    "same_maker_reviewer": "制单人与审核人相同",
+    "days_after_period_end": "日期距所属会计期间最后一天的天数（正数表示晚于期末）",
+    "min_pair_count": "凭证中最罕见的一级科目借贷对应关系在本公司出现的凭证数",
+    "summary_blank": "摘要为空",
+}
+
+def _trailing_zeros(amount: np.ndarray, max_digits: int = 9) -> np.ndarray:
+    """计算整数金额末尾0的个数（带角分的金额为0）"""
+    cents = np.rint(amount * 100).astype(np.int64)
+    whole = np.where(cents % 100 == 0, cents // 100, 0)
+    zeros = np.zeros(len(amount), dtype=np.int64)
+    for digits in range(1, max_digits + 1):
+        zeros += (whole > 0) & (whole % (10 ** digits) == 0)
+    return zeros
+
+def _subject_pair_counts(voucher_df: pd.DataFrame, keys: pd.Series) -> pd.Series:
+    """计算每张凭证中最罕见的一级科目借贷对应关系的出现次数"""
+    top_codes = voucher_df["科目编码"].astype(str).str.split(".").str[0]
+    lines = pd.DataFrame({"key": keys, "公司": voucher_df["公司"], "科目": top_codes})
+
+    debit = lines[voucher_df["借方金额"] > 0].drop_duplicates()
+    credit = lines[voucher_df["贷方金额"] > 0][["key", "科目"]].drop_duplicates()
+    pairs = debit.merge(credit, on="key", suffixes=("_借", "_贷"))
+    pairs = pairs[pairs["科目_借"] != pairs["科目_贷"]]
+    if pairs.empty:
+        return pd.Series(np.inf, index=voucher_df.index)
+
+    pairs["count"] = pairs.groupby(["公司", "科目_借", "科目_贷"])["key"].transform("size")
+    voucher_min = pairs.groupby("key")["count"].min()
+    return keys.map(voucher_min).fillna(np.inf)
+
+def build_features(voucher_df: pd.DataFrame) -> pd.DataFrame:
+    """为整张凭证表生成规则求值所需的特征列（节假日相关列在求值时按当前日历补充）"""
+    keys = voucher_keys(voucher_df)
+    dates = voucher_df["日期"]
+    amount = np.maximum(voucher_df["借方金额"].to_numpy(), voucher_df["贷方金额"].to_numpy())
+
+    features = pd.DataFrame(index=voucher_df.index)
+    features["voucher_key"] = keys
+    features["weekday"] = dates.dt.weekday.fillna(-1).astype(int)
+    features["amount"] = amount
+    features["trailing_zeros"] = _trailing_zeros(amount)
+
+    if "制单" in voucher_df.columns and "审核" in voucher_df.columns:
+        maker = voucher_header(voucher_df, "制单", keys)
+        reviewer = voucher_header(voucher_df, "审核", keys)
+        features["same_maker_reviewer"] = maker.notna() & (maker == reviewer)
+    else:
+        features["same_maker_reviewer"] = False
+
+    features["days_after_period_end"] = (dates - accounting_period_end(voucher_df)).dt.days.fillna(-999).astype(int)
+    features["min_pair_count"] = _subject_pair_counts(voucher_df, keys)
+    features["summary_blank"] = voucher_df["摘要"].fillna("").astype(str).str.strip() == ""
+    return features
+
+def validate_rules(rules: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """校验规则定义，表达式只能引用特征列"""
+    validated = []
+    seen = set()
+    for rule in rules:
+        rule_id = str(rule.get("id", "")).strip()
+        if not re.match(r'^[A-Za-z_][A-Za-z0-9_]*$', rule_id):
+            raise ValueError(f"规则ID '{rule_id}' 格式不正确，应为字母、数字和下划线组合")
+        if rule_id in seen:
+            raise ValueError(f"规则ID '{rule_id}' 重复")
+        expression = validate_expression(rule.get("expression", ""), FEATURE_COLUMNS, f"规则 '{rule_id}'")
+        seen.add(rule_id)
+        validated.append({
+            "id": rule_id,
+            "name": rule.get("name") or rule_id,
+            "expression": expression,
+            "weight": float(rule.get("weight", 1)),
+        })
+    return validated
+
+def compile_rules(rules: List[Dict[str, Any]]) -> str:
+    """将规则编译为一个多行赋值表达式，供DataFrame.eval一次求值"""
+    return "\n".join(f"rule_{rule['id']} = {rule['expression']}" for rule in rules)
+
+def evaluate_rules(features: pd.DataFrame, rules: List[Dict[str, Any]]) -> pd.DataFrame:
+    """对特征表求值，返回每条分录每条规则的命中矩阵"""
+    evaluated = features.eval(compile_rules(rules))
+    columns = [f"rule_{rule['id']}" for rule in rules]
+    hits = evaluated[columns].astype(bool)
+    hits.columns = [rule["id"] for rule in rules]
+    return hits
+
+def score_vouchers(voucher_df: pd.DataFrame, hits: pd.DataFrame, keys: pd.Series,
+                   rules: List[Dict[str, Any]], min_score: float = 0) -> pd.DataFrame:
+    """按凭证汇总命中规则与得分，返回按得分降序的异常凭证清单"""
+    voucher_hits = hits.groupby(keys, sort=False).any()
+    weights = np.array([rule["weight"] for rule in rules])
+    scores = voucher_hits.to_numpy().astype(float) @ weights
+    flagged = scores > max(min_score, 0)
+    if not flagged.any():
+        return pd.DataFrame()
+
+    voucher_hits = voucher_hits[flagged]
+    names = np.array([rule["name"] for rule in rules], dtype=object)
+    hit_matrix = voucher_hits.to_numpy()
+
+    info = voucher_df.groupby(keys, sort=False).agg(
+        公司=("公司", "first"),
+        日期=("日期", "first"),
+        凭证字=("凭证字", "first"),
+        凭证号=("凭证号", "first"),
+        摘要=("摘要", "first"),
+        借方合计=("借方金额", "sum"),
+        分录数=("借方金额", "size"),
+    ).loc[voucher_hits.index]
+
+    result = info.reset_index(drop=True)
+    result.insert(0, "凭证唯一标识", voucher_hits.index.to_numpy())
+    result["得分"] = scores[flagged]
+    result["命中规则数"] = hit_matrix.sum(axis=1)
+    result["命中规则"] = ["、".join(names[row]) for row in hit_matrix]
+    return result.sort_values(["得分", "借方合计"], ascending=[False, False], kind="mergesort").reset_index(drop=True)
+
+def run_journal_entry_tests(voucher_df: pd.DataFrame, features: pd.DataFrame, rules: List[Dict[str, Any]],
+                            calendar: HolidayCalendar, min_score: float = 0) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """一次求值全部规则，返回(异常凭证清单, 规则命中统计)"""
+    if voucher_df.empty:
+        return pd.DataFrame(), pd.DataFrame()
+
+    dates = voucher_df["日期"]
+    features = features.loc[voucher_df.index].assign(
+        is_holiday=calendar.is_holiday(dates).to_numpy(),
+        is_makeup_workday=calendar.is_makeup_workday(dates).to_numpy(),
+    )
+    keys = features["voucher_key"]
+    hits = evaluate_rules(features, rules)
+
+    summary = pd.DataFrame({
+        "规则": [rule["name"] for rule in rules],
+        "权重": [rule["weight"] for rule in rules],
+        "命中分录数": hits.sum().to_numpy(),
+        "命中凭证数": hits.groupby(keys, sort=False).any().sum().to_numpy(),
+    }, index=[rule["id"] for rule in rules])
+
+    return score_vouchers(voucher_df, hits, keys, rules, min_score), summary
+
+def select_rules(rule_ids: Optional[List[str]] = None, custom_rules: Optional[List[Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+    """选择默认规则子集并追加自定义规则"""
+    rules = DEFAULT_RULES
+    if rule_ids:
+        unknown = set(rule_ids) - {rule["id"] for rule in DEFAULT_RULES}
+        if unknown:
+            raise ValueError(f"未知规则: {', '.join(sorted(unknown))}")
+        rules = [rule for rule in DEFAULT_RULES if rule["id"] in rule_ids]
+    return validate_rules(list(rules) + list(custom_rules or []))
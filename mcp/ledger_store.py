@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+共享账簿存储
+将余额表与凭证表按列保存为.npy文件：数值、日期与布尔列原样保存，字符串列保存为整数编码与取值表。
+各MCP服务进程以只读内存映射打开，数值列直接共享操作系统页缓存中的同一份数据（零拷贝），
+字符串列按编码取值即可还原，无需解析CSV及重新计算派生列。
+
+存储按源文件的大小与修改时间以及派生列计算代码的摘要标识版本；守护进程（python ledger_store.py）
+在源文件变化时重建新版本并原子切换，已打开旧版本的进程不受影响
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import time
+import numpy as np
+import pandas as pd
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+# 存储格式版本，格式变化时旧存储视为过期
+STORE_VERSION = 1
+
+# 指向当前版本目录的清单文件
+CURRENT_FILE = "current.json"
+
+# 守护进程检查源文件变化的间隔（秒）
+DEFAULT_INTERVAL = 30
+
+# 计算派生列（交易对方、业务分类）的模块，内容变化后存储视为过期
+DERIVATION_MODULES = ("voucher_features.py", "business_classifier.py")
+
+@lru_cache(maxsize=1)
+def derivation_fingerprint() -> str:
+    """本进程加载的派生列计算代码的摘要：提取规则或分类规则修改后与存储中记录的不一致"""
+    digest = hashlib.sha256()
+    for name in DERIVATION_MODULES:
+        digest.update((Path(__file__).parent / name).read_bytes())
+    return digest.hexdigest()[:16]
+
+def source_fingerprint(path: Path) -> Dict[str, Any]:
+    """源文件的路径、大小与修改时间，用于判断存储是否过期"""
+    stat = Path(path).stat()
+    return {"path": str(Path(path).resolve()), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+def _encode_strings(column: pd.Series) -> tuple[np.ndarray, list]:
+    """字符串（object）列编码为int32编码与取值表，缺失值编码为-1"""
+    codes, uniques = pd.factorize(column, use_na_sentinel=True)
+    return codes.astype(np.int32), [value.item() if isinstance(value, np.generic) else value for value in uniques]
+
+def write_table(df: pd.DataFrame, directory: Path) -> List[Dict[str, Any]]:
+    """按列写入数据表，返回列描述；取值表单独保存，清单只记录文件名"""
+    directory.mkdir(parents=True, exist_ok=True)
+    columns = []
+    for i, name in enumerate(df.columns):
+        column = df[name]
+        entry: Dict[str, Any] = {"name": name, "file": f"c{i}.npy"}
+        categories = None
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            entry.update(kind="categorical", ordered=bool(column.cat.ordered))
+            values, categories = column.cat.codes.to_numpy(), column.cat.categories.tolist()
+        elif isinstance(column.dtype, pd.StringDtype):
+            entry.update(kind="string")
+            values, categories = _encode_strings(column.astype(object))
+        elif column.dtype == object:
+            entry.update(kind="object")
+            values, categories = _encode_strings(column)
+        else:
+            entry.update(kind="numpy")
+            values = column.to_numpy()
+        np.save(directory / entry["file"], np.ascontiguousarray(values), allow_pickle=False)
+        if categories is not None:
+            entry["categories"] = f"c{i}.json"
+            with open(directory / entry["categories"], "w", encoding="utf-8") as f:
+                json.dump(categories, f, ensure_ascii=False)
+        columns.append(entry)
+    return columns
+
+def read_table(directory: Path, columns: List[Dict[str, Any]]) -> pd.DataFrame:
+    """以只读内存映射打开数据表：数值列零拷贝，字符串列按编码取值（同一取值共享同一对象）"""
+    data = {}
+    for entry in columns:
+        # 以普通ndarray视图使用映射内容，避免np.memmap子类传入pandas
+        values = np.load(directory / entry["file"], mmap_mode="r", allow_pickle=False).view(np.ndarray)
+        kind = entry["kind"]
+        if kind == "numpy":
+            data[entry["name"]] = values
+            continue
+        with open(directory / entry["categories"], encoding="utf-8") as f:
+            categories = json.load(f)
+        if kind == "categorical":
+            data[entry["name"]] = pd.Categorical.from_codes(values, categories=categories, ordered=entry["ordered"])
+            continue
+        # 末尾追加缺失值，编码-1正好取到它
+        lookup = np.asarray(categories + [np.nan], dtype=object)
+        strings = lookup.take(values)
+        data[entry["name"]] = pd.array(strings, dtype="string") if kind == "string" else strings
+    return pd.DataFrame(data, copy=False)
+
+def read_manifest(store_dir: Path) -> Optional[Dict[str, Any]]:
+    """读取当前版本的清单，不存在或格式版本不符时返回None"""
+    current = Path(store_dir) / CURRENT_FILE
+    if not current.exists():
+        return None
+    try:
+        manifest = json.loads(current.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    if manifest.get("store_version") != STORE_VERSION or not (Path(store_dir) / manifest["directory"]).is_dir():
+        return None
+    return manifest
+
+def is_fresh(manifest: Optional[Dict[str, Any]], table: str, source: Path) -> bool:
+    """存储中的数据表是否与源文件及当前的派生列计算代码一致"""
+    if manifest is None or table not in manifest["tables"] or not Path(source).exists():
+        return False
+    if manifest.get("derivation") != derivation_fingerprint():
+        return False
+    return manifest["tables"][table]["source"] == source_fingerprint(source)
+
+def open_table(store_dir: Path, table: str, source: Path) -> Optional[pd.DataFrame]:
+    """打开与源文件一致的数据表，没有可用存储时返回None"""
+    manifest = read_manifest(store_dir)
+    if not is_fresh(manifest, table, source):
+        return None
+    return read_table(Path(store_dir) / manifest["directory"] / table, manifest["tables"][table]["columns"])
+
+def build_store(store_dir: Path, tables: Dict[str, pd.DataFrame], sources: Dict[str, Path]) -> Dict[str, Any]:
+    """写入新版本并原子切换清单，随后清理旧版本（仍被映射的旧文件在POSIX上可继续读取）"""
+    store_dir = Path(store_dir)
+    store_dir.mkdir(parents=True, exist_ok=True)
+    version = f"v{time.time_ns()}"
+    staging = store_dir / f".{version}.tmp"
+    manifest: Dict[str, Any] = {"store_version": STORE_VERSION, "directory": version,
+                                "built_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                                "derivation": derivation_fingerprint(), "tables": {}}
+    for table, df in tables.items():
+        columns = write_table(df, staging / table)
+        manifest["tables"][table] = {"source": source_fingerprint(sources[table]), "rows": len(df), "columns": columns}
+    os.replace(staging, store_dir / version)
+
+    pointer = store_dir / f".{CURRENT_FILE}.tmp"
+    pointer.write_text(json.dumps(manifest, ensure_ascii=False), encoding="utf-8")
+    os.replace(pointer, store_dir / CURRENT_FILE)
+
+    for old in store_dir.iterdir():
+        if old.is_dir() and old.name != version:
+            # Windows上仍被映射的文件无法删除，留待下次重建时清理
+            shutil.rmtree(old, ignore_errors=True)
+    return manifest
+
+def store_size(store_dir: Path, manifest: Dict[str, Any]) -> int:
+    """当前版本占用的字节数"""
+    return sum(f.stat().st_size for f in (Path(store_dir) / manifest["directory"]).rglob("*.npy"))
+
+class LedgerDaemon:
+    """保持共享存储与源文件同步：源文件变化时重建，并保持当前版本的映射常驻页缓存"""
+
+    def __init__(self, store_dir: Path, interval: float = DEFAULT_INTERVAL):
+        self.store_dir = Path(store_dir)
+        self.interval = interval
+        self.mapped: List[np.ndarray] = []
+
+    def sync(self) -> bool:
+        """源文件变化时重建存储，返回是否重建"""
+        import financial_data_mcp as server
+        sources = {"balance": server.resolve_data_path(server.BALANCE_FILE),
+                   "voucher": server.resolve_data_path(server.VOUCHER_FILE)}
+        manifest = read_manifest(self.store_dir)
+        if all(is_fresh(manifest, table, source) for table, source in sources.items()):
+            if not self.mapped:
+                self._map(manifest)
+            return False
+
+        started = time.perf_counter()
+        tables = {"balance": server.read_balance_csv(), "voucher": server.read_voucher_csv()}
+        manifest = build_store(self.store_dir, tables, sources)
+        print(f"共享存储已重建: {self.store_dir / manifest['directory']} "
+              f"({store_size(self.store_dir, manifest) / 1024 / 1024:.0f}MB, {time.perf_counter() - started:.1f}s)",
+              file=sys.stderr)
+        self._map(manifest)
+        return True
+
+    def _map(self, manifest: Dict[str, Any]):
+        """映射当前版本的全部列文件并预读一遍，使页面常驻页缓存"""
+        self.mapped = [np.load(path, mmap_mode="r", allow_pickle=False)
+                       for path in sorted((self.store_dir / manifest["directory"]).rglob("*.npy"))]
+        for values in self.mapped:
+            np.asarray(values).view(np.uint8).sum()
+
+    def run(self):
+        while True:
+            try:
+                self.sync()
+            except Exception as e:
+                print(f"共享存储同步失败: {e}", file=sys.stderr)
+            time.sleep(self.interval)
+
+def main():
+    """主函数"""
+    sys.path.insert(0, str(Path(__file__).parent))
+    import financial_data_mcp as server
+
+    parser = argparse.ArgumentParser(description="构建并维护MCP服务共享的账簿存储")
+    parser.add_argument("--store-dir", default=str(server.STORE_DIR), help="存储目录，需与服务的FINANCIAL_MCP_STORE_DIR一致")
+    parser.add_argument("--interval", type=float, default=DEFAULT_INTERVAL, help="检查源文件变化的间隔（秒）")
+    parser.add_argument("--once", action="store_true", help="只构建一次（已是最新时不重建）后退出")
+    args = parser.parse_args()
+
+    daemon = LedgerDaemon(Path(args.store_dir), args.interval)
+    if args.once:
+        rebuilt = daemon.sync()
+        print("共享存储已是最新" if not rebuilt else "共享存储构建完成", file=sys.stderr)
+        return 0
+    print(f"共享存储守护进程启动: {args.store_dir}，每{args.interval:g}秒检查源文件", file=sys.stderr)
+    daemon.run()
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+科目月度发生额异常检测
+在月度余额序列的（公司, 科目）× 月份矩阵上，用滑动窗口一次计算全部序列的
+滚动中位数与MAD稳健z值，识别环比突增突减、同比季节性偏离和余额方向反转，按异常程度统一排序
+"""
+
+import warnings
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from typing import List, Optional
+
+from balance_series import BalanceSeries
+
+ANOMALY_TYPES = {
+    "spike": "环比异常",
+    "seasonal": "同比偏离",
+    "sign_flip": "余额方向反转",
+}
+
+# MAD换算为标准差的系数
+MAD_SCALE = 1.4826
+
+# MAD为0时改用平均绝对偏差（Iglewicz-Hoaglin修正z值）的系数
+MEAN_AD_SCALE = 1.2533
+
+# 参与计算的最少历史月份数
+MIN_PERIODS = 3
+
+# z值上限，历史发生额完全平稳的序列出现变动时z值按上限计，再按偏离金额排序
+MAX_Z = 999.9
+
+ANOMALY_COLUMNS = ["公司", "科目编码", "月份", "异常类型", "本月金额", "参照金额", "偏离金额", "z值"]
+
+def rolling_median_mad(values: np.ndarray, window: int) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """对矩阵每行计算前window个月（不含当月）的中位数、MAD、平均绝对偏差与有效月数"""
+    padded = np.concatenate([np.full((values.shape[0], window), np.nan), values], axis=1)
+    windows = sliding_window_view(padded, window, axis=1)[:, :values.shape[1], :]
+    counts = np.sum(~np.isnan(windows), axis=2)
+    with warnings.catch_warnings():
+        # 历史月份全部缺失时nanmedian返回NaN并告警
+        warnings.simplefilter("ignore", RuntimeWarning)
+        median = np.nanmedian(windows, axis=2)
+        deviation = np.abs(windows - median[:, :, None])
+        mad = np.nanmedian(deviation, axis=2)
+        mean_ad = np.nanmean(deviation, axis=2)
+    return median, mad, mean_ad, counts
+
+def robust_scale(mad: np.ndarray, mean_ad: np.ndarray, floor: float) -> np.ndarray:
+    """稳健尺度：优先用MAD，MAD为0时用平均绝对偏差，均为0时取下限"""
+    scale = np.where(mad > 0, MAD_SCALE * mad, MEAN_AD_SCALE * mean_ad)
+    return np.maximum(np.nan_to_num(scale), floor)
+
+def _collect(series: BalanceSeries, rows: np.ndarray, flags: np.ndarray, kind: str,
+             current: np.ndarray, reference: np.ndarray, z: np.ndarray) -> pd.DataFrame:
+    """将命中位置转换为异常记录"""
+    row_ids, col_ids = np.nonzero(flags)
+    keys = [series.keys[rows[i]] for i in row_ids]
+    months = series.months
+    return pd.DataFrame({
+        "公司": [key[0] for key in keys],
+        "科目编码": [key[1] for key in keys],
+        "月份": [months[c] for c in col_ids],
+        "异常类型": ANOMALY_TYPES[kind],
+        "本月金额": current[row_ids, col_ids],
+        "参照金额": reference[row_ids, col_ids],
+        "偏离金额": current[row_ids, col_ids] - reference[row_ids, col_ids],
+        "z值": np.clip(z[row_ids, col_ids], -MAX_Z, MAX_Z),
+    }, columns=ANOMALY_COLUMNS)
+
+def detect_movement_anomalies(series: BalanceSeries, rows: Optional[np.ndarray] = None, window: int = 6,
+                              threshold: float = 3.5, min_amount: float = 10000.0,
+                              kinds: Optional[List[str]] = None) -> pd.DataFrame:
+    """对选定的（公司, 科目）序列批量检测异常，按|z值|、偏离金额降序返回"""
+    kinds = kinds or list(ANOMALY_TYPES)
+    unknown = set(kinds) - set(ANOMALY_TYPES)
+    if unknown:
+        raise ValueError(f"不支持的异常类型: {', '.join(sorted(unknown))}")
+    if rows is None:
+        rows = np.arange(len(series.keys))
+    if len(rows) == 0 or series.ending.shape[1] == 0:
+        return pd.DataFrame(columns=ANOMALY_COLUMNS)
+
+    # 月度净发生额（借方为正）
+    movement = series.debit[rows] - series.credit[rows]
+    median, mad, mean_ad, counts = rolling_median_mad(movement, window)
+    # 尺度下限使平稳序列的z值门槛与金额门槛一致
+    scale = robust_scale(mad, mean_ad, min_amount / threshold)
+    enough_history = counts >= MIN_PERIODS
+
+    results = []
+    if "spike" in kinds:
+        z = (movement - median) / scale
+        flags = enough_history & (np.abs(z) >= threshold) & (np.abs(movement - median) >= min_amount)
+        results.append(_collect(series, rows, flags, "spike", movement, median, z))
+
+    if "seasonal" in kinds and movement.shape[1] > 12:
+        last_year = np.concatenate([np.full((len(rows), 12), np.nan), movement[:, :-12]], axis=1)
+        z = (movement - last_year) / scale
+        flags = (enough_history & ~np.isnan(last_year) & (np.abs(z) >= threshold)
+                 & (np.abs(movement - last_year) >= min_amount))
+        results.append(_collect(series, rows, flags, "seasonal", movement, np.nan_to_num(last_year), np.nan_to_num(z)))
+
+    if "sign_flip" in kinds:
+        ending = series.ending[rows]
+        previous = np.concatenate([series.opening[rows][:, None], ending[:, :-1]], axis=1)
+        flags = (np.sign(ending) * np.sign(previous) < 0) & (np.abs(ending) >= min_amount) & (np.abs(previous) >= min_amount)
+        # 以余额变动相对历史波动的倍数作为排序依据
+        z = (ending - previous) / scale
+        results.append(_collect(series, rows, flags, "sign_flip", ending, previous, z))
+
+    results = [r for r in results if not r.empty]
+    if not results:
+        return pd.DataFrame(columns=ANOMALY_COLUMNS)
+    anomalies = pd.concat(results, ignore_index=True)
+    order = np.lexsort((-anomalies["偏离金额"].abs().to_numpy(), -anomalies["z值"].abs().to_numpy()))
+    return anomalies.iloc[order].reset_index(drop=True)
+
+def select_rows(series: BalanceSeries, company: Optional[str] = None, subject_code: Optional[str] = None,
+                level: int = 1) -> np.ndarray:
+    """按公司、科目前缀和科目级次（0为全部级次）选择序列"""
+    selected = []
+    for i, (key_company, key_code) in enumerate(series.keys):
+        if company and company.lower() not in str(key_company).lower():
+            continue
+        if subject_code and not (key_code == subject_code or key_code.startswith(subject_code + ".")):
+            continue
+        if level and key_code.count(".") + 1 != level:
+            continue
+        selected.append(i)
+    return np.asarray(selected, dtype=np.int64)
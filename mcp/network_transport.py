@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+本地网络传输
+在一个进程内同时提供Streamable HTTP（/mcp）与SSE（/sse、/messages/）两种传输，
+多个客户端共享同一份已加载的数据与派生缓存；可监听本机端口或Unix套接字
+"""
+
+import contextlib
+import ipaddress
+import sys
+from typing import Optional
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.routing import Mount, Route
+from starlette.responses import Response
+
+from mcp.server import Server
+from mcp.server.models import InitializationOptions
+from mcp.server.sse import SseServerTransport
+from mcp.server.streamable_http_manager import StreamableHTTPSessionManager
+from mcp.server.transport_security import TransportSecuritySettings
+
+# Streamable HTTP端点与SSE端点
+STREAMABLE_PATH = "/mcp"
+SSE_PATH = "/sse"
+MESSAGES_PATH = "/messages/"
+
+# 空闲超过该时间（秒）的Streamable HTTP会话被关闭，其游标随之失效
+SESSION_IDLE_TIMEOUT = 1800
+
+def is_loopback(host: str) -> bool:
+    """是否为本机回环地址"""
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+def security_settings(host: Optional[str]) -> TransportSecuritySettings:
+    """监听回环地址或Unix套接字时校验Host与Origin，防止浏览器页面经DNS重绑定访问本机服务"""
+    if host is not None and not is_loopback(host):
+        return TransportSecuritySettings(enable_dns_rebinding_protection=False)
+    hosts = ["localhost", "localhost:*", "127.0.0.1", "127.0.0.1:*", "[::1]", "[::1]:*"]
+    return TransportSecuritySettings(
+        enable_dns_rebinding_protection=True,
+        allowed_hosts=hosts,
+        allowed_origins=[f"http://{host}" for host in hosts],
+    )
+
+class StreamableEndpoint:
+    """以ASGI应用形式挂载的Streamable HTTP端点（Route对非函数端点按ASGI应用调用）"""
+
+    def __init__(self, session_manager: StreamableHTTPSessionManager):
+        self.session_manager = session_manager
+
+    async def __call__(self, scope, receive, send):
+        await self.session_manager.handle_request(scope, receive, send)
+
+def create_app(server: Server, options: InitializationOptions, host: Optional[str] = None) -> Starlette:
+    """构建同时提供两种传输的ASGI应用"""
+    security = security_settings(host)
+    session_manager = StreamableHTTPSessionManager(
+        server, security_settings=security, session_idle_timeout=SESSION_IDLE_TIMEOUT
+    )
+    sse = SseServerTransport(MESSAGES_PATH, security_settings=security)
+
+    async def handle_sse(request):
+        async with sse.connect_sse(request.scope, request.receive, request._send) as (read_stream, write_stream):
+            await server.run(read_stream, write_stream, options)
+        return Response()
+
+    @contextlib.asynccontextmanager
+    async def lifespan(_app):
+        async with session_manager.run():
+            yield
+
+    return Starlette(
+        routes=[
+            Route(STREAMABLE_PATH, endpoint=StreamableEndpoint(session_manager)),
+            Route(SSE_PATH, endpoint=handle_sse, methods=["GET"]),
+            Mount(MESSAGES_PATH, app=sse.handle_post_message),
+        ],
+        lifespan=lifespan,
+    )
+
+async def serve(server: Server, options: InitializationOptions, host: str = "127.0.0.1", port: int = 8765,
+                socket_path: Optional[str] = None):
+    """启动HTTP服务；指定socket_path时监听Unix套接字，忽略host与port"""
+    app = create_app(server, options, None if socket_path else host)
+    if socket_path:
+        config = uvicorn.Config(app, uds=socket_path, log_level="warning")
+        print(f"MCP服务监听Unix套接字: {socket_path}（Streamable HTTP {STREAMABLE_PATH}，SSE {SSE_PATH}）",
+              file=sys.stderr)
+    else:
+        if not is_loopback(host):
+            print(f"⚠️ 监听非本机地址 {host}，服务没有身份验证，任何能访问该地址的人都可以查询账簿", file=sys.stderr)
+        config = uvicorn.Config(app, host=host, port=port, log_level="warning")
+        print(f"MCP服务监听: http://{host}:{port}{STREAMABLE_PATH}（SSE: http://{host}:{port}{SSE_PATH}）",
+              file=sys.stderr)
+    await uvicorn.Server(config).serve()
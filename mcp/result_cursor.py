@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+查询结果分页游标
+首次查询时保存筛选结果的行位置数组，返回不透明游标；后续翻页直接按位置取行，
+无需重新筛选。游标按TTL过期，并限制同时保存的结果集数量；
+网络传输下结果集归属创建它的会话，其他会话无法使用，单个会话也不能挤占全部名额
+"""
+
+import base64
+import json
+import secrets
+import threading
+import time
+import numpy as np
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+# 游标有效期（秒）
+DEFAULT_TTL = 600
+
+# 最多同时保存的结果集数量，超出时淘汰最久未使用的
+DEFAULT_MAX_ENTRIES = 64
+
+# 每个会话最多保存的结果集数量
+DEFAULT_MAX_PER_OWNER = 16
+
+class CursorStore:
+    """按结果集ID保存行位置数组，游标编码为（结果集ID, 偏移量）"""
+
+    def __init__(self, ttl: float = DEFAULT_TTL, max_entries: int = DEFAULT_MAX_ENTRIES,
+                 max_per_owner: int = DEFAULT_MAX_PER_OWNER):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_per_owner = max_per_owner
+        self._entries: "OrderedDict[str, Tuple[str, np.ndarray, float, Optional[str]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _evict(self, now: float, owner: Optional[str] = None):
+        """清理过期及超出数量上限的结果集，owner超出会话上限时先淘汰其最久未使用的结果集"""
+        expired = [key for key, (_, _, expires, _) in self._entries.items() if expires <= now]
+        for key in expired:
+            del self._entries[key]
+        if owner is not None:
+            owned = [key for key, entry in self._entries.items() if entry[3] == owner]
+            for key in owned[:max(len(owned) - self.max_per_owner, 0)]:
+                del self._entries[key]
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    @staticmethod
+    def encode(result_id: str, offset: int) -> str:
+        """将（结果集ID, 偏移量）编码为不透明字符串"""
+        return base64.urlsafe_b64encode(json.dumps([result_id, offset]).encode()).decode().rstrip("=")
+
+    @staticmethod
+    def decode(cursor: str) -> Tuple[str, int]:
+        """解码游标字符串"""
+        try:
+            padded = cursor + "=" * (-len(cursor) % 4)
+            result_id, offset = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            return str(result_id), max(int(offset), 0)
+        except (ValueError, TypeError):
+            raise ValueError("游标格式不正确")
+
+    def create(self, tool: str, positions: np.ndarray, offset: int, owner: Optional[str] = None) -> str:
+        """保存结果集并返回指向offset处的游标，owner为所属会话（单客户端时为None）"""
+        now = time.monotonic()
+        result_id = secrets.token_urlsafe(9)
+        with self._lock:
+            self._evict(now)
+            self._entries[result_id] = (tool, np.asarray(positions, dtype=np.int64), now + self.ttl, owner)
+            self._evict(now, owner)
+        return self.encode(result_id, offset)
+
+    def resolve(self, cursor: str, tool: str, owner: Optional[str] = None) -> Tuple[str, np.ndarray, int]:
+        """解析游标，返回(结果集ID, 行位置数组, 偏移量)；访问会刷新有效期"""
+        result_id, offset = self.decode(cursor)
+        now = time.monotonic()
+        with self._lock:
+            self._evict(now)
+            entry = self._entries.get(result_id)
+            # 其他会话的游标与不存在的游标同样处理，不暴露其存在
+            if entry is None or entry[3] != owner:
+                raise ValueError("游标已过期或不存在，请重新查询")
+            entry_tool, positions, _, _ = entry
+            if entry_tool != tool:
+                raise ValueError(f"游标属于工具 {entry_tool}，不能用于 {tool}")
+            self._entries[result_id] = (entry_tool, positions, now + self.ttl, owner)
+            self._entries.move_to_end(result_id)
+        return result_id, positions, offset
+
+    def next_cursor(self, result_id: str, offset: int, total: int) -> Optional[str]:
+        """下一页游标，已到末页时返回None"""
+        return self.encode(result_id, offset) if offset < total else None
@@ -5,8 +5,9 @@
 """
 
 import os
-import sys
+import runpy
 import subprocess
+import sys
 from pathlib import Path
 
 def find_virtualenv_python():
@@ -30,14 +31,25 @@ def main():
     python_executable = find_virtualenv_python()
     mcp_script = str(Path(__file__).parent / "financial_data_mcp.py")
     
-    print(f"使用 Python: {python_executable}")
-    print(f"运行 MCP 服务器: {mcp_script}")
+    # 标准输出用于MCP协议通信，提示信息写入标准错误
+    print(f"使用 Python: {python_executable}", file=sys.stderr)
+    print(f"运行 MCP 服务器: {mcp_script}", file=sys.stderr)
+    
+    os.chdir(Path(__file__).parent.parent)
+    
+    if os.path.realpath(python_executable) == os.path.realpath(sys.executable):
+        # 已经是目标解释器，直接在当前进程运行，无需再启动一个解释器
+        sys.path.insert(0, str(Path(mcp_script).parent))
+        sys.argv = [mcp_script] + sys.argv[1:]
+        runpy.run_path(mcp_script, run_name="__main__")
+        return 0
     
-    # 运行 MCP 服务器
-    result = subprocess.run([python_executable, mcp_script], 
-                          cwd=str(Path(__file__).parent.parent))
+    if os.name == "nt":
+        # Windows上exec会让当前进程先退出，客户端会认为服务器已关闭，仍以子进程运行
+        return subprocess.run([python_executable, mcp_script] + sys.argv[1:]).returncode
     
-    return result.returncode
+    # 用虚拟环境的解释器替换当前进程，标准输入输出直接交给MCP服务器
+    os.execv(python_executable, [python_executable, mcp_script] + sys.argv[1:])
 
 if __name__ == "__main__":
-    sys.exit(main())
\ No newline at end of file
+    sys.exit(main())
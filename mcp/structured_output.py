@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+结构化输出
+将工具结果DataFrame直接按列转换为JSON列数组或CSV，不逐行格式化：
+金额保持数值类型（浮点数保留6位小数以去除累加误差），日期统一为YYYY-MM-DD字符串，缺失值（含NaN、NaT）为null
+"""
+
+import json
+import math
+import numpy as np
+import pandas as pd
+from typing import Any, Dict, Optional
+
+OUTPUT_FORMATS = ("markdown", "json", "csv")
+
+# 浮点数保留的小数位数
+FLOAT_DECIMALS = 6
+
+# 工具输入参数中的output_format定义，所有工具共用
+OUTPUT_FORMAT_SCHEMA = {
+    "type": "string",
+    "description": "输出格式：markdown（默认，便于阅读）、json（列数组，便于程序处理）、csv",
+    "enum": list(OUTPUT_FORMATS),
+    "default": "markdown"
+}
+
+def output_format(args: dict) -> str:
+    """读取并校验output_format参数"""
+    fmt = str(args.get("output_format") or "markdown").lower()
+    if fmt not in OUTPUT_FORMATS:
+        raise ValueError(f"不支持的输出格式: {fmt}，可选 {', '.join(OUTPUT_FORMATS)}")
+    return fmt
+
+def column_values(column: pd.Series) -> list:
+    """将一列转换为JSON可序列化的列表，整列一次转换"""
+    if pd.api.types.is_datetime64_any_dtype(column):
+        values = column.dt.strftime("%Y-%m-%d").to_numpy(dtype=object)
+        return np.where(column.isna().to_numpy(), None, values).tolist()
+    if pd.api.types.is_bool_dtype(column) or pd.api.types.is_integer_dtype(column):
+        return column.to_numpy().tolist()
+    if pd.api.types.is_float_dtype(column):
+        values = np.round(column.to_numpy(dtype=float), FLOAT_DECIMALS)
+        return np.where(np.isfinite(values), values, None).tolist()
+    values = column.to_numpy(dtype=object)
+    return np.where(column.isna().to_numpy(), None, values).tolist()
+
+def frame_to_columns(df: pd.DataFrame) -> Dict[str, Any]:
+    """DataFrame转换为{columns, rows, data: {列名: 值数组}}"""
+    return {
+        "columns": [str(column) for column in df.columns],
+        "rows": len(df),
+        "data": {str(column): column_values(df[column]) for column in df.columns},
+    }
+
+def _json_default(value: Any) -> Any:
+    """meta中的numpy标量与时间戳"""
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (pd.Timestamp, np.datetime64)):
+        return pd.Timestamp(value).strftime("%Y-%m-%d")
+    return str(value)
+
+def json_safe(value: Any) -> Any:
+    """meta预处理：NaN、无穷大与NaT转换为None（严格JSON不允许NaN），逐层处理字典与列表"""
+    if isinstance(value, dict):
+        return {key: json_safe(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [json_safe(item) for item in value]
+    if isinstance(value, np.generic):
+        value = value.item()
+    if value is None or value is pd.NaT:
+        return None
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+def render_structured(fmt: str, tables: Dict[str, pd.DataFrame], meta: Optional[Dict[str, Any]] = None) -> str:
+    """按json或csv格式输出一组结果表及汇总信息
+
+    json: {"meta": {...}, "tables": {表名: {columns, rows, data}}}
+    csv: meta为"# 键: 值"注释行，多张表之间以"# table: 表名"分隔
+    """
+    meta = json_safe(meta or {})
+    if fmt == "json":
+        payload = {"meta": meta, "tables": {name: frame_to_columns(df) for name, df in tables.items()}}
+        return json.dumps(payload, ensure_ascii=False, separators=(",", ":"), default=_json_default, allow_nan=False)
+
+    parts = [f"# {key}: {json.dumps(value, ensure_ascii=False, default=_json_default, allow_nan=False)}"
+             for key, value in meta.items()]
+    for name, df in tables.items():
+        if len(tables) > 1:
+            parts.append(f"# table: {name}")
+        parts.append(df.round(FLOAT_DECIMALS).to_csv(index=False, date_format="%Y-%m-%d", lineterminator="\n").rstrip("\n"))
+    return "\n".join(parts)
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+科目目录与名称索引
+余额表中的科目行按（科目编码, 科目名称, 公司）去重并预先汇总期末借贷方余额，
+科目名称按去重后的名称建立索引，支持子串、全名、同义词与拼音首字母查找；
+查找只扫描去重后的名称与目录条目，耗时与余额表行数无关
+
+拼音首字母优先使用pypinyin（含多音字），未安装时按GB2312一级汉字的拼音排序推算，
+并为常见多音字补充读音
+"""
+
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Optional
+
+try:
+    from pypinyin import Style, pinyin
+except ImportError:
+    pinyin = None
+
+# GB2312一级汉字按拼音排序，各首字母的起始编码
+GB2312_INITIALS = [
+    (0xB0A1, "a"), (0xB0C5, "b"), (0xB2C1, "c"), (0xB4EE, "d"), (0xB6EA, "e"), (0xB7A2, "f"),
+    (0xB8C1, "g"), (0xB9FE, "h"), (0xBBF7, "j"), (0xBFA6, "k"), (0xC0AC, "l"), (0xC2E8, "m"),
+    (0xC4C3, "n"), (0xC5B6, "o"), (0xC5BE, "p"), (0xC6DA, "q"), (0xC8BB, "r"), (0xC8F6, "s"),
+    (0xCBFA, "t"), (0xCDDA, "w"), (0xCEF4, "x"), (0xD1B9, "y"), (0xD4D1, "z"),
+]
+GB2312_LEVEL1_END = 0xD7F9
+GB2312_STARTS = [start for start, _ in GB2312_INITIALS]
+
+# 科目名称中常见多音字的全部首字母（GB2312只按一个读音排序）
+POLYPHONE_INITIALS = {
+    "行": "xh", "会": "hk", "长": "cz", "重": "zc", "调": "td", "率": "ls", "折": "zs",
+    "还": "hh", "差": "cs", "处": "c", "单": "ds", "藏": "cz", "期": "q", "应": "y",
+    "供": "g", "便": "bp", "转": "z", "数": "s", "属": "sz", "给": "gj", "劳": "l",
+}
+
+# 目录条目的汇总金额列
+BALANCE_COLUMNS = ["期末余额借方", "期末余额贷方"]
+
+# 按科目汇总后的列
+SUBJECT_COLUMNS = ["科目编码", "科目名称", "subject_code_path"] + BALANCE_COLUMNS + ["公司数", "公司列表"]
+
+def char_initials(char: str) -> str:
+    """单个字符可能的拼音首字母，字母数字为其小写，其他字符为空"""
+    if char.isascii():
+        return char.lower() if char.isalnum() else ""
+    if char in POLYPHONE_INITIALS:
+        return POLYPHONE_INITIALS[char]
+    try:
+        code = int.from_bytes(char.encode("gb2312"), "big")
+    except UnicodeEncodeError:
+        return ""
+    if code < GB2312_STARTS[0] or code > GB2312_LEVEL1_END:
+        return ""
+    return GB2312_INITIALS[int(np.searchsorted(GB2312_STARTS, code, side="right")) - 1][1]
+
+def name_initials(name: str) -> List[str]:
+    """名称中每个字符可能的拼音首字母，忽略空白与标点"""
+    if pinyin is not None:
+        letters = pinyin(name, style=Style.FIRST_LETTER, heteronym=True, errors=lambda text: list(text))
+        candidates = ["".join(dict.fromkeys(option.lower() for option in options if option.isascii() and option.isalnum()))
+                      for options in letters]
+    else:
+        candidates = [char_initials(char) for char in name]
+    return [options for options in candidates if options]
+
+def initials_contain(initials: List[str], query: str) -> bool:
+    """query是否与名称中某一段连续字符的拼音首字母相符"""
+    width = len(query)
+    for start in range(len(initials) - width + 1):
+        if all(letter in initials[start + offset] for offset, letter in enumerate(query)):
+            return True
+    return False
+
+def is_initials_query(text: str) -> bool:
+    """只含字母（可含数字）的查询按拼音首字母查找"""
+    return text.isascii() and text.isalnum() and any(char.isalpha() for char in text)
+
+class SubjectCatalog:
+    """科目目录：每个（科目编码, 科目名称, 公司）一条，名称去重后建立索引"""
+
+    def __init__(self, balance_df: pd.DataFrame, full_names: Optional[Dict[str, str]] = None):
+        rows = balance_df[balance_df["科目编码"].notna() & balance_df["科目名称"].notna()]
+        # 条目按在余额表中首次出现的顺序排列，与逐行筛选的结果顺序一致
+        entries = rows.assign(首行=np.arange(len(rows))).groupby(
+            ["科目编码", "科目名称", "公司"], sort=False, observed=True
+        ).agg(
+            首行=("首行", "first"),
+            subject_code_path=("subject_code_path", "first"),
+            **{column: (column, "sum") for column in BALANCE_COLUMNS},
+        ).reset_index()
+        entries["科目编码"] = entries["科目编码"].astype(str)
+        entries["科目名称"] = entries["科目名称"].astype(str)
+        entries["公司"] = entries["公司"].astype(str)
+
+        name_ids, names = pd.factorize(entries["科目名称"])
+        self.entries = entries
+        self.names = pd.Series(names, dtype=object)
+        self.name_ids = name_ids
+        self.companies = pd.Series(entries["公司"].unique(), dtype=object)
+        self.company_ids = pd.Index(self.companies).get_indexer(entries["公司"])
+
+        # 科目全名（上级名称-本级名称）同样去重后索引
+        full = entries["科目编码"].map(full_names or {}).fillna(entries["科目名称"].str.strip())
+        full_ids, full_unique = pd.factorize(full)
+        self.full_names = pd.Series(full_unique, dtype=object)
+        self.full_name_ids = full_ids
+        self._initials: Optional[List[List[str]]] = None
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def company_mask(self, company: Optional[str]) -> np.ndarray:
+        """公司名称匹配（与余额表筛选相同的不区分大小写匹配）的条目"""
+        if not company:
+            return np.ones(len(self.entries), dtype=bool)
+        matched = self.companies.str.contains(str(company), case=False, na=False).to_numpy()
+        return matched[self.company_ids]
+
+    def match_names(self, term: str) -> np.ndarray:
+        """科目名称包含term的条目"""
+        matched = self.names.str.contains(term, case=False, na=False, regex=False).to_numpy()
+        return matched[self.name_ids]
+
+    def match_full_names(self, term: str) -> np.ndarray:
+        """科目全名包含term的条目"""
+        matched = self.full_names.str.contains(term, case=False, na=False, regex=False).to_numpy()
+        return matched[self.full_name_ids]
+
+    def match_terms(self, matcher) -> Dict[str, np.ndarray]:
+        """对去重后的科目名称扫描一遍同义词表，返回 同义词(小写) → 名称包含该词的条目"""
+        return {term: hits[self.name_ids] for term, hits in matcher.term_hits(self.names).items()}
+
+    def match_initials(self, query: str) -> np.ndarray:
+        """科目名称拼音首字母包含query的条目"""
+        if self._initials is None:
+            self._initials = [name_initials(name) for name in self.names]
+        query = query.lower()
+        matched = np.array([initials_contain(initials, query) for initials in self._initials], dtype=bool)
+        return matched[self.name_ids] if len(matched) else np.zeros(len(self.entries), dtype=bool)
+
+    def subjects(self, mask: np.ndarray) -> pd.DataFrame:
+        """按科目编码汇总选中的条目：名称与路径取首次出现的一条，余额求和，列出相关公司"""
+        # 目录条目只有科目数×公司数条，逐条累加比分组聚合的固定开销更小
+        summary: Dict[str, dict] = {}
+        for entry in self.entries[mask].sort_values("首行", kind="stable").itertuples(index=False):
+            subject = summary.get(entry.科目编码)
+            if subject is None:
+                subject = summary[entry.科目编码] = {
+                    "科目编码": entry.科目编码, "科目名称": entry.科目名称, "subject_code_path": entry.subject_code_path,
+                    "期末余额借方": 0.0, "期末余额贷方": 0.0, "公司列表": [],
+                }
+            subject["期末余额借方"] += entry.期末余额借方
+            subject["期末余额贷方"] += entry.期末余额贷方
+            if entry.公司 not in subject["公司列表"]:
+                subject["公司列表"].append(entry.公司)
+        rows = [{**subject, "公司数": len(subject["公司列表"])} for subject in summary.values()]
+        return pd.DataFrame(rows, columns=SUBJECT_COLUMNS)
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+对方科目资金流向图
+按凭证将借方科目与贷方科目两两配对（多借多贷按贷方金额占比分摊），
+再按公司、月份、借方科目、贷方科目汇总为流向边表，一次物化后供查询复用
+"""
+
+import numpy as np
+import pandas as pd
+from typing import Dict, Optional, Tuple
+
+from voucher_features import voucher_keys
+
+# 流向边表字段：资金从贷方科目流向借方科目
+EDGE_COLUMNS = ["公司", "期间", "借方科目", "贷方科目", "金额", "笔数"]
+
+# 借贷净额小于该值的科目视为在凭证内已对冲
+MIN_AMOUNT = 0.005
+
+def _voucher_subject_net(voucher_df: pd.DataFrame, key_ids: np.ndarray) -> Tuple[pd.DataFrame, pd.Index]:
+    """按（凭证, 科目）汇总借贷净额，红字冲销自然归入相反方向"""
+    subject_ids, subject_uniques = pd.factorize(voucher_df["科目编码"].astype(str))
+    net = (voucher_df["借方金额"] - voucher_df["贷方金额"]).to_numpy()
+
+    lines = pd.DataFrame({"key": key_ids, "subject": subject_ids, "net": net})
+    lines = lines.groupby(["key", "subject"], sort=False, as_index=False)["net"].sum()
+    lines = lines[lines["net"].abs() >= MIN_AMOUNT]
+    return lines, subject_uniques
+
+def build_flow_edges(voucher_df: pd.DataFrame) -> pd.DataFrame:
+    """由凭证明细生成按公司、月份汇总的借贷科目流向边表"""
+    if voucher_df.empty:
+        return pd.DataFrame(columns=EDGE_COLUMNS)
+
+    key_ids = pd.factorize(voucher_keys(voucher_df))[0]
+    lines, subject_uniques = _voucher_subject_net(voucher_df, key_ids)
+
+    debit = lines[lines["net"] > 0].rename(columns={"subject": "debit", "net": "debit_amount"})
+    credit = lines[lines["net"] < 0].rename(columns={"subject": "credit", "net": "credit_amount"})
+    credit = credit.assign(credit_amount=-credit["credit_amount"])
+    credit["credit_total"] = credit.groupby("key")["credit_amount"].transform("sum")
+
+    # 每个借方科目的金额按贷方各科目金额占比分摊
+    pairs = debit.merge(credit, on="key")
+    pairs["金额"] = pairs["debit_amount"] * pairs["credit_amount"] / pairs["credit_total"]
+
+    # 凭证所属公司与月份（取凭证首行）
+    header = pd.DataFrame({"key": key_ids, "公司": voucher_df["公司"].to_numpy(),
+                           "日期": voucher_df["日期"].to_numpy()}).drop_duplicates("key").set_index("key")
+    period = (header["日期"].dt.year * 100 + header["日期"].dt.month).fillna(0).astype(np.int64)
+    pairs["公司"] = header["公司"].reindex(pairs["key"]).to_numpy()
+    pairs["期间"] = period.reindex(pairs["key"]).to_numpy()
+
+    edges = pairs.groupby(["公司", "期间", "debit", "credit"], sort=False).agg(
+        金额=("金额", "sum"),
+        笔数=("key", "size"),
+    ).reset_index()
+    edges["借方科目"] = pd.Categorical.from_codes(edges["debit"], categories=subject_uniques)
+    edges["贷方科目"] = pd.Categorical.from_codes(edges["credit"], categories=subject_uniques)
+    edges["公司"] = edges["公司"].astype("category")
+    return edges[EDGE_COLUMNS]
+
+def subject_name_lookup(voucher_df: pd.DataFrame) -> Dict[str, str]:
+    """生成科目编码到名称的映射，上级科目名称由下级科目全名截取"""
+    name_column = "科目全名" if "科目全名" in voucher_df.columns else "科目名称"
+    subjects = voucher_df[["科目编码", name_column]].dropna().astype(str).drop_duplicates("科目编码")
+
+    names = dict(zip(subjects["科目编码"], subjects[name_column]))
+    for code, full_name in list(names.items()):
+        code_parts = code.split(".")
+        name_parts = full_name.split("_")
+        for level in range(1, len(code_parts)):
+            names.setdefault(".".join(code_parts[:level]), "_".join(name_parts[:level]))
+    return names
+
+def _prefix_mask(codes: pd.Series, subject_code: str) -> np.ndarray:
+    """按科目编码前缀（含下级科目）筛选，只在分类值上做字符串比较"""
+    categories = codes.cat.categories.astype(str)
+    matched = (categories == subject_code) | categories.str.startswith(subject_code + ".")
+    return np.asarray(matched)[codes.cat.codes.to_numpy()]
+
+def truncate_code(codes: pd.Series, level: int) -> np.ndarray:
+    """将分类科目编码截取到指定级次（0表示不截取），只对分类值做字符串处理"""
+    categories = codes.cat.categories.astype(str)
+    if level > 0:
+        categories = categories.str.split(".").str[:level].str.join(".")
+    return np.asarray(categories)[codes.cat.codes.to_numpy()]
+
+def query_subject_flows(edges: pd.DataFrame, subject_code: str, company: Optional[str] = None,
+                        period_start: Optional[int] = None, period_end: Optional[int] = None,
+                        level: int = 1) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """查询科目的资金来源与去向，返回(来源表, 去向表, 科目内部划转)
+
+    来源为借记该科目时对应的贷方科目，去向为贷记该科目时对应的借方科目，
+    借贷双方均属于该科目（如银行账户之间互转）的部分单独列示
+    """
+    mask = np.ones(len(edges), dtype=bool)
+    if company:
+        companies = edges["公司"].cat.categories.astype(str)
+        mask &= np.asarray(companies.str.contains(company, case=False, regex=False))[edges["公司"].cat.codes.to_numpy()]
+    if period_start:
+        mask &= (edges["期间"] >= period_start).to_numpy()
+    if period_end:
+        mask &= (edges["期间"] <= period_end).to_numpy()
+
+    edges = edges[mask]
+    debit_match = _prefix_mask(edges["借方科目"], subject_code)
+    credit_match = _prefix_mask(edges["贷方科目"], subject_code)
+
+    def aggregate(frame: pd.DataFrame, counterpart_column: str) -> pd.DataFrame:
+        grouped = frame[["金额", "笔数"]].groupby(truncate_code(frame[counterpart_column], level), sort=False).sum()
+        grouped = grouped.rename_axis("对方科目").sort_values("金额", ascending=False).reset_index()
+        grouped["占比"] = grouped["金额"] / max(grouped["金额"].sum(), MIN_AMOUNT)
+        return grouped
+
+    inflows = aggregate(edges[debit_match & ~credit_match], "贷方科目")
+    outflows = aggregate(edges[credit_match & ~debit_match], "借方科目")
+
+    internal = edges[debit_match & credit_match]
+    internal = internal.groupby(["贷方科目", "借方科目"], sort=False, observed=True)[["金额", "笔数"]].sum()
+    internal = internal.sort_values("金额", ascending=False).reset_index()
+    return inflows, outflows, internal
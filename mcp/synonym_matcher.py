@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+财务术语同义词匹配
+同义词表从用户可编辑的文本文件加载，全部同义词编译为一棵前缀树：
+判断查询词涉及哪些同义词组只需沿前缀树扫描一遍查询词，
+对文本列则将相关同义词合并为一个按前缀树生成的正则，对去重后的文本单次匹配。
+文件修改后下次使用时自动重新加载，无需重启服务
+
+文件格式：每行一组，"主词: 同义词1、同义词2"，同义词可用顿号、逗号或空白分隔，
+主词本身也参与匹配；#开头的行为注释
+"""
+
+import re
+import threading
+import numpy as np
+import pandas as pd
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# 同义词之间的分隔符
+TERM_SEPARATOR = re.compile(r"[、,，;；\s]+")
+
+# 前缀树中标记词尾的键
+TERM_END = ""
+
+def parse_synonyms(text: str) -> Dict[str, List[str]]:
+    """解析同义词文件内容，返回 主词 → [主词, 同义词...]，同一主词出现多次时合并"""
+    groups: Dict[str, List[str]] = {}
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        main_term, _, rest = line.replace("：", ":").partition(":")
+        main_term = main_term.strip()
+        if not main_term:
+            continue
+        terms = groups.setdefault(main_term, [main_term])
+        for term in TERM_SEPARATOR.split(rest):
+            if term and term not in terms:
+                terms.append(term)
+    return groups
+
+def build_trie(terms: Iterable[str]) -> dict:
+    """按小写字符构建前缀树，词尾节点以TERM_END键保存原词"""
+    trie: dict = {}
+    for term in terms:
+        node = trie
+        for char in term.lower():
+            node = node.setdefault(char, {})
+        node[TERM_END] = term
+    return trie
+
+def trie_pattern(node: dict) -> str:
+    """由前缀树生成正则：共同前缀只出现一次，匹配时每个位置最多沿树走一遍"""
+    branches = [re.escape(char) + trie_pattern(child) for char, child in sorted(node.items()) if char != TERM_END]
+    if not branches:
+        return ""
+    body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+    return f"(?:{body})?" if TERM_END in node else body
+
+class SynonymMatcher:
+    """编译后的同义词表"""
+
+    def __init__(self, groups: Dict[str, List[str]]):
+        self.groups = groups
+        # 同义词 → 所属主词（按文件顺序）
+        self.term_groups: Dict[str, List[str]] = {}
+        for main_term, terms in groups.items():
+            for term in terms:
+                self.term_groups.setdefault(term.lower(), []).append(main_term)
+        self.trie = build_trie(term for terms in groups.values() for term in terms)
+
+    def __len__(self) -> int:
+        return len(self.term_groups)
+
+    def terms_in(self, text: str) -> List[str]:
+        """text中出现的全部同义词（含相互重叠的），按出现位置排列"""
+        text = text.lower()
+        found = []
+        for start in range(len(text)):
+            node = self.trie
+            for char in text[start:]:
+                node = node.get(char)
+                if node is None:
+                    break
+                if TERM_END in node:
+                    found.append(node[TERM_END].lower())
+        return list(dict.fromkeys(found))
+
+    def related_groups(self, keyword: str) -> List[str]:
+        """查询词本身是同义词、或包含某个同义词时所涉及的主词，按文件顺序"""
+        hit = set()
+        for term in self.terms_in(keyword):
+            hit.update(self.term_groups[term])
+        return [main_term for main_term in self.groups if main_term in hit]
+
+    def related_terms(self, keyword: str) -> List[str]:
+        """查询词涉及的各组同义词，按组及组内顺序排列"""
+        return [term for main_term in self.related_groups(keyword) for term in self.groups[main_term]]
+
+    def term_hits(self, texts: pd.Series) -> Dict[str, np.ndarray]:
+        """对文本逐条扫描一遍，返回 同义词(小写) → 各文本是否包含该词"""
+        hits: Dict[str, np.ndarray] = {}
+        for position, text in enumerate(texts):
+            if isinstance(text, str):
+                for term in self.terms_in(text):
+                    if term not in hits:
+                        hits[term] = np.zeros(len(texts), dtype=bool)
+                    hits[term][position] = True
+        return hits
+
+    def mark(self, texts: pd.Series, terms: List[str]) -> pd.Series:
+        """文本是否包含terms中任一词：去重后用一个合并正则单次匹配，再按下标展开"""
+        if not terms:
+            return pd.Series(False, index=texts.index)
+        codes, uniques = pd.factorize(texts)
+        matched = pd.Series(uniques, dtype=object).str.contains(
+            compile_terms(tuple(sorted({term.lower() for term in terms}))), na=False).to_numpy()
+        hits = np.zeros(len(texts), dtype=bool)
+        known = codes >= 0
+        hits[known] = matched[codes[known]]
+        return pd.Series(hits, index=texts.index)
+
+@lru_cache(maxsize=256)
+def compile_terms(terms: Tuple[str, ...]) -> re.Pattern:
+    """将一组词编译为一个不区分大小写的前缀树正则"""
+    return re.compile(trie_pattern(build_trie(terms)), re.IGNORECASE)
+
+class SynonymSource:
+    """同义词文件：修改时间变化后下次获取时重新加载，文件不存在时使用空表"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._mtime: Optional[int] = None
+        self._matcher = SynonymMatcher({})
+
+    def get(self) -> SynonymMatcher:
+        try:
+            mtime = self.path.stat().st_mtime_ns
+        except OSError:
+            mtime = None
+        with self._lock:
+            if mtime != self._mtime:
+                groups = parse_synonyms(self.path.read_text(encoding="utf-8")) if mtime is not None else {}
+                self._matcher = SynonymMatcher(groups)
+                self._mtime = mtime
+            return self._matcher
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+工具调用运行指标
+按工具累计调用耗时直方图、扫描行数与返回行数、缓存命中及抽样的内存峰值；
+单次调用的计数通过上下文变量收集，可选将每次调用追加写入JSON-lines跟踪文件
+"""
+
+import contextvars
+import json
+import random
+import threading
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+from typing import Any, Dict, Optional
+
+# 耗时直方图的分桶上限（毫秒），最后一档为超过最大上限
+LATENCY_BUCKETS_MS = [1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+
+class CallStats:
+    """单次工具调用的计数"""
+
+    def __init__(self):
+        self.rows_scanned = 0
+        self.rows_returned = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+current_call: contextvars.ContextVar[Optional[CallStats]] = contextvars.ContextVar("current_call", default=None)
+
+def record_scan(rows: int):
+    """记录当前调用扫描的行数"""
+    stats = current_call.get()
+    if stats is not None:
+        stats.rows_scanned += rows
+
+def record_returned(rows: int):
+    """记录当前调用返回的记录数"""
+    stats = current_call.get()
+    if stats is not None:
+        stats.rows_returned += rows
+
+class ToolMetrics:
+    """按工具汇总的运行指标"""
+
+    def __init__(self, trace_file: Optional[str] = None, memory_sample_rate: float = 0.0):
+        self.trace_file = trace_file
+        self.memory_sample_rate = memory_sample_rate
+        self.started = time.time()
+        self._tools: Dict[str, Dict[str, Any]] = {}
+        self._caches: Dict[str, list] = {}
+        self._lock = threading.Lock()
+        # tracemalloc为进程级，同一时间只对一个调用抽样
+        self._memory_lock = threading.Lock()
+
+    def record_cache(self, cache: str, hit: bool):
+        """记录缓存命中或未命中，同时计入当前调用"""
+        stats = current_call.get()
+        if stats is not None:
+            if hit:
+                stats.cache_hits += 1
+            else:
+                stats.cache_misses += 1
+        with self._lock:
+            counts = self._caches.setdefault(cache, [0, 0])
+            counts[0 if hit else 1] += 1
+
+    def _tool_entry(self, tool: str) -> Dict[str, Any]:
+        return self._tools.setdefault(tool, {
+            "calls": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0,
+            "histogram": np.zeros(len(LATENCY_BUCKETS_MS) + 1, dtype=np.int64),
+            "rows_scanned": 0, "rows_returned": 0, "cache_hits": 0, "cache_misses": 0,
+            "memory_samples": 0, "peak_bytes": 0,
+        })
+
+    async def measure(self, tool: str, arguments: dict, call):
+        """执行call()并记录指标，返回call的结果"""
+        stats = CallStats()
+        token = current_call.set(stats)
+        sampled = (self.memory_sample_rate > 0 and random.random() < self.memory_sample_rate
+                   and self._memory_lock.acquire(blocking=False))
+        started_tracing = False
+        if sampled:
+            started_tracing = not tracemalloc.is_tracing()
+            if started_tracing:
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+
+        started = time.perf_counter()
+        error = None
+        result = None
+        try:
+            result = await call()
+            return result
+        except Exception as e:
+            error = str(e)
+            raise
+        finally:
+            # 工具以"❌"开头的文本返回参数错误等失败信息
+            if error is None and result and getattr(result[0], "text", "").startswith("❌"):
+                error = result[0].text.split("\n")[0]
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            peak_bytes = None
+            if sampled:
+                peak_bytes = tracemalloc.get_traced_memory()[1]
+                if started_tracing:
+                    tracemalloc.stop()
+                self._memory_lock.release()
+            current_call.reset(token)
+            self._record(tool, arguments, stats, elapsed_ms, peak_bytes, error, result)
+
+    def _record(self, tool: str, arguments: dict, stats: CallStats, elapsed_ms: float,
+                peak_bytes: Optional[int], error: Optional[str], result):
+        with self._lock:
+            entry = self._tool_entry(tool)
+            entry["calls"] += 1
+            entry["errors"] += error is not None
+            entry["total_ms"] += elapsed_ms
+            entry["max_ms"] = max(entry["max_ms"], elapsed_ms)
+            entry["histogram"][np.searchsorted(LATENCY_BUCKETS_MS, elapsed_ms, side="left")] += 1
+            entry["rows_scanned"] += stats.rows_scanned
+            entry["rows_returned"] += stats.rows_returned
+            entry["cache_hits"] += stats.cache_hits
+            entry["cache_misses"] += stats.cache_misses
+            if peak_bytes is not None:
+                entry["memory_samples"] += 1
+                entry["peak_bytes"] = max(entry["peak_bytes"], peak_bytes)
+
+            if self.trace_file:
+                record = {
+                    "ts": time.strftime("%Y-%m-%dT%H:%M:%S"), "tool": tool, "arguments": arguments,
+                    "elapsed_ms": round(elapsed_ms, 3), "rows_scanned": stats.rows_scanned,
+                    "rows_returned": stats.rows_returned, "cache_hits": stats.cache_hits,
+                    "cache_misses": stats.cache_misses, "peak_bytes": peak_bytes, "error": error,
+                    "response_chars": sum(len(getattr(content, "text", "")) for content in result or []),
+                }
+                with open(self.trace_file, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+
+    @staticmethod
+    def _percentile(histogram: np.ndarray, q: float, max_ms: float) -> float:
+        """按直方图估计分位数：取所在分桶的上限，且不超过实际最大耗时"""
+        cumulative = np.cumsum(histogram)
+        index = int(np.searchsorted(cumulative, q * cumulative[-1], side="left"))
+        if index >= len(LATENCY_BUCKETS_MS):
+            return max_ms
+        return min(float(LATENCY_BUCKETS_MS[index]), max_ms)
+
+    def tool_summary(self) -> pd.DataFrame:
+        """各工具的调用次数、耗时分位数、扫描与返回行数、缓存命中率及内存峰值"""
+        with self._lock:
+            rows = []
+            for tool, entry in self._tools.items():
+                cache_total = entry["cache_hits"] + entry["cache_misses"]
+                rows.append({
+                    "工具": tool,
+                    "调用次数": entry["calls"],
+                    "错误次数": entry["errors"],
+                    "平均耗时ms": entry["total_ms"] / entry["calls"],
+                    "P50耗时ms": self._percentile(entry["histogram"], 0.5, entry["max_ms"]),
+                    "P95耗时ms": self._percentile(entry["histogram"], 0.95, entry["max_ms"]),
+                    "P99耗时ms": self._percentile(entry["histogram"], 0.99, entry["max_ms"]),
+                    "最大耗时ms": entry["max_ms"],
+                    "扫描行数": entry["rows_scanned"],
+                    "返回行数": entry["rows_returned"],
+                    "缓存命中率": entry["cache_hits"] / cache_total if cache_total else None,
+                    "内存抽样次数": entry["memory_samples"],
+                    "内存峰值字节": entry["peak_bytes"] if entry["memory_samples"] else None,
+                })
+        columns = ["工具", "调用次数", "错误次数", "平均耗时ms", "P50耗时ms", "P95耗时ms", "P99耗时ms", "最大耗时ms",
+                   "扫描行数", "返回行数", "缓存命中率", "内存抽样次数", "内存峰值字节"]
+        return pd.DataFrame(rows, columns=columns).sort_values("平均耗时ms", ascending=False, ignore_index=True)
+
+    def latency_histogram(self) -> pd.DataFrame:
+        """各工具的耗时直方图，列为分桶上限"""
+        labels = [f"≤{upper}ms" for upper in LATENCY_BUCKETS_MS] + [f">{LATENCY_BUCKETS_MS[-1]}ms"]
+        with self._lock:
+            data = {tool: entry["histogram"].copy() for tool, entry in self._tools.items()}
+        histogram = pd.DataFrame.from_dict(data, orient="index", columns=labels) if data else pd.DataFrame(columns=labels)
+        return histogram.rename_axis("工具").reset_index()
+
+    def cache_summary(self) -> pd.DataFrame:
+        """各缓存的命中与未命中次数"""
+        with self._lock:
+            rows = [{"缓存": cache, "命中": hits, "未命中": misses} for cache, (hits, misses) in self._caches.items()]
+        return pd.DataFrame(rows, columns=["缓存", "命中", "未命中"])
+
+    def reset(self):
+        """清空已累计的指标"""
+        with self._lock:
+            self._tools.clear()
+            self._caches.clear()
+            self.started = time.time()
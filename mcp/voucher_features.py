@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+凭证明细派生字段
+从摘要等文本字段中批量提取交易对方等信息，供各分析引擎复用
+"""
+
+import re
+import pandas as pd
+from typing import Optional
+
+# 摘要中的交易对方提取规则（按优先级排列）
+COUNTERPARTY_PATTERNS = [
+    # 收到供应商XXX的发票
+    re.compile(r'收到供应商(?P<cp>.+?)的发票'),
+    # 确认XXX收入
+    re.compile(r'^确认(?P<cp>.+?)收入'),
+    # 收到货款/XXX、付货款/XXX/发票号123、付货款/发票号123/XXX：取最后一个非发票号分段
+    re.compile(r'^.*/(?!发票号)(?P<cp>[^/]+?)(?:/发票号[^/]*)?$'),
+]
+
+# 不含交易对方的摘要：个人报销（刘锦秀报差旅费/市场部），末段是内部部门而非往来单位
+INTERNAL_SUMMARY_PATTERNS = [
+    re.compile(r'^[^/]*报[^/]+/(?:[^/]*/)*[^/]*(?:部|科|室|车间)(?:-[^/]*)?$'),
+]
+
+def extract_counterparty(summary: pd.Series) -> pd.Series:
+    """从摘要中批量提取交易对方名称，无法识别时为NaN"""
+    text = summary.astype("string").str.strip()
+    result = pd.Series(pd.NA, index=summary.index, dtype="string")
+    internal = pd.Series(False, index=summary.index)
+    for pattern in INTERNAL_SUMMARY_PATTERNS:
+        internal |= text.str.match(pattern).fillna(False).astype(bool)
+
+    for pattern in COUNTERPARTY_PATTERNS:
+        pending = result.isna() & ~internal
+        if not pending.any():
+            break
+        extracted = text[pending].str.extract(pattern)["cp"]
+        result[pending] = extracted
+
+    result = result.str.strip()
+    # 纯数字或过短的分段不视为交易对方
+    invalid = result.str.fullmatch(r'[\d\s.\-]*', na=False) | (result.str.len() < 2)
+    return result.mask(invalid)
+
+def voucher_keys(voucher_df: pd.DataFrame) -> pd.Series:
+    """返回每条分录所属凭证的唯一标识"""
+    if "凭证唯一标识" in voucher_df.columns:
+        return voucher_df["凭证唯一标识"].astype(str)
+    return (
+        voucher_df["公司"].astype(str) + "_" + voucher_df["日期"].dt.year.astype(str) + "_"
+        + voucher_df["凭证字"].astype(str) + "-" + voucher_df["凭证号"].astype(str)
+    )
+
+def voucher_header(voucher_df: pd.DataFrame, column: str, keys: Optional[pd.Series] = None) -> pd.Series:
+    """将仅在凭证首行填写的表头字段（制单、审核等）扩展到凭证的每一行"""
+    if keys is None:
+        keys = voucher_keys(voucher_df)
+    return voucher_df[column].groupby(keys, sort=False).transform("first")
+
+def accounting_period_end(voucher_df: pd.DataFrame) -> pd.Series:
+    """根据会计年度和期间计算会计期间的最后一天，缺失时按日期所在月份"""
+    year = voucher_df["日期"].dt.year
+    month = voucher_df["日期"].dt.month
+    if "会计年度" in voucher_df.columns:
+        # 会计年度在原始导出中带千分位（如"2,024"）
+        fiscal_year = pd.to_numeric(voucher_df["会计年度"].astype(str).str.replace(",", ""), errors="coerce")
+        year = fiscal_year.fillna(year)
+    if "期间" in voucher_df.columns:
+        month = pd.to_numeric(voucher_df["期间"], errors="coerce").fillna(month)
+    valid = year.notna() & month.notna()
+
+    period_start = pd.to_datetime(
+        pd.DataFrame({"year": year[valid], "month": month[valid], "day": 1}).astype(int), errors="coerce"
+    )
+    return (period_start + pd.offsets.MonthEnd(0)).reindex(voucher_df.index)
@@ -0,0 +1,449 @@
+#!/usr/bin/env python3
+"""
+凭证模式报表引擎
+报表以声明式模板定义：哪些科目的分录触发报表、同一凭证（或经清理类科目串联的一组凭证）的
+分录如何合并为一行、各金额列取哪些科目的哪一方、按摘要关键词如何归类。
+模板在整张凭证表上以分组运算一次求值，生成明细表、汇总表与文本报告，
+新增分析只需在模板文件中增加一项配置，无需编写脚本
+
+模板字段：
+  id / name / description  模板标识、名称与说明
+  row              "voucher"：每张凭证（或每组串联凭证）一行；"line"：每条触发分录一行
+  trigger          触发条件列表，每项 {"subjects": [科目编码前缀], "side": "debit"|"credit"|"any"}
+  exclude_summary  摘要含任一关键词的分录不参与报表（如期末损益结转）
+  link_subject     row为voucher时可选的清理类科目：同一公司按日期、凭证号排序，从年初余额开始累计，
+                   该科目累计余额归零前的凭证合并为一行（如经固定资产清理分步结转的处置）
+  measures         金额列 {列名: {"subjects": [...], "exclude_subjects": [...], "side": "debit"|"credit"|"net"}}
+  derived          派生列 {列名: 表达式}，可引用金额列及之前的派生列，按顺序以DataFrame.eval求值；
+                   表达式只支持列名、常量及比较、算术、逻辑运算
+  fields           文本列 {列名: {"column": 凭证表列, "subjects": [...], "agg": "first"|"last"|"join"}}
+  classify         归类 {"column": 列名, "rules": [{"label": 类别, "keywords": [...]}], "default": 类别}，
+                   组内摘要命中的第一条规则生效
+  summary          汇总 {"sum": [金额列], "balance_subject": 科目编码}，期末余额取自余额表
+"""
+
+import json
+import re
+import threading
+import numpy as np
+import pandas as pd
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from expression_guard import validate_expression
+from voucher_features import voucher_keys
+
+# 明细表的固定列（逐分录报表不含分录数）
+BASE_COLUMNS = ["公司", "日期", "凭证号", "分录数"]
+
+# 串联凭证的清理科目余额未归零时的状态
+OPEN_STATUS = "未结清"
+CLOSED_STATUS = "已结清"
+
+ROW_MODES = ("voucher", "line")
+TRIGGER_SIDES = ("debit", "credit", "any")
+MEASURE_SIDES = ("debit", "credit", "net")
+FIELD_AGGREGATIONS = ("first", "last", "join")
+
+TEMPLATE_ID_PATTERN = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+def _subject_list(value: Any, where: str) -> List[str]:
+    """校验科目编码前缀列表"""
+    if value is None:
+        return []
+    if isinstance(value, str):
+        value = [value]
+    subjects = [str(code).strip() for code in value if str(code).strip()]
+    if not isinstance(value, list) or len(subjects) != len(value):
+        raise ValueError(f"{where} 的科目应为非空的科目编码列表")
+    return subjects
+
+def _keyword_list(value: Any, where: str) -> List[str]:
+    """校验关键词列表"""
+    if isinstance(value, str):
+        value = [value]
+    if not isinstance(value, list) or not value or not all(str(k).strip() for k in value):
+        raise ValueError(f"{where} 的关键词应为非空列表")
+    return [str(k).strip() for k in value]
+
+def validate_template(template: Dict[str, Any]) -> Dict[str, Any]:
+    """校验模板定义，返回补全默认值后的模板"""
+    if not isinstance(template, dict):
+        raise ValueError("模板应为JSON对象")
+    template_id = str(template.get("id", "")).strip()
+    if not TEMPLATE_ID_PATTERN.match(template_id):
+        raise ValueError(f"模板ID '{template_id}' 格式不正确，应为字母、数字和下划线组合")
+
+    row = template.get("row", "voucher")
+    if row not in ROW_MODES:
+        raise ValueError(f"模板 '{template_id}' 的row应为 {'/'.join(ROW_MODES)}")
+
+    triggers = []
+    for index, condition in enumerate(template.get("trigger") or [], 1):
+        where = f"模板 '{template_id}' 的第{index}个触发条件"
+        side = condition.get("side", "any")
+        if side not in TRIGGER_SIDES:
+            raise ValueError(f"{where} 的side应为 {'/'.join(TRIGGER_SIDES)}")
+        subjects = _subject_list(condition.get("subjects"), where)
+        if not subjects:
+            raise ValueError(f"{where} 缺少科目")
+        triggers.append({"subjects": subjects, "side": side})
+    if not triggers:
+        raise ValueError(f"模板 '{template_id}' 缺少触发条件")
+
+    link_subject = str(template.get("link_subject") or "").strip() or None
+    if link_subject and row != "voucher":
+        raise ValueError(f"模板 '{template_id}' 仅在row为voucher时可设置link_subject")
+
+    names = set(BASE_COLUMNS)
+    def claim(name: str) -> str:
+        name = str(name).strip()
+        if not name or name in names:
+            raise ValueError(f"模板 '{template_id}' 的列名 '{name}' 为空或重复")
+        names.add(name)
+        return name
+
+    measures = {}
+    for name, spec in (template.get("measures") or {}).items():
+        where = f"模板 '{template_id}' 的金额列 '{name}'"
+        side = spec.get("side", "net")
+        if side not in MEASURE_SIDES:
+            raise ValueError(f"{where} 的side应为 {'/'.join(MEASURE_SIDES)}")
+        measures[claim(name)] = {
+            "subjects": _subject_list(spec.get("subjects"), where),
+            "exclude_subjects": _subject_list(spec.get("exclude_subjects"), where),
+            "side": side,
+        }
+
+    # 派生列只能引用金额列及之前的派生列
+    derived = {}
+    for name, expression in (template.get("derived") or {}).items():
+        derived[claim(name)] = validate_expression(expression, list(measures) + list(derived),
+                                                   f"模板 '{template_id}' 的派生列 '{name}'")
+
+    fields = {}
+    for name, spec in (template.get("fields") or {}).items():
+        where = f"模板 '{template_id}' 的文本列 '{name}'"
+        agg = spec.get("agg", "first")
+        if agg not in FIELD_AGGREGATIONS or not spec.get("column"):
+            raise ValueError(f"{where} 需指定column，agg应为 {'/'.join(FIELD_AGGREGATIONS)}")
+        fields[claim(name)] = {"column": str(spec["column"]), "subjects": _subject_list(spec.get("subjects"), where),
+                               "agg": agg}
+
+    classify = None
+    if template.get("classify"):
+        spec = template["classify"]
+        rules = [{"label": str(rule.get("label", "")).strip(),
+                  "keywords": _keyword_list(rule.get("keywords"), f"模板 '{template_id}' 的归类规则")}
+                 for rule in spec.get("rules") or []]
+        if not rules or not all(rule["label"] for rule in rules):
+            raise ValueError(f"模板 '{template_id}' 的归类规则缺少类别")
+        classify = {"column": claim(spec.get("column") or "类别"), "rules": rules,
+                    "default": str(spec.get("default") or "其他")}
+
+    amounts = list(measures) + list(derived)
+    summary = template.get("summary") or {}
+    sums = summary.get("sum") or amounts
+    unknown = [name for name in sums if name not in amounts]
+    if unknown:
+        raise ValueError(f"模板 '{template_id}' 的汇总列不是金额列: {', '.join(unknown)}")
+
+    return {
+        "id": template_id,
+        "name": str(template.get("name") or template_id),
+        "description": str(template.get("description") or ""),
+        "row": row,
+        "trigger": triggers,
+        "exclude_summary": _keyword_list(template["exclude_summary"], f"模板 '{template_id}' 的exclude_summary")
+        if template.get("exclude_summary") else [],
+        "link_subject": link_subject,
+        "measures": measures,
+        "derived": derived,
+        "fields": fields,
+        "classify": classify,
+        "summary": {"sum": list(sums), "balance_subject": str(summary.get("balance_subject") or "").strip() or None},
+    }
+
+def parse_templates(text: str) -> Dict[str, Dict[str, Any]]:
+    """解析模板文件（模板对象组成的JSON数组），返回 模板ID → 模板"""
+    templates: Dict[str, Dict[str, Any]] = {}
+    for template in json.loads(text):
+        template = validate_template(template)
+        if template["id"] in templates:
+            raise ValueError(f"模板ID '{template['id']}' 重复")
+        templates[template["id"]] = template
+    return templates
+
+class TemplateSource:
+    """模板文件：修改时间变化后下次获取时重新加载，文件不存在时没有内置模板"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._mtime: Optional[int] = None
+        self._templates: Dict[str, Dict[str, Any]] = {}
+
+    def get(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            mtime = self.path.stat().st_mtime_ns
+        except OSError:
+            mtime = None
+        with self._lock:
+            if mtime != self._mtime:
+                self._templates = parse_templates(self.path.read_text(encoding="utf-8")) if mtime is not None else {}
+                self._mtime = mtime
+            return self._templates
+
+@lru_cache(maxsize=256)
+def _prefix_pattern(prefixes: Tuple[str, ...]) -> re.Pattern:
+    """科目编码前缀的合并正则：前缀须在编码层级边界上（1601匹配1601与1601.01，不匹配16011）"""
+    return re.compile(r"^(?:" + "|".join(re.escape(p) for p in prefixes) + r")(?:\.|$)")
+
+def subject_mask(codes: pd.Series, prefixes: List[str]) -> np.ndarray:
+    """科目编码是否属于任一前缀，去重后匹配再按下标展开"""
+    if not prefixes:
+        return np.zeros(len(codes), dtype=bool)
+    index, uniques = pd.factorize(codes)
+    matched = pd.Series(uniques, dtype=object).str.match(_prefix_pattern(tuple(prefixes))).to_numpy(dtype=bool)
+    return np.where(index >= 0, matched[index], False)
+
+def side_amount(lines: pd.DataFrame, side: str) -> np.ndarray:
+    """分录在指定方向的金额，net为借方减贷方"""
+    debit = lines["借方金额"].fillna(0).to_numpy(dtype=float)
+    credit = lines["贷方金额"].fillna(0).to_numpy(dtype=float)
+    if side == "debit":
+        return debit
+    if side == "credit":
+        return credit
+    return debit - credit
+
+def _keyword_hits(texts: pd.Series, groups: List[List[str]]) -> np.ndarray:
+    """对去重后的文本做一次组合正则匹配，返回各关键词组是否出现的布尔矩阵（行：文本，列：组）"""
+    pattern = re.compile("^" + "".join(
+        f"(?=.*?(?P<g{position}>{'|'.join(re.escape(k) for k in keywords)}))?"
+        for position, keywords in enumerate(groups)
+    ), re.IGNORECASE | re.DOTALL)
+    index, uniques = pd.factorize(texts.fillna("").astype(str))
+    hits = pd.Series(uniques, dtype=object).str.extract(pattern).notna().to_numpy()
+    return hits[index]
+
+def _chain_vouchers(lines: pd.DataFrame, keys: pd.Series, link_subject: str,
+                    opening: Optional[pd.Series] = None) -> Tuple[pd.Series, pd.Series]:
+    """按清理科目串联凭证：同一公司按日期、凭证号排序，前一张凭证后清理科目累计余额不为零时并入同一组
+
+    累计余额从opening（公司 → 凭证表起点的清理科目余额）开始，期初已在进行中的处置结清后，
+    后续凭证重新分组。返回 凭证 → 组号，以及各组清理科目的最终余额（分）
+    """
+    link = np.where(subject_mask(lines["科目编码"].astype(str), [link_subject]), side_amount(lines, "net"), 0.0)
+    vouchers = pd.DataFrame({
+        "key": keys.to_numpy(), "公司": lines["公司"].to_numpy(), "日期": lines["日期"].to_numpy(),
+        "号": pd.to_numeric(lines["凭证号"], errors="coerce").to_numpy(), "清理": link,
+    }).groupby("key", sort=False).agg(公司=("公司", "first"), 日期=("日期", "first"), 号=("号", "first"),
+                                      清理=("清理", "sum"))
+    vouchers = vouchers.sort_values(["公司", "日期", "号"], kind="stable")
+
+    companies = vouchers["公司"].to_numpy()
+    start = np.zeros(len(vouchers), dtype=np.int64)
+    if opening is not None:
+        start = np.rint(vouchers["公司"].map(opening).fillna(0).to_numpy(dtype=float) * 100).astype(np.int64)
+    cents = pd.Series(np.rint(vouchers["清理"].to_numpy() * 100).astype(np.int64), index=vouchers.index)
+    running = cents.groupby(companies).cumsum() + start
+    previous = running.groupby(companies).shift().fillna(pd.Series(start, index=vouchers.index)).astype(np.int64)
+    # 每家公司的首张凭证总是新起一组，不与上一家公司的组合并
+    first = pd.Series(companies).ne(pd.Series(companies).shift()).to_numpy()
+    carried = (previous != 0).to_numpy() & ~first
+    chain = pd.Series((~carried).cumsum() - 1, index=vouchers.index)
+    return chain, running.groupby(chain.to_numpy()).last()
+
+def _field_values(lines: pd.DataFrame, ids: np.ndarray, spec: Dict[str, Any], n_groups: int) -> pd.Series:
+    """文本列：在符合科目条件的分录中按组取首个、末个或去重拼接的非空值"""
+    mask = subject_mask(lines["科目编码"].astype(str), spec["subjects"]) if spec["subjects"] else np.ones(len(lines), bool)
+    values = lines[spec["column"]].where(mask).replace("", np.nan)
+    frame = pd.DataFrame({"id": ids, "value": values.to_numpy()}).dropna()
+    if spec["agg"] == "join":
+        frame = frame.astype({"value": str}).drop_duplicates()
+        result = frame.groupby("id")["value"].agg("；".join)
+    else:
+        result = frame.groupby("id")["value"].agg(spec["agg"])
+    return result.reindex(range(n_groups))
+
+def run_template(template: Dict[str, Any], voucher_df: pd.DataFrame,
+                 balance_df: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+    """在整张凭证表上执行模板，返回报表明细（每组凭证或每条触发分录一行）
+
+    给出balance_df时，串联凭证的清理科目余额从各公司凭证表起始年度的年初余额开始累计
+    """
+    codes = voucher_df["科目编码"].astype(str)
+    keep = np.ones(len(voucher_df), dtype=bool)
+    if template["exclude_summary"]:
+        keep = ~_keyword_hits(voucher_df["摘要"], [template["exclude_summary"]])[:, 0]
+
+    trigger = np.zeros(len(voucher_df), dtype=bool)
+    for condition in template["trigger"]:
+        hit = subject_mask(codes, condition["subjects"])
+        if condition["side"] != "any":
+            hit &= side_amount(voucher_df, condition["side"]) != 0
+        trigger |= hit
+    trigger &= keep
+
+    if template["row"] == "line":
+        lines = voucher_df[trigger]
+        ids = np.arange(len(lines))
+        status = None
+    else:
+        keys = voucher_keys(voucher_df)
+        in_scope = keep & keys.isin(keys[trigger].unique()).to_numpy()
+        lines, keys = voucher_df[in_scope], keys[in_scope]
+        if template["link_subject"]:
+            opening = None
+            if balance_df is not None:
+                first_years = voucher_df.groupby("公司", observed=True)["日期"].min().dropna().dt.year
+                opening = opening_balances(balance_df, template["link_subject"], first_years)
+            chain, balance = _chain_vouchers(lines, keys, template["link_subject"], opening)
+            status = np.where(balance.sort_index().to_numpy() != 0, OPEN_STATUS, CLOSED_STATUS)
+        else:
+            chain = pd.Series(np.arange(keys.nunique()), index=keys.unique())
+            status = None
+        # 没有触发分录时映射结果为空的浮点数组，显式转为整数供bincount使用
+        ids = keys.map(chain).to_numpy(dtype=np.int64)
+        # 组内分录按凭证顺序排列，使"首个/末个"取值与凭证先后一致
+        order = np.lexsort((pd.to_numeric(lines["凭证号"], errors="coerce").to_numpy(), ids))
+        lines, ids = lines.iloc[order], ids[order]
+
+    n_groups = int(ids.max()) + 1 if len(ids) else 0
+    line_codes = lines["科目编码"].astype(str)
+    grouped = pd.DataFrame({
+        "id": ids, "公司": lines["公司"].to_numpy(), "日期": lines["日期"].to_numpy(),
+        "凭证号": (lines["凭证字"].astype(str) + "-" + lines["凭证号"].astype(str)).to_numpy(),
+    })
+    rows = grouped.groupby("id").agg(公司=("公司", "first"), 日期=("日期", "max"), 分录数=("id", "size"))
+    rows.insert(2, "凭证号", grouped.drop_duplicates(["id", "凭证号"]).groupby("id")["凭证号"].agg("、".join))
+    rows = rows.reindex(range(n_groups))
+    if template["row"] == "line":
+        rows = rows.drop(columns="分录数")
+
+    if template["classify"]:
+        spec = template["classify"]
+        hits = pd.DataFrame(_keyword_hits(lines["摘要"], [rule["keywords"] for rule in spec["rules"]]))
+        hits = hits.groupby(ids).any().reindex(range(n_groups), fill_value=False).to_numpy()
+        rows[spec["column"]] = np.select(list(hits.T), [rule["label"] for rule in spec["rules"]], spec["default"])
+    for name, spec in template["fields"].items():
+        rows[name] = _field_values(lines, ids, spec, n_groups).to_numpy()
+
+    for name, spec in template["measures"].items():
+        mask = subject_mask(line_codes, spec["subjects"]) if spec["subjects"] else np.ones(len(lines), bool)
+        mask &= ~subject_mask(line_codes, spec["exclude_subjects"])
+        amount = np.where(mask, side_amount(lines, spec["side"]), 0.0)
+        rows[name] = np.round(np.bincount(ids, weights=amount, minlength=n_groups), 2)
+    for name, expression in template["derived"].items():
+        rows[name] = np.round(rows.eval(expression).astype(float), 2)
+    if status is not None:
+        rows["清理状态"] = status
+
+    return rows.sort_values(["公司", "日期"], kind="stable").reset_index(drop=True)
+
+def closing_balances(balance_df: pd.DataFrame, subject_code: str) -> pd.DataFrame:
+    """科目在各公司、年度最后一期的期末余额（借方为正）"""
+    rows = balance_df[(balance_df["科目编码"].astype(str) == subject_code) & balance_df["核算维度名称"].isna()]
+    rows = rows.sort_values("期间", kind="stable").groupby(["公司", "年份"], observed=True).last()
+    return (rows["期末余额借方"].fillna(0) - rows["期末余额贷方"].fillna(0)).rename("期末余额").reset_index()
+
+def opening_balances(balance_df: pd.DataFrame, subject_code: str, years: pd.Series) -> pd.Series:
+    """科目在各公司指定年度的年初余额（借方为正），years为 公司 → 年度，余额表缺少该年度时为0"""
+    rows = balance_df[(balance_df["科目编码"].astype(str) == subject_code) & balance_df["核算维度名称"].isna()
+                      & balance_df["年份"].notna()]
+    rows = rows.sort_values("期间", kind="stable").groupby(["公司", "年份"], observed=True).first()
+    opening = rows["期初余额借方"].fillna(0) - rows["期初余额贷方"].fillna(0)
+    opening.index = pd.MultiIndex.from_arrays([opening.index.get_level_values(0).astype(str),
+                                               opening.index.get_level_values(1).astype(int)])
+    wanted = pd.MultiIndex.from_arrays([years.index.astype(str), years.to_numpy().astype(int)])
+    return pd.Series(opening.reindex(wanted).fillna(0).to_numpy(), index=years.index.astype(str))
+
+def summarize(template: Dict[str, Any], rows: pd.DataFrame,
+              balance_df: Optional[pd.DataFrame] = None) -> Dict[str, pd.DataFrame]:
+    """按公司、年度汇总金额列（可附科目期末余额），有归类时另按类别汇总"""
+    sums = template["summary"]["sum"]
+    frame = rows.assign(年份=rows["日期"].dt.year)
+    aggregations = {"笔数": ("公司", "size"), **{name: (name, "sum") for name in sums}}
+
+    summary = frame.groupby(["公司", "年份"], observed=True).agg(**aggregations).reset_index()
+    subject = template["summary"]["balance_subject"]
+    if subject and balance_df is not None:
+        summary = summary.merge(closing_balances(balance_df, subject), on=["公司", "年份"], how="left")
+    tables = {"summary": summary}
+
+    if template["classify"]:
+        column = template["classify"]["column"]
+        tables["classes"] = frame.groupby(["公司", "年份", column], observed=True).agg(**aggregations) \
+            .reset_index().sort_values(["公司", "年份", "笔数"], ascending=[True, True, False], kind="stable")
+    return tables
+
+def _amount(value: float) -> str:
+    return "0.00" if pd.isna(value) or abs(value) < 0.005 else f"{value:,.2f}"
+
+def render_text(template: Dict[str, Any], rows: pd.DataFrame, tables: Dict[str, pd.DataFrame],
+                report_date: Optional[str] = None) -> str:
+    """生成文本报告：分析期间、按公司年度汇总、按类别统计与逐笔明细"""
+    title = f"{template['name']}分析报告"
+    report_date = report_date or pd.Timestamp.today().strftime("%Y-%m-%d")
+    lines = [title, "=" * (len(title) * 2), "", f"报告日期：{report_date}"]
+    if not rows.empty:
+        lines.append(f"分析期间：{rows['日期'].min():%Y-%m-%d} - {rows['日期'].max():%Y-%m-%d}")
+    if template["description"]:
+        lines.append(f"报表说明：{template['description']}")
+    lines.append(f"记录数：{len(rows)}")
+
+    sums = template["summary"]["sum"]
+    lines += ["", "一、按公司年度汇总", "-" * 20]
+    for company, group in tables["summary"].groupby("公司", sort=False):
+        lines.append(company)
+        for _, item in group.iterrows():
+            parts = [f"{item['笔数']}笔"] + [f"{name}{_amount(item[name])}元" for name in sums]
+            if "期末余额" in item:
+                parts.append(f"{template['summary']['balance_subject']}期末余额{_amount(item['期末余额'])}元")
+            lines.append(f"  - {item['年份']}年：" + "，".join(parts))
+
+    section = 2
+    if "classes" in tables:
+        column = template["classify"]["column"]
+        lines += ["", f"二、按{column}统计", "-" * 20]
+        for company, group in tables["classes"].groupby("公司", sort=False):
+            lines.append(company)
+            for _, item in group.iterrows():
+                parts = [f"{item['笔数']}笔"] + [f"{name}{_amount(item[name])}元" for name in sums]
+                lines.append(f"  - {item['年份']}年 {item[column]}：" + "，".join(parts))
+        section = 3
+
+    numerals = "一二三四"
+    lines += ["", f"{numerals[section - 1]}、明细", "-" * 20]
+    texts = list(template["fields"])
+    for position, (_, item) in enumerate(rows.iterrows(), 1):
+        head = [f"{item['日期']:%Y-%m-%d}", item["凭证号"], item["公司"]]
+        if template["classify"]:
+            head.append(item[template["classify"]["column"]])
+        if "清理状态" in item and item["清理状态"] == OPEN_STATUS:
+            head.append(OPEN_STATUS)
+        amounts = [f"{name}{_amount(item[name])}" for name in sums if not pd.isna(item[name]) and abs(item[name]) >= 0.005]
+        details = [f"{name}：{item[name]}" for name in texts if pd.notna(item[name])]
+        lines.append(f"{position}. " + " | ".join(str(part) for part in head))
+        if amounts:
+            lines.append("   " + "，".join(amounts))
+        for detail in details:
+            lines.append(f"   {detail}")
+    return "\n".join(lines) + "\n"
+
+def save_report(template: Dict[str, Any], rows: pd.DataFrame, text: str, directory: Path) -> List[Path]:
+    """将明细写为CSV、报告写为文本，文件名取模板ID（客户端提供的名称不进入路径）"""
+    if not TEMPLATE_ID_PATTERN.match(template["id"]):
+        raise ValueError(f"模板ID '{template['id']}' 格式不正确，应为字母、数字和下划线组合")
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    csv_path = directory / f"{template['id']}_明细表.csv"
+    text_path = directory / f"{template['id']}_分析报告.txt"
+    root = directory.resolve()
+    if any(not path.resolve().is_relative_to(root) for path in (csv_path, text_path)):
+        raise ValueError(f"报表文件路径超出输出目录: {directory}")
+    rows.to_csv(csv_path, index=False, encoding="utf-8", date_format="%Y-%m-%d", float_format="%.2f")
+    text_path.write_text(text, encoding="utf-8")
+    return [csv_path, text_path]